@@ -18,6 +18,7 @@ import hydra
 from omegaconf import DictConfig, OmegaConf, open_dict
 from hydra.utils import to_absolute_path
 from leapsim.utils.reformat import omegaconf_to_dict, print_dict
+from leapsim.utils.embodiment import Embodiment
 from leapsim.utils.utils import set_np_formatting, set_seed, get_current_commit_hash
 from leapsim.utils.rlgames_utils import RLGPUEnv, RLGPUAlgoObserver, get_rlgames_env_creator
 from rl_games.common import env_configurations, vecenv
@@ -109,6 +110,10 @@ class HardwarePlayer(object):
         self.leap_dof_lower = self.real_to_sim(self.leap_dof_lower).squeeze()
         self.leap_dof_upper = self.real_to_sim(self.leap_dof_upper).squeeze()
 
+        # Converts observations to [-1, 1] and clips targets on the GPU, in place.
+        self.embodiment = Embodiment(limits=(self.leap_dof_lower.cpu().numpy(), self.leap_dof_upper.cpu().numpy()),
+                                     backend='torch', device=self.device)
+
     def plot_callback(self):
         self.fig.canvas.restore_region(self.bg)
 
@@ -192,12 +197,9 @@ class HardwarePlayer(object):
         # hardware deployment buffer
         obs_buf = torch.from_numpy(np.zeros((1, 0)).astype(np.float32)).cuda()
 
-        def unscale(x, lower, upper):
-            return (2.0 * x - upper - lower) / (upper - lower)
-
         obses = torch.from_numpy(obses.astype(np.float32)).cuda()
         prev_target = obses[None].clone()
-        cur_obs_buf = unscale(obses, self.leap_dof_lower, self.leap_dof_upper)[None]
+        cur_obs_buf = self.embodiment.convert(obses, 'LEAPsim', 'one_range', out=obses)[None]
 
         if self.config["task"]["env"]["include_history"]:
             num_append_iters = 3
@@ -250,7 +252,7 @@ class HardwarePlayer(object):
                 action = action * torch.tensor(self.config["task"]["env"]["actions_mask"]).cuda()[None, :]
 
             target = prev_target + self.action_scale * action 
-            target = torch.clip(target, self.leap_dof_lower, self.leap_dof_upper)
+            self.embodiment.clip(target, 'LEAPsim', out=target)
             prev_target = target.clone()
         
             # interact with the hardware
@@ -267,7 +269,7 @@ class HardwarePlayer(object):
             obses = torch.from_numpy(obses.astype(np.float32)).cuda()
 
             # obs_buf_list.append(obses.cpu().numpy().squeeze())
-            cur_obs_buf = unscale(obses, self.leap_dof_lower, self.leap_dof_upper)[None]
+            cur_obs_buf = self.embodiment.convert(obses, 'LEAPsim', 'one_range', out=obses)[None]
             self.cur_obs_joint_angles = cur_obs_buf.clone()
 
             if self.debug_viz:
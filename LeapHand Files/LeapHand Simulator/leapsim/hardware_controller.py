@@ -8,15 +8,18 @@
 # https://github.com/HaozhiQi/hora/blob/main/hora/algo/deploy/robots/leap.py
 # --------------------------------------------------------
 
+import time
+
 import rospy
 from std_msgs.msg import String
 from std_msgs.msg import Float32
 from sensor_msgs.msg import JointState
 import numpy as np
 from leap_hand.srv import *
+from leapsim.utils.embodiment import Embodiment
 
 class LeapHand(object):
-    def __init__(self):
+    def __init__(self, state_timeout=0.05):
         """ Simple python interface to the leap Hand.
 
         The leapClient is a simple python interface to an leap
@@ -26,6 +29,9 @@ class LeapHand(object):
 
         The constructors sets up publishers and subscribes to the joint states
         topic for the hand.
+
+        :param state_timeout: Age (s) after which a streamed joint state is
+            stale and poll_joint_position() asks the /leap_position service.
         """
 
         # Topics (that can be remapped) for named graps
@@ -34,16 +40,28 @@ class LeapHand(object):
         # we can change the hand topic prefix (for example, to leapHand_0)
         # instead of remapping it at the command line.
         topic_joint_command = '/leaphand_node/cmd_ones'
+        topic_joint_state = '/leaphand_node/joint_states'
 
         # Publishers for above topics.
         self.pub_joint = rospy.Publisher(topic_joint_command, JointState, queue_size=10)
-        #rospy.Subscriber(topic_joint_state, JointState, self._joint_state_callback)
+        # Latest streamed state as (LEAPhand positions, time.monotonic() at receipt),
+        # replaced as a whole by the subscriber thread so readers never see half an update.
         self._joint_state = None
+        self.state_timeout = state_timeout
+        self.stream_polls = 0   # poll_joint_position() answered from the stream
+        self.service_polls = 0  # ... and from the service because the stream was stale
+        rospy.Subscriber(topic_joint_state, JointState, self._joint_state_callback, queue_size=1)
         self.leap_position = rospy.ServiceProxy('/leap_position', leap_position)
         self.leap_effort = rospy.ServiceProxy('/leap_effort', leap_effort)
+        self._embodiment = None
+
+    def _joint_state_callback(self, data):
+        self._joint_state = (np.array(data.position, dtype=np.float64), time.monotonic())
 
-    #def _joint_state_callback(self, data):
-    #self._joint_state = data
+    def joint_state_age(self):
+        """ Seconds since the last streamed joint state, inf if none yet. """
+        state = self._joint_state
+        return float('inf') if state is None else time.monotonic() - state[1]
 
     def sim_to_real(self, values):
         return values[self.sim_to_real_indices]
@@ -83,10 +101,19 @@ class LeapHand(object):
     def poll_joint_position(self):
         """ Get the current joint positions of the hand.
 
-        :param wait: If true, waits for a 'fresh' state reading.
+        Reads the latest state streamed on /leaphand_node/joint_states; only
+        when it is older than state_timeout (node not streaming, stalled or
+        just started) does it call the /leap_position service.
+
         :return: Joint positions, or None if none have been received.
         """
-        joint_position = np.array(self.leap_position().position)
+        state = self._joint_state
+        if state is not None and time.monotonic() - state[1] <= self.state_timeout:
+            joint_position = state[0]
+            self.stream_polls += 1
+        else:
+            joint_position = np.array(self.leap_position().position)
+            self.service_polls += 1
         #joint_effort = np.array(self.leap_effort().effort)
 
         joint_position = self.LEAPhand_to_sim_ones(joint_position)
@@ -101,17 +128,18 @@ class LeapHand(object):
         
         return sim_min, sim_max
 
+    @property
+    def embodiment(self):
+        # Built on first use, the limits and index maps are set by deploy.py after construction.
+        if self._embodiment is None:
+            self._embodiment = Embodiment(limits=self.LEAPsim_limits(), offset=3.14, dtype=np.float64)
+        return self._embodiment
+
     def LEAPhand_to_LEAPsim(self, joints):
-        joints = np.array(joints)
-        ret_joints = joints - 3.14
-        return ret_joints
+        return self.embodiment.LEAPhand_to_LEAPsim(joints)
 
     def LEAPhand_to_sim_ones(self, joints):
-        joints = self.LEAPhand_to_LEAPsim(joints)
-        sim_min, sim_max = self.LEAPsim_limits()
-        joints = unscale_np(joints, sim_min, sim_max)
-        
-        return joints
+        return self.embodiment.LEAPhand_to_sim_ones(joints)
 
 def unscale_np(x, lower, upper):
     return (2.0 * x - upper - lower)/(upper - lower)
@@ -0,0 +1,240 @@
+"""Finds the serial port a LEAP Hand is attached to.
+
+`find_leap_hand` pings the expected motor IDs on every candidate port in
+parallel and returns the port whose motor set matches, so a missing hand
+costs one ping timeout instead of one per port, and a different serial
+device (the glove, another Dynamixel chain) is never grabbed. The winner is
+cached by its /dev/serial/by-id name, which survives replugging and
+ttyUSB renumbering, together with the ports that were searched. On the next
+start only the cached port is pinged, as long as the same ports are there:
+a new serial device (a second hand) brings back the full search, which
+refuses to pick between two hands. Pass the ports this process already
+has open (the glove links) as `exclude`, so they are never probed.
+
+    port = find_leap_hand(range(16))
+    client = DynamixelClient(range(16), port, 4000000)
+"""
+import glob
+import json
+import logging
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Sequence
+
+from leap_hand_utils.dynamixel_client import PROTOCOL_VERSION
+
+DEFAULT_CACHE_PATH = os.path.join(os.path.expanduser('~'), '.leapglove',
+                                  'leap_hand_port.json')
+BY_ID_DIR = '/dev/serial/by-id'
+SYSFS_ROOT = '/sys'
+ADDR_MODEL_NUMBER = 0
+LEN_MODEL_NUMBER = 2
+RECOMMENDED_LATENCY_TIMER = 1  # ms; the FTDI default of 16 ms caps the read rate
+
+
+def candidate_ports(exclude: Sequence[str] = ()) -> List[str]:
+    """Lists the serial ports that could have a LEAP Hand on them.
+
+    Stable /dev/serial/by-id names come first; ttyUSB/ttyACM nodes already
+    covered by one of them are left out, and so are the ports in `exclude`
+    (under any name, see exclude_ports()).
+    """
+    if sys.platform.startswith('win'):
+        try:
+            from serial.tools import list_ports
+        except ImportError:
+            ports = ['COM{}'.format(i) for i in range(1, 21)]
+        else:
+            ports = [port.device for port in list_ports.comports()]
+        return exclude_ports(ports, exclude)
+
+    ports = sorted(glob.glob(os.path.join(BY_ID_DIR, '*')))
+    seen = {os.path.realpath(port) for port in ports}
+    for pattern in ('/dev/ttyUSB*', '/dev/ttyACM*', '/dev/tty.usbserial*'):
+        for port in sorted(glob.glob(pattern)):
+            if os.path.realpath(port) not in seen:
+                ports.append(port)
+                seen.add(os.path.realpath(port))
+    return exclude_ports(ports, exclude)
+
+
+def exclude_ports(ports: Sequence[str], exclude: Sequence[str]) -> List[str]:
+    """Returns `ports` without the ones in `exclude`.
+
+    Symlinks are resolved, so a glove opened as /dev/serial/by-id/... also
+    removes the /dev/ttyUSB node it points at, and the other way round.
+    """
+    excluded = {os.path.realpath(port) for port in exclude}
+    return [port for port in ports if os.path.realpath(port) not in excluded]
+
+
+def by_id_path(port: str, by_id_dir: str = BY_ID_DIR) -> str:
+    """Returns the /dev/serial/by-id link pointing at `port`, or `port`."""
+    target = os.path.realpath(port)
+    for link in sorted(glob.glob(os.path.join(by_id_dir, '*'))):
+        if os.path.realpath(link) == target:
+            return link
+    return port
+
+
+def probe_port(port: str, motor_ids: Sequence[int], baudrate: int = 4000000,
+               sdk=None) -> List[int]:
+    """Returns the IDs in `motor_ids` that answer on `port`.
+
+    Pings the first ID and gives up if it does not answer, so a port without
+    a hand costs a single timeout; otherwise one sync read of the model
+    number finds the rest. Ports that cannot be opened return [].
+    """
+    if sdk is None:
+        import dynamixel_sdk
+        sdk = dynamixel_sdk
+    motor_ids = list(motor_ids)
+    try:
+        port_handler = sdk.PortHandler(port)
+        if not port_handler.openPort():
+            return []
+    except Exception:
+        return []
+    found = []
+    try:
+        if not port_handler.setBaudRate(baudrate):
+            return []
+        packet_handler = sdk.PacketHandler(PROTOCOL_VERSION)
+        _, comm_result, _ = packet_handler.ping(port_handler, motor_ids[0])
+        if comm_result != sdk.COMM_SUCCESS:
+            return []
+        operation = sdk.GroupSyncRead(port_handler, packet_handler,
+                                      ADDR_MODEL_NUMBER, LEN_MODEL_NUMBER)
+        for motor_id in motor_ids:
+            operation.addParam(motor_id)
+        operation.txRxPacket()  # Missing motors time out; the rest answer
+        found = [motor_id for motor_id in motor_ids if operation.isAvailable(
+            motor_id, ADDR_MODEL_NUMBER, LEN_MODEL_NUMBER)]
+    except Exception:
+        logging.debug('Probing %s failed', port, exc_info=True)
+    finally:
+        port_handler.closePort()
+    return found
+
+
+def probe_ports(ports: Sequence[str], motor_ids: Sequence[int],
+                baudrate: int = 4000000, sdk=None) -> Dict[str, List[int]]:
+    """Probes every port in parallel; returns port -> IDs that answered."""
+    ports = list(ports)
+    if not ports:
+        return {}
+    with ThreadPoolExecutor(max_workers=len(ports)) as pool:
+        results = pool.map(
+            lambda port: probe_port(port, motor_ids, baudrate, sdk), ports)
+        return dict(zip(ports, results))
+
+
+def latency_timer_path(port: str, sysfs_root: str = SYSFS_ROOT) -> str:
+    """Returns the sysfs latency_timer file of a USB serial port."""
+    device = os.path.basename(os.path.realpath(port))
+    return os.path.join(sysfs_root, 'bus', 'usb-serial', 'devices', device,
+                        'latency_timer')
+
+
+def read_latency_timer(port: str,
+                       sysfs_root: str = SYSFS_ROOT) -> Optional[int]:
+    """Returns the FTDI latency timer (ms) of `port`, None if it has none."""
+    try:
+        with open(latency_timer_path(port, sysfs_root)) as f:
+            return int(f.read().strip())
+    except (OSError, ValueError):
+        return None
+
+
+def check_latency_timer(port: str,
+                        sysfs_root: str = SYSFS_ROOT) -> Optional[int]:
+    """Warns if the port's latency timer is above the recommended 1 ms."""
+    latency = read_latency_timer(port, sysfs_root)
+    if latency is not None and latency > RECOMMENDED_LATENCY_TIMER:
+        logging.warning(
+            'USB latency timer of %s is %d ms, every read waits that long. '
+            'Set it to %d ms: echo %d | sudo tee %s', port, latency,
+            RECOMMENDED_LATENCY_TIMER, RECOMMENDED_LATENCY_TIMER,
+            latency_timer_path(port, sysfs_root))
+    return latency
+
+
+def _load_cache(cache_path: str) -> dict:
+    try:
+        with open(cache_path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def load_cached_port(cache_path: str = DEFAULT_CACHE_PATH) -> Optional[str]:
+    """Returns the cached LEAP Hand port, or None."""
+    return _load_cache(cache_path).get('port')
+
+
+def save_cached_port(port: str, motor_ids: Sequence[int],
+                     cache_path: str = DEFAULT_CACHE_PATH,
+                     ports: Sequence[str] = ()):
+    """Remembers the LEAP Hand port, and the `ports` searched to find it,
+    for the next start."""
+    os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+    with open(cache_path, 'w') as f:
+        json.dump({'port': port, 'motor_ids': list(motor_ids),
+                   'ports': sorted(ports)}, f, indent=2)
+
+
+def find_leap_hand(motor_ids: Sequence[int], baudrate: int = 4000000,
+                   candidates: Optional[Sequence[str]] = None,
+                   cache_path: Optional[str] = DEFAULT_CACHE_PATH,
+                   sdk=None, sysfs_root: str = SYSFS_ROOT,
+                   by_id_dir: str = BY_ID_DIR,
+                   exclude: Sequence[str] = ()) -> str:
+    """Returns the port whose motors are exactly `motor_ids`.
+
+    Args:
+        motor_ids: The IDs the hand must answer to.
+        baudrate: The bus baud rate.
+        candidates: Ports to probe. Defaults to candidate_ports().
+        cache_path: Where the winning port is remembered; None disables the
+            cache. The cached port is used without searching only while the
+            candidates are the ones the search found a single hand among.
+        sdk: The DynamixelSDK module (or a stand-in, e.g. fake_dynamixel).
+        exclude: Ports that are never probed, e.g. the glove links already
+            open in this process: probing sets the port to `baudrate` and
+            writes Dynamixel pings into it.
+
+    Raises:
+        OSError: If no port, or more than one, has the expected motors.
+    """
+    expected = sorted(motor_ids)
+    if candidates is None:
+        candidates = candidate_ports(exclude)
+    else:
+        candidates = exclude_ports(candidates, exclude)
+    searched = sorted(candidates)
+    cache = _load_cache(cache_path) if cache_path else {}
+    cached = cache.get('port')
+    if cached is not None and cache.get('ports') == searched:
+        if sorted(probe_port(cached, expected, baudrate, sdk)) == expected:
+            check_latency_timer(cached, sysfs_root)
+            return cached
+        logging.info('Cached LEAP Hand port %s did not answer, searching', cached)
+        candidates = [port for port in candidates if port != cached]
+    elif cached is not None:
+        logging.info('Serial ports changed since %s was cached, searching', cached)
+
+    found = probe_ports(candidates, expected, baudrate, sdk)
+    matches = [port for port, ids in found.items() if sorted(ids) == expected]
+    if len(matches) != 1:
+        seen = {port: ids for port, ids in found.items() if ids}
+        raise OSError(
+            ('Expected one port with motors {}, found {} (motors seen: {}). '
+             'Check that the hand is powered and connected.').format(
+                 expected, matches or 'none', seen or 'none'))
+
+    port = by_id_path(matches[0], by_id_dir)
+    check_latency_timer(port, sysfs_root)
+    if cache_path:
+        save_cached_port(port, expected, cache_path, ports=searched)
+    return port
@@ -1,6 +1,8 @@
 import numpy as np
 
 from leap_hand_utils.dynamixel_client import *
+from leap_hand_utils.discovery import find_leap_hand
+from leap_hand_utils.embodiment import ALLEGRO, ONE_RANGE, CommandWriter, Embodiment
 import leap_hand_utils.leap_hand_utils as lhu
 import time
 #######################################################
@@ -31,49 +33,45 @@ class LeapNode:
         self.kD = 200
         self.curr_lim = 350
         self.prev_pos = self.pos = self.curr_pos = lhu.allegro_to_LEAPhand(np.zeros(16))
-        #You can put the correct port here or have the node auto-search for a hand at the first 3 ports.
+        #Precomputed allegro / [-1,1] -> LEAP conversions for the allegro and ones commands
+        self.embodiment = Embodiment(allegro_zeros=False, dtype=np.float64)
+        #You can put the correct port here or have the node search every serial port for a hand (leap_hand_utils/discovery.py).
         # For example ls /dev/serial/by-id/* to find your LEAP Hand. Then use the result.  
         # For example: /dev/serial/by-id/usb-FTDI_USB__-__Serial_Converter_FT7W91VW-if00-port0
         self.motors = motors = [0,1,2,3,4,5,6,7,8,9,10,11,12,13,14,15]
-        try:
-            self.dxl_client = DynamixelClient(motors, '/dev/ttyUSB0', 4000000)
-            self.dxl_client.connect()
-        except Exception:
-            try:
-                self.dxl_client = DynamixelClient(motors, '/dev/ttyUSB1', 4000000)
-                self.dxl_client.connect()
-            except Exception:
-                self.dxl_client = DynamixelClient(motors, 'COM13', 4000000)
-                self.dxl_client.connect()
+        # Pings the motors on every serial port in parallel and remembers the winning /dev/serial/by-id path, so later starts are instant.
+        self.dxl_client = DynamixelClient(motors, find_leap_hand(motors), 4000000)
+        self.dxl_client.connect()
         #Enables position-current control mode and the default parameters, it commands a position and then caps the current so the motors don't overload
-        self.dxl_client.sync_write(motors, np.ones(len(motors))*5, 11, 1)
-        self.dxl_client.set_torque_enabled(motors, True)
-        self.dxl_client.sync_write(motors, np.ones(len(motors)) * self.kP, 84, 2) # Pgain stiffness     
-        self.dxl_client.sync_write([0,4,8], np.ones(3) * (self.kP * 0.75), 84, 2) # Pgain stiffness for side to side should be a bit less
-        self.dxl_client.sync_write(motors, np.ones(len(motors)) * self.kI, 82, 2) # Igain
-        self.dxl_client.sync_write(motors, np.ones(len(motors)) * self.kD, 80, 2) # Dgain damping
-        self.dxl_client.sync_write([0,4,8], np.ones(3) * (self.kD * 0.75), 80, 2) # Dgain damping for side to side should be a bit less
-        #Max at current (in unit 1ma) so don't overheat and grip too hard #500 normal or #350 for lite
-        self.dxl_client.sync_write(motors, np.ones(len(motors)) * self.curr_lim, 102, 2)
+        #configure() reads the registers back and only writes what differs, so restarting the node on a powered hand is quick
+        side = np.isin(motors, [0,4,8])
+        self.dxl_client.configure(motors, {
+            'operating_mode': 5,
+            'position_p_gain': np.where(side, self.kP * 0.75, self.kP), # Pgain stiffness, for side to side should be a bit less
+            'position_i_gain': self.kI, # Igain
+            'position_d_gain': np.where(side, self.kD * 0.75, self.kD), # Dgain damping, for side to side should be a bit less
+            'current_limit': self.curr_lim, #Max at current (in unit 1ma) so don't overheat and grip too hard #500 normal or #350 for lite
+            'torque_enable': 1,
+        })
         self.dxl_client.write_desired_pos(self.motors, self.curr_pos)
+        #Commands are converted, clipped to the joint limits (see lhu.angle_safety_clip) and written in one pass
+        self.command = CommandWriter(self.embodiment, self.dxl_client.position_writer(self.motors))
 
     #Receive LEAP pose and directly control the robot
     def set_leap(self, pose):
+        self.command.write(pose)
         self.prev_pos = self.curr_pos
-        self.curr_pos = np.array(pose)
-        self.dxl_client.write_desired_pos(self.motors, self.curr_pos)
+        self.curr_pos = self.command.position()
     #allegro compatibility joint angles.  It adds 180 to make the fully open position at 0 instead of 180
     def set_allegro(self, pose):
-        pose = lhu.allegro_to_LEAPhand(pose, zeros=False)
+        self.command.write(pose, ALLEGRO)
         self.prev_pos = self.curr_pos
-        self.curr_pos = np.array(pose)
-        self.dxl_client.write_desired_pos(self.motors, self.curr_pos)
+        self.curr_pos = self.command.position()
     #Sim compatibility for policies, it assumes the ranges are [-1,1] and then convert to leap hand ranges.
     def set_ones(self, pose):
-        pose = lhu.sim_ones_to_LEAPhand(np.array(pose))
+        self.command.write(pose, ONE_RANGE)
         self.prev_pos = self.curr_pos
-        self.curr_pos = np.array(pose)
-        self.dxl_client.write_desired_pos(self.motors, self.curr_pos)
+        self.curr_pos = self.command.position()
     #read position of the robot
     def read_pos(self):
         return self.dxl_client.read_pos()
@@ -0,0 +1,127 @@
+"""Fixed-rate control loop that keeps only the latest command.
+
+Command callbacks (ROS subscriptions, a policy, the glove) call `submit()`,
+which only stores the pose; a command that arrives before the next tick
+replaces the pending one. `tick()` runs at the loop's own rate: it writes the
+pending goal (converted, clipped and rate limited by the CommandWriter) and
+reads position, velocity and current back right after, under one bus lock.
+The reading is cached, so `state()` answers queries without touching the
+bus and however fast commands come in, the bus sees one write + read per
+tick.
+
+The ROS 2 node drives `tick()` from a timer; anything else can call it from
+its own periodic thread.
+"""
+import threading
+import time
+from typing import Optional, Sequence
+
+import numpy as np
+
+from leap_hand_utils.embodiment import LEAPHAND, CommandWriter
+
+
+class HandState:
+    """One cached reading: pos, vel, cur (LEAP conventions), the goal sent
+    with it, timestamp (time.perf_counter()) and seq (tick count)."""
+
+    def __init__(self, num_motors: int):
+        self.pos = np.zeros(num_motors, dtype=np.float32)
+        self.vel = np.zeros(num_motors, dtype=np.float32)
+        self.cur = np.zeros(num_motors, dtype=np.float32)
+        self.goal = np.zeros(num_motors, dtype=np.float64)
+        self.timestamp = 0.0
+        self.seq = 0
+
+    def copy_from(self, other: 'HandState'):
+        self.pos[:], self.vel[:], self.cur[:] = other.pos, other.vel, other.cur
+        self.goal[:] = other.goal
+        self.timestamp, self.seq = other.timestamp, other.seq
+
+
+class HandControlLoop:
+    """Latest-command holder and state cache around a DynamixelClient.
+
+    Args:
+        client: Connected DynamixelClient for `motor_ids`.
+        command: CommandWriter on the client's position writer.
+        motor_ids: The hand's motors, in joint order.
+        bus_lock: Lock shared with anything else using the client; a new
+            RLock if None.
+
+    Attributes:
+        submitted: Commands submitted.
+        coalesced: Commands replaced by a newer one before a tick sent them.
+        sent: Goals written (unchanged goals are skipped by the writer).
+        ticks: Ticks run.
+    """
+
+    def __init__(self, client, command: CommandWriter,
+                 motor_ids: Sequence[int],
+                 bus_lock: Optional[threading.RLock] = None):
+        self.client = client
+        self.command = command
+        self.motor_ids = list(motor_ids)
+        self.bus_lock = bus_lock or threading.RLock()
+        self._pending = None  # (pose, src) waiting for the next tick
+        self._pending_lock = threading.Lock()
+        self._state = HandState(len(self.motor_ids))  # Filled by tick()
+        self._state_lock = threading.Lock()
+        self._back = HandState(len(self.motor_ids))   # Tick scratch
+        self.submitted = 0
+        self.coalesced = 0
+        self.sent = 0
+        self.ticks = 0
+        self.tick()  # Prime the cache with a first reading
+
+    def submit(self, pose, src: str = LEAPHAND):
+        """Stores `pose` (given in `src`) for the next tick."""
+        pose = np.array(pose, dtype=np.float64)
+        if pose.shape != (len(self.motor_ids),):
+            raise ValueError('Expected {} joints, got {}'.format(
+                len(self.motor_ids), pose.shape))
+        with self._pending_lock:
+            if self._pending is not None:
+                self.coalesced += 1
+            self._pending = (pose, src)
+            self.submitted += 1
+
+    def tick(self) -> HandState:
+        """Writes the pending goal, reads the hand back and caches it.
+
+        Returns the new state without copying it. Its buffers are reused
+        two ticks later, so other threads should use state() instead.
+        """
+        with self._pending_lock:
+            pending, self._pending = self._pending, None
+        back = self._back
+        with self.bus_lock:
+            if pending is not None and self.command.write(*pending):
+                self.sent += 1
+            self.client.read_pos_vel_cur(out=(back.pos, back.vel, back.cur))
+        back.timestamp = time.perf_counter()
+        back.goal[:] = self.command.position()
+        self.ticks += 1
+        back.seq = self.ticks
+        with self._state_lock:
+            self._state, self._back = back, self._state
+        return back
+
+    def state(self) -> HandState:
+        """Copy of the latest reading; never touches the bus."""
+        state = HandState(len(self.motor_ids))
+        with self._state_lock:
+            state.copy_from(self._state)
+        return state
+
+    def age(self) -> float:
+        """Seconds since the latest reading."""
+        return time.perf_counter() - self._state.timestamp
+
+    def stats(self) -> dict:
+        return {
+            'ticks': self.ticks,
+            'submitted': self.submitted,
+            'coalesced': self.coalesced,
+            'sent': self.sent,
+        }
@@ -31,6 +31,27 @@ DEFAULT_POS_SCALE = 2.0 * np.pi / 4096  # 0.088 degrees
 DEFAULT_VEL_SCALE = 0.229 * 2.0 * np.pi / 60.0  # 0.229 rpm
 DEFAULT_CUR_SCALE = 1.34
 
+# Present-state fields available to DynamixelClient.exchange().
+EXCHANGE_FIELDS = {
+    'pos': (ADDR_PRESENT_POSITION, LEN_PRESENT_POSITION),
+    'vel': (ADDR_PRESENT_VELOCITY, LEN_PRESENT_VELOCITY),
+    'cur': (ADDR_PRESENT_CURRENT, LEN_PRESENT_CURRENT),
+}
+
+# Startup configuration registers for DynamixelClient.configure(), as
+# name: (address, size). Addresses below torque enable are EEPROM and only
+# accept writes while torque is off.
+CONFIG_REGISTERS = {
+    'operating_mode': (11, 1),
+    'position_d_gain': (80, 2),
+    'position_i_gain': (82, 2),
+    'position_p_gain': (84, 2),
+    'current_limit': (102, 2),  # Goal current, the cap in current-based position mode
+    'torque_enable': (ADDR_TORQUE_ENABLE, 1),
+}
+# Registers at most this many bytes apart are read back in one sync read.
+MAX_READ_GAP = 16
+
 
 def dynamixel_cleanup_handler():
     """Cleanup function to ensure Dynamixels are disconnected properly."""
@@ -59,6 +80,154 @@ def unsigned_to_signed(value: int, size: int) -> int:
     return value
 
 
+def block_dtype(fields: Sequence[Tuple[str, int, str]], address: int,
+                size: int) -> np.dtype:
+    """Builds the record dtype of one motor's control table block.
+
+    Args:
+        fields: (name, address, dtype) of each register in the block.
+        address: The start address of the block.
+        size: The size of the block in bytes.
+    """
+    return np.dtype({
+        'names': [name for name, _, _ in fields],
+        'formats': [dtype for _, _, dtype in fields],
+        'offsets': [field_address - address for _, field_address, _ in fields],
+        'itemsize': size,
+    })
+
+
+def plan_config_writes(motor_ids: Sequence[int], targets: dict,
+                       current: Optional[dict] = None
+                       ) -> Sequence[Tuple[int, int, dict]]:
+    """Compiles a register table into the sync writes that apply it.
+
+    Args:
+        motor_ids: The motor IDs, in the order of the target arrays.
+        targets: CONFIG_REGISTERS name -> int array with one value per motor.
+        current: Same layout, the values read back from the motors. Only
+            registers that differ are written. If None, everything is.
+
+    Returns:
+        A list of (address, size, {motor_id: data bytes}) in write order:
+        EEPROM registers (with torque turned off around them where needed),
+        then runs of adjacent RAM registers merged into one write each, then
+        torque enable last.
+    """
+    def dirty(name):
+        if current is None or name not in current:
+            return np.ones(len(motor_ids), dtype=bool)
+        return np.asarray(current[name]) != targets[name]
+
+    def write(names, mask):
+        address = CONFIG_REGISTERS[names[0]][0]
+        size = sum(CONFIG_REGISTERS[name][1] for name in names)
+        data = {}
+        for index in np.flatnonzero(mask):
+            data[motor_ids[index]] = b''.join(
+                int(targets[name][index]).to_bytes(
+                    CONFIG_REGISTERS[name][1], 'little')
+                for name in names)
+        return address, size, data
+
+    names = sorted(targets, key=lambda name: CONFIG_REGISTERS[name][0])
+    eeprom = [name for name in names
+              if CONFIG_REGISTERS[name][0] < ADDR_TORQUE_ENABLE]
+    ram = [name for name in names
+           if CONFIG_REGISTERS[name][0] > ADDR_TORQUE_ENABLE]
+    plan = []
+
+    torque = None
+    if 'torque_enable' in targets:
+        torque = dirty('torque_enable')
+    unlock = np.zeros(len(motor_ids), dtype=bool)
+    eeprom_dirty = np.zeros(len(motor_ids), dtype=bool)
+    for name in eeprom:
+        eeprom_dirty |= dirty(name)
+    if current is not None and 'torque_enable' in current:
+        # Motors holding torque must let go before their EEPROM can change.
+        unlock = eeprom_dirty & (np.asarray(current['torque_enable']) != 0)
+        if unlock.any():
+            plan.append((ADDR_TORQUE_ENABLE, 1, {
+                motor_ids[index]: b'\x00' for index in np.flatnonzero(unlock)}))
+            if torque is not None:
+                torque |= unlock & (targets['torque_enable'] != 0)
+    for name in eeprom:
+        plan.append(write([name], dirty(name)))
+
+    run = []
+    for name in ram + [None]:
+        if run and (name is None or CONFIG_REGISTERS[name][0] !=
+                    sum(CONFIG_REGISTERS[run[-1]])):
+            mask = np.zeros(len(motor_ids), dtype=bool)
+            for member in run:
+                mask |= dirty(member)
+            plan.append(write(run, mask))
+            run = []
+        if name is not None:
+            run.append(name)
+
+    if torque is not None:
+        plan.append(write(['torque_enable'], torque))
+    elif unlock.any():
+        plan.append((ADDR_TORQUE_ENABLE, 1, {
+            motor_ids[index]: b'\x01' for index in np.flatnonzero(unlock)}))
+    return [entry for entry in plan if entry[2]]
+
+
+class SyncRecordBuffer:
+    """Preallocated buffer holding the raw reply of a sync read.
+
+    `records` is a structured array with one record per motor, built once
+    over the buffer with np.frombuffer, and `fields` maps each field name to
+    its (strided) view; `fill()` only copies the new bytes in.
+    """
+
+    def __init__(self, dtype: np.dtype, num_motors: int):
+        self._raw = bytearray(dtype.itemsize * num_motors)
+        self._size = dtype.itemsize
+        self.records = np.frombuffer(self._raw, dtype=dtype)
+        self.fields = {name: self.records[name] for name in dtype.names}
+
+    def fill(self, operation, motor_ids: Sequence[int]) -> bool:
+        """Copies the per-motor data bytes a GroupSyncRead stored.
+
+        Returns False if the raw data is not available or incomplete, in
+        which case the caller falls back to getData().
+        """
+        data_dict = getattr(operation, 'data_dict', None)
+        if data_dict is None:
+            return False
+        raw = self._raw
+        size = self._size
+        offset = 0
+        for motor_id in motor_ids:
+            data = data_dict.get(motor_id)
+            if data is None or len(data) != size:
+                return False
+            raw[offset:offset + size] = data
+            offset += size
+        return True
+
+
+class DynamixelSample:
+    """Read-only views of a reader's latest data, updated in place.
+
+    Attributes:
+        count: Number of successful reads so far; increases by one with
+            every read that refreshed the data.
+        timestamp: time.perf_counter() at the end of that read.
+    """
+
+    def __init__(self, **arrays: np.ndarray):
+        for name, array in arrays.items():
+            view = array.view()
+            view.flags.writeable = False
+            setattr(self, name, view)
+        self.count = 0
+        self.timestamp = 0.0
+
+
 class DynamixelClient:
     """Client for communicating with Dynamixel motors.
 
@@ -75,7 +244,8 @@ class DynamixelClient:
                  lazy_connect: bool = False,
                  pos_scale: Optional[float] = None,
                  vel_scale: Optional[float] = None,
-                 cur_scale: Optional[float] = None):
+                 cur_scale: Optional[float] = None,
+                 sdk=None):
         """Initializes a new client.
 
         Args:
@@ -93,9 +263,13 @@ class DynamixelClient:
                 motor-dependent. If not provided uses the default scale.
             cur_scale: The scaling factor for the currents. This is
                 motor-dependent. If not provided uses the default scale.
+            sdk: The module providing the DynamixelSDK API. Defaults to
+                `dynamixel_sdk`; pass `leap_hand_utils.fake_dynamixel` to run
+                without hardware.
         """
-        import dynamixel_sdk
-        self.dxl = dynamixel_sdk
+        if sdk is None:
+            import dynamixel_sdk as sdk
+        self.dxl = sdk
 
         self.motor_ids = list(motor_ids)
         self.port_name = port
@@ -140,6 +314,8 @@ class DynamixelClient:
             cur_scale=cur_scale if cur_scale is not None else DEFAULT_CUR_SCALE,
         )
         self._sync_writers = {}
+        self._exchanges = {}
+        self._position_writers = {}
 
         self.OPEN_CLIENTS.add(self)
 
@@ -199,6 +375,8 @@ class DynamixelClient:
                 forever.
             retry_interval: The number of seconds to wait between retries.
         """
+        # Enabling torque may reset the goal to the present position.
+        self._invalidate_goal_positions()
         remaining_ids = list(motor_ids)
         while remaining_ids:
             remaining_ids = self.write_byte(
@@ -215,36 +393,88 @@ class DynamixelClient:
             time.sleep(retry_interval)
             retries -= 1
 
-    def read_pos_vel_cur(self) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    # The read_* methods return fresh copies by default. For allocation-free
+    # polling, pass preallocated `out` arrays to fill, or copy=False to get
+    # the reader's DynamixelSample (read-only views, updated in place).
+    def read_pos_vel_cur(self, out=None, copy: bool = True
+                         ) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
         """Returns the current positions and velocities."""
-        return self._pos_vel_cur_reader.read()
-    def read_pos_vel(self) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        return self._pos_vel_cur_reader.read(out=out, copy=copy)
+    def read_pos_vel(self, out=None, copy: bool = True
+                     ) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
         """Returns the current positions and velocities."""
-        return self._pos_vel_reader.read()
-    def read_pos(self) -> np.ndarray:
+        return self._pos_vel_reader.read(out=out, copy=copy)
+    def read_pos(self, out=None, copy: bool = True) -> np.ndarray:
         """Returns the current positions and velocities."""
-        return self._pos_reader.read()
-    def read_vel(self) -> np.ndarray:
+        return self._pos_reader.read(out=out, copy=copy)
+    def read_vel(self, out=None, copy: bool = True) -> np.ndarray:
         """Returns the current positions and velocities."""
-        return self._vel_reader.read()
-    def read_cur(self) -> np.ndarray:
+        return self._vel_reader.read(out=out, copy=copy)
+    def read_cur(self, out=None, copy: bool = True) -> np.ndarray:
         """Returns the current positions and velocities."""
-        return self._cur_reader.read()
+        return self._cur_reader.read(out=out, copy=copy)
 
     def write_desired_pos(self, motor_ids: Sequence[int],
-                          positions: np.ndarray):
+                          positions: np.ndarray) -> bool:
         """Writes the given desired positions.
 
+        Nothing is sent if every target quantizes to the encoder tick the
+        motors were last sent; see position_writer().
+
         Args:
             motor_ids: The motor IDs to write to.
             positions: The joint angles in radians to write.
+
+        Returns:
+            Whether a sync write was sent.
         """
         assert len(motor_ids) == len(positions)
+        return self.position_writer(motor_ids).write(positions)
+
+    def position_writer(self, motor_ids: Sequence[int]
+                        ) -> 'DynamixelPositionWriter':
+        """Returns the cached goal position writer for `motor_ids`."""
+        key = tuple(motor_ids)
+        writer = self._position_writers.get(key)
+        if writer is None:
+            writer = DynamixelPositionWriter(
+                self, key, pos_scale=self._pos_vel_cur_reader.pos_scale)
+            self._position_writers[key] = writer
+        return writer
+
+    def _invalidate_goal_positions(self):
+        """Forgets the goals the position writers last sent."""
+        for writer in self._position_writers.values():
+            writer.invalidate()
+
+    def exchange(self, positions: np.ndarray,
+                 fields: Sequence[str] = ('pos', 'vel', 'cur')
+                 ) -> Tuple[np.ndarray, ...]:
+        """Writes desired positions and reads back present state in one go.
+
+        The goal position sync write and the sync read of the requested
+        fields are sent back to back, with the packets prepared beforehand.
 
-        # Convert to Dynamixel position space.
-        positions = positions / self._pos_vel_cur_reader.pos_scale
-        self.sync_write(motor_ids, positions, ADDR_GOAL_POSITION,
-                        LEN_GOAL_POSITION)
+        Args:
+            positions: The joint angles in radians for all of `motor_ids`.
+            fields: Any of 'pos', 'vel' and 'cur', in the order to return.
+
+        Returns:
+            One array per field. The arrays are preallocated and overwritten
+            by the next exchange with the same fields; copy them to keep
+            them. If the read fails they keep the previous values.
+        """
+        fields = tuple(fields)
+        operation = self._exchanges.get(fields)
+        if operation is None:
+            operation = DynamixelExchange(
+                self, self.motor_ids, fields,
+                pos_scale=self._pos_vel_cur_reader.pos_scale,
+                vel_scale=self._pos_vel_cur_reader.vel_scale,
+                cur_scale=self._pos_vel_cur_reader.cur_scale)
+            self._exchanges[fields] = operation
+        self._invalidate_goal_positions()
+        return operation.run(positions)
 
     def write_byte(
             self,
@@ -285,6 +515,8 @@ class DynamixelClient:
             size: The size of the control table value being written to.
         """
         self.check_connected()
+        if address <= ADDR_GOAL_POSITION < address + size:
+            self._invalidate_goal_positions()
         key = (address, size)
         if key not in self._sync_writers:
             self._sync_writers[key] = self.dxl.GroupSyncWrite(
@@ -307,6 +539,86 @@ class DynamixelClient:
 
         sync_writer.clearParam()
 
+    def read_registers(self, motor_ids: Sequence[int],
+                       names: Sequence[str]) -> Optional[dict]:
+        """Reads CONFIG_REGISTERS from a group of motors.
+
+        Registers close together share one sync read. Returns name -> int
+        array (one value per motor), or None if any read failed.
+        """
+        self.check_connected()
+        blocks = []  # [address, end, names]
+        for name in sorted(names, key=lambda name: CONFIG_REGISTERS[name][0]):
+            address, size = CONFIG_REGISTERS[name]
+            if blocks and address - blocks[-1][1] <= MAX_READ_GAP:
+                blocks[-1][1] = max(blocks[-1][1], address + size)
+                blocks[-1][2].append(name)
+            else:
+                blocks.append([address, address + size, [name]])
+
+        values = {}
+        for address, end, block_names in blocks:
+            operation = self.dxl.GroupSyncRead(
+                self.port_handler, self.packet_handler, address, end - address)
+            for motor_id in motor_ids:
+                operation.addParam(motor_id)
+            comm_result = operation.txRxPacket()
+            if not self.handle_packet_result(comm_result,
+                                             context='read_registers'):
+                return None
+            for name in block_names:
+                register, size = CONFIG_REGISTERS[name]
+                if not all(operation.isAvailable(motor_id, register, size)
+                           for motor_id in motor_ids):
+                    return None
+                values[name] = np.array([
+                    operation.getData(motor_id, register, size)
+                    for motor_id in motor_ids
+                ], dtype=np.int64)
+        return values
+
+    def configure(self, motor_ids: Sequence[int], config: dict,
+                  read_back: bool = True) -> int:
+        """Applies a per-motor register table with as few writes as possible.
+
+        Args:
+            motor_ids: The motor IDs to configure.
+            config: CONFIG_REGISTERS name -> value, either one value for all
+                motors or one per motor.
+            read_back: Read the registers first and skip the values the
+                motors already hold. Falls back to writing everything if the
+                read fails.
+
+        Returns:
+            The number of sync writes sent.
+        """
+        self.check_connected()
+        motor_ids = list(motor_ids)
+        targets = {
+            name: np.broadcast_to(np.asarray(value), len(motor_ids)).astype(
+                np.int64)
+            for name, value in config.items()
+        }
+        current = None
+        if read_back:
+            current = self.read_registers(motor_ids, list(targets))
+
+        plan = plan_config_writes(motor_ids, targets, current)
+        if plan:
+            self._invalidate_goal_positions()
+        for address, size, data in plan:
+            key = (address, size)
+            if key not in self._sync_writers:
+                self._sync_writers[key] = self.dxl.GroupSyncWrite(
+                    self.port_handler, self.packet_handler, address, size)
+            sync_writer = self._sync_writers[key]
+            for motor_id, value in data.items():
+                sync_writer.addParam(motor_id, value)
+            comm_result = sync_writer.txPacket()
+            self.handle_packet_result(comm_result, context='configure')
+            sync_writer.clearParam()
+        return len(plan)
+
     def check_connected(self):
         """Ensures the robot is connected."""
         if self.lazy_connect and not self.is_connected:
@@ -361,8 +673,23 @@ class DynamixelReader:
     """Reads data from Dynamixel motors.
 
     This wraps a GroupBulkRead from the DynamixelSDK.
+
+    Readers that declare FIELDS decode the whole sync read reply through a
+    structured np.frombuffer view and scale each field with one vector op.
+    The per-motor getData() loop is kept as a fallback for when the raw
+    reply is not available (or when `vectorized` is turned off).
+
+    `read()` returns copies by default; it can instead fill caller-provided
+    arrays (`out`) or return `sample`, a DynamixelSample of read-only views
+    of the reader's own arrays (`copy=False`). Neither allocates arrays.
     """
 
+    # (name, address, dtype) of the registers decoded by the vectorized path.
+    # Each name maps to the `_<name>_data` array and the `<name>_scale` factor.
+    FIELDS = ()
+    # Names of the `_<name>_data` arrays returned by read(), in order.
+    OUTPUTS = ()
+
     def __init__(self, client: DynamixelClient, motor_ids: Sequence[int],
                  address: int, size: int):
         """Initializes a new reader."""
@@ -370,7 +697,15 @@ class DynamixelReader:
         self.motor_ids = motor_ids
         self.address = address
         self.size = size
+        self.vectorized = bool(self.FIELDS)
+        self._records = (SyncRecordBuffer(block_dtype(self.FIELDS, address, size),
+                                          len(motor_ids))
+                         if self.FIELDS else None)
+        self._record_targets = None
         self._initialize_data()
+        self._outputs = self._output_arrays()
+        self.sample = DynamixelSample(
+            **dict(zip(self.OUTPUTS or ('data',), self._outputs)))
 
         self.operation = self.client.dxl.GroupSyncRead(client.port_handler,
                                                        client.packet_handler, address, size)
@@ -382,8 +717,17 @@ class DynamixelReader:
                     '[Motor ID: {}] Could not add parameter to bulk read.'
                     .format(motor_id))
 
-    def read(self, retries: int = 1):
-        """Reads data from the motors."""
+    def read(self, retries: int = 1, out=None, copy: bool = True):
+        """Reads data from the motors.
+
+        Args:
+            retries: The number of times to retry a failed read.
+            out: Optional preallocated array (or tuple of arrays, in the
+                order read() returns them) to fill instead of allocating.
+            copy: If False (and no `out`), returns `self.sample` instead of
+                copies. If the read fails, the previous data is returned
+                and `sample.count` does not change.
+        """
         self.client.check_connected()
         success = False
         while not success and retries >= 0:
@@ -394,7 +738,12 @@ class DynamixelReader:
 
         # If we failed, send a copy of the previous data.
         if not success:
-            return self._get_data()
+            return self._output(out, copy)
+
+        if self.vectorized and self._records.fill(self.operation,
+                                                  self.motor_ids):
+            self._update_records()
+            return self._finish_read(out, copy)
 
         errored_ids = []
         for i, motor_id in enumerate(self.motor_ids):
@@ -411,12 +760,47 @@ class DynamixelReader:
             logging.error('Bulk read data is unavailable for: %s',
                           str(errored_ids))
 
+        return self._finish_read(out, copy)
+
+    def _finish_read(self, out, copy: bool):
+        self.sample.count += 1
+        self.sample.timestamp = time.perf_counter()
+        return self._output(out, copy)
+
+    def _output(self, out, copy: bool):
+        """Returns the data as requested by read()."""
+        if out is not None:
+            if len(self._outputs) == 1:
+                np.copyto(out, self._outputs[0])
+            else:
+                for target, source in zip(out, self._outputs):
+                    np.copyto(target, source)
+            return out
+        if not copy:
+            return self.sample
         return self._get_data()
 
     def _initialize_data(self):
         """Initializes the cached data."""
         self._data = np.zeros(len(self.motor_ids), dtype=np.float32)
 
+    def _output_arrays(self) -> Tuple[np.ndarray, ...]:
+        """Returns the arrays read() returns, in order."""
+        if not self.OUTPUTS:
+            return (self._data,)
+        return tuple(getattr(self, '_' + name + '_data')
+                     for name in self.OUTPUTS)
+
+    def _update_records(self):
+        """Updates the data of all motors from the decoded records."""
+        if self._record_targets is None:
+            self._record_targets = [
+                (self._records.fields[name], getattr(self, name + '_scale'),
+                 getattr(self, '_' + name + '_data'))
+                for name, _, _ in self.FIELDS]
+        for field, scale, target in self._record_targets:
+            np.multiply(field, scale, out=target, casting='unsafe')
+
     def _update_data(self, index: int, motor_id: int):
         """Updates the data index for the given motor ID."""
         self._data[index] = self.operation.getData(motor_id, self.address,
@@ -430,6 +814,11 @@ class DynamixelReader:
 class DynamixelPosVelCurReader(DynamixelReader):
     """Reads positions, currents and velocities."""
 
+    FIELDS = (('cur', ADDR_PRESENT_CURRENT, '<i2'),
+              ('vel', ADDR_PRESENT_VELOCITY, '<i4'),
+              ('pos', ADDR_PRESENT_POSITION, '<i4'))
+    OUTPUTS = ('pos', 'vel', 'cur')
+
     def __init__(self,
                  client: DynamixelClient,
                  motor_ids: Sequence[int],
@@ -475,6 +864,10 @@ class DynamixelPosVelCurReader(DynamixelReader):
 class DynamixelPosVelReader(DynamixelReader):
     """Reads positions and velocities."""
 
+    FIELDS = (('vel', ADDR_PRESENT_VELOCITY, '<i4'),
+              ('pos', ADDR_PRESENT_POSITION, '<i4'))
+    OUTPUTS = ('pos', 'vel')
+
     def __init__(self,
                  client: DynamixelClient,
                  motor_ids: Sequence[int],
@@ -512,6 +905,9 @@ class DynamixelPosVelReader(DynamixelReader):
 class DynamixelPosReader(DynamixelReader):
     """Reads positions and velocities."""
 
+    FIELDS = (('pos', ADDR_PRESENT_POSITION, '<i4'),)
+    OUTPUTS = ('pos',)
+
     def __init__(self,
                  client: DynamixelClient,
                  motor_ids: Sequence[int],
@@ -544,6 +940,9 @@ class DynamixelPosReader(DynamixelReader):
 class DynamixelVelReader(DynamixelReader):
     """Reads positions and velocities."""
 
+    FIELDS = (('vel', ADDR_PRESENT_VELOCITY, '<i4'),)
+    OUTPUTS = ('vel',)
+
     def __init__(self,
                  client: DynamixelClient,
                  motor_ids: Sequence[int],
@@ -578,6 +977,9 @@ class DynamixelVelReader(DynamixelReader):
 class DynamixelCurReader(DynamixelReader):
     """Reads positions and velocities."""
 
+    FIELDS = (('cur', ADDR_PRESENT_CURRENT, '<i2'),)
+    OUTPUTS = ('cur',)
+
     def __init__(self,
                  client: DynamixelClient,
                  motor_ids: Sequence[int],
@@ -608,6 +1010,200 @@ class DynamixelCurReader(DynamixelReader):
         return self._cur_data.copy()
 
 
+class DynamixelPositionWriter:
+    """Goal position sync write that only goes out when a goal changes.
+
+    Targets are quantized to encoder ticks; if no motor's tick value changed
+    since the last write, the transaction is skipped. The sync write
+    parameter (ID + 4 goal bytes per motor) lives in a preallocated record
+    array, so a write is one rint/astype into it, one tobytes() (compared
+    with the parameter last sent) and one syncWriteTxOnly call.
+
+    Attributes:
+        sent: Number of sync writes sent.
+        skipped: Number of writes skipped because nothing changed.
+    """
+
+    def __init__(self, client: DynamixelClient, motor_ids: Sequence[int],
+                 pos_scale: float = 1.0):
+        self.client = client
+        self.motor_ids = list(motor_ids)
+        self.pos_scale = pos_scale
+        self._param = np.zeros(len(self.motor_ids),
+                               dtype=[('id', 'u1'), ('goal', '<i4')])
+        self._param['id'] = self.motor_ids
+        self._goal = self._param['goal']
+        self._scratch = np.zeros(len(self.motor_ids))
+        self._last_param = b''
+        self._valid = False
+        self.sent = 0
+        self.skipped = 0
+
+    def invalidate(self):
+        """Makes the next write() go out even if the goals look unchanged."""
+        self._valid = False
+
+    def write(self, positions: np.ndarray, force: bool = False) -> bool:
+        """Writes `positions` (radians); returns whether a packet was sent."""
+        ticks = np.rint(np.asarray(positions, dtype=np.float64) /
+                        self.pos_scale).astype('<i4')
+        return self._send(ticks, force)
+
+    def write_affine(self, x: np.ndarray, gain: np.ndarray, bias: np.ndarray,
+                     lower: np.ndarray, upper: np.ndarray,
+                     max_step: Optional[np.ndarray] = None,
+                     force: bool = False) -> bool:
+        """Writes goals `gain * x + bias` ticks, clipped and rate limited.
+
+        The whole command is computed in place in a preallocated buffer: the
+        affine map (a unit conversion folded with the encoder scale), the
+        clip to [lower, upper], the clip to within `max_step` ticks of the
+        goals last sent (skipped while those are unknown) and the rounding.
+        Everything is per motor and in ticks; see embodiment.CommandWriter.
+
+        Returns:
+            Whether a sync write was sent.
+        """
+        ticks = self._scratch
+        np.multiply(x, gain, out=ticks)
+        np.add(ticks, bias, out=ticks)
+        # maximum/minimum rather than np.clip, whose wrapper costs more than
+        # the arithmetic at this size.
+        np.maximum(ticks, lower, out=ticks)
+        np.minimum(ticks, upper, out=ticks)
+        if max_step is not None and self._valid:
+            # While valid, the goal buffer holds the goals last sent.
+            np.subtract(ticks, self._goal, out=ticks)
+            np.maximum(ticks, -max_step, out=ticks)
+            np.minimum(ticks, max_step, out=ticks)
+            np.add(ticks, self._goal, out=ticks)
+        np.rint(ticks, out=ticks)
+        return self._send(ticks, force)
+
+    def goal_positions(self) -> np.ndarray:
+        """Returns the goals of the last write, in radians."""
+        return self._goal * self.pos_scale
+
+    def _send(self, ticks: np.ndarray, force: bool) -> bool:
+        self._goal[:] = ticks
+        param = self._param.tobytes()
+        if self._valid and not force and param == self._last_param:
+            self.skipped += 1
+            return False
+
+        client = self.client
+        client.check_connected()
+        comm_result = client.packet_handler.syncWriteTxOnly(
+            client.port_handler, ADDR_GOAL_POSITION, LEN_GOAL_POSITION, param,
+            len(param))
+        if not client.handle_packet_result(comm_result,
+                                           context='write_desired_pos'):
+            self._valid = False
+            return False
+        self._last_param = param
+        self._valid = True
+        self.sent += 1
+        return True
+
+
+class DynamixelExchange:
+    """Goal position sync write followed by a sync read of present state.
+
+    Both group operations are built once with their parameters registered,
+    so a run only swaps in the new goal bytes and decodes the reply into
+    preallocated arrays.
+    """
+
+    def __init__(self,
+                 client: DynamixelClient,
+                 motor_ids: Sequence[int],
+                 fields: Sequence[str],
+                 pos_scale: float = 1.0,
+                 vel_scale: float = 1.0,
+                 cur_scale: float = 1.0):
+        unknown = [field for field in fields if field not in EXCHANGE_FIELDS]
+        if unknown or not fields:
+            raise ValueError('Invalid exchange fields: {}'.format(fields))
+        self.client = client
+        self.motor_ids = list(motor_ids)
+        self.pos_scale = pos_scale
+        scales = {'pos': pos_scale, 'vel': vel_scale, 'cur': cur_scale}
+
+        self.writer = client.dxl.GroupSyncWrite(
+            client.port_handler, client.packet_handler, ADDR_GOAL_POSITION,
+            LEN_GOAL_POSITION)
+        for motor_id in self.motor_ids:
+            if not self.writer.addParam(motor_id, bytes(LEN_GOAL_POSITION)):
+                raise OSError(
+                    '[Motor ID: {}] Could not add parameter to sync write.'
+                    .format(motor_id))
+
+        # One sync read over the smallest block covering every field.
+        self.address = min(EXCHANGE_FIELDS[field][0] for field in fields)
+        self.size = max(sum(EXCHANGE_FIELDS[field])
+                        for field in fields) - self.address
+        self.reader = client.dxl.GroupSyncRead(
+            client.port_handler, client.packet_handler, self.address,
+            self.size)
+        for motor_id in self.motor_ids:
+            if not self.reader.addParam(motor_id):
+                raise OSError(
+                    '[Motor ID: {}] Could not add parameter to sync read.'
+                    .format(motor_id))
+
+        self._records = SyncRecordBuffer(block_dtype(
+            [(field, EXCHANGE_FIELDS[field][0],
+              '<i2' if EXCHANGE_FIELDS[field][1] == 2 else '<i4')
+             for field in fields], self.address, self.size),
+            len(self.motor_ids))
+
+        # (name, address, size, unsigned buffer, signed view, scale, result)
+        self._fields = []
+        for field in fields:
+            address, size = EXCHANGE_FIELDS[field]
+            unsigned = np.zeros(len(self.motor_ids),
+                                dtype=np.uint16 if size == 2 else np.uint32)
+            signed = unsigned.view(np.int16 if size == 2 else np.int32)
+            result = np.zeros(len(self.motor_ids), dtype=np.float32)
+            self._fields.append((field, address, size, unsigned, signed,
+                                 scales[field], result))
+        self.results = tuple(field[-1] for field in self._fields)
+
+    def run(self, positions: np.ndarray) -> Tuple[np.ndarray, ...]:
+        """Writes `positions` (radians) and returns the fresh readings."""
+        self.client.check_connected()
+        assert len(positions) == len(self.motor_ids)
+        goal = np.rint(np.asarray(positions, dtype=np.float64) /
+                       self.pos_scale).astype('<i4').tobytes()
+        writer = self.writer
+        for i, motor_id in enumerate(self.motor_ids):
+            writer.changeParam(motor_id, goal[4 * i:4 * i + 4])
+
+        write_result = writer.txPacket()
+        read_result = self.reader.txRxPacket()
+
+        self.client.handle_packet_result(write_result, context='exchange')
+        if not self.client.handle_packet_result(read_result,
+                                                context='exchange'):
+            return self.results
+
+        if self._records.fill(self.reader, self.motor_ids):
+            records = self._records.fields
+            for name, _, _, _, _, scale, result in self._fields:
+                np.multiply(records[name], scale, out=result,
+                            casting='unsafe')
+            return self.results
+
+        # A successful sync read means every motor replied.
+        get_data = self.reader.getData
+        motor_ids = self.motor_ids
+        for _, address, size, unsigned, signed, scale, result in self._fields:
+            unsigned[:] = [get_data(motor_id, address, size)
+                           for motor_id in motor_ids]
+            np.multiply(signed, scale, out=result, casting='unsafe')
+        return self.results
+
+
 # Register global cleanup function.
 atexit.register(dynamixel_cleanup_handler)
 
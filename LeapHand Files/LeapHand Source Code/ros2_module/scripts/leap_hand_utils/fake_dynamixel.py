@@ -0,0 +1,433 @@
+"""In-process stand-in for the DynamixelSDK.
+
+Exposes the subset of the `dynamixel_sdk` API used by DynamixelClient
+(PortHandler, PacketHandler, GroupSyncWrite, GroupSyncRead) on top of a
+simulated chain of motors, so the client and LeapNode can run without a
+LEAP Hand attached:
+
+    client = DynamixelClient(motors, 'fake0', 4000000, sdk=fake_dynamixel)
+
+Each motor has a Protocol 2.0 (XC330/XH430) control table. EEPROM registers
+(below torque enable) only accept writes while torque is off, like the real
+servos. Timing and motion are configurable per bus, see `get_bus`:
+
+- `latency`: fixed round trip per reply (USB latency timer, OS scheduling).
+- `simulate_baud`: also charge the time the packets spend on the wire at the
+  port's baud rate (10 bits per byte) and each responder's return delay.
+- `time_constant`: first-order joint dynamics. With 0 (default) a motor with
+  torque on snaps to its goal on the next transaction; otherwise the present
+  position follows the goal with this time constant, and present velocity
+  and current are derived from it.
+"""
+import math
+import threading
+import time
+from typing import Dict, Iterable, Optional
+
+COMM_SUCCESS = 0
+COMM_PORT_BUSY = -1000
+COMM_TX_FAIL = -1001
+COMM_RX_FAIL = -1002
+COMM_RX_TIMEOUT = -3001
+
+ERRNUM_ACCESS = 7  # Status packet error: write to a locked (EEPROM) register
+
+# Control table, XC330/XH430 Protocol 2.0.
+ADDR_MODEL_NUMBER = 0
+ADDR_ID = 7
+ADDR_RETURN_DELAY_TIME = 9
+ADDR_OPERATING_MODE = 11
+ADDR_TORQUE_ENABLE = 64
+ADDR_POSITION_D_GAIN = 80
+ADDR_POSITION_I_GAIN = 82
+ADDR_POSITION_P_GAIN = 84
+ADDR_GOAL_CURRENT = 102  # The current limit in current-based position mode
+ADDR_GOAL_POSITION = 116
+ADDR_PRESENT_CURRENT = 126
+ADDR_PRESENT_VELOCITY = 128
+ADDR_PRESENT_POSITION = 132
+
+CONTROL_TABLE_SIZE = 256
+DEFAULT_POSITION = 2048  # 180 degrees, the LEAP Hand home pose
+DEFAULT_MODEL_NUMBER = 1240  # XC330-M288
+DEFAULT_REGISTERS = (  # (address, size, value) on power up
+    (ADDR_RETURN_DELAY_TIME, 1, 0),
+    (ADDR_OPERATING_MODE, 1, 3),
+    (ADDR_POSITION_P_GAIN, 2, 800),
+    (ADDR_GOAL_CURRENT, 2, 1750),
+    (ADDR_GOAL_POSITION, 4, DEFAULT_POSITION),
+    (ADDR_PRESENT_POSITION, 4, DEFAULT_POSITION),
+)
+
+POSITION_MODES = (3, 4, 5)
+CURRENT_BASED_POSITION_MODE = 5
+
+# Simulated servo internals.
+VELOCITY_UNIT = 0.229 * 4096 / 60.0  # ticks/s per present velocity unit
+CURRENT_PER_GAIN_TICK = 1.0 / 256    # present current units per P gain x tick of error
+BITS_PER_BYTE = 10                   # 8N1
+RETURN_DELAY_UNIT = 2e-6             # s per return delay time unit
+
+# Protocol 2.0 packet overhead: header(4) + id + length(2) + instruction + crc(2).
+INSTRUCTION_OVERHEAD = 10
+STATUS_OVERHEAD = 11                 # ... + error byte
+
+_BUSES: Dict[str, 'FakeDynamixelBus'] = {}
+_BUSES_LOCK = threading.Lock()
+
+
+class FakeDynamixelBus:
+    """A chain of simulated motors sharing one serial port.
+
+    Every transaction that waits for a status packet sleeps until its reply
+    would have arrived: `latency`, plus the wire time when `simulate_baud`
+    is set. Sync writes have no reply and return immediately, but keep the
+    line busy for the next transaction.
+    """
+
+    def __init__(self, motor_ids: Iterable[int] = range(16),
+                 latency: float = 0.001,
+                 simulate_baud: bool = False,
+                 time_constant: float = 0.0):
+        self.latency = latency
+        self.simulate_baud = simulate_baud
+        self.time_constant = time_constant
+        self.baudrate = None
+        self.lock = threading.Lock()
+        self.transactions = 0
+        self.bytes_sent = 0
+        self.bytes_received = 0
+        self.tables = {}
+        self.loads = {}      # Extra present current per motor (contact), dynamics only
+        self._positions = {}  # Unquantized present position, ticks
+        self._busy_until = 0.0
+        self._last_step = time.perf_counter()
+        for motor_id in motor_ids:
+            table = bytearray(CONTROL_TABLE_SIZE)
+            self.tables[motor_id] = table
+            self.write(motor_id, ADDR_MODEL_NUMBER, 2, DEFAULT_MODEL_NUMBER)
+            self.write(motor_id, ADDR_ID, 1, motor_id)
+            for address, size, value in DEFAULT_REGISTERS:
+                self.write(motor_id, address, size, value)
+            self.loads[motor_id] = 0
+            self._positions[motor_id] = float(DEFAULT_POSITION)
+
+    def read(self, motor_id: int, address: int, size: int,
+             signed: bool = False) -> int:
+        """Returns the value stored in a control table register."""
+        table = self.tables[motor_id]
+        return int.from_bytes(table[address:address + size], 'little',
+                              signed=signed)
+
+    def write(self, motor_id: int, address: int, size: int, value: int):
+        """Stores a value (signed or unsigned) into a control table register."""
+        table = self.tables[motor_id]
+        value = int(value) & ((1 << (8 * size)) - 1)
+        table[address:address + size] = value.to_bytes(size, 'little')
+
+    def writable(self, motor_id: int, address: int) -> bool:
+        """EEPROM registers are locked while torque is enabled."""
+        return (address >= ADDR_TORQUE_ENABLE or
+                not self.tables[motor_id][ADDR_TORQUE_ENABLE])
+
+    def wire_time(self, num_bytes: int) -> float:
+        """Seconds `num_bytes` take on the line at the port's baud rate."""
+        if not self.simulate_baud or not self.baudrate:
+            return 0.0
+        return num_bytes * BITS_PER_BYTE / self.baudrate
+
+    def transact(self, reply: bool = True, tx_bytes: int = 0,
+                 rx_bytes: int = 0, responders: Iterable[int] = ()):
+        """Accounts for one packet on the bus (and its reply, if any)."""
+        self.transactions += 1
+        self.bytes_sent += tx_bytes
+        now = time.perf_counter()
+        done = max(now, self._busy_until) + self.wire_time(tx_bytes)
+        if reply:
+            self.bytes_received += rx_bytes
+            done += self.latency + self.wire_time(rx_bytes)
+            if self.simulate_baud:
+                done += sum(self.tables[motor_id][ADDR_RETURN_DELAY_TIME]
+                            for motor_id in responders) * RETURN_DELAY_UNIT
+        self._busy_until = done
+        if reply and done > now:
+            time.sleep(done - now)
+        self.step()
+
+    def step(self):
+        """Advances the motors to now; only torque-enabled motors move."""
+        now = time.perf_counter()
+        dt = now - self._last_step
+        self._last_step = now
+        for motor_id in self.tables:
+            if not self.read(motor_id, ADDR_TORQUE_ENABLE, 1):
+                continue
+            goal = self.read(motor_id, ADDR_GOAL_POSITION, 4, signed=True)
+            if self.time_constant <= 0:
+                self.write(motor_id, ADDR_PRESENT_POSITION, 4, goal)
+                continue
+            self._follow(motor_id, goal, dt)
+
+    def _follow(self, motor_id: int, goal: int, dt: float):
+        """First-order tracking of the goal position over `dt` seconds."""
+        present = self.read(motor_id, ADDR_PRESENT_POSITION, 4, signed=True)
+        position = self._positions[motor_id]
+        if round(position) != present:  # Written from outside
+            position = float(present)
+        mode = self.read(motor_id, ADDR_OPERATING_MODE, 1)
+        error = goal - position if mode in POSITION_MODES else 0.0
+        gain = (self.read(motor_id, ADDR_POSITION_P_GAIN, 2) *
+                CURRENT_PER_GAIN_TICK)
+        # Error beyond which the motor asks for more than its current limit.
+        saturation = math.inf
+        if mode == CURRENT_BASED_POSITION_MODE and gain > 0:
+            saturation = self.read(motor_id, ADDR_GOAL_CURRENT, 2) / gain
+        remaining = abs(error)
+        if remaining > saturation:
+            # Saturated: the joint closes the error at the limited rate
+            # until it is back in the linear region.
+            saturated_time = ((remaining - saturation) * self.time_constant /
+                              saturation)
+            if dt <= saturated_time:
+                remaining -= saturation * dt / self.time_constant
+            else:
+                remaining = saturation * math.exp(
+                    -(dt - saturated_time) / self.time_constant)
+        else:
+            remaining *= math.exp(-dt / self.time_constant)
+        move = math.copysign(abs(error) - remaining, error)
+        current = math.copysign(gain * min(remaining, saturation), error)
+        position += move
+        self._positions[motor_id] = position
+        velocity = move / dt / VELOCITY_UNIT if dt > 0 else 0.0
+        self.write(motor_id, ADDR_PRESENT_POSITION, 4, round(position))
+        self.write(motor_id, ADDR_PRESENT_VELOCITY, 4, round(velocity))
+        self.write(motor_id, ADDR_PRESENT_CURRENT, 2,
+                   round(current) + self.loads[motor_id])
+
+
+def get_bus(port: str, motor_ids: Optional[Iterable[int]] = None,
+            **kwargs) -> FakeDynamixelBus:
+    """Returns the bus attached to `port`, creating it on first use.
+
+    Keyword arguments (latency, simulate_baud, time_constant) only apply when
+    the bus is created.
+    """
+    with _BUSES_LOCK:
+        if port not in _BUSES:
+            _BUSES[port] = FakeDynamixelBus(
+                motor_ids if motor_ids is not None else range(16), **kwargs)
+        return _BUSES[port]
+
+
+def reset_buses():
+    """Forgets every simulated bus."""
+    with _BUSES_LOCK:
+        _BUSES.clear()
+
+
+class PortHandler:
+    """Simulated serial port; attaches to the bus registered for the name."""
+
+    def __init__(self, port_name: str):
+        self.port_name = port_name
+        self.baudrate = None
+        self.is_open = False
+        self.is_using = False
+        self.bus = get_bus(port_name)
+
+    def openPort(self) -> bool:
+        self.is_open = True
+        return True
+
+    def closePort(self):
+        self.is_open = False
+
+    def setBaudRate(self, baudrate: int) -> bool:
+        self.baudrate = baudrate
+        self.bus.baudrate = baudrate
+        return True
+
+
+class PacketHandler:
+    """Simulated Protocol 2.0 packet handler."""
+
+    def __init__(self, protocol_version: float = 2.0):
+        self.protocol_version = protocol_version
+
+    def ping(self, port: PortHandler, motor_id: int):
+        """Returns (model_number, comm_result, error)."""
+        bus = port.bus
+        with bus.lock:
+            present = motor_id in bus.tables
+            bus.transact(tx_bytes=INSTRUCTION_OVERHEAD,
+                         rx_bytes=STATUS_OVERHEAD + 3 if present else 0,
+                         responders=(motor_id,) if present else ())
+        if not present:
+            return 0, COMM_RX_TIMEOUT, 0
+        return bus.read(motor_id, ADDR_MODEL_NUMBER, 2), COMM_SUCCESS, 0
+
+    def _read_tx_rx(self, port: PortHandler, motor_id: int, address: int,
+                    size: int):
+        bus = port.bus
+        if motor_id not in bus.tables:
+            return 0, COMM_RX_TIMEOUT, 0
+        with bus.lock:
+            bus.transact(tx_bytes=INSTRUCTION_OVERHEAD + 4,
+                         rx_bytes=STATUS_OVERHEAD + size,
+                         responders=(motor_id,))
+            return bus.read(motor_id, address, size), COMM_SUCCESS, 0
+
+    def _write_tx_rx(self, port: PortHandler, motor_id: int, address: int,
+                     size: int, value: int):
+        bus = port.bus
+        if motor_id not in bus.tables:
+            return COMM_RX_TIMEOUT, 0
+        with bus.lock:
+            error = 0
+            if bus.writable(motor_id, address):
+                bus.write(motor_id, address, size, value)
+            else:
+                error = ERRNUM_ACCESS
+            bus.transact(tx_bytes=INSTRUCTION_OVERHEAD + 2 + size,
+                         rx_bytes=STATUS_OVERHEAD, responders=(motor_id,))
+        return COMM_SUCCESS, error
+
+    def read1ByteTxRx(self, port: PortHandler, motor_id: int, address: int):
+        return self._read_tx_rx(port, motor_id, address, 1)
+
+    def read2ByteTxRx(self, port: PortHandler, motor_id: int, address: int):
+        return self._read_tx_rx(port, motor_id, address, 2)
+
+    def read4ByteTxRx(self, port: PortHandler, motor_id: int, address: int):
+        return self._read_tx_rx(port, motor_id, address, 4)
+
+    def write1ByteTxRx(self, port: PortHandler, motor_id: int, address: int,
+                       value: int):
+        return self._write_tx_rx(port, motor_id, address, 1, value)
+
+    def write2ByteTxRx(self, port: PortHandler, motor_id: int, address: int,
+                       value: int):
+        return self._write_tx_rx(port, motor_id, address, 2, value)
+
+    def write4ByteTxRx(self, port: PortHandler, motor_id: int, address: int,
+                       value: int):
+        return self._write_tx_rx(port, motor_id, address, 4, value)
+
+    def syncWriteTxOnly(self, port: PortHandler, start_address: int,
+                        data_length: int, param, param_length: int) -> int:
+        """Sync write from a raw parameter block: (ID, data) per motor."""
+        bus = port.bus
+        param = bytes(param[:param_length])
+        stride = 1 + data_length
+        with bus.lock:
+            for offset in range(0, param_length, stride):
+                motor_id = param[offset]
+                if (motor_id in bus.tables and
+                        bus.writable(motor_id, start_address)):
+                    bus.tables[motor_id][start_address:start_address +
+                                         data_length] = param[
+                                             offset + 1:offset + stride]
+            bus.transact(reply=False,
+                         tx_bytes=INSTRUCTION_OVERHEAD + 4 + param_length)
+        return COMM_SUCCESS
+
+    def getTxRxResult(self, comm_result: int) -> str:
+        return '[FakeDynamixel] communication result {}'.format(comm_result)
+
+    def getRxPacketError(self, error: int) -> str:
+        if error == 0:
+            return ''
+        return '[FakeDynamixel] packet error {}'.format(error)
+
+
+class GroupSyncWrite:
+    """Simulated sync write of one register to several motors."""
+
+    def __init__(self, port: PortHandler, packet_handler: PacketHandler,
+                 start_address: int, data_length: int):
+        self.port = port
+        self.start_address = start_address
+        self.data_length = data_length
+        self.data_dict = {}
+
+    def addParam(self, motor_id: int, data) -> bool:
+        if motor_id in self.data_dict or len(data) != self.data_length:
+            return False
+        self.data_dict[motor_id] = bytes(data)
+        return True
+
+    def changeParam(self, motor_id: int, data) -> bool:
+        if motor_id not in self.data_dict or len(data) != self.data_length:
+            return False
+        self.data_dict[motor_id] = bytes(data)
+        return True
+
+    def clearParam(self):
+        self.data_dict.clear()
+
+    def txPacket(self) -> int:
+        bus = self.port.bus
+        with bus.lock:
+            for motor_id, data in self.data_dict.items():
+                if (motor_id in bus.tables and
+                        bus.writable(motor_id, self.start_address)):
+                    bus.tables[motor_id][self.start_address:self.start_address
+                                         + self.data_length] = data
+            bus.transact(reply=False, tx_bytes=INSTRUCTION_OVERHEAD + 4 +
+                         len(self.data_dict) * (1 + self.data_length))
+        return COMM_SUCCESS
+
+
+class GroupSyncRead:
+    """Simulated sync read of one register block from several motors."""
+
+    def __init__(self, port: PortHandler, packet_handler: PacketHandler,
+                 start_address: int, data_length: int):
+        self.port = port
+        self.start_address = start_address
+        self.data_length = data_length
+        self.data_dict = {}
+
+    def addParam(self, motor_id: int) -> bool:
+        if motor_id in self.data_dict:
+            return False
+        self.data_dict[motor_id] = None
+        return True
+
+    def clearParam(self):
+        self.data_dict.clear()
+
+    def txRxPacket(self) -> int:
+        bus = self.port.bus
+        with bus.lock:
+            responders = [motor_id for motor_id in self.data_dict
+                          if motor_id in bus.tables]
+            bus.transact(tx_bytes=INSTRUCTION_OVERHEAD + 4 +
+                         len(self.data_dict),
+                         rx_bytes=len(responders) *
+                         (STATUS_OVERHEAD + self.data_length),
+                         responders=responders)
+            for motor_id in self.data_dict:
+                table = bus.tables.get(motor_id)
+                self.data_dict[motor_id] = (
+                    None if table is None else bytes(
+                        table[self.start_address:self.start_address +
+                              self.data_length]))
+        if any(data is None for data in self.data_dict.values()):
+            return COMM_RX_TIMEOUT
+        return COMM_SUCCESS
+
+    def isAvailable(self, motor_id: int, address: int,
+                    data_length: int) -> bool:
+        if self.data_dict.get(motor_id) is None:
+            return False
+        return (address >= self.start_address and address + data_length <=
+                self.start_address + self.data_length)
+
+    def getData(self, motor_id: int, address: int, data_length: int) -> int:
+        if not self.isAvailable(motor_id, address, data_length):
+            return 0
+        offset = address - self.start_address
+        return int.from_bytes(
+            self.data_dict[motor_id][offset:offset + data_length], 'little')
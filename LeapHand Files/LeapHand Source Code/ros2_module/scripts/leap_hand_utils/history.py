@@ -0,0 +1,77 @@
+"""Ring buffer of the latest hand readings.
+
+The node's polling loop appends every reading (timestamp, position, velocity,
+current); `last(k)` hands back the newest k in time order with one copy per
+field, so a history service can answer "the last 50 samples" in a single
+response instead of the client polling 50 times:
+
+    history = StateHistory(16, capacity=1000)
+    history.append(t, pos, vel, cur)           # polling loop
+    t, pos, vel, cur = history.last(50)        # service: (50,), (50, 16) x 3
+
+Storage is preallocated (float64 times, float32 readings like the client's
+reads), so appending allocates nothing.
+"""
+import threading
+
+import numpy as np
+
+# Name of the stream hand readings are recorded under, shared with the
+# session recorder (glove_utils.recorder.HAND).
+HAND_STREAM = 'hand'
+
+
+class StateHistory:
+    """Fixed-size, thread-safe ring buffer of (t, pos, vel, cur) samples.
+
+    Args:
+        num_motors: Values per reading.
+        capacity: Samples kept; the oldest are overwritten.
+
+    Attributes:
+        appended: Samples appended so far (including overwritten ones).
+    """
+
+    def __init__(self, num_motors: int, capacity: int = 1000):
+        if capacity <= 0:
+            raise ValueError('capacity must be positive, got {}'.format(capacity))
+        self.num_motors = num_motors
+        self.capacity = capacity
+        self._t = np.zeros(capacity, dtype=np.float64)
+        self._pos = np.zeros((capacity, num_motors), dtype=np.float32)
+        self._vel = np.zeros((capacity, num_motors), dtype=np.float32)
+        self._cur = np.zeros((capacity, num_motors), dtype=np.float32)
+        self._lock = threading.Lock()
+        self.appended = 0
+
+    def __len__(self):
+        return min(self.appended, self.capacity)
+
+    def append(self, t: float, pos, vel, cur):
+        """Stores one reading, overwriting the oldest once full."""
+        with self._lock:
+            index = self.appended % self.capacity
+            self._t[index] = t
+            self._pos[index] = pos
+            self._vel[index] = vel
+            self._cur[index] = cur
+            self.appended += 1
+
+    def last(self, k: int = 0):
+        """Returns the newest `k` samples (all buffered if 0), oldest first.
+
+        Returns:
+            (t, pos, vel, cur): copies shaped (n,) and (n, num_motors), with
+            n = min(k, len(self)).
+        """
+        with self._lock:
+            size = min(self.appended, self.capacity)
+            count = size if k <= 0 else min(k, size)
+            stop = self.appended % self.capacity
+            index = np.arange(stop - count, stop) % self.capacity
+            return (self._t[index], self._pos[index], self._vel[index],
+                    self._cur[index])
+
+    def clear(self):
+        with self._lock:
+            self.appended = 0
@@ -1,9 +1,10 @@
 '''
 Some utilities for LEAP Hand that help with converting joint angles between each convention.
 '''
-from re import L
 import numpy as np
 
+from leap_hand_utils.embodiment import sim_limits
+
 
 '''
 Embodiments:
@@ -12,6 +13,9 @@ LEAPhand: Real LEAP hand (180 for the motor is actual zero)
 LEAPsim:  Leap hand in sim (has allegro-like zero positions)
 one_range: [-1, 1] for all joints to facilitate RL
 allegro:  Allegro hand in real or sim
+
+These work on one pose at a time and allocate on every call. For control loops and batches use
+leap_hand_utils.embodiment.Embodiment, which precomputes the same conversions and applies them in place.
 '''
 
 #Safety clips all joints so nothing unsafe can happen. Highly recommend using this before commanding
@@ -22,10 +26,9 @@ def angle_safety_clip(joints):
     return np.clip(joints, real_min, real_max)
 
 ###Sometimes it's useful to constrain the thumb more heavily(you have to implement here), but regular usually works good.
+###Unknown types raise a ValueError (the limits live in embodiment.py).
 def LEAPsim_limits(type = "regular"):
-    sim_min = np.array([-1.047, -0.314, -0.506, -0.366, -1.047, -0.314, -0.506, -0.366, -1.047, -0.314, -0.506, -0.366, -0.349, -0.47, -1.20, -1.34])
-    sim_max = np.array([1.047,    2.23,  1.885,  2.042,  1.047,   2.23,  1.885,  2.042,  1.047,   2.23,  1.885,  2.042,  2.094,  2.443, 1.90,  1.88])
-    return sim_min, sim_max
+    return sim_limits(type)
 
 #this goes from [-1, 1] to [lower, upper]
 def scale(x, lower, upper):
@@ -37,14 +40,14 @@ def unscale(x, lower, upper):
 #-----------------------------------------------------------------------------------
 #Isaac has custom ranges from -1 to 1 so we convert that to LEAPHand real world
 def sim_ones_to_LEAPhand(joints, hack_thumb = False):
-    sim_min, sim_max = LEAPsim_limits(type = hack_thumb)
+    sim_min, sim_max = LEAPsim_limits(type = "hack_thumb" if hack_thumb else "regular")
     joints = scale(joints, sim_min, sim_max)
     joints = LEAPsim_to_LEAPhand(joints)
     return joints
 #LEAPHand real world to Isaac has custom ranges from -1 to 1
 def LEAPhand_to_sim_ones(joints, hack_thumb = False):  
     joints = LEAPhand_to_LEAPsim(joints)
-    sim_min, sim_max = LEAPsim_limits(type = hack_thumb)
+    sim_min, sim_max = LEAPsim_limits(type = "hack_thumb" if hack_thumb else "regular")
     joints = unscale(joints, sim_min, sim_max)
     return joints
 
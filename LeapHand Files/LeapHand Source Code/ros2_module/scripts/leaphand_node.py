@@ -1,14 +1,22 @@
 #!/usr/bin/env python3
 
+import array
+
 import numpy as np
 import rclpy
+from rclpy.callback_groups import MutuallyExclusiveCallbackGroup, ReentrantCallbackGroup
+from rclpy.executors import MultiThreadedExecutor
 from rclpy.node import Node
 from sensor_msgs.msg import JointState
 from std_msgs.msg import String
 
+from leap_hand_utils.control_loop import HandControlLoop
 from leap_hand_utils.dynamixel_client import DynamixelClient
+from leap_hand_utils.discovery import find_leap_hand
+from leap_hand_utils.embodiment import ALLEGRO, LEAPHAND, ONE_RANGE, CommandWriter, Embodiment
+from leap_hand_utils.history import StateHistory
 import leap_hand_utils.leap_hand_utils as lhu
-from leap_hand.srv import LeapPosition, LeapVelocity, LeapEffort, LeapPosVelEff
+from leap_hand.srv import LeapPosition, LeapVelocity, LeapEffort, LeapPosVelEff, LeapHistory, LeapHistoryPacked
 
 #LEAP hand conventions:
 #180 is flat out home pose for the index, middle, ring, finger MCPs.
@@ -18,8 +26,13 @@ from leap_hand.srv import LeapPosition, LeapVelocity, LeapEffort, LeapPosVelEff
 #The joint numbering goes from Index (0-3), Middle(4-7), Ring(8-11) to Thumb(12-15) and from MCP Side, MCP Forward, PIP, DIP for each finger.
 #For instance, the MCP Side of Index is ID 0, the MCP Forward of Ring is 9, the DIP of Ring is 11
 
-#I recommend you only query when necessary and below 90 samples a second.  Used the combined commands if you can to save time.  Also don't forget about the USB latency settings in the readme.
-#The services allow you to always have the latest data when you want it, and not spam the communication lines with unused data.
+#The node runs one control timer at control_rate (Hz). Command topics only store the latest pose; each tick writes it
+#(if it changed) and reads position, velocity and current right after, then publishes them as sensor_msgs/JointState on
+#joint_states. The services answer from that cached reading, so they never wait on the bus and polling them does not
+#slow the hand down. Subscribe to joint_states instead of polling if you need every sample.
+#Every reading also goes into a ring buffer of the last history_size ticks. leap_history returns the newest `count` of them
+#with their stamps in one response (leap_history_packed: the same as float32), e.g. for an observation history or logging.
+#Set fake_hardware to true to run the node against the simulated bus in leap_hand_utils/fake_dynamixel.py.
 
 class LeapNode(Node):
     def __init__(self):
@@ -29,105 +42,175 @@ class LeapNode(Node):
         self.kI = self.declare_parameter('kI', 0.0).get_parameter_value().double_value
         self.kD = self.declare_parameter('kD', 200.0).get_parameter_value().double_value
         self.curr_lim = self.declare_parameter('curr_lim', 350.0).get_parameter_value().double_value
+        # Control loop rate (Hz): one goal write + state read and one joint_states message per tick
+        self.control_rate = self.declare_parameter('control_rate', 100.0).get_parameter_value().double_value
+        # Serial port of the hand, empty to search for it
+        port = self.declare_parameter('port', '').get_parameter_value().string_value
+        # Run on the simulated bus (leap_hand_utils/fake_dynamixel.py) instead of a real hand
+        fake_hardware = self.declare_parameter('fake_hardware', False).get_parameter_value().bool_value
+        # Control ticks kept for the history services (10 s at 100 Hz)
+        history_size = self.declare_parameter('history_size', 1000).get_parameter_value().integer_value
         self.ema_amount = 0.2
         self.prev_pos = self.pos = self.curr_pos = lhu.allegro_to_LEAPhand(np.zeros(16))
+        # Precomputed allegro / [-1,1] -> LEAP conversions for the allegro and ones commands
+        self.embodiment = Embodiment(allegro_zeros=False, dtype=np.float64)
 
-        # Subscribes to a variety of sources that can command the hand
-        self.create_subscription(JointState, 'cmd_leap', self._receive_pose, 10)
-        self.create_subscription(JointState, 'cmd_allegro', self._receive_allegro, 10)
-        self.create_subscription(JointState, 'cmd_ones', self._receive_ones, 10)
-
-        # Creates services that can give information about the hand out
-        self.create_service(LeapPosition, 'leap_position', self.pos_srv)
-        self.create_service(LeapVelocity, 'leap_velocity', self.vel_srv)
-        self.create_service(LeapEffort, 'leap_effort', self.eff_srv)
-        self.create_service(LeapPosVelEff, 'leap_pos_vel_eff', self.pos_vel_eff_srv)
-        self.create_service(LeapPosVelEff, 'leap_pos_vel', self.pos_vel_srv)
-        # You can put the correct port here or have the node auto-search for a hand at the first 3 ports.
+        # You can put the correct port here or have the node search every serial port for a hand (leap_hand_utils/discovery.py).
         # For example ls /dev/serial/by-id/* to find your LEAP Hand. Then use the result.  
         # For example: /dev/serial/by-id/usb-FTDI_USB__-__Serial_Converter_FT7W91VW-if00-port0
         self.motors = [0,1,2,3,4,5,6,7,8,9,10,11,12,13,14,15]
-        try:
-            self.dxl_client = DynamixelClient(self.motors, '/dev/ttyUSB0', 4000000)
-            self.dxl_client.connect()
-        except Exception:
-            try:
-                self.dxl_client = DynamixelClient(self.motors, '/dev/ttyUSB1', 4000000)
-                self.dxl_client.connect()
-            except Exception:
-                self.dxl_client = DynamixelClient(self.motors, '/dev/ttyUSB2', 4000000)
-                self.dxl_client.connect()
+        if fake_hardware:
+            from leap_hand_utils import fake_dynamixel
+            self.dxl_client = DynamixelClient(self.motors, port or 'fake-leaphand', 4000000, sdk=fake_dynamixel)
+        else:
+            # Pings the motors on every serial port in parallel and remembers the winning /dev/serial/by-id path, so later starts are instant.
+            self.dxl_client = DynamixelClient(self.motors, port or find_leap_hand(self.motors), 4000000)
+        self.dxl_client.connect()
 
         # Enables position-current control mode and the default parameters
-        self.dxl_client.sync_write(self.motors, np.ones(len(self.motors)) * 5, 11, 1)
-        self.dxl_client.set_torque_enabled(self.motors, True)
-        self.dxl_client.sync_write(self.motors, np.ones(len(self.motors)) * self.kP, 84, 2)  # Pgain stiffness     
-        self.dxl_client.sync_write([0,4,8], np.ones(3) * (self.kP * 0.75), 84, 2)  # Pgain stiffness for side to side should be a bit less
-        self.dxl_client.sync_write(self.motors, np.ones(len(self.motors)) * self.kI, 82, 2)  # Igain
-        self.dxl_client.sync_write(self.motors, np.ones(len(self.motors)) * self.kD, 80, 2)  # Dgain damping
-        self.dxl_client.sync_write([0,4,8], np.ones(3) * (self.kD * 0.75), 80, 2)  # Dgain damping for side to side should be a bit less
-        # Max at current (in unit 1ma) so don't overheat and grip too hard
-        self.dxl_client.sync_write(self.motors, np.ones(len(self.motors)) * self.curr_lim, 102, 2)
+        # configure() reads the registers back and only writes what differs, so restarting the node on a powered hand is quick
+        side = np.isin(self.motors, [0,4,8])
+        self.dxl_client.configure(self.motors, {
+            'operating_mode': 5,
+            'position_p_gain': np.where(side, self.kP * 0.75, self.kP),  # Pgain stiffness, for side to side should be a bit less
+            'position_i_gain': self.kI,  # Igain
+            'position_d_gain': np.where(side, self.kD * 0.75, self.kD),  # Dgain damping, for side to side should be a bit less
+            'current_limit': self.curr_lim,  # Max at current (in unit 1ma) so don't overheat and grip too hard
+            'torque_enable': 1,
+        })
         self.dxl_client.write_desired_pos(self.motors, self.curr_pos)
+        # Commands are converted, clipped to the joint limits (see lhu.angle_safety_clip) and written in one pass
+        self.command = CommandWriter(self.embodiment, self.dxl_client.position_writer(self.motors))
+        # Holds the latest command and the latest reading; only the control timer touches the bus
+        self.loop = HandControlLoop(self.dxl_client, self.command, self.motors)
+        # The last history_size readings, stamped with the node clock
+        self.history = StateHistory(len(self.motors), history_size)
+
+        # Callback groups for the MultiThreadedExecutor: the control timer never overlaps itself, while commands and
+        # service requests only touch the loop's pending command and cached state, so they can run alongside it.
+        self.control_group = MutuallyExclusiveCallbackGroup()
+        self.io_group = ReentrantCallbackGroup()
+
+        # Publishes the hand state read every control tick
+        self.joint_state = JointState()
+        self.joint_state.name = ['joint_{}'.format(motor) for motor in self.motors]
+        self.joint_state_pub = self.create_publisher(JointState, 'joint_states', 10)
+
+        # Subscribes to a variety of sources that can command the hand
+        self.create_subscription(JointState, 'cmd_leap', self._receive_pose, 10, callback_group=self.io_group)
+        self.create_subscription(JointState, 'cmd_allegro', self._receive_allegro, 10, callback_group=self.io_group)
+        self.create_subscription(JointState, 'cmd_ones', self._receive_ones, 10, callback_group=self.io_group)
+
+        # Creates services that can give information about the hand out
+        self.create_service(LeapPosition, 'leap_position', self.pos_srv, callback_group=self.io_group)
+        self.create_service(LeapVelocity, 'leap_velocity', self.vel_srv, callback_group=self.io_group)
+        self.create_service(LeapEffort, 'leap_effort', self.eff_srv, callback_group=self.io_group)
+        self.create_service(LeapPosVelEff, 'leap_pos_vel_eff', self.pos_vel_eff_srv, callback_group=self.io_group)
+        self.create_service(LeapPosVelEff, 'leap_pos_vel', self.pos_vel_srv, callback_group=self.io_group)
+        self.create_service(LeapHistory, 'leap_history', self.history_srv, callback_group=self.io_group)
+        self.create_service(LeapHistoryPacked, 'leap_history_packed', self.history_packed_srv, callback_group=self.io_group)
+
+        self.create_timer(1.0 / self.control_rate, self._control_tick, callback_group=self.control_group)
 
-    # Receive LEAP pose and directly control the robot.  Fully open here is 180 and increases in this value closes the hand.
+    # Receive LEAP pose and hand it to the next control tick.  Fully open here is 180 and increases in this value closes the hand.
     def _receive_pose(self, msg):
-        pose = msg.position
-        self.prev_pos = self.curr_pos
-        self.curr_pos = np.array(pose)
-        self.dxl_client.write_desired_pos(self.motors, self.curr_pos)
+        self._submit(msg, LEAPHAND)
 
     #Allegro compatibility, first read the allegro publisher and then convert to leap
     #It adds 180 to the input to make the fully open position at 0 instead of 180.
     def _receive_allegro(self, msg):
-        pose = lhu.allegro_to_LEAPhand(msg.position, zeros=False)
-        self.prev_pos = self.curr_pos
-        self.curr_pos = np.array(pose)
-        self.dxl_client.write_desired_pos(self.motors, self.curr_pos)
+        self._submit(msg, ALLEGRO)
 
     # Sim compatibility, first read the sim publisher and then convert to leap
     #Sim compatibility for policies, it assumes the ranges are [-1,1] and then convert to leap hand ranges.
     def _receive_ones(self, msg):
-        pose = lhu.sim_ones_to_LEAPhand(np.array(msg.position))
-        self.prev_pos = self.curr_pos
-        self.curr_pos = np.array(pose)
-        self.dxl_client.write_desired_pos(self.motors, self.curr_pos)
+        self._submit(msg, ONE_RANGE)
 
-    # Service that reads and returns the pos of the robot in regular LEAP Embodiment scaling.
+    # Only the newest command per tick is sent, older ones are dropped (counted in self.loop.coalesced)
+    def _submit(self, msg, src):
+        try:
+            self.loop.submit(msg.position, src)
+        except ValueError as e:
+            self.get_logger().warn('Ignoring command: {}'.format(e), throttle_duration_sec=1.0)
+
+    # Control tick: write the latest command, read the hand back once and publish it
+    def _control_tick(self):
+        state = self.loop.tick()
+        if not np.array_equal(state.goal, self.curr_pos):
+            self.prev_pos = self.curr_pos
+            self.curr_pos = state.goal.copy()
+        now = self.get_clock().now()
+        self.history.append(now.nanoseconds * 1e-9, state.pos, state.vel, state.cur)
+        msg = self.joint_state
+        msg.header.stamp = now.to_msg()
+        msg.position = state.pos.tolist()
+        msg.velocity = state.vel.tolist()
+        msg.effort = state.cur.tolist()
+        self.joint_state_pub.publish(msg)
+
+    # Service that returns the latest pos of the robot in regular LEAP Embodiment scaling.
     def pos_srv(self, request, response):
-        response.position = self.dxl_client.read_pos().tolist()
+        response.position = self.loop.state().pos.tolist()
         return response
 
-    # Service that reads and returns the vel of the robot in LEAP Embodiment
+    # Service that returns the latest vel of the robot in LEAP Embodiment
     def vel_srv(self, request, response):
-        response.velocity = self.dxl_client.read_vel().tolist()
+        response.velocity = self.loop.state().vel.tolist()
         return response
 
-    # Service that reads and returns the effort/current of the robot in LEAP Embodiment
+    # Service that returns the latest effort/current of the robot in LEAP Embodiment
     def eff_srv(self, request, response):
-        response.effort = self.dxl_client.read_cur().tolist()
+        response.effort = self.loop.state().cur.tolist()
         return response
-    #Use these combined services to save a lot of latency if you need multiple datapoints
+    #The combined services return one consistent reading from the same control tick
     def pos_vel_srv(self, request, response):
-        output = self.dxl_client.read_pos_vel()
-        response.position = output[0].tolist()
-        response.velocity = output[1].tolist()
-        response.effort = np.zeros_like(output[1]).tolist()
+        state = self.loop.state()
+        response.position = state.pos.tolist()
+        response.velocity = state.vel.tolist()
+        response.effort = np.zeros_like(state.vel).tolist()
         return response
-    #Use these combined services to save a lot of latency if you need multiple datapoints
+    #The combined services return one consistent reading from the same control tick
     def pos_vel_eff_srv(self, request, response):
-        output = self.dxl_client.read_pos_vel_cur()
-        response.position = output[0].tolist()
-        response.velocity = output[1].tolist()
-        response.effort = output[2].tolist()
+        state = self.loop.state()
+        response.position = state.pos.tolist()
+        response.velocity = state.vel.tolist()
+        response.effort = state.cur.tolist()
         return response
+    #History services: the newest request.count buffered readings (0 for all), oldest first, rows of num_motors values
+    def history_srv(self, request, response):
+        return self._fill_history(request, response, 'd')
+    #Same as float32, half the bytes on the wire
+    def history_packed_srv(self, request, response):
+        return self._fill_history(request, response, 'f')
+    def _fill_history(self, request, response, typecode):
+        t, pos, vel, cur = self.history.last(request.count)
+        response.stamps = _packed('d', t)
+        response.num_motors = len(self.motors)
+        response.position = _packed(typecode, pos)
+        response.velocity = _packed(typecode, vel)
+        response.effort = _packed(typecode, cur)
+        return response
+
+# Array fields take array.array as is, filled from the numpy buffer instead of converting every value
+def _packed(typecode, values):
+    packed = array.array(typecode)
+    packed.frombytes(np.ascontiguousarray(values, dtype='d' if typecode == 'd' else 'f').tobytes())
+    return packed
 
 def main(args=None):
     rclpy.init(args=args)
     leaphand_node = LeapNode()
-    rclpy.spin(leaphand_node)
-    leaphand_node.destroy_node()
-    rclpy.shutdown()
+    # Commands, services and the control timer run on separate executor threads (see the callback groups above)
+    executor = MultiThreadedExecutor()
+    executor.add_node(leaphand_node)
+    try:
+        executor.spin()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        executor.shutdown()
+        leaphand_node.destroy_node()
+        rclpy.shutdown()
 
 if __name__ == '__main__':
     main()
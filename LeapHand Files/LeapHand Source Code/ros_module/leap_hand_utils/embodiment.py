@@ -0,0 +1,275 @@
+"""Batched joint-angle conversion between the LEAP Hand conventions.
+
+Every conversion in leap_hand_utils is a per-joint affine map, so an
+`Embodiment` precomputes `a * x + b` for each pair of conventions once and
+applies it to a single pose (16,) or a batch (N, 16) in two in-place ops,
+without allocating when given `out` (pass `out=x` to convert in place):
+
+    embodiment = Embodiment()                      # float32, numpy
+    embodiment.sim_ones_to_LEAPhand(actions, out=actions)
+    embodiment.convert(poses, 'allegro', 'LEAPhand', out=buffer)
+
+Conventions (see leap_hand_utils.py):
+
+LEAPhand:  Real LEAP hand (180 degrees is the motor's zero).
+LEAPsim:   LEAP hand in sim (allegro-like zeros).
+one_range: [-1, 1] over the sim joint limits, for RL.
+allegro:   Allegro hand; the MCP side joints 0/4/8 have no match and are
+           pinned to the LEAP zero with `allegro_zeros`.
+
+With backend='torch' the tables live on `device` and the same calls take
+tensors (fused into one addcmul), so deploy.py can convert on the GPU.
+
+`CommandWriter` goes one step further on the command path: conversion,
+safety clip, rate limit and tick quantization in one pass into the motor
+writer's buffer.
+"""
+from typing import Optional, Tuple
+
+import numpy as np
+
+LEAPHAND = 'LEAPhand'
+LEAPSIM = 'LEAPsim'
+ONE_RANGE = 'one_range'
+ALLEGRO = 'allegro'
+EMBODIMENTS = (LEAPHAND, LEAPSIM, ONE_RANGE, ALLEGRO)
+
+NUM_JOINTS = 16
+# LEAPsim -> LEAPhand offset used by leap_hand_utils.
+LEAP_OFFSET = 3.14159
+# Value allegro_to_LEAPhand(zeros=True) pins the MCP side joints to.
+ALLEGRO_ZERO = 3.14
+ALLEGRO_ZERO_JOINTS = (0, 4, 8)
+
+# Joint limits in LEAPsim.
+REGULAR_SIM_MIN = (-1.047, -0.314, -0.506, -0.366, -1.047, -0.314, -0.506, -0.366,
+                   -1.047, -0.314, -0.506, -0.366, -0.349, -0.47, -1.20, -1.34)
+REGULAR_SIM_MAX = (1.047, 2.23, 1.885, 2.042, 1.047, 2.23, 1.885, 2.042,
+                   1.047, 2.23, 1.885, 2.042, 2.094, 2.443, 1.90, 1.88)
+
+
+def sim_limits(type: str = 'regular') -> Tuple[np.ndarray, np.ndarray]:
+    """Returns the (min, max) LEAPsim joint limits of a named set."""
+    if type == 'regular':
+        return np.array(REGULAR_SIM_MIN), np.array(REGULAR_SIM_MAX)
+    raise ValueError('Unknown LEAPsim limits: {!r} (only "regular" is '
+                     'defined)'.format(type))
+
+
+class Embodiment:
+    """Precomputed conversions between the LEAP Hand conventions.
+
+    Args:
+        limits: Name of a limit set for sim_limits(), or explicit
+            (sim_min, sim_max) arrays in LEAPsim, e.g. from the sim asset.
+        offset: LEAPsim -> LEAPhand offset.
+        allegro_zeros: Pin the joints allegro has no match for (0, 4, 8) to
+            the LEAP zero going to LEAPhand, and to 0 coming back.
+        allegro_teleop: Apply the thumb teleop correction of
+            allegro_to_LEAPhand(teleop=True).
+        dtype: Element type of the tables and of allocated outputs.
+        backend: 'numpy' or 'torch'.
+        device: Torch device for the tables.
+
+    Attributes:
+        sim_min, sim_max: LEAPsim limits.
+        real_min, real_max: The same limits in LEAPhand.
+    """
+
+    def __init__(self, limits='regular', offset: float = LEAP_OFFSET,
+                 allegro_zeros: bool = True, allegro_teleop: bool = False,
+                 dtype=np.float32, backend: str = 'numpy',
+                 device: Optional[str] = None):
+        if backend not in ('numpy', 'torch'):
+            raise ValueError('Unknown backend: {}'.format(backend))
+        if isinstance(limits, str):
+            sim_min, sim_max = sim_limits(limits)
+        else:
+            sim_min, sim_max = (np.asarray(limit, dtype=np.float64)
+                                for limit in limits)
+        if sim_min.shape != (NUM_JOINTS,) or sim_max.shape != (NUM_JOINTS,):
+            raise ValueError('Expected {} joint limits, got {} and {}'.format(
+                NUM_JOINTS, sim_min.shape, sim_max.shape))
+        self.backend = backend
+        self.offset = offset
+
+        # Each convention as (a, b) to LEAPhand and back, in float64.
+        ones = np.ones(NUM_JOINTS)
+        half_range = 0.5 * (sim_max - sim_min)
+        centre = 0.5 * (sim_max + sim_min) + offset
+        to_leap = {
+            LEAPHAND: (ones, np.zeros(NUM_JOINTS)),
+            LEAPSIM: (ones, np.full(NUM_JOINTS, offset)),
+            ONE_RANGE: (half_range, centre),
+        }
+        from_leap = {
+            LEAPHAND: to_leap[LEAPHAND],
+            LEAPSIM: (ones, np.full(NUM_JOINTS, -offset)),
+            ONE_RANGE: (1.0 / half_range, -centre / half_range),
+        }
+        a_in, b_in = ones.copy(), np.full(NUM_JOINTS, offset)
+        a_out, b_out = ones.copy(), np.full(NUM_JOINTS, -offset)
+        if allegro_zeros:
+            zeros = list(ALLEGRO_ZERO_JOINTS)
+            a_in[zeros], b_in[zeros] = 0.0, ALLEGRO_ZERO
+            a_out[zeros], b_out[zeros] = 0.0, 0.0
+        if allegro_teleop:
+            # As in leap_hand_utils: the thumb joints are shifted, not offset.
+            b_in[12], b_in[14] = 0.2, -0.2
+            b_out[12], b_out[14] = -0.2, 0.2
+        to_leap[ALLEGRO] = (a_in, b_in)
+        from_leap[ALLEGRO] = (a_out, b_out)
+
+        # src -> dst is from_leap[dst] after to_leap[src].
+        self._maps = {}
+        for src, (a1, b1) in to_leap.items():
+            for dst, (a2, b2) in from_leap.items():
+                self._maps[src, dst] = (self._table(a2 * a1, dtype, device),
+                                        self._table(a2 * b1 + b2, dtype, device))
+        self.sim_min = self._table(sim_min, dtype, device)
+        self.sim_max = self._table(sim_max, dtype, device)
+        self.real_min = self._table(sim_min + offset, dtype, device)
+        self.real_max = self._table(sim_max + offset, dtype, device)
+        self.dtype = self.sim_min.dtype
+
+    def _table(self, values: np.ndarray, dtype, device):
+        if self.backend == 'torch':
+            import torch
+            if isinstance(dtype, type) and issubclass(dtype, np.generic):
+                dtype = torch.from_numpy(np.zeros(0, dtype=dtype)).dtype
+            return torch.as_tensor(values, dtype=dtype, device=device)
+        return np.asarray(values, dtype=dtype)
+
+    def _output(self, x, out):
+        if out is not None:
+            return out
+        if self.backend == 'torch':
+            import torch
+            return torch.empty(x.shape, dtype=self.dtype, device=self.sim_min.device)
+        return np.empty(np.shape(x), dtype=self.dtype)
+
+    def coefficients(self, src: str, dst: str):
+        """Returns the per-joint (a, b) with dst = a * src + b."""
+        try:
+            return self._maps[src, dst]
+        except KeyError:
+            raise ValueError('Unknown conversion {} -> {}, expected two of '
+                             '{}'.format(src, dst, EMBODIMENTS)) from None
+
+    def convert(self, x, src: str, dst: str, out=None):
+        """Converts poses (16,) or (N, 16) from `src` to `dst`.
+
+        Args:
+            x: Poses in `src`; any array-like for numpy, a tensor for torch.
+            out: Destination of x's shape (may be x itself). Allocated in
+                the embodiment's dtype if not given.
+
+        Returns:
+            `out`.
+        """
+        a, b = self.coefficients(src, dst)
+        out = self._output(x, out)
+        if self.backend == 'torch':
+            import torch
+            return torch.addcmul(b, x, a, out=out)
+        np.multiply(x, a, out=out, casting='same_kind')
+        return np.add(out, b, out=out)
+
+    def clip(self, x, embodiment: str = LEAPHAND, out=None):
+        """Clips poses to the joint limits, in LEAPhand or LEAPsim."""
+        if embodiment == LEAPHAND:
+            lower, upper = self.real_min, self.real_max
+        elif embodiment == LEAPSIM:
+            lower, upper = self.sim_min, self.sim_max
+        else:
+            raise ValueError('No joint limits for {}'.format(embodiment))
+        out = self._output(x, out)
+        if self.backend == 'torch':
+            import torch
+            torch.maximum(x, lower, out=out)
+            return torch.minimum(out, upper, out=out)
+        return np.clip(x, lower, upper, out=out, casting='same_kind')
+
+    def sim_ones_to_LEAPhand(self, x, out=None):
+        return self.convert(x, ONE_RANGE, LEAPHAND, out)
+
+    def LEAPhand_to_sim_ones(self, x, out=None):
+        return self.convert(x, LEAPHAND, ONE_RANGE, out)
+
+    def LEAPsim_to_LEAPhand(self, x, out=None):
+        return self.convert(x, LEAPSIM, LEAPHAND, out)
+
+    def LEAPhand_to_LEAPsim(self, x, out=None):
+        return self.convert(x, LEAPHAND, LEAPSIM, out)
+
+    def allegro_to_LEAPhand(self, x, out=None):
+        return self.convert(x, ALLEGRO, LEAPHAND, out)
+
+    def LEAPhand_to_allegro(self, x, out=None):
+        return self.convert(x, LEAPHAND, ALLEGRO, out)
+
+
+class CommandWriter:
+    """Converts, safety clips, rate limits and writes goal positions in one go.
+
+    The conversion to LEAPhand and the encoder scale fold into one gain and
+    bias per joint for each source convention, and the real joint limits
+    (as in angle_safety_clip) into tick bounds, so a command runs as a few
+    in-place ops straight into the position writer's tick buffer
+    (DynamixelPositionWriter.write_affine) without temporaries.
+
+        command = CommandWriter(Embodiment(dtype=np.float64),
+                                client.position_writer(motors), max_delta=0.1)
+        command.write(actions, ONE_RANGE)
+
+    Args:
+        embodiment: Conversions and joint limits; numpy backend.
+        writer: The DynamixelPositionWriter for the hand's motors.
+        max_delta: Largest goal change per command in radians (scalar or
+            per joint), None for no rate limit. Rounded down to whole ticks,
+            at least one.
+    """
+
+    def __init__(self, embodiment: Embodiment, writer,
+                 max_delta: Optional[float] = None):
+        if embodiment.backend != 'numpy':
+            raise ValueError('CommandWriter needs a numpy Embodiment')
+        self.embodiment = embodiment
+        self.writer = writer
+        scale = writer.pos_scale
+        self._maps = {}
+        for src in EMBODIMENTS:
+            a, b = embodiment.coefficients(src, LEAPHAND)
+            self._maps[src] = (np.asarray(a, dtype=np.float64) / scale,
+                               np.asarray(b, dtype=np.float64) / scale)
+        self.lower = np.ceil(np.asarray(embodiment.real_min, dtype=np.float64) / scale)
+        self.upper = np.floor(np.asarray(embodiment.real_max, dtype=np.float64) / scale)
+        self.max_delta = max_delta
+
+    @property
+    def max_delta(self):
+        return self._max_delta
+
+    @max_delta.setter
+    def max_delta(self, max_delta):
+        self._max_delta = max_delta
+        if max_delta is None:
+            self._max_step = None
+        else:
+            self._max_step = np.maximum(
+                np.floor(np.broadcast_to(max_delta, (NUM_JOINTS,)) /
+                         self.writer.pos_scale), 1.0)
+
+    def write(self, pose, src: str = LEAPHAND, force: bool = False) -> bool:
+        """Writes a (16,) pose given in `src`; returns whether it was sent."""
+        try:
+            gain, bias = self._maps[src]
+        except KeyError:
+            raise ValueError('Unknown embodiment {}, expected one of '
+                             '{}'.format(src, EMBODIMENTS)) from None
+        return self.writer.write_affine(pose, gain, bias, self.lower,
+                                        self.upper, self._max_step, force)
+
+    def position(self) -> np.ndarray:
+        """Returns the goal last sent (after clipping), in LEAPhand."""
+        return self.writer.goal_positions()
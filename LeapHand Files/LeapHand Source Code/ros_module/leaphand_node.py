@@ -1,4 +1,6 @@
 #!/usr/bin/env python3
+import threading
+
 import numpy as np
 import rospy
 
@@ -6,6 +8,9 @@ from sensor_msgs.msg import JointState
 from std_msgs.msg import String
 
 from leap_hand_utils.dynamixel_client import *
+from leap_hand_utils.discovery import find_leap_hand
+from leap_hand_utils.embodiment import ALLEGRO, ONE_RANGE, CommandWriter, Embodiment
+from leap_hand_utils.history import StateHistory
 import leap_hand_utils.leap_hand_utils as lhu
 from leap_hand.srv import *
 
@@ -20,6 +25,10 @@ from leap_hand.srv import *
 
 #I recommend you only query when necessary and below 90 samples a second.  Used the combined commands if you can to save time.  Also don't forget about the USB latency settings in the readme.
 #The services allow you to always have the latest data when you want it, and not spam the communication lines with unused data.
+#The node also reads position, velocity and current at state_rate (Hz) and publishes them as a JointState on /leaphand_node/joint_states.
+#Subscribe to that instead of calling the services every control step; a subscriber only pays a memory read per step.
+#The last history_size published readings are also buffered: leap_history returns the newest `count` with their stamps in one
+#call (leap_history_packed: the same as float32), e.g. for an observation history or logging.
 
 class LeapNode:
     def __init__(self):
@@ -28,8 +37,12 @@ class LeapNode:
         self.kI = float(rospy.get_param('/leaphand_node/kI', 0.0))
         self.kD = float(rospy.get_param('/leaphand_node/kD', 200.0))
         self.curr_lim = float(rospy.get_param('/leaphand_node/curr_lim', 350.0)) #don't go past 600ma on this, or it'll overcurrent sometimes for regular, 350ma for lite.
+        self.state_rate = float(rospy.get_param('/leaphand_node/state_rate', 100.0)) #joint_states publish rate, 0 to turn the stream off
+        self.history = StateHistory(16, int(rospy.get_param('/leaphand_node/history_size', 1000))) #readings kept for leap_history
         self.ema_amount = 0.2
         self.prev_pos = self.pos = self.curr_pos = lhu.allegro_to_LEAPhand(np.zeros(16))
+        #Precomputed allegro / [-1,1] -> LEAP conversions for the allegro and ones commands
+        self.embodiment = Embodiment(allegro_zeros=False, dtype=np.float64)
         
         #subscribes to a variety of sources that can command the hand, and creates services that can give information about the hand out
         rospy.Subscriber("/leaphand_node/cmd_leap", JointState, self._receive_pose)
@@ -38,73 +51,104 @@ class LeapNode:
         rospy.Service('leap_position', leap_position, self.pos_srv)
         rospy.Service('leap_velocity', leap_velocity, self.vel_srv)
         rospy.Service('leap_effort', leap_effort, self.eff_srv)
+        rospy.Service('leap_history', leap_history, self.history_srv)
+        rospy.Service('leap_history_packed', leap_history_packed, self.history_packed_srv)
+        self.pub_joint_state = rospy.Publisher("/leaphand_node/joint_states", JointState, queue_size=1)
+        #rospy runs every subscriber, service and timer callback on its own thread, so bus access goes through this lock
+        self.bus_lock = threading.RLock()
         
-        #You can put the correct port here or have the node auto-search for a hand at the first 3 ports.
+        #You can put the correct port here or have the node search every serial port for a hand (leap_hand_utils/discovery.py).
         # For example ls /dev/serial/by-id/* to find your LEAP Hand. Then use the result.  
         # For example: /dev/serial/by-id/usb-FTDI_USB__-__Serial_Converter_FT7W91VW-if00-port0
         self.motors = motors = [0,1,2,3,4,5,6,7,8,9,10,11,12,13,14,15]
-        try:
-            self.dxl_client = DynamixelClient(motors, '/dev/ttyUSB0', 4000000)
-            self.dxl_client.connect()
-        except Exception:
-            try:
-                self.dxl_client = DynamixelClient(motors, '/dev/ttyUSB1', 4000000)
-                self.dxl_client.connect()
-            except Exception:
-                self.dxl_client = DynamixelClient(motors, '/dev/ttyUSB2', 4000000)
-                self.dxl_client.connect()
+        # Pings the motors on every serial port in parallel and remembers the winning /dev/serial/by-id path, so later starts are instant.
+        self.dxl_client = DynamixelClient(motors, find_leap_hand(motors), 4000000)
+        self.dxl_client.connect()
         #Enables position-current control mode and the default parameters, it commands a position and then caps the current so the motors don't overload
-        self.dxl_client.sync_write(motors, np.ones(len(motors))*5, 11, 1)
-        self.dxl_client.set_torque_enabled(motors, True)
-        self.dxl_client.sync_write(motors, np.ones(len(motors)) * self.kP, 84, 2) # Pgain stiffness     
-        self.dxl_client.sync_write([0,4,8], np.ones(3) * (self.kP * 0.75), 84, 2) # Pgain stiffness for side to side should be a bit less
-        self.dxl_client.sync_write(motors, np.ones(len(motors)) * self.kI, 82, 2) # Igain
-        self.dxl_client.sync_write(motors, np.ones(len(motors)) * self.kD, 80, 2) # Dgain damping
-        self.dxl_client.sync_write([0,4,8], np.ones(3) * (self.kD * 0.75), 80, 2) # Dgain damping for side to side should be a bit less
-        #Max at current (in unit 1ma) so don't overheat and grip too hard #500 normal or #350 for lite
-        self.dxl_client.sync_write(motors, np.ones(len(motors)) * self.curr_lim, 102, 2)
+        #configure() reads the registers back and only writes what differs, so restarting the node on a powered hand is quick
+        side = np.isin(motors, [0,4,8])
+        self.dxl_client.configure(motors, {
+            'operating_mode': 5,
+            'position_p_gain': np.where(side, self.kP * 0.75, self.kP), # Pgain stiffness, for side to side should be a bit less
+            'position_i_gain': self.kI, # Igain
+            'position_d_gain': np.where(side, self.kD * 0.75, self.kD), # Dgain damping, for side to side should be a bit less
+            'current_limit': self.curr_lim, #Max at current (in unit 1ma) so don't overheat and grip too hard #500 normal or #350 for lite
+            'torque_enable': 1,
+        })
         self.dxl_client.write_desired_pos(self.motors, self.curr_pos)
+        #Commands are converted, clipped to the joint limits (see lhu.angle_safety_clip) and written in one pass
+        self.command = CommandWriter(self.embodiment, self.dxl_client.position_writer(self.motors))
+        #Fixed rate joint state stream, one combined pos/vel/cur read per message
+        self.joint_state = JointState()
+        self.joint_state.name = ['joint_{}'.format(motor) for motor in motors]
+        if self.state_rate > 0:
+            rospy.Timer(rospy.Duration(1.0 / self.state_rate), self._publish_state)
         while not rospy.is_shutdown():
             rospy.spin()
 
     # Receive LEAP pose and directly control the robot.  Fully open here is 180 and increases in this value closes the hand.
     def _receive_pose(self, pose):
-        pose = pose.position
-        self.prev_pos = self.curr_pos
-        self.curr_pos = np.array(pose)
-        self.dxl_client.write_desired_pos(self.motors, self.curr_pos)
+        with self.bus_lock:
+            self.command.write(pose.position)
+            self.prev_pos = self.curr_pos
+            self.curr_pos = self.command.position()
     #Allegro compatibility, first read the allegro publisher and then convert to leap
     #It adds 180 to the input to make the fully open position at 0 instead of 180.
     def _receive_allegro(self, pose):
-        pose = lhu.allegro_to_LEAPhand(pose.position, zeros=False)
-        self.prev_pos = self.curr_pos
-        self.curr_pos = np.array(pose)
-        self.dxl_client.write_desired_pos(self.motors, self.curr_pos)
+        with self.bus_lock:
+            self.command.write(pose.position, ALLEGRO)
+            self.prev_pos = self.curr_pos
+            self.curr_pos = self.command.position()
     # Sim compatibility, first read the sim publisher and then convert to leap
     #Sim compatibility for policies, it assumes the ranges are [-1,1] and then convert to leap hand ranges.
     def _receive_ones(self, pose):
-        pose = lhu.sim_ones_to_LEAPhand(np.array(pose.position))
-        self.prev_pos = self.curr_pos
-        self.curr_pos = np.array(pose)
-        self.dxl_client.write_desired_pos(self.motors, self.curr_pos)
+        with self.bus_lock:
+            self.command.write(pose.position, ONE_RANGE)
+            self.prev_pos = self.curr_pos
+            self.curr_pos = self.command.position()
+
+    #Timer callback: read the hand once and publish it on /leaphand_node/joint_states
+    def _publish_state(self, event):
+        with self.bus_lock:
+            pos, vel, cur = self.dxl_client.read_pos_vel_cur()
+        msg = self.joint_state
+        msg.header.stamp = rospy.Time.now()
+        msg.position, msg.velocity, msg.effort = pos, vel, cur
+        self.history.append(msg.header.stamp.to_sec(), pos, vel, cur)
+        self.pub_joint_state.publish(msg)
 
     #Service that reads and returns the pos of the robot in regular LEAP Embodiment scaling.
     def pos_srv(self, req):
-        return {"position": self.dxl_client.read_pos()}
+        with self.bus_lock:
+            return {"position": self.dxl_client.read_pos()}
     #Service that reads and returns the vel of the robot in LEAP Embodiment
     def vel_srv(self, req):
-        return {"velocity": self.dxl_client.read_vel()}
+        with self.bus_lock:
+            return {"velocity": self.dxl_client.read_vel()}
     #Service that reads and returns the effort/current of the robot in LEAP Embodiment
     def eff_srv(self, req):
-        return {"effort": self.dxl_client.read_cur()}
+        with self.bus_lock:
+            return {"effort": self.dxl_client.read_cur()}
     #Use these combined services to save a lot of latency if you need multiple datapoints
     def pos_vel_srv(self, req):
-        output = self.dxl_client.read_pos_vel()
+        with self.bus_lock:
+            output = self.dxl_client.read_pos_vel()
         return {"position": output[0], "velocity": output[1], "effort": np.zeros_like(output[1])}
     #Use these combined services to save a lot of latency if you need multiple datapoints
     def pos_vel_eff_srv(self, req):
-        output = self.dxl_client.read_pos_vel_cur()
+        with self.bus_lock:
+            output = self.dxl_client.read_pos_vel_cur()
         return {"position": output[0], "velocity": output[1], "effort": output[2]}
+    #History services: the newest req.count streamed readings (0 for all), oldest first, rows of num_motors values
+    def history_srv(self, req):
+        t, pos, vel, cur = self.history.last(req.count)
+        return {"stamps": t, "num_motors": self.history.num_motors, "position": pos.ravel().astype(np.float64),
+                "velocity": vel.ravel().astype(np.float64), "effort": cur.ravel().astype(np.float64)}
+    #Same as float32, half the bytes on the wire
+    def history_packed_srv(self, req):
+        t, pos, vel, cur = self.history.last(req.count)
+        return {"stamps": t, "num_motors": self.history.num_motors, "position": pos.ravel(),
+                "velocity": vel.ravel(), "effort": cur.ravel()}
     
 #init the arm node
 def main(**kwargs):
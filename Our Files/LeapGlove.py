@@ -1,14 +1,19 @@
 # --- Dependencies ---
 # Install these with pip if not already present:
 #   pip install pyserial keyboard numpy
-# The 're' and 'time' modules are built-in with Python and require no installation.
+# The 'time' module is built-in with Python and requires no installation.
 
 import serial    # pip install pyserial
-import re        # built-in, no install needed
 import time      # built-in, no install needed
 import keyboard  # pip install keyboard
 import numpy as np  # pip install numpy
 
+from glove_utils.feedback import ForceFeedback
+from glove_utils.haptics import HAPTIC_INTERVAL
+from glove_utils.parser import FINGER_NAMES
+from glove_utils.retarget import RetargetTable
+from glove_utils.station import TeleopPair, TeleopStation
+
 
 
 # ============== LeapGlove.py ===============
@@ -17,14 +22,34 @@ import numpy as np  # pip install numpy
 
 # === Serial/Bluetooth and timing config ===
 ESP32_PORT = "COM8"          # The Bluetooth port the LucidGlove ESP32 is enumerated to, change as needed (check your device manager)
+LEAPHAND_PORT = None         # The LeapHand's port, None to find it (only works with a single hand connected)
 BAUD_RATE = 115200           # Serial communication speed
 SEND_INTERVAL = 0.012        # How often to send hand pose updates (to LeapHand), ~83Hz
-SERVO_UPDATE_INTERVAL = 2.0  # How often to read current/load from LeapHand servos (dont go below 1 sec, unstable)
+FEEDBACK_INTERVAL = 0.025    # How often to read current/load from LeapHand servos for force feedback (40Hz, bus access is serialized with the pose writes)
+STATS_INTERVAL = 5.0         # How often to print loop rate, jitter and latency stats
+DISPLAY_INTERVAL = 0.1       # How often to refresh the finger bend readout in the console
+HAPTIC_MIN_INTERVAL = HAPTIC_INTERVAL  # Fastest haptic command rate, matches the firmware's hapticInterval
+BINARY_PROTOCOL = True       # Try the compact binary framing first, falls back to ASCII lines if the glove firmware doesn't answer
 
 ENABLE_LEAPHAND = True       # Toggle LeapHand (robotic hand) integration
+ENABLE_FORCE_FEEDBACK = True # Stream servo load to the glove brakes (toggle at runtime with 'f')
+IDLE_CURRENT = 0.05          # Servo current (A) treated as idle noise, no brake
+CONTACT_THRESHOLD = 1.3      # Servo current (A) that maps to full brake
+CALIBRATION_DURATION = 5.0       # Seconds the shift+c calibration window stays open
+RECORD_SESSION = False       # Record glove bytes/samples, commanded poses and hand telemetry to ~/.leapglove/sessions/<start time>-<pair> (replay with python -m glove_utils.replay)
+TELEMETRY_RATE = 100         # Hand position/velocity/current poll rate (Hz) while recording; force feedback then reads the same samples
+
+# === Glove -> LeapHand pairs (glove_utils/station.py) ===
+# One entry per glove, each driving its own LeapHand with its own threads, calibration and retargeting.
+# The pair name is also the name of its calibration profile (saved after shift+c) and of its retargeting
+# profile (fitted from recordings with python -m glove_utils.retarget), both loaded on start.
+# Bimanual station: give every hand its port, e.g.
+#   PAIRS = [{"name": "left", "glove_port": "COM8", "hand_port": "COM3"},
+#            {"name": "right", "glove_port": "COM9", "hand_port": "COM4"}]
+PAIRS = [{"name": "default", "glove_port": ESP32_PORT, "hand_port": LEAPHAND_PORT}]
 
 # === HAPTICS: Preset commands for the glove (for haptic feedback, i.e., servo braking) ===
-servo_zero_command = "A0B0C0D0E0\n"   # Command to release all servos (no haptic resistance)
+servo_zero_command = [0, 0, 0, 0, 0]   # Release all servos (no haptic resistance)
 # Predefined brake strengths (0-1000) for each finger in "ball_hold" grip mode
 haptic_presets = {
     "ball_hold": {
@@ -44,238 +69,199 @@ if ENABLE_LEAPHAND:
 
     class LeapNode(BaseLeapNode):
         # Subclass for future extension; currently just calls parent constructor
-        def __init__(self):
-            super().__init__()  # Uses default serial port for LeapHand
+        def __init__(self, port=None, exclude_ports=()):
+            super().__init__(port=port, exclude_ports=exclude_ports)  # None finds the LeapHand's serial port, skipping the glove links
 
 # === Utility: Convert glove finger data to Allegro pose format (for LeapHand) ===
+# Allegro joint indices driven by Thumb, Index, Middle and Ring (FINGER_NAMES order, no pinky on the hand)
+ALLEGRO_FINGER_JOINTS = np.array([[13, 14, 15], [1, 2, 3], [5, 6, 7], [9, 10, 11]])
+ALLEGRO_JOINT_GAINS = np.array([1.8, 1.4, 1.4])  # Empirically tuned for Allegro/LeapHand
+
 def glove_to_allegro(glove_data):
     pose = np.zeros(16)  # Allegro expects a 16-joint vector (4 fingers × 4 joints)
-    # Mapping glove finger keys to Allegro joint indices
-    finger_map = {
-        "Index (P)": [1, 2, 3],
-        "Middle (C)": [5, 6, 7],
-        "Ring (D)": [9, 10, 11],
-        "Thumb (A)": [13, 14, 15]
-    }
-    for finger, joints in finger_map.items():
-        bend = np.clip(glove_data[finger] / 100.0, 0.0, 1.0)  # Convert percent to 0-1
-        # Scale joint angles (empirically tuned for Allegro/LeapHand)
-        pose[joints[0]] = bend * 1.8
-        pose[joints[1]] = bend * 1.4
-        pose[joints[2]] = bend * 1.4
+    bend = np.clip(glove_data[:4] / 100.0, 0.0, 1.0)  # Convert percent to 0-1
+    pose[ALLEGRO_FINGER_JOINTS] = bend[:, None] * ALLEGRO_JOINT_GAINS
     return pose
 
-# === Utility: Read and process servo currents from LeapHand ===
-def get_finger_currents(leap_node, idle_current=0.05, contact_threshold=1.3):
-    try:
-        # Read raw current sensor values
-        raw_vals = leap_node.read_cur()
-        # Convert to amperes using scaling factor
-        current_vals = [val * 0.00269 for val in raw_vals]
-        # Sometimes Thumb sensor is broken; patch value with Pinky if needed
-        if current_vals[0] < 0.005:
-            current_vals[0] = abs(current_vals[4])
-        print(f"🔧 raw read_cur(): {raw_vals}")
-        print(f"📏 type: {type(current_vals)}, length: {len(current_vals)}")
-    except Exception as e:
-        print(f"❌ Failed to read currents: {e}")
-        # Return zeros for all fingers if reading failed
-        return {k: 0 for k in ["Thumb (A)", "Index (P)", "Middle (C)", "Ring (D)", "Pinky (E)"]}
-
-    # Convert currents to a 0-1000 brake/load value, ignoring idle noise
-    def scale(val):
-        excess = max(0.0, abs(val) - idle_current)
-        range_current = contact_threshold - idle_current
-        return min(int((excess / range_current) * 1000), 1000)
-
-    # Print currents for debugging
-    print("🔎 Raw Currents:")
-    print(f"  Thumb={current_vals[0]:.2f} A, Index={current_vals[1]:.2f} A, Middle={current_vals[2]:.2f} A, Ring={current_vals[3]:.2f} A")
-
-    # Map current values to finger names and scale
-    currents = {
-        "Thumb (A)": scale(current_vals[0]),
-        "Index (P)": scale(current_vals[1]),
-        "Middle (C)": scale(current_vals[2]),
-        "Ring (D)": scale(current_vals[3]),
-        "Pinky (E)": scale(current_vals[3])  # Pinky uses same sensor as Ring (for 4-finger hand)
-    }
-    return currents
-
-# === Calibration state: min/max analog values for each finger ===
-calibration_ranges = {
-    "Thumb (A)": [float('inf'), float('-inf')],
-    "Index (P)": [float('inf'), float('-inf')],
-    "Middle (C)": [float('inf'), float('-inf')],
-    "Ring (D)": [float('inf'), float('-inf')],
-    "Pinky (E)": [float('inf'), float('-inf')],
-}
-calibrated = False  # Flag for calibration
+# === Retargeting: finger bend -> joint angles through per-joint lookup tables (glove_utils/retarget.py) ===
+# Glove finger driving each joint when no fitted profile exists: Index 0-3, Middle 4-7, Ring 8-11, Thumb 12-15
+DEFAULT_JOINT_FINGERS = [1, 1, 1, 1, 2, 2, 2, 2, 3, 3, 3, 3, 0, 0, 0, 0]
+
+def default_retarget():
+    """The fixed linear gains above as a table, used by pairs without a fitted profile."""
+    return RetargetTable.linear(DEFAULT_JOINT_FINGERS, glove_to_allegro(np.zeros(5)),
+                                glove_to_allegro(np.full(5, 100.0)), embodiment='allegro')
+
+# === Pairs: glove link, LeapHand, calibration, retargeting and force feedback (servo current -> EMA filter -> 0-1000 brake) per pair ===
+def make_pair(name, glove_port, hand_port=None):
+    force_feedback = ForceFeedback(idle_current=IDLE_CURRENT, contact_threshold=CONTACT_THRESHOLD) if ENABLE_LEAPHAND else None
+    pair = TeleopPair(
+        name,
+        glove_port,
+        hand_port=hand_port,
+        enable_hand=ENABLE_LEAPHAND,
+        default_retarget=default_retarget(),
+        baud_rate=BAUD_RATE,
+        binary_protocol=BINARY_PROTOCOL,
+        send_interval=SEND_INTERVAL,
+        feedback_interval=FEEDBACK_INTERVAL,
+        haptic_interval=HAPTIC_MIN_INTERVAL,
+        force_feedback=force_feedback,
+        record=RECORD_SESSION,
+        telemetry_rate=TELEMETRY_RATE,
+        hand_opener=LeapNode if ENABLE_LEAPHAND else None,
+    )
+    pair.feedback_enabled = ENABLE_FORCE_FEEDBACK and force_feedback is not None
+    pair.on_calibrated = finish_calibration
+    return pair
 
 # === Calibrate glove sensor ranges ===
-def calibrate(serial_conn, duration=5):
+def calibrate(station):
     """
-    Runs a 5s loop to find min/max for each finger. User should move all fingers
-    through their full range during calibration.
+    Opens a calibration window on every glove. User should move all fingers through their full range.
+    Teleop keeps running (on the previous calibration) until the window closes.
     """
-    global calibration_ranges, calibrated
     print("\n🛠️ Starting calibration... Move fingers through full range.")
-    start_time = time.time()
-    while time.time() - start_time < duration:
-        if serial_conn.in_waiting > 0:
-            raw_data = serial_conn.readline().decode('utf-8').strip()
-            data = parse_raw_data(raw_data)
-            if data:
-                # Update min/max per finger if sample is valid
-                for key in calibration_ranges:
-                    value = data[key]
-                    if value < 10000:  # Ignore outliers/glitches
-                        calibration_ranges[key][0] = min(calibration_ranges[key][0], value)
-                        calibration_ranges[key][1] = max(calibration_ranges[key][1], value)
-    calibrated = True
-    print("\n✅ Calibration complete:")
-    for key, (min_val, max_val) in calibration_ranges.items():
-        print(f"  {key}: Min={min_val}, Max={max_val}, Range={max_val - min_val:.1f}")
-
-# === Parse raw serial glove data into a dict of finger values ===
-def parse_raw_data(raw_data):
-    """
-    Expects string like: 'A0000B0000C0000D0000E0000F0000G0000P0000'
-    The group mapping depends on hardware wiring.
-    Returns a mapping of logical finger names to integer values.
-    """
-    pattern = r"A(\d+)B(\d+)C(\d+)D(\d+)E(\d+)F(\d+)G(\d+)P(\d+)(.*)"
-    match = re.match(pattern, raw_data)
-    if match:
-        # Parse fields by index
-        raw = {
-            "Thumb (A)": int(match.group(1)),
-            "Index (P)": int(match.group(8)),
-            "Middle (C)": int(match.group(3)),
-            "Ring (D)": int(match.group(4)),
-            "Pinky (E)": int(match.group(5)),
-        }
-        # Remap values for correct logical finger order (hardware mapping quirk)
-        return {
-            "Thumb (A)": raw["Pinky (E)"],
-            "Index (P)": raw["Ring (D)"],
-            "Middle (C)": raw["Middle (C)"],
-            "Ring (D)": raw["Index (P)"],
-            "Pinky (E)": raw["Thumb (A)"],
-        }
-    return None
-
-# === Use calibration to convert raw finger values to 0–100% and print ===
-def parse_and_print_data(raw_data):
-    """
-    Reads and prints glove data as percentages if calibrated.
-    Returns dictionary of {finger: percent} if data is valid.
-    """
-    global calibration_ranges, calibrated
-    data = parse_raw_data(raw_data)
-    if data:
-        if calibrated:
-            output = {}
-            for key, value in data.items():
-                min_val, max_val = calibration_ranges[key]
-                if max_val - min_val >= 5:  # Ignore bad calibration
-                    percentage = ((value - min_val) / (max_val - min_val)) * 100
-                    output[key] = max(0, min(100, percentage))  # Clamp to 0-100
-                else:
-                    output[key] = 0
-                print(f"{key}: {output[key]:.1f}%", end="  ")
-            print(end="\r", flush=True)
-            return output
-        else:
-            print(f"\rCalibration not done. Raw data: {raw_data}       ", end='', flush=True)
-    return None
-
-# === Main loop: Glove-robot integration ===
-try:
-    # Open serial connection to glove
-    esp32_serial = serial.Serial(ESP32_PORT, BAUD_RATE, timeout=1)
-    print(f"✅ Connected to {ESP32_PORT}")
-
-    # Initialize LeapHand if enabled
-    leap_node = None
-    if ENABLE_LEAPHAND:
-        leap_node = LeapNode()
-        print("🤖 LEAP Hand initialized")
-
-        # Test current sensor connection on LeapHand
-        print("🔍 Testing leap_node.read_cur()...")
-        try:
-            current_vals = leap_node.read_cur()
-            print(f"✅ read_cur() success: {current_vals}")
-        except Exception as e:
-            print(f"❌ read_cur() failed: {e}")
-
-    # --- Main loop state ---
-    last_send_time = time.time()
-    last_servo_update_time = time.time()
-    latest_glove_data = None  # Latest glove values (percentages, post-calibration)
-
-    while True:
-        # === Keyboard Controls ===
-        if keyboard.is_pressed('shift+c'):
-            calibrate(esp32_serial)
-            time.sleep(0.5)  # Debounce
-
-        if keyboard.is_pressed('shift+z'):
-            print("\n🔧 Zeroing all servos...")
-            esp32_serial.write(servo_zero_command.encode())
-            time.sleep(0.5)
-
-        # Apply ball-hold preset on 'b' press
-        if keyboard.is_pressed('b'):
-            print("\n🖐️ Activating ball-hold preset...")
-            preset = haptic_presets["ball_hold"]
-            # Map logical finger values to correct servo letter order
-            command = (
-                f"A{preset['Pinky (E)']}"
-                f"B{preset['Thumb (A)']}"
-                f"C{preset['Index (P)']}"
-                f"D{preset['Middle (C)']}"
-                f"E{preset['Ring (D)']}\n"
-            )
-            esp32_serial.write(command.encode())
-            print(f"→ Sent: {command.strip()}")
-            time.sleep(0.5)
-        # Manual preset strengths 0–9: send same value to all servos
-        for i in range(10):
-            if keyboard.is_pressed(str(i)):
-                strength = i * 100  # 0–900
-                print(f"\n🖐️ Activating haptic preset {i} ({strength} brake)...")
-                command = f"A{strength}B{strength}C{strength}D{strength}E{strength}\n"
-                esp32_serial.write(command.encode())
-                print(f"→ Sent: {command.strip()}")
-                time.sleep(0.5)
-                break
-
-        # === Read glove data and print finger bend ===
-        if esp32_serial.in_waiting > 0:
-            raw_data = esp32_serial.readline().decode('utf-8').strip()
-            latest_glove_data = parse_and_print_data(raw_data)
-
-        now = time.time()
-        # === Send hand pose to LeapHand, and read servo load, at specified intervals ===
-        if ENABLE_LEAPHAND and calibrated and latest_glove_data:
-            if (now - last_send_time) >= SEND_INTERVAL:
-                pose = glove_to_allegro(latest_glove_data)
-                leap_node.set_allegro(pose)
-                last_send_time = now
-
-            if (now - last_servo_update_time) >= SERVO_UPDATE_INTERVAL:
-                brake_values = get_finger_currents(leap_node)
-                print(f"\n🔧 LOAD: Thumb={brake_values['Thumb (A)']}  Index={brake_values['Index (P)']}  Middle={brake_values['Middle (C)']}  Ring={brake_values['Ring (D)']}  Pinky={brake_values['Pinky (E)']}")
-                last_servo_update_time = now
-
-except serial.SerialException as e:
-    print(f"Serial Error: {e}")
-
-except KeyboardInterrupt:
-    print("\n🛑 Exiting...")
-
-finally:
-    if 'esp32_serial' in locals() and esp32_serial.is_open:
-        esp32_serial.close()
+    station.calibrate(CALIBRATION_DURATION)
+
+def finish_calibration(pair):
+    calibration = pair.calibration
+    print(f"\n✅ Calibration complete ({pair.name}), saved as profile '{pair.calibration_profile}':")
+    for key, min_val, max_val in zip(FINGER_NAMES, calibration.lower, calibration.upper):
+        print(f"  {key}: Min={min_val:.0f}, Max={max_val:.0f}, Range={max_val - min_val:.1f}")
+
+# === Console readout, refreshed every DISPLAY_INTERVAL from the main thread ===
+def display_glove_data(station):
+    readouts = []
+    for pair in station:
+        label = f"[{pair.name}] " if len(station) > 1 else ""
+        if pair.calibration.calibrated and pair.bend is not None:
+            readouts.append(label + "  ".join(f"{key}: {value:.1f}%" for key, value in zip(FINGER_NAMES, pair.bend)))
+        elif pair.raw is not None:
+            readouts.append(label + f"Calibration not done. Raw data: {pair.raw}")
+    if readouts:
+        print("   ".join(readouts) + "       ", end="\r", flush=True)
+
+# === Print servo load computed by each pair's force feedback task ===
+def print_load(pair, label):
+    print(f"\n🔧 LOAD{label}: " + "  ".join(f"{key}={value}" for key, value in zip(FINGER_NAMES, pair.force_feedback.brakes)))
+
+# === Print each pair's loop rate, jitter and latency ===
+def print_stats(station):
+    for name, stats in station.stats().items():
+        label = f" [{name}]" if len(station) > 1 else ""
+        period = stats['pose_period']
+        jitter = stats['pose_jitter']
+        latency = stats['latency']
+        haptic_stats = stats['haptics']
+        if period.get('count', 0) == 0:
+            continue
+        line = f"\n⏱️ Pose loop{label}: {1000.0 / period['mean_ms']:.1f} Hz, jitter p99={jitter['p99_ms']:.2f} ms, overruns={stats['pose_overruns']}"
+        if latency.get('count', 0):
+            line += f", glove->hand latency p50={latency['p50_ms']:.1f} ms p99={latency['p99_ms']:.1f} ms"
+        if stats['glove_age_ms'] is not None:
+            line += f", last glove sample {stats['glove_age_ms']:.0f} ms ago"
+        if 'feedback_period' in stats and stats['feedback_period'].get('count', 0):
+            line += f"\n🔁 Force feedback{label}: {1000.0 / stats['feedback_period']['mean_ms']:.1f} Hz, overruns={stats['feedback_overruns']}"
+        if 'recorder' in stats:
+            recording = stats['recorder']
+            line += f"\n💾 Recording{label}: rows={recording['rows']}, dropped={sum(recording['dropped'].values())}, {recording['bytes_written'] / 1e6:.1f} MB written"
+        if haptic_stats['submitted']:
+            line += f"\n📨 Haptics{label}: sent={haptic_stats['sent']}, coalesced={haptic_stats['coalesced']}, unchanged={haptic_stats['dropped']}"
+        print(line)
+        if station[name].leap_node is not None and station[name].force_feedback is not None:
+            print_load(station[name], label)
+
+# === Keyboard controls (event driven, run on the keyboard thread) ===
+# Commands go to every glove's haptic channel, which maps fingers to servo letters and rate-limits the writes.
+# Presets pause force feedback streaming (otherwise it would overwrite them right away); 'f' toggles it back.
+def register_hotkeys(station):
+    feedback_enabled = [ENABLE_FORCE_FEEDBACK and ENABLE_LEAPHAND]
+
+    def set_feedback(enabled):
+        if feedback_enabled[0] != enabled:
+            feedback_enabled[0] = enabled
+            station.set_feedback(enabled)
+            print(f"\n🔁 Force feedback {'on' if enabled else 'paused'}")
+
+    def zero_servos():
+        print("\n🔧 Zeroing all servos...")
+        set_feedback(False)
+        station.submit_haptics(servo_zero_command)
+
+    # Apply ball-hold preset on 'b' press
+    def ball_hold():
+        print("\n🖐️ Activating ball-hold preset...")
+        set_feedback(False)
+        station.submit_haptics(haptic_presets["ball_hold"])
+
+    # Manual preset strengths 0–9: send same value to all servos
+    def strength_preset(i):
+        strength = i * 100  # 0–900
+        print(f"\n🖐️ Activating haptic preset {i} ({strength} brake)...")
+        set_feedback(False)
+        station.submit_haptics([strength] * 5)
+
+    def toggle_feedback():
+        set_feedback(not feedback_enabled[0])
+
+    keyboard.add_hotkey('shift+c', calibrate, args=(station,))
+    keyboard.add_hotkey('shift+z', zero_servos)
+    keyboard.add_hotkey('b', ball_hold)
+    keyboard.add_hotkey('f', toggle_feedback)
+    for i in range(10):
+        keyboard.add_hotkey(str(i), strength_preset, args=(i,))
+
+# === Main: Glove-robot integration ===
+def main():
+    station = TeleopStation([make_pair(**pair) for pair in PAIRS])
+    try:
+        # Open every glove link (binary framing if the firmware supports it) and LeapHand, concurrently
+        station.open()
+        for pair in station:
+            print(f"✅ [{pair.name}] Connected to {pair.glove_port}, glove link mode: {pair.link_mode}")
+            if not pair.calibration.calibrated:
+                print(f"ℹ️ [{pair.name}] No calibration profile '{pair.calibration_profile}' yet, press shift+c to calibrate")
+            if pair.retarget is pair.default_retarget:
+                print(f"ℹ️ [{pair.name}] No retargeting profile '{pair.retarget_profile}' yet, using the linear gains")
+            if pair.recorder is not None:
+                print(f"💾 [{pair.name}] Recording session to {pair.recorder.path}")
+            if pair.leap_node is not None:
+                print(f"🤖 [{pair.name}] LEAP Hand initialized")
+
+                # Test current sensor connection on LeapHand
+                print("🔍 Testing leap_node.read_cur()...")
+                try:
+                    current_vals = pair.leap_node.read_cur()
+                    print(f"✅ read_cur() success: {current_vals}")
+                except Exception as e:
+                    print(f"❌ read_cur() failed: {e}")
+
+        # Every pair gets its own glove reader, pose scheduler (SEND_INTERVAL) and force feedback task (FEEDBACK_INTERVAL)
+        register_hotkeys(station)
+        station.start()
+
+        last_stats = time.time()
+        while station.is_running:
+            time.sleep(DISPLAY_INTERVAL)
+            display_glove_data(station)
+            if time.time() - last_stats >= STATS_INTERVAL:
+                last_stats = time.time()
+                print_stats(station)
+        # Every pair stopped on its own: surface why (e.g. serial.SerialException on a dropped link)
+        errors = station.errors()
+        if errors:
+            raise next(iter(errors.values()))
+
+    except serial.SerialException as e:
+        print(f"Serial Error: {e}")
+
+    except KeyboardInterrupt:
+        print("\n🛑 Exiting...")
+
+    finally:
+        station.close()
+        keyboard.unhook_all_hotkeys()
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,13 @@
 import numpy as np
 
 from leap_hand_utils.dynamixel_client import *
+from leap_hand_utils.discovery import find_leap_hand
+from leap_hand_utils.embodiment import ALLEGRO, LEAPHAND, ONE_RANGE, CommandWriter, Embodiment
+from leap_hand_utils.trajectory import CUBIC, TrajectoryBuffer
 import leap_hand_utils.leap_hand_utils as lhu
+from leap_hand_utils.history import HAND_STREAM
+import logging
+import threading
 import time
 #######################################################
 """This can control and query the LEAP Hand
@@ -19,10 +25,39 @@ I recommend you only query when necessary and below 90 samples a second.  Used t
 #The joint numbering goes from Index (0-3), Middle(4-7), Ring(8-11) to Thumb(12-15) and from MCP Side, MCP Forward, PIP, DIP for each finger.
 #For instance, the MCP Side of Index is ID 0, the MCP Forward of Ring is 9, the DIP of Ring is 11
 
+#Telemetry: pass poll_rate (Hz) or call start_polling() to have a background thread read position, velocity and current
+#continuously. The read functions then return the latest snapshot immediately instead of waiting on the bus.
+#A failed poll (serial timeout, CRC error) is logged, counted in poll_errors and kept in error; the poller keeps going, and
+#snapshot().timestamp tells how old the data is.
+#Every bus access (polling and commands) goes through bus_lock, so the node can be shared between threads.
+
+#Streaming: call start_streaming() and feed timestamped poses with stream_leap/stream_allegro/stream_ones instead of set_*.
+#A command thread plays them back `delay` seconds late at a fixed rate, interpolating between them (linear or cubic,
+#optionally velocity limited), so a 20 Hz policy or the 83 Hz glove loop no longer makes the servos step. If the
+#producer falls more than `delay` behind, the last pose is held and counted in trajectory.underruns.
+
+#Recording: set recorder to a started glove_utils.recorder.SessionRecorder and every telemetry poll is appended to its
+#HAND_STREAM ('hand') stream (timestamp, pos, vel, cur), without touching the bus again.
+
 """
 ########################################################
+class LeapSnapshot:
+    #One telemetry sample. seq increases with every poll; it is -1 while the poller is rewriting the buffer.
+    def __init__(self, num_motors):
+        self.pos = np.zeros(num_motors, dtype=np.float32)
+        self.vel = np.zeros(num_motors, dtype=np.float32)
+        self.cur = np.zeros(num_motors, dtype=np.float32)
+        self.timestamp = 0.0  # time.perf_counter() of the read
+        self.seq = 0
+
+    def copy(self):
+        snapshot = LeapSnapshot(len(self.pos))
+        snapshot.pos[:], snapshot.vel[:], snapshot.cur[:] = self.pos, self.vel, self.cur
+        snapshot.timestamp, snapshot.seq = self.timestamp, self.seq
+        return snapshot
+
 class LeapNode:
-    def __init__(self):
+    def __init__(self, dxl_client=None, poll_rate=None, port=None, max_delta=None, exclude_ports=()):
         ####Some parameters
         # I recommend you keep the current limit from 350 for the lite, and 550 for the full hand
         # Increase KP if the hand is too weak, decrease if it's jittery.
@@ -31,64 +66,205 @@ class LeapNode:
         self.kD = 200
         self.curr_lim = 350
         self.prev_pos = self.pos = self.curr_pos = lhu.allegro_to_LEAPhand(np.zeros(16))
-        #You can put the correct port here or have the node auto-search for a hand at the first 3 ports.
-        # For example ls /dev/serial/by-id/* to find your LEAP Hand. Then use the result.  
+        #Precomputed allegro / [-1,1] -> LEAP conversions for set_allegro, set_ones and the stream_* calls
+        self.embodiment = Embodiment(allegro_zeros=False, dtype=np.float64)
+        #You can put the correct port here (port=...) or have the node search every serial port for a hand, see leap_hand_utils/discovery.py.
+        # The search pings the motors on all ports in parallel and remembers the winning /dev/serial/by-id path, so later starts are instant.
         # For example: /dev/serial/by-id/usb-FTDI_USB__-__Serial_Converter_FT7W91VW-if00-port0
+        # Ports already open in this process (the glove links) go in exclude_ports so the search never probes them.
+        # You can also pass an already connected DynamixelClient (e.g. one built on leap_hand_utils.fake_dynamixel) to skip the search.
         self.motors = motors = [0,1,2,3,4,5,6,7,8,9,10,11,12,13,14,15]
-        try:
-            self.dxl_client = DynamixelClient(motors, '/dev/ttyUSB0', 4000000)
+        if dxl_client is not None:
+            self.dxl_client = dxl_client
+        else:
+            self.dxl_client = DynamixelClient(motors, port or find_leap_hand(motors, exclude=exclude_ports), 4000000)
             self.dxl_client.connect()
-        except Exception:
-            try:
-                self.dxl_client = DynamixelClient(motors, '/dev/ttyUSB1', 4000000)
-                self.dxl_client.connect()
-            except Exception:
-                self.dxl_client = DynamixelClient(motors, 'COM5', 4000000)
-                self.dxl_client.connect()
         #Enables position-current control mode and the default parameters, it commands a position and then caps the current so the motors don't overload
-        self.dxl_client.sync_write(motors, np.ones(len(motors))*5, 11, 1)
-        self.dxl_client.set_torque_enabled(motors, True)
-        self.dxl_client.sync_write(motors, np.ones(len(motors)) * self.kP, 84, 2) # Pgain stiffness     
-        self.dxl_client.sync_write([0,4,8], np.ones(3) * (self.kP * 0.75), 84, 2) # Pgain stiffness for side to side should be a bit less
-        self.dxl_client.sync_write(motors, np.ones(len(motors)) * self.kI, 82, 2) # Igain
-        self.dxl_client.sync_write(motors, np.ones(len(motors)) * self.kD, 80, 2) # Dgain damping
-        self.dxl_client.sync_write([0,4,8], np.ones(3) * (self.kD * 0.75), 80, 2) # Dgain damping for side to side should be a bit less
-        #Max at current (in unit 1ma) so don't overheat and grip too hard #500 normal or #350 for lite
-        self.dxl_client.sync_write(motors, np.ones(len(motors)) * self.curr_lim, 102, 2)
+        #configure() reads the registers back and only writes what differs, so restarting the node on a powered hand is quick
+        side = np.isin(motors, [0,4,8])
+        self.dxl_client.configure(motors, {
+            'operating_mode': 5,
+            'position_p_gain': np.where(side, self.kP * 0.75, self.kP), # Pgain stiffness, for side to side should be a bit less
+            'position_i_gain': self.kI, # Igain
+            'position_d_gain': np.where(side, self.kD * 0.75, self.kD), # Dgain damping, for side to side should be a bit less
+            'current_limit': self.curr_lim, #Max at current (in unit 1ma) so don't overheat and grip too hard #500 normal or #350 for lite
+            'torque_enable': 1,
+        })
         self.dxl_client.write_desired_pos(self.motors, self.curr_pos)
+        #Every set_* command is converted, clipped to the joint limits (see lhu.angle_safety_clip) and, with max_delta
+        #(rad per command, scalar or per joint), rate limited against the last goal in one pass into the goal tick buffer.
+        #curr_pos is the goal that was actually sent.
+        self.command = CommandWriter(self.embodiment, self.dxl_client.position_writer(motors), max_delta)
+
+        #Telemetry state. Two snapshot buffers: the poller fills the back one and then swaps it in.
+        self.bus_lock = threading.RLock()
+        self._snapshots = [LeapSnapshot(len(motors)), LeapSnapshot(len(motors))]
+        self._snapshot = self._snapshots[0]
+        self._poll_thread = None
+        self._poll_stop = threading.Event()
+        self.polls = 0
+        self.poll_overruns = 0
+        self.poll_errors = 0
+        self.stream_errors = 0
+        self.error = None  # Last exception raised on the poller or stream thread
+        self.recorder = None
+        self.trajectory = None
+        self._stream_thread = None
+        self._stream_stop = threading.Event()
+        self.stream_overruns = 0
+        if poll_rate:
+            self.start_polling(poll_rate)
 
     #Receive LEAP pose and directly control the robot
     def set_leap(self, pose):
-        self.prev_pos = self.curr_pos
-        self.curr_pos = np.array(pose)
-        self.dxl_client.write_desired_pos(self.motors, self.curr_pos)
+        self._command(pose)
     #allegro compatibility joint angles.  It adds 180 to make the fully open position at 0 instead of 180
     def set_allegro(self, pose):
-        pose = lhu.allegro_to_LEAPhand(pose, zeros=False)
-        self.prev_pos = self.curr_pos
-        self.curr_pos = np.array(pose)
-        self.dxl_client.write_desired_pos(self.motors, self.curr_pos)
+        self._command(pose, ALLEGRO)
     #Sim compatibility for policies, it assumes the ranges are [-1,1] and then convert to leap hand ranges.
     def set_ones(self, pose):
-        pose = lhu.sim_ones_to_LEAPhand(np.array(pose))
-        self.prev_pos = self.curr_pos
-        self.curr_pos = np.array(pose)
-        self.dxl_client.write_desired_pos(self.motors, self.curr_pos)
+        self._command(pose, ONE_RANGE)
+    def _command(self, pose, embodiment=LEAPHAND):
+        with self.bus_lock:
+            self.command.write(pose, embodiment)
+            self.prev_pos = self.curr_pos
+            self.curr_pos = self.command.position()
     #read position of the robot
     def read_pos(self):
-        return self.dxl_client.read_pos()
+        if self.is_polling:
+            return self.snapshot().pos
+        with self.bus_lock:
+            return self.dxl_client.read_pos()
     #read velocity
     def read_vel(self):
-        return self.dxl_client.read_vel()
+        if self.is_polling:
+            return self.snapshot().vel
+        with self.bus_lock:
+            return self.dxl_client.read_vel()
     #read current
     def read_cur(self):
-        return self.dxl_client.read_cur()
+        if self.is_polling:
+            return self.snapshot().cur
+        with self.bus_lock:
+            return self.dxl_client.read_cur()
     #These combined commands are faster FYI and return a list of data
     def pos_vel(self):
-        return self.dxl_client.read_pos_vel()
+        if self.is_polling:
+            snapshot = self.snapshot()
+            return snapshot.pos, snapshot.vel
+        with self.bus_lock:
+            return self.dxl_client.read_pos_vel()
     #These combined commands are faster FYI and return a list of data
     def pos_vel_eff_srv(self):
-        return self.dxl_client.read_pos_vel_cur()
+        if self.is_polling:
+            snapshot = self.snapshot()
+            return snapshot.pos, snapshot.vel, snapshot.cur
+        with self.bus_lock:
+            return self.dxl_client.read_pos_vel_cur()
+
+    #Background telemetry: reads position, velocity and current at rate_hz into the snapshot buffers
+    def start_polling(self, rate_hz=100):
+        if self.is_polling:
+            return
+        self._poll_stop.clear()
+        self._poll_thread = threading.Thread(target=self._poll, args=(1.0 / rate_hz,), name='leap-telemetry', daemon=True)
+        self._poll_thread.start()
+    def stop_polling(self):
+        self._poll_stop.set()
+        if self._poll_thread is not None:
+            self._poll_thread.join()
+            self._poll_thread = None
+    @property
+    def is_polling(self):
+        return self._poll_thread is not None
+    #Consistent copy of the latest telemetry (pos, vel, cur, timestamp, seq), never touches the bus
+    def snapshot(self):
+        while True:
+            current = self._snapshot
+            seq = current.seq
+            snapshot = current.copy()
+            #Retry if the poller rewrote this buffer while we were copying it
+            if seq >= 0 and current.seq == seq:
+                return snapshot
+    def _poll(self, interval):
+        def poll():
+            back = self._snapshots[(self.polls + 1) % 2]
+            with self.bus_lock:
+                back.seq = -1
+                self.dxl_client.read_pos_vel_cur(out=(back.pos, back.vel, back.cur))
+            back.timestamp = time.perf_counter()
+            back.seq = self.polls + 1
+            self._snapshot = back
+            self.polls += 1
+            recorder = self.recorder
+            if recorder is not None:
+                recorder.record(HAND_STREAM, back.timestamp, back.pos, back.vel, back.cur)
+        def skipped(missed):
+            self.poll_overruns += missed
+        def failed(error):
+            logging.exception('Telemetry poll failed')
+            self.poll_errors += 1
+            self.error = error
+        _run_periodic(interval, self._poll_stop, poll, skipped, failed)
+
+    #Trajectory streaming: plays back stream_* poses delay seconds late at rate_hz, max_velocity in rad/s per joint
+    def start_streaming(self, rate_hz=200, delay=0.05, interpolation=CUBIC, max_velocity=None):
+        if self.is_streaming:
+            return
+        self.trajectory = TrajectoryBuffer(len(self.motors), interpolation, max_velocity)
+        self.trajectory.reset(self.curr_pos)
+        self._stream_stop.clear()
+        self._stream_thread = threading.Thread(target=self._stream, args=(1.0 / rate_hz, delay), name='leap-trajectory', daemon=True)
+        self._stream_thread.start()
+    def stop_streaming(self):
+        self._stream_stop.set()
+        if self._stream_thread is not None:
+            self._stream_thread.join()
+            self._stream_thread = None
+    @property
+    def is_streaming(self):
+        return self._stream_thread is not None
+    #Queue a LEAP pose valid at time t (time.perf_counter(), defaults to now). Returns False if t is not after the last pose.
+    def stream_leap(self, pose, t=None):
+        return self.trajectory.push(time.perf_counter() if t is None else t, pose)
+    def stream_allegro(self, pose, t=None):
+        return self.stream_leap(self.embodiment.allegro_to_LEAPhand(pose), t)
+    def stream_ones(self, pose, t=None):
+        return self.stream_leap(self.embodiment.sim_ones_to_LEAPhand(pose), t)
+    def _stream(self, interval, delay):
+        last = [time.perf_counter()]
+        def command():
+            now = time.perf_counter()
+            pose = self.trajectory.sample(now - delay, now - last[0])
+            last[0] = now
+            if pose is not None:
+                self.set_leap(pose)
+        def skipped(missed):
+            self.stream_overruns += missed
+        def failed(error):
+            logging.exception('Trajectory command failed')
+            self.stream_errors += 1
+            self.error = error
+        _run_periodic(interval, self._stream_stop, command, skipped, failed)
+
+#Calls tick() every interval seconds until stop is set. When a tick runs late (e.g. the bus was busy) the missed ticks
+#are skipped instead of bursting to catch up, and reported to skipped(count). An exception in tick() is passed to
+#failed(exception) and the loop carries on with the next tick.
+def _run_periodic(interval, stop, tick, skipped, failed):
+    next_tick = time.perf_counter()
+    while not stop.is_set():
+        try:
+            tick()
+        except Exception as e:
+            failed(e)
+        next_tick += interval
+        delay = next_tick - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+        else:
+            missed = int(-delay // interval) + 1
+            skipped(missed)
+            next_tick += missed * interval
 ########################################################
 
 
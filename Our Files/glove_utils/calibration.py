@@ -0,0 +1,256 @@
+"""Glove calibration: raw flex sensor readings -> 0-100% finger bend.
+
+A `GloveCalibration` holds per-finger lower/upper bounds and an optional
+monotonic curve as NumPy arrays and maps a whole (N, 5) batch of samples in
+one vectorized call. Bounds come either from the plain min/max of the
+calibration samples or from percentiles (robust to the odd glitch); the
+curve is a per-finger polynomial fitted to the empirical distribution of the
+normalized samples, which evens out sensors that sit near one end of their
+range for most of the motion. The fit is stored as a table over CURVE_POINTS
+evenly spaced inputs with a running maximum taken along it, so a polynomial
+that wiggles can't make the bend go backwards while the finger closes.
+
+Calibration runs incrementally: `begin()` opens a window, `observe()` is
+called with every sample the teleop loop already receives, and the new
+bounds replace the old ones in one step when the window closes, so `apply()`
+keeps working (with the previous calibration) the whole time.
+
+Calibrations are saved as named JSON profiles, one per operator.
+"""
+import json
+import os
+import re
+import threading
+import time
+from typing import List, Optional
+
+import numpy as np
+
+from glove_utils.parser import FINGER_NAMES
+
+DEFAULT_PROFILE_DIR = os.path.join(os.path.expanduser('~'), '.leapglove',
+                                   'calibration')
+PROFILE_EXTENSION = '.json'
+_PROFILE_NAME = re.compile(r'[A-Za-z0-9_.-]+')
+
+OUTLIER_THRESHOLD = 10000  # Raw readings at or above this are glitches
+MIN_SPAN = 5               # Fingers with a smaller range are left at 0%
+CURVE_POINTS = 65          # Table size of a fitted curve
+
+
+class GloveCalibration:
+    """Per-finger calibration model applied to batches of raw samples.
+
+    Args:
+        num_fingers: Number of sensor columns.
+        percentiles: Optional (low, high) percentiles used as the bounds
+            instead of the plain min/max of the calibration samples.
+        curve_degree: Degree of the per-finger curve fitted when a window
+            closes, or 0 to keep the mapping linear.
+        max_samples: Capacity of the sample buffer used by a window; the
+            oldest samples are overwritten once it is full.
+    """
+
+    def __init__(self, num_fingers: int = len(FINGER_NAMES),
+                 percentiles: Optional[tuple] = None,
+                 curve_degree: int = 0,
+                 max_samples: int = 4096):
+        self.num_fingers = num_fingers
+        self.percentiles = percentiles
+        self.curve_degree = curve_degree
+        self.lower = np.zeros(num_fingers)
+        self.upper = np.zeros(num_fingers)
+        self.curve = None  # (num_fingers, CURVE_POINTS) non-decreasing bend table
+        self.calibrated = False
+
+        self._lock = threading.Lock()
+        self._samples = np.zeros((max_samples, num_fingers))
+        self._num_samples = 0
+        self._deadline = None
+
+    # === Applying ===
+
+    def apply(self, samples: np.ndarray) -> np.ndarray:
+        """Maps raw samples, shape (num_fingers,) or (N, num_fingers), to 0-100%.
+
+        Fingers whose calibrated range is below MIN_SPAN (or everything,
+        before the first calibration) map to 0.
+        """
+        lower, upper, curve = self.lower, self.upper, self.curve
+        span = upper - lower
+        bend = (np.asarray(samples, dtype=np.float64) - lower) / np.maximum(span, 1)
+        np.clip(bend, 0.0, 1.0, out=bend)
+        if curve is not None:
+            bend = _evaluate_curve(curve, bend)
+            np.clip(bend, 0.0, 1.0, out=bend)
+        bend *= 100.0
+        bend[..., span < MIN_SPAN] = 0
+        return bend
+
+    # === Incremental calibration ===
+
+    def begin(self, duration: float = 5.0):
+        """Opens a calibration window; samples are collected by `observe()`."""
+        with self._lock:
+            self._num_samples = 0
+            self._deadline = time.monotonic() + duration
+
+    @property
+    def active(self) -> bool:
+        """True while a calibration window is open."""
+        return self._deadline is not None
+
+    def observe(self, samples: np.ndarray) -> bool:
+        """Adds raw samples to the open window.
+
+        Returns True on the call that closes the window and commits the new
+        calibration, False otherwise (including when no window is open).
+        """
+        if self._deadline is None:
+            return False
+        samples = np.asarray(samples, dtype=np.float64).reshape(-1, self.num_fingers)
+        with self._lock:
+            if self._deadline is None:
+                return False
+            self._append(samples)
+            if time.monotonic() < self._deadline:
+                return False
+            self._deadline = None
+            return self._commit()
+
+    def cancel(self):
+        """Closes the window without touching the current calibration."""
+        with self._lock:
+            self._deadline = None
+
+    def fit(self, samples: np.ndarray) -> bool:
+        """Calibrates from a recorded (N, num_fingers) array in one call."""
+        with self._lock:
+            self._num_samples = 0
+            self._append(np.asarray(samples, dtype=np.float64).reshape(-1, self.num_fingers))
+            return self._commit()
+
+    def _append(self, samples):
+        capacity = len(self._samples)
+        samples = samples[-capacity:]
+        index = np.arange(self._num_samples, self._num_samples + len(samples)) % capacity
+        self._samples[index] = samples
+        self._num_samples += len(samples)
+
+    def _commit(self) -> bool:
+        samples = self._samples[:min(self._num_samples, len(self._samples))]
+        if len(samples) == 0:
+            return False
+        # Glitched readings are masked out per finger, not per sample.
+        masked = np.where(samples < OUTLIER_THRESHOLD, samples, np.nan)
+        if self.percentiles is not None:
+            lower, upper = np.nanpercentile(masked, self.percentiles, axis=0)
+        else:
+            lower, upper = np.nanmin(masked, axis=0), np.nanmax(masked, axis=0)
+        lower = np.nan_to_num(lower)
+        upper = np.nan_to_num(upper)
+
+        curve = None
+        if self.curve_degree > 0:
+            bend = np.clip((masked - lower) / np.maximum(upper - lower, 1), 0.0, 1.0)
+            curve = _fit_curves(bend, self.curve_degree)
+
+        # Swap the model in one go so apply() never sees a half update.
+        self.lower, self.upper, self.curve = lower, upper, curve
+        self.calibrated = True
+        return True
+
+    # === Profiles ===
+
+    def to_dict(self) -> dict:
+        return {
+            'num_fingers': self.num_fingers,
+            'percentiles': list(self.percentiles) if self.percentiles else None,
+            'curve_degree': self.curve_degree,
+            'lower': self.lower.tolist(),
+            'upper': self.upper.tolist(),
+            'curve_table': self.curve.tolist() if self.curve is not None else None,
+            'calibrated': self.calibrated,
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> 'GloveCalibration':
+        calibration = cls(num_fingers=data['num_fingers'],
+                          percentiles=data.get('percentiles'),
+                          curve_degree=data.get('curve_degree', 0))
+        calibration.lower = np.array(data['lower'], dtype=np.float64)
+        calibration.upper = np.array(data['upper'], dtype=np.float64)
+        if data.get('curve_table') is not None:
+            calibration.curve = np.array(data['curve_table'], dtype=np.float64)
+        calibration.calibrated = data.get('calibrated', True)
+        return calibration
+
+    def save(self, name: str, directory: str = DEFAULT_PROFILE_DIR) -> str:
+        """Saves the calibration as profile `name`; returns the file path."""
+        path = profile_path(name, directory)
+        os.makedirs(directory, exist_ok=True)
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(self.to_dict(), f, indent=2)
+        os.replace(tmp_path, path)
+        return path
+
+    @classmethod
+    def load(cls, name: str, directory: str = DEFAULT_PROFILE_DIR) -> 'GloveCalibration':
+        """Loads profile `name`; raises FileNotFoundError if it does not exist."""
+        with open(profile_path(name, directory)) as f:
+            return cls.from_dict(json.load(f))
+
+
+def profile_path(name: str, directory: str = DEFAULT_PROFILE_DIR) -> str:
+    if not _PROFILE_NAME.fullmatch(name):
+        raise ValueError('Invalid calibration profile name: {!r}'.format(name))
+    return os.path.join(directory, name + PROFILE_EXTENSION)
+
+
+def list_profiles(directory: str = DEFAULT_PROFILE_DIR) -> List[str]:
+    """Returns the names of the profiles saved in `directory`."""
+    if not os.path.isdir(directory):
+        return []
+    return sorted(filename[:-len(PROFILE_EXTENSION)]
+                  for filename in os.listdir(directory)
+                  if filename.endswith(PROFILE_EXTENSION))
+
+
+def _fit_curves(bend: np.ndarray, degree: int) -> np.ndarray:
+    """Fits, per finger, a polynomial from normalized bend to its quantile.
+
+    The fit is anchored at (0, 0) and (1, 1) so the curve keeps the
+    calibrated end points. Returns the polynomials sampled on CURVE_POINTS
+    inputs in [0, 1], clipped to [0, 1] and made non-decreasing.
+    """
+    levels = np.linspace(0.0, 1.0, 21)
+    curves = np.zeros((bend.shape[1], degree + 1))
+    for finger in range(bend.shape[1]):
+        column = bend[:, finger]
+        column = column[~np.isnan(column)]
+        if len(column) <= degree:
+            curves[finger, -2] = 1.0  # Identity
+            continue
+        x = np.concatenate([np.quantile(column, levels), [0.0, 1.0]])
+        y = np.concatenate([levels, [0.0, 1.0]])
+        weights = np.concatenate([np.ones_like(levels), [10.0, 10.0]])
+        curves[finger] = np.polyfit(x, y, degree, w=weights)
+
+    grid = np.linspace(0.0, 1.0, CURVE_POINTS)
+    table = np.zeros((len(curves), CURVE_POINTS))
+    for column in curves.T:  # Horner's scheme, all fingers at once
+        table *= grid
+        table += column[:, None]
+    np.clip(table, 0.0, 1.0, out=table)
+    return np.maximum.accumulate(table, axis=1)
+
+
+def _evaluate_curve(curve: np.ndarray, bend: np.ndarray) -> np.ndarray:
+    """Interpolates each finger's table at its column of `bend` (in [0, 1])."""
+    position = bend * (curve.shape[1] - 1)
+    index = np.minimum(position.astype(np.intp), curve.shape[1] - 2)
+    fraction = position - index
+    fingers = np.arange(curve.shape[0])
+    low = curve[fingers, index]
+    return low + (curve[fingers, index + 1] - low) * fraction
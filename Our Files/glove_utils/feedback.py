@@ -0,0 +1,162 @@
+"""Closed-loop force feedback: LEAP Hand motor current -> glove brake values.
+
+`ForceFeedback` is called with a LeapNode on the teleop engine's feedback
+task. Each call reads the present currents, filters them per finger (EMA or
+running median), and maps them to 0-1000 brake values with the idle /
+contact-threshold scaling that `get_finger_currents` used:
+
+    brake = min(1000, max(0, |I| - idle) / (contact - idle) * 1000)
+
+The result (FINGER_NAMES order) is meant to be submitted to a HapticChannel,
+which takes care of rate limiting the glove link.
+"""
+from typing import Optional
+
+import numpy as np
+
+from glove_utils.parser import FINGER_NAMES
+
+CURRENT_TO_AMPS = 0.00269  # read_cur() units -> A
+MAX_BRAKE = 1000
+
+# read_cur() entry used for each logical finger. The hand has no pinky, so it
+# follows the ring finger's sensor.
+FINGER_MOTORS = np.array([0, 1, 2, 3, 3])
+# Entry patched in when the thumb sensor reads (near) zero; it sometimes breaks.
+THUMB_FALLBACK_MOTOR = 4
+THUMB_BROKEN_THRESHOLD = 0.005  # A
+
+FILTER_EMA = 'ema'
+FILTER_MEDIAN = 'median'
+
+
+class ForceFeedback:
+    """Reads, filters and scales finger currents into brake values.
+
+    Args:
+        idle_current: Currents below this (A) are noise and give no brake.
+        contact_threshold: Current (A) that maps to full brake.
+        filter_type: FILTER_EMA, FILTER_MEDIAN or None.
+        alpha: EMA weight of the newest sample.
+        median_window: Number of samples the median filter looks at.
+    """
+
+    def __init__(self, idle_current: float = 0.05,
+                 contact_threshold: float = 1.3,
+                 filter_type: Optional[str] = FILTER_EMA,
+                 alpha: float = 0.3,
+                 median_window: int = 5):
+        if filter_type not in (FILTER_EMA, FILTER_MEDIAN, None):
+            raise ValueError('Unknown filter type: {}'.format(filter_type))
+        self.idle_current = idle_current
+        self.contact_threshold = contact_threshold
+        self.filter_type = filter_type
+        self.alpha = alpha
+        self.reads = 0
+        self.read_errors = 0
+        self.currents = np.zeros(len(FINGER_NAMES))  # Filtered, A
+        self.brakes = np.zeros(len(FINGER_NAMES), dtype=np.int64)
+
+        self._history = np.zeros((median_window, len(FINGER_NAMES)))
+
+    def __call__(self, leap_node) -> Optional[np.ndarray]:
+        """Reads the hand's currents; returns brake values or None on error."""
+        try:
+            raw = leap_node.read_cur()
+        except Exception:
+            self.read_errors += 1
+            return None
+        return self.update(raw)
+
+    def update(self, raw_currents) -> np.ndarray:
+        """Filters one read_cur() sample and returns brakes (FINGER_NAMES order)."""
+        amps = np.abs(np.asarray(raw_currents, dtype=np.float64)[FINGER_MOTORS]) * CURRENT_TO_AMPS
+        if amps[0] < THUMB_BROKEN_THRESHOLD:
+            amps[0] = abs(raw_currents[THUMB_FALLBACK_MOTOR]) * CURRENT_TO_AMPS
+
+        if self.reads == 0 or self.filter_type is None:
+            self.currents = amps
+            self._history[:] = amps
+        elif self.filter_type == FILTER_EMA:
+            self.currents = self.currents + self.alpha * (amps - self.currents)
+        else:
+            self._history[self.reads % len(self._history)] = amps
+            self.currents = np.median(self._history, axis=0)
+        self.reads += 1
+
+        self.brakes = self.scale(self.currents)
+        return self.brakes
+
+    def update_batch(self, raw_currents) -> np.ndarray:
+        """Runs update() over an (N, motors) series of read_cur() samples.
+
+        Vectorized for replaying recorded sessions: returns the (N, 5) brakes
+        that N update() calls would (up to float rounding) and leaves the
+        filter in the same state.
+        """
+        raw = np.asarray(raw_currents, dtype=np.float64).reshape(-1, np.shape(raw_currents)[-1])
+        amps = np.abs(raw[:, FINGER_MOTORS]) * CURRENT_TO_AMPS
+        broken = amps[:, 0] < THUMB_BROKEN_THRESHOLD
+        amps[broken, 0] = np.abs(raw[broken, THUMB_FALLBACK_MOTOR]) * CURRENT_TO_AMPS
+        if len(amps) == 0:
+            return np.zeros((0, len(FINGER_NAMES)), dtype=np.int64)
+
+        reads = self.reads
+        if reads == 0 or self.filter_type is None:
+            # The first sample passes through and fills the history.
+            first, previous, history = amps[:1], amps[0], np.repeat(amps[:1], len(self._history), axis=0)
+            amps, reads = amps[1:], reads + 1
+        else:
+            # Oldest slot first.
+            first, previous = amps[:0], self.currents
+            history = np.roll(self._history, -(reads % len(self._history)), axis=0)
+        if self.filter_type is None:
+            currents = amps
+        elif self.filter_type == FILTER_EMA:
+            currents = _ema(amps, previous, self.alpha)
+        else:
+            window = len(self._history)
+            series = np.concatenate([history, amps])
+            currents = np.median(np.lib.stride_tricks.sliding_window_view(series, window, axis=0)[1:], axis=-1)
+            written = np.arange(reads + len(amps) - window, reads + len(amps))
+            self._history[written % window] = series[-window:]
+        currents = np.concatenate([first, currents])
+        self.reads += len(currents)
+        self.currents = currents[-1].copy()
+        brakes = self.scale(currents)
+        self.brakes = brakes[-1].copy()
+        return brakes
+
+    def scale(self, currents: np.ndarray) -> np.ndarray:
+        """Converts currents (A) to 0-1000 brake values, ignoring idle noise."""
+        excess = np.maximum(np.abs(currents) - self.idle_current, 0.0)
+        brakes = excess / (self.contact_threshold - self.idle_current) * MAX_BRAKE
+        return np.minimum(brakes, MAX_BRAKE).astype(np.int64)
+
+    def reset(self):
+        """Forgets the filter state."""
+        self.reads = 0
+
+
+# Rows per closed-form EMA block; its decay weights are formed explicitly.
+_EMA_BLOCK = 256
+
+
+def _ema(samples: np.ndarray, previous: np.ndarray, alpha: float) -> np.ndarray:
+    """y[n] = y[n-1] + alpha * (x[n] - y[n-1]) over (N, k) samples, blockwise.
+
+    Within a block y = decay^(n+1) * y[-1] + alpha * sum decay^(n-i) * x[i],
+    one matrix product instead of N dependent steps.
+    """
+    decay = 1.0 - alpha
+    lags = np.arange(_EMA_BLOCK)
+    weights = np.tril(decay ** np.maximum(lags[:, None] - lags[None, :], 0))
+    carry = decay ** (lags + 1.0)
+    out = np.empty_like(samples)
+    for start in range(0, len(samples), _EMA_BLOCK):
+        block = samples[start:start + _EMA_BLOCK]
+        rows = len(block)
+        out[start:start + rows] = (alpha * (weights[:rows, :rows] @ block) +
+                                   carry[:rows, None] * previous)
+        previous = out[start + rows - 1]
+    return out
@@ -0,0 +1,139 @@
+"""Rate-limited, coalescing haptic command writer for the LucidGlove.
+
+The firmware applies at most one haptic command every `hapticInterval`
+(15 ms, checked with `>`, so one per 16 ms); anything written faster piles up
+in its serial buffer and is applied late. `HapticChannel` therefore keeps a
+single latest-value-wins slot that any thread can `submit()` to, and a
+background writer that sends the slot at most once per `min_interval`:
+
+- a value submitted while another is still waiting replaces it (coalesced),
+- a value equal to what the glove already has is not sent at all (dropped),
+- only the fingers that changed are written; the others are sent as
+  "unchanged" (left out of the ASCII line, HAPTIC_UNCHANGED in binary).
+"""
+import logging
+import threading
+import time
+from typing import Mapping, Optional, Sequence, Union
+
+import numpy as np
+
+from glove_utils.parser import FINGER_NAMES
+from glove_utils.protocol import HapticEncoder
+
+HAPTIC_INTERVAL = 0.016  # Firmware hapticInterval (15 ms, strict '>')
+MAX_LIMIT = 1000
+
+# Logical finger driving each servo letter A..E (hardware mapping quirk).
+HAPTIC_FINGER_ORDER = ("Pinky (E)", "Thumb (A)", "Index (P)", "Middle (C)", "Ring (D)")
+_SERVO_TO_FINGER = np.array([FINGER_NAMES.index(finger) for finger in HAPTIC_FINGER_ORDER])
+
+HapticValues = Union[Mapping[str, int], Sequence[int], np.ndarray]
+
+
+class HapticChannel(threading.Thread):
+    """Background writer for haptic limits (0-1000 brake per finger).
+
+    Args:
+        serial_conn: Open serial connection to the glove. The channel must
+            be its only writer while running.
+        encoder: HapticEncoder for the negotiated link mode; ASCII if None.
+        min_interval: Minimum time between two writes in seconds.
+        name: Thread name.
+    """
+
+    def __init__(self, serial_conn, encoder: Optional[HapticEncoder] = None,
+                 min_interval: float = HAPTIC_INTERVAL, name: str = 'haptics'):
+        super().__init__(name=name, daemon=True)
+        self.serial_conn = serial_conn
+        self.encoder = encoder if encoder is not None else HapticEncoder()
+        self.min_interval = min_interval
+        self.submitted = 0
+        self.sent = 0       # Commands written to the glove
+        self.coalesced = 0  # Values replaced by a newer one before being sent
+        self.dropped = 0    # Values equal to what the glove already has
+        self.bytes_sent = 0
+        self.error = None
+
+        self._condition = threading.Condition()
+        self._pending = None  # Latest unsent limits, servo order A..E
+        self._current = None  # Limits last handed to the writer, servo order A..E
+        self._last_write = -float('inf')
+        self._stop_event = threading.Event()
+
+    def submit(self, values: HapticValues):
+        """Queues new limits; never blocks on the serial port.
+
+        `values` is a dict keyed by FINGER_NAMES or a sequence in
+        FINGER_NAMES order.
+        """
+        if isinstance(values, Mapping):
+            values = [values[finger] for finger in FINGER_NAMES]
+        limits = np.clip(np.asarray(values, dtype=np.int64), 0, MAX_LIMIT)[_SERVO_TO_FINGER]
+        with self._condition:
+            self.submitted += 1
+            if self._pending is not None:
+                self.coalesced += 1
+                self._pending = None
+            if self._current is not None and np.array_equal(limits, self._current):
+                self.dropped += 1
+                return
+            self._pending = limits
+            self._condition.notify()
+
+    def run(self):
+        while not self._stop_event.is_set():
+            with self._condition:
+                while self._pending is None and not self._stop_event.is_set():
+                    self._condition.wait()
+            if self._stop_event.is_set():
+                break
+
+            # Later submissions coalesce into the slot while we wait.
+            delay = self._last_write + self.min_interval - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+
+            with self._condition:
+                limits, self._pending = self._pending, None
+                if limits is None:  # Cancelled by a value equal to the current one
+                    continue
+                previous, self._current = self._current, limits
+            if previous is None:
+                command = limits
+            else:
+                command = np.where(limits != previous, limits, -1)
+            data = self.encoder.encode(command.tolist())
+            try:
+                self.serial_conn.write(data)
+            except Exception as e:  # serial.SerialException, OSError
+                logging.error('Haptic write failed: %s', e)
+                self.error = e
+                break
+            self._last_write = time.perf_counter()
+            self.sent += 1
+            self.bytes_sent += len(data)
+
+    def stop(self, timeout: float = 1.0):
+        """Stops the writer; a value still waiting in the slot is discarded."""
+        self._stop_event.set()
+        with self._condition:
+            self._condition.notify()
+        if self.is_alive():
+            self.join(timeout)
+
+    def stats(self) -> dict:
+        return {
+            'submitted': self.submitted,
+            'sent': self.sent,
+            'coalesced': self.coalesced,
+            'dropped': self.dropped,
+            'bytes_sent': self.bytes_sent,
+        }
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *args):
+        self.stop()
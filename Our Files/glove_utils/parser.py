@@ -0,0 +1,231 @@
+"""Decoders for the LucidGlove alpha-encoded serial stream.
+
+The firmware (ENCODE_ALPHA in Encoding.ino) sends one line per loop:
+
+    A<thumb>B<index>C<middle>D<ring>E<pinky>F<joyX>G<joyY>P<trigger>[H..O]\\n
+
+where the optional H..O letters are button flags. A decoded frame is an
+int32 vector of FRAME_SIZE entries: the eight numeric fields in letter order
+(A..G, P) followed by the eight flags (H..O) as 0/1.
+
+Our glove is not wired in the firmware's finger order, so the logical
+fingers (FINGER_NAMES) are picked out of a frame with the FINGER_REMAP
+index table.
+"""
+import re
+import struct
+from operator import itemgetter
+from typing import Optional
+
+import numpy as np
+
+FIELD_LETTERS = b'ABCDEFGP'
+FLAG_LETTERS = b'HIJKLMNO'
+NUM_FIELDS = len(FIELD_LETTERS)
+FRAME_SIZE = NUM_FIELDS + len(FLAG_LETTERS)
+
+FINGER_NAMES = ("Thumb (A)", "Index (P)", "Middle (C)", "Ring (D)", "Pinky (E)")
+# Frame column feeding each logical finger (hardware mapping quirk):
+# Thumb <- E, Index <- D, Middle <- C, Ring <- P, Pinky <- A.
+FINGER_REMAP = np.array([4, 3, 2, 7, 0], dtype=np.intp)
+
+MAX_LINE_LENGTH = 128  # Longer runs without a newline are garbage
+
+# One precompiled pattern validates a line and splits out its fields.
+_LINE_PATTERN = re.compile(
+    rb'A(\d+)B(\d+)C(\d+)D(\d+)E(\d+)F(\d+)G(\d+)P(\d+)([H-O]*)\r?')
+# Digit string -> int for every value the firmware can send (analog reads
+# and the doubled trigger stay below 2 * 4096); int() is the fallback.
+_DIGITS_TO_INT = {str(i).encode(): i for i in range(2 * 4096)}.__getitem__
+
+# A decoded line is packed in one call into a preallocated buffer holding
+# the frame followed by the remapped fingers.
+_STORAGE_STRUCT = struct.Struct('=%di' % (FRAME_SIZE + len(FINGER_NAMES)))
+_PICK_FINGERS = itemgetter(*FINGER_REMAP.tolist())
+_NO_FLAGS = (0,) * len(FLAG_LETTERS)
+
+# Batch decoding: a buffer of well-formed lines reduces to this skeleton once
+# digits, flags and carriage returns are deleted.
+_LINE_SKELETON = FIELD_LETTERS + b'\n'
+_SKELETON_DELETE = b'0123456789\r' + FLAG_LETTERS
+_TO_SPACE = bytes.maketrans(FIELD_LETTERS + FLAG_LETTERS + b'\r',
+                            b' ' * (FRAME_SIZE + 1))
+_NOT_FLAG = bytes(b for b in range(256) if b not in FLAG_LETTERS)
+_NOT_FLAG_OR_CR = bytes(b for b in range(256) if b not in FLAG_LETTERS + b'\r')
+# The skeleton says nothing about where flags and carriage returns sit; a
+# buffer holding any is checked against the line pattern, as feed() would.
+_BUFFER_PATTERN = re.compile(rb'(?:' + _LINE_PATTERN.pattern + rb'\n)*')
+
+
+class GloveStreamDecoder:
+    """Incremental decoder for raw bytes read from the glove serial port.
+
+    `feed()` accepts chunks of any size: partial lines are buffered until
+    their newline arrives, and when a read holds several complete lines only
+    the newest valid one is decoded (the older ones are counted as
+    superseded). The result is written into the preallocated `frame` and
+    `fingers` arrays, which are reused across calls.
+    """
+
+    def __init__(self):
+        self._storage = np.zeros(_STORAGE_STRUCT.size // 4, dtype=np.int32)
+        self._storage_view = memoryview(self._storage)
+        self.frame = self._storage[:FRAME_SIZE]
+        self.fingers = self._storage[FRAME_SIZE:]
+        self.frames = 0      # Lines decoded into `frame`
+        self.superseded = 0  # Lines skipped because a newer one arrived
+        self.errors = 0      # Malformed lines
+        self._buffer = bytearray()
+
+    def feed(self, data: bytes) -> bool:
+        """Consumes raw bytes; returns True if `frame` holds a new sample."""
+        if self._buffer:
+            self._buffer += data
+            data = bytes(self._buffer)
+            self._buffer.clear()
+        end = data.rfind(b'\n')
+        if end < 0:
+            self._buffer += data[-MAX_LINE_LENGTH:]
+            return False
+        if end + 1 < len(data):
+            self._buffer += data[end + 1:end + 1 + MAX_LINE_LENGTH]
+
+        # Newest line first; older lines are only decoded if it is corrupt.
+        start = data.rfind(b'\n', 0, end) + 1
+        if self.decode_line(data[start:end]):
+            if start:
+                self.superseded += data.count(b'\n', 0, start)
+            return True
+        older = data[:start].split(b'\n')[:-1]
+        for i in range(len(older) - 1, -1, -1):
+            if self.decode_line(older[i]):
+                self.superseded += i
+                return True
+        return False
+
+    def decode_line(self, line: bytes) -> bool:
+        """Decodes one line (without newline) into `frame` and `fingers`."""
+        match = _LINE_PATTERN.fullmatch(line)
+        if match is None:
+            if line.strip():
+                self.errors += 1
+            return False
+
+        *fields, flags = match.groups()
+        try:
+            values = list(map(_DIGITS_TO_INT, fields))
+        except KeyError:  # Zero padded or out of the firmware's range
+            values = list(map(int, fields))
+        if flags:
+            values += [letter in flags for letter in FLAG_LETTERS]
+        else:
+            values += _NO_FLAGS
+        _STORAGE_STRUCT.pack_into(self._storage_view, 0, *values,
+                                  *_PICK_FINGERS(values))
+        self.frames += 1
+        return True
+
+    def reset(self):
+        """Drops any buffered partial line."""
+        self._buffer.clear()
+
+
+def decode_buffer(data: bytes, return_ends: bool = False):
+    """Decodes every complete line of a recorded stream in one batch.
+
+    Clean buffers are validated with a single skeleton comparison and their
+    numbers converted by one np.array() call over the split fields. If that
+    finds a malformed line (a field without digits, a flag or carriage
+    return before the end of a line, ...), the lines are filtered with the
+    streaming decoder's line pattern first, so both decoders keep exactly
+    the same lines.
+
+    Args:
+        data: Raw bytes as read from the glove. A trailing partial line is
+            ignored.
+        return_ends: Also return the offset of each decoded line's newline
+            in `data`, e.g. to timestamp the frames of a recording.
+
+    Returns:
+        An (N, FRAME_SIZE) int32 array with one row per valid line, and with
+        `return_ends` an (N,) int64 array of newline offsets.
+    """
+    data = bytes(data[:data.rfind(b'\n') + 1])
+    num_lines = data.count(b'\n')
+    ends = None
+    values = _clean_fields(data, num_lines)
+    if values is None:
+        lines = data.split(b'\n')[:-1]
+        valid = [i for i, line in enumerate(lines) if _LINE_PATTERN.fullmatch(line)]
+        if return_ends:
+            ends = (np.cumsum([len(line) + 1 for line in lines], dtype=np.int64) - 1)[valid]
+        lines = [lines[i] for i in valid]
+        num_lines = len(lines)
+        data = b''.join(line + b'\n' for line in lines)
+        values = _split_fields(data)
+    elif return_ends:
+        ends = np.flatnonzero(np.frombuffer(data, dtype=np.uint8) == ord('\n'))
+
+    frames = np.zeros((num_lines, FRAME_SIZE), dtype=np.int32)
+    if num_lines:
+        frames[:, :NUM_FIELDS] = values.reshape(num_lines, NUM_FIELDS)
+        if data.translate(None, _NOT_FLAG):
+            for row, line in zip(frames, data.split(b'\n')):
+                flags = line.translate(None, _NOT_FLAG)
+                if flags:
+                    row[NUM_FIELDS:] = [letter in flags for letter in FLAG_LETTERS]
+    if return_ends:
+        return frames, ends.astype(np.int64)
+    return frames
+
+
+def _split_fields(data: bytes) -> np.ndarray:
+    return np.array(data.translate(_TO_SPACE).split(), dtype=np.int32)
+
+
+def _clean_fields(data: bytes, num_lines: int) -> Optional[np.ndarray]:
+    """The fields of `data` if every line is well formed, else None."""
+    if data.translate(None, _SKELETON_DELETE) != _LINE_SKELETON * num_lines:
+        return None
+    values = _split_fields(data)
+    if values.size != num_lines * NUM_FIELDS:
+        return None  # A field without digits
+    if data.translate(None, _NOT_FLAG_OR_CR) and not _BUFFER_PATTERN.fullmatch(data):
+        return None  # A flag or carriage return before the end of a line
+    return values
+
+
+def frames_to_fingers(frames: np.ndarray) -> np.ndarray:
+    """Picks the logical fingers out of an (N, FRAME_SIZE) frame array."""
+    return frames[:, FINGER_REMAP]
+
+
+# === Legacy regex path, kept as the reference for GloveParserBenchmark ===
+
+
+def parse_raw_data(raw_data: str) -> Optional[dict]:
+    """
+    Expects string like: 'A0000B0000C0000D0000E0000F0000G0000P0000'
+    The group mapping depends on hardware wiring.
+    Returns a mapping of logical finger names to integer values.
+    """
+    pattern = r"A(\d+)B(\d+)C(\d+)D(\d+)E(\d+)F(\d+)G(\d+)P(\d+)(.*)"
+    match = re.match(pattern, raw_data)
+    if match:
+        # Parse fields by index
+        raw = {
+            "Thumb (A)": int(match.group(1)),
+            "Index (P)": int(match.group(8)),
+            "Middle (C)": int(match.group(3)),
+            "Ring (D)": int(match.group(4)),
+            "Pinky (E)": int(match.group(5)),
+        }
+        # Remap values for correct logical finger order (hardware mapping quirk)
+        return {
+            "Thumb (A)": raw["Pinky (E)"],
+            "Index (P)": raw["Ring (D)"],
+            "Middle (C)": raw["Middle (C)"],
+            "Ring (D)": raw["Index (P)"],
+            "Pinky (E)": raw["Thumb (A)"],
+        }
+    return None
@@ -0,0 +1,304 @@
+"""Compact binary framing for the host <-> LucidGlove link.
+
+Every packet is little-endian and fixed-size for its type:
+
+    sync (2) | type (u8) | seq (u8) | payload | crc16 (u16)
+
+`sync` is SYNC_BYTES, `seq` counts packets of that type modulo 256 (gaps
+are reported as dropped packets) and the CRC is CRC-16/CCITT-FALSE
+(`binascii.crc_hqx` seeded with 0xFFFF) over type, seq and payload.
+
+Payloads:
+
+- PACKET_GLOVE_FRAME (glove -> host, 23 bytes instead of ~40 in ASCII):
+  the eight fields A..G, P as u16 followed by the H..O flags as a bitmask.
+- PACKET_HAPTICS (host -> glove, 16 bytes instead of ~26 in ASCII): the
+  five haptic limits A..E as u16; HAPTIC_UNCHANGED leaves a servo as is.
+
+The binary mode is negotiated at connection time: `negotiate()` sends the
+HELLO line and switches to binary only if the glove answers with ACK.
+Firmware that does not know the handshake keeps streaming ASCII and the
+link stays in ASCII mode. HELLO contains none of the letters A..E, so the
+legacy `decodeData()` parses it as "no change" for every servo.
+"""
+import binascii
+import struct
+import time
+from typing import List, Sequence, Tuple
+
+import numpy as np
+
+from glove_utils.parser import (_PICK_FINGERS, _STORAGE_STRUCT, FLAG_LETTERS,
+                                FRAME_SIZE, NUM_FIELDS, GloveStreamDecoder)
+
+MODE_ASCII = 'ascii'
+MODE_BINARY = 'binary'
+
+HELLO = b'?proto=bin1\n'
+ACK = b'!proto=bin1\n'
+
+SYNC_BYTES = b'\xa5\x5a'
+PACKET_GLOVE_FRAME = 0x01
+PACKET_HAPTICS = 0x02
+
+HEADER_SIZE = len(SYNC_BYTES) + 2  # sync, type, seq
+CRC_SIZE = 2
+CRC_SEED = 0xFFFF
+
+NUM_HAPTICS = 5
+HAPTIC_UNCHANGED = 0xFFFF  # Sent as -1 in the ASCII encoding
+
+_GLOVE_PAYLOAD = struct.Struct('<%dHB' % NUM_FIELDS)
+_HAPTIC_PAYLOAD = struct.Struct('<%dH' % NUM_HAPTICS)
+_CRC = struct.Struct('<H')
+# A whole glove packet, for the single-aligned-packet fast path.
+_GLOVE_PACKET = struct.Struct('<2sBB%dHBH' % NUM_FIELDS)
+
+PACKET_SIZES = {
+    PACKET_GLOVE_FRAME: HEADER_SIZE + _GLOVE_PAYLOAD.size + CRC_SIZE,
+    PACKET_HAPTICS: HEADER_SIZE + _HAPTIC_PAYLOAD.size + CRC_SIZE,
+}
+
+# Flag bitmask -> the eight 0/1 flag values, bit 0 being H.
+_FLAG_BITS = [tuple((mask >> bit) & 1 for bit in range(len(FLAG_LETTERS)))
+              for mask in range(256)]
+
+
+def encode_packet(packet_type: int, seq: int, payload: bytes) -> bytes:
+    body = bytes((packet_type, seq & 0xFF)) + payload
+    return SYNC_BYTES + body + _CRC.pack(binascii.crc_hqx(body, CRC_SEED))
+
+
+def encode_glove_frame(frame: Sequence[int], seq: int) -> bytes:
+    """Encodes a FRAME_SIZE glove frame (fields then 0/1 flags)."""
+    flags = 0
+    for bit, flag in enumerate(frame[NUM_FIELDS:]):
+        if flag:
+            flags |= 1 << bit
+    payload = _GLOVE_PAYLOAD.pack(*(int(value) for value in frame[:NUM_FIELDS]), flags)
+    return encode_packet(PACKET_GLOVE_FRAME, seq, payload)
+
+
+def encode_haptics(limits: Sequence[int], seq: int) -> bytes:
+    """Encodes five haptic limits (A..E order, negative = unchanged)."""
+    payload = _HAPTIC_PAYLOAD.pack(*(HAPTIC_UNCHANGED if value < 0 else int(value)
+                                     for value in limits))
+    return encode_packet(PACKET_HAPTICS, seq, payload)
+
+
+def encode_haptics_ascii(limits: Sequence[int]) -> bytes:
+    """Encodes haptic limits as the firmware's ASCII line; negative limits
+    are left out, which the firmware reads as unchanged."""
+    return b''.join(b'%c%d' % (letter, value)
+                    for letter, value in zip(b'ABCDE', limits)
+                    if value >= 0) + b'\n'
+
+
+def decode_haptics(payload: bytes) -> List[int]:
+    """Decodes a PACKET_HAPTICS payload into five limits (-1 = unchanged)."""
+    return [-1 if value == HAPTIC_UNCHANGED else value
+            for value in _HAPTIC_PAYLOAD.unpack(payload)]
+
+
+def split_packets(buffer: bytearray) -> Tuple[List[Tuple[int, int, bytes]], int]:
+    """Extracts every complete, CRC-valid packet from `buffer`.
+
+    Returns the packets as (type, seq, payload) tuples and the number of
+    corrupt packet candidates that were skipped. Consumed bytes (including
+    any garbage before a sync word) are removed from `buffer`; an incomplete
+    trailing packet is left in place for the next call.
+    """
+    packets = []
+    errors = 0
+    pos = 0
+    size = len(buffer)
+    while True:
+        start = buffer.find(SYNC_BYTES, pos)
+        if start < 0:
+            # Keep a possible first half of a sync word.
+            pos = size - 1 if buffer.endswith(SYNC_BYTES[:1]) else size
+            break
+        if start + HEADER_SIZE > size:
+            pos = start
+            break
+        packet_size = PACKET_SIZES.get(buffer[start + 2])
+        if packet_size is None:
+            errors += 1
+            pos = start + 1
+            continue
+        end = start + packet_size
+        if end > size:
+            pos = start
+            break
+        body = bytes(buffer[start + 2:end - CRC_SIZE])
+        if binascii.crc_hqx(body, CRC_SEED) != _CRC.unpack_from(buffer, end - CRC_SIZE)[0]:
+            errors += 1
+            pos = start + 1
+            continue
+        packets.append((body[0], body[1], body[2:]))
+        pos = end
+    del buffer[:pos]
+    return packets, errors
+
+
+def _crc_table() -> np.ndarray:
+    table = np.zeros(256, dtype=np.uint16)
+    for byte in range(256):
+        crc = byte << 8
+        for _ in range(8):
+            crc = ((crc << 1) ^ 0x1021 if crc & 0x8000 else crc << 1) & 0xFFFF
+        table[byte] = crc
+    return table
+
+
+_CRC_TABLE = _crc_table()
+
+
+def decode_packets(data: bytes) -> Tuple[np.ndarray, np.ndarray]:
+    """Decodes every glove packet of a recorded binary stream in one batch.
+
+    The batch counterpart of BinaryGloveDecoder (as decode_buffer is for the
+    ASCII lines): sync words are located, the CRCs of all candidates checked
+    together (table-driven, one vector step per byte) and the payloads
+    unpacked into frames. Corrupt candidates are skipped.
+
+    Returns:
+        An (N, FRAME_SIZE) int32 frame array and the (N,) offsets of each
+        packet's last byte in `data`.
+    """
+    buffer = np.frombuffer(bytes(data), dtype=np.uint8)
+    size = PACKET_SIZES[PACKET_GLOVE_FRAME]
+    if len(buffer) < size:
+        return np.zeros((0, FRAME_SIZE), dtype=np.int32), np.zeros(0, dtype=np.int64)
+    starts = np.flatnonzero((buffer[:-size + 1] == SYNC_BYTES[0]) &
+                            (buffer[1:len(buffer) - size + 2] == SYNC_BYTES[1]) &
+                            (buffer[2:len(buffer) - size + 3] == PACKET_GLOVE_FRAME))
+    packets = buffer[starts[:, None] + np.arange(size)]
+    crc = np.full(len(packets), CRC_SEED, dtype=np.uint16)
+    for column in range(len(SYNC_BYTES), size - CRC_SIZE):
+        crc = (crc << 8) ^ _CRC_TABLE[(crc >> 8) ^ packets[:, column]]
+    valid = crc == (packets[:, -2].astype(np.uint16) | packets[:, -1].astype(np.uint16) << 8)
+    # A sync word inside a valid packet's payload is not a packet start.
+    starts, packets = starts[valid], packets[valid]
+    keep = np.ones(len(starts), dtype=bool)
+    keep[1:] = np.diff(starts) >= size
+    starts, packets = starts[keep], packets[keep]
+
+    frames = np.zeros((len(packets), FRAME_SIZE), dtype=np.int32)
+    payload = packets[:, HEADER_SIZE:HEADER_SIZE + _GLOVE_PAYLOAD.size]
+    frames[:, :NUM_FIELDS] = payload[:, :2 * NUM_FIELDS:2] | payload[:, 1:2 * NUM_FIELDS:2].astype(np.int32) << 8
+    frames[:, NUM_FIELDS:] = (payload[:, -1:] >> np.arange(len(FLAG_LETTERS), dtype=np.uint8)) & 1
+    return frames, starts + size - 1
+
+
+class BinaryGloveDecoder(GloveStreamDecoder):
+    """Drop-in replacement for GloveStreamDecoder on a binary-mode link.
+
+    Fills the same `frame` and `fingers` arrays and counters; corrupt
+    packets count as `errors` and sequence gaps as `dropped`.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.dropped = 0  # Packets lost on the link (sequence gaps)
+        self._last_seq = None
+
+    def feed(self, data: bytes) -> bool:
+        """Consumes raw bytes; returns True if `frame` holds a new sample."""
+        if not self._buffer and len(data) == _GLOVE_PACKET.size:
+            # Common case: the read returned exactly one aligned packet.
+            sync, packet_type, seq, *values, flags, crc = _GLOVE_PACKET.unpack(data)
+            if (sync == SYNC_BYTES and packet_type == PACKET_GLOVE_FRAME and
+                    binascii.crc_hqx(data[2:-CRC_SIZE], CRC_SEED) == crc):
+                if self._last_seq is not None:
+                    self.dropped += (seq - self._last_seq - 1) & 0xFF
+                self._last_seq = seq
+                self._store(values, flags)
+                return True
+
+        self._buffer += data
+        packets, errors = split_packets(self._buffer)
+        self.errors += errors
+        newest = None
+        for packet_type, seq, payload in packets:
+            if packet_type != PACKET_GLOVE_FRAME:
+                continue
+            if self._last_seq is not None:
+                self.dropped += (seq - self._last_seq - 1) & 0xFF
+            self._last_seq = seq
+            if newest is not None:
+                self.superseded += 1
+            newest = payload
+        if newest is None:
+            return False
+        *values, flags = _GLOVE_PAYLOAD.unpack(newest)
+        self._store(values, flags)
+        return True
+
+    def _store(self, values: list, flags: int):
+        values += _FLAG_BITS[flags]
+        _STORAGE_STRUCT.pack_into(self._storage_view, 0, *values,
+                                  *_PICK_FINGERS(values))
+        self.frames += 1
+
+    def decode_line(self, line: bytes) -> bool:
+        """Packets have no line framing: `line` is fed as raw bytes.
+
+        Returns True if a packet completed, as feed() does.
+        """
+        return self.feed(line)
+
+    def reset(self):
+        """Drops any buffered partial packet and the sequence history."""
+        super().reset()
+        self._last_seq = None
+
+
+class HapticEncoder:
+    """Encodes haptic limits for the negotiated link mode."""
+
+    def __init__(self, mode: str = MODE_ASCII):
+        self.mode = mode
+        self.seq = 0
+
+    def encode(self, limits: Sequence[int]) -> bytes:
+        """Encodes five limits in A..E order (negative = unchanged)."""
+        if self.mode != MODE_BINARY:
+            return encode_haptics_ascii(limits)
+        packet = encode_haptics(limits, self.seq)
+        self.seq = (self.seq + 1) & 0xFF
+        return packet
+
+
+def create_decoder(mode: str):
+    """Returns a fresh stream decoder for the given link mode."""
+    return BinaryGloveDecoder() if mode == MODE_BINARY else GloveStreamDecoder()
+
+
+def negotiate(serial_conn, timeout: float = 0.5):
+    """Tries to switch the glove link to binary mode.
+
+    Sends HELLO and waits up to `timeout` seconds for ACK. Anything the glove
+    sent after ACK (or, without ACK, the partial line being received) is fed
+    to the returned decoder.
+
+    Returns:
+        (mode, decoder): MODE_BINARY with a BinaryGloveDecoder, or
+        MODE_ASCII with a GloveStreamDecoder if the glove never answered.
+    """
+    serial_conn.reset_input_buffer()
+    serial_conn.write(HELLO)
+    received = bytearray()
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        received += serial_conn.read(serial_conn.in_waiting or 1)
+        ack = received.find(ACK)
+        if ack >= 0:
+            decoder = BinaryGloveDecoder()
+            decoder.feed(bytes(received[ack + len(ACK):]))
+            return MODE_BINARY, decoder
+        # Only a partial line can still turn into ACK.
+        del received[:received.rfind(b'\n') + 1]
+    decoder = GloveStreamDecoder()
+    decoder.feed(bytes(received))  # Buffers the partial line
+    return MODE_ASCII, decoder
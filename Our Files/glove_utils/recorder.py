@@ -0,0 +1,416 @@
+"""Session recording: glove samples, commanded poses and hand telemetry.
+
+A `SessionRecorder` keeps one set of preallocated chunks per stream. The
+teleop threads append rows into the current chunk (a few array stores, no
+allocation, no I/O, no lock), and a full chunk is handed to a background
+thread that writes it out and gives it back. If the writer ever falls so far
+behind that no chunk is free, rows are dropped and counted instead of
+blocking the caller.
+
+Every stream is a `t` column (time.perf_counter(), float64) plus fixed-width
+columns, see DEFAULT_STREAMS. On disk a session is a directory of plain
+.npy files, one per column and chunk:
+
+    session.json              streams, columns, start time, row counts
+    glove/t-000000.npy        (rows,) float64
+    glove/fingers-000000.npy  (rows, 5) int32
+    hand/pos-000000.npy       (rows, 16) float32
+    ...
+
+The raw glove serial reads go to GLOVE_BYTES (`record_bytes()`), split
+into rows of BYTES_ROW_SIZE bytes plus their length, so a session can be
+replayed through the whole pipeline (glove_utils.replay).
+
+`SessionReader` memory-maps the chunks, so slicing a long session (by row
+or by time) only reads the rows it returns:
+
+    with SessionRecorder(session_path()) as recorder:
+        recorder.record(GLOVE, t, raw, bend)
+    hand = SessionReader(path)[HAND]
+    window = hand.between(t0, t0 + 10.0)   # {'t': ..., 'pos': ..., ...}
+"""
+import collections
+import glob
+import json
+import logging
+import os
+import queue
+import threading
+import time
+from typing import Dict, Optional
+
+import numpy as np
+
+from leap_hand_utils.history import HAND_STREAM
+
+DEFAULT_SESSION_DIR = os.path.join(os.path.expanduser('~'), '.leapglove',
+                                   'sessions')
+INDEX_FILE = 'session.json'
+TIME_COLUMN = 't'
+
+GLOVE_BYTES = 'glove_bytes'  # Serial reads from the glove, as received
+GLOVE = 'glove'      # Raw sensor values and calibrated 0-100% bend (NaN before calibration)
+COMMAND = 'command'  # Goal pose sent to the hand, LEAPhand radians, and the
+                     # time of the glove read its frame came in (frame_t)
+HAND = HAND_STREAM   # Telemetry: position, velocity, current
+BYTES_ROW_SIZE = 64
+DEFAULT_STREAMS = {
+    GLOVE_BYTES: (('data', BYTES_ROW_SIZE, 'uint8'), ('size', 1, 'uint8')),
+    GLOVE: (('fingers', 5, 'int32'), ('bend', 5, 'float32')),
+    COMMAND: (('pose', 16, 'float32'), ('frame_t', 1, 'float64')),
+    HAND: (('pos', 16, 'float32'), ('vel', 16, 'float32'),
+           ('cur', 16, 'float32')),
+}
+
+
+def session_path(name: Optional[str] = None,
+                 directory: str = DEFAULT_SESSION_DIR) -> str:
+    """Returns the directory of session `name` (default: the current time)."""
+    if name is None:
+        name = time.strftime('%Y%m%d-%H%M%S')
+    return os.path.join(directory, name)
+
+
+def _chunk_file(directory: str, stream: str, column: str, index: int) -> str:
+    return os.path.join(directory, stream, '{}-{:06d}.npy'.format(column, index))
+
+
+class StreamWriter:
+    """Ring of preallocated chunks for one stream; single producer.
+
+    Args:
+        name: Stream name.
+        columns: ((name, width, dtype), ...), without the time column.
+        chunk_rows: Rows per chunk (and per file).
+        num_chunks: Chunks in the ring.
+        on_full: Called as `on_full(writer, chunk, rows)` when a chunk is
+            ready to be written; the chunk must be returned with `release()`.
+    """
+
+    def __init__(self, name: str, columns, chunk_rows: int, num_chunks: int,
+                 on_full):
+        if num_chunks < 2:
+            raise ValueError('A stream needs at least two chunks')
+        self.name = name
+        self.columns = tuple((column, int(width), np.dtype(dtype))
+                             for column, width, dtype in columns)
+        self.chunk_rows = chunk_rows
+        self.rows = 0
+        self.dropped = 0
+        self._on_full = on_full
+        # deque append/popleft are atomic, so the writer thread can give
+        # chunks back without a lock.
+        self._free = collections.deque(
+            [np.empty(chunk_rows)] +
+            [np.empty((chunk_rows, width), dtype) for _, width, dtype in self.columns]
+            for _ in range(num_chunks))
+        self._chunk = None
+        self._row = 0
+
+    def append(self, t: float, *values) -> bool:
+        """Stores one row (one value per column); False if it was dropped."""
+        chunk = self._chunk
+        if chunk is None:
+            try:
+                chunk = self._chunk = self._free.popleft()
+            except IndexError:
+                self.dropped += 1
+                return False
+        row = self._row
+        chunk[0][row] = t
+        for array, value in zip(chunk[1:], values):
+            array[row] = value
+        self._row = row = row + 1
+        self.rows += 1
+        if row == self.chunk_rows:
+            self.flush()
+        return True
+
+    def flush(self):
+        """Hands the current chunk to the writer, even if it is not full.
+
+        Only call this from the producing thread (or once it has stopped).
+        """
+        if self._chunk is not None and self._row:
+            self._on_full(self, self._chunk, self._row)
+            self._chunk = None
+            self._row = 0
+
+    def release(self, chunk):
+        self._free.append(chunk)
+
+
+class SessionRecorder:
+    """Records streams of timestamped rows into a session directory.
+
+    `record()` may be called from several threads as long as each stream has
+    a single producer (e.g. the glove reader records GLOVE, the pose task
+    COMMAND, the telemetry poller HAND).
+
+    Args:
+        path: Session directory, created if needed; use session_path().
+        streams: {name: ((column, width, dtype), ...)}.
+        chunk_rows: Rows per chunk. Also the most a crash can lose per stream.
+        num_chunks: Chunks per stream; more absorb longer disk stalls.
+        metadata: Extra JSON-serializable entries for the session index,
+            e.g. the link mode and the profiles in use. Kept in `metadata`,
+            which is written again on close().
+    """
+
+    def __init__(self, path: str, streams: Dict = DEFAULT_STREAMS,
+                 chunk_rows: int = 4096, num_chunks: int = 4,
+                 metadata: Optional[dict] = None):
+        self.path = path
+        self.chunks_written = 0
+        self.bytes_written = 0
+        self.error = None
+        self.streams = {name: StreamWriter(name, columns, chunk_rows, num_chunks,
+                                           self._submit)
+                        for name, columns in streams.items()}
+        self._chunk_counts = {name: 0 for name in streams}
+        self._queue = queue.Queue()
+        self._thread = None
+        self.metadata = {
+            'start_time': time.time(),
+            'start_perf_counter': time.perf_counter(),
+            'chunk_rows': chunk_rows,
+            'streams': {name: [[column, width, dtype.str]
+                               for column, width, dtype in writer.columns]
+                        for name, writer in self.streams.items()},
+        }
+        self.metadata.update(metadata or {})
+
+    def start(self):
+        """Creates the session directory and starts the writer thread."""
+        if self._thread is not None:
+            return
+        for name in self.streams:
+            os.makedirs(os.path.join(self.path, name), exist_ok=True)
+        self._write_index()
+        self._thread = threading.Thread(target=self._run, name='session-writer',
+                                        daemon=True)
+        self._thread.start()
+
+    def close(self):
+        """Writes the partly filled chunks and the final index.
+
+        Call it once the producers have stopped.
+        """
+        if self._thread is None:
+            return
+        for writer in self.streams.values():
+            writer.flush()
+        self._queue.put(None)
+        self._thread.join()
+        self._thread = None
+        self._write_index()
+
+    def record(self, stream: str, t: float, *values) -> bool:
+        """Appends one row to `stream`; False if it was dropped."""
+        return self.streams[stream].append(t, *values)
+
+    def record_bytes(self, stream: str, t: float, data: bytes) -> bool:
+        """Appends raw bytes to a (data, size) stream such as GLOVE_BYTES."""
+        writer = self.streams[stream]
+        width = writer.columns[0][1]
+        recorded = True
+        for start in range(0, len(data), width):
+            piece = data[start:start + width]
+            row = np.frombuffer(piece.ljust(width, b'\0'), dtype=np.uint8)
+            recorded &= writer.append(t, row, len(piece))
+        return recorded
+
+    def stats(self) -> dict:
+        return {
+            'rows': {name: writer.rows for name, writer in self.streams.items()},
+            'dropped': {name: writer.dropped for name, writer in self.streams.items()},
+            'chunks_written': self.chunks_written,
+            'bytes_written': self.bytes_written,
+            'pending': self._queue.qsize(),
+        }
+
+    def _submit(self, writer: StreamWriter, chunk, rows: int):
+        self._queue.put((writer, chunk, rows))
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                break
+            writer, chunk, rows = item
+            try:
+                self._write_chunk(writer, chunk, rows)
+            except OSError as e:
+                logging.error('Writing %s chunk failed: %s', writer.name, e)
+                self.error = e
+            finally:
+                writer.release(chunk)
+
+    def _write_chunk(self, writer: StreamWriter, chunk, rows: int):
+        index = self._chunk_counts[writer.name]
+        columns = (TIME_COLUMN,) + tuple(column for column, _, _ in writer.columns)
+        # The time column goes last: readers only pick up chunks whose
+        # t-file exists, so a chunk never shows up half written.
+        for column, array in reversed(list(zip(columns, chunk))):
+            path = _chunk_file(self.path, writer.name, column, index)
+            with open(path + '.tmp', 'wb') as f:
+                np.save(f, array[:rows])
+            os.replace(path + '.tmp', path)
+            self.bytes_written += array[:rows].nbytes
+        self._chunk_counts[writer.name] = index + 1
+        self.chunks_written += 1
+
+    def _write_index(self):
+        index = dict(self.metadata)
+        index['rows'] = {name: writer.rows - writer._row
+                         for name, writer in self.streams.items()}
+        index['dropped'] = {name: writer.dropped
+                            for name, writer in self.streams.items()}
+        path = os.path.join(self.path, INDEX_FILE)
+        with open(path + '.tmp', 'w') as f:
+            json.dump(index, f, indent=2)
+        os.replace(path + '.tmp', path)
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+def save_session(path: str, streams: Dict[str, Dict[str, np.ndarray]],
+                 metadata: Optional[dict] = None) -> str:
+    """Writes whole arrays as a session SessionReader can open.
+
+    For batch results (e.g. a replay), where going row by row through a
+    SessionRecorder would only cost time. Every stream is one chunk.
+
+    Args:
+        path: Session directory, created if needed.
+        streams: {name: {TIME_COLUMN: (N,), column: (N, width), ...}}.
+        metadata: Extra entries for the session index.
+
+    Returns:
+        `path`.
+    """
+    index = {'start_time': time.time(), 'start_perf_counter': 0.0,
+             'streams': {}, 'rows': {}, 'dropped': {}}
+    index.update(metadata or {})
+    for name, columns in streams.items():
+        os.makedirs(os.path.join(path, name), exist_ok=True)
+        rows = len(columns[TIME_COLUMN])
+        index['streams'][name] = [
+            [column, int(np.prod(np.shape(values)[1:], dtype=int)), np.asarray(values).dtype.str]
+            for column, values in columns.items() if column != TIME_COLUMN]
+        index['rows'][name] = rows
+        index['dropped'][name] = 0
+        if rows == 0:
+            continue
+        for column, values in columns.items():
+            np.save(_chunk_file(path, name, column, 0),
+                    np.asarray(values, dtype=np.float64 if column == TIME_COLUMN else None))
+    with open(os.path.join(path, INDEX_FILE), 'w') as f:
+        json.dump(index, f, indent=2)
+    return path
+
+
+class StreamReader:
+    """Row and time slicing over one recorded stream, without loading it.
+
+    Rows come back as {column: array}, always including TIME_COLUMN.
+    """
+
+    def __init__(self, path: str, name: str, columns):
+        self.name = name
+        self.columns = tuple(column for column, _, _ in columns)
+        self._chunks = []
+        for index in range(len(glob.glob(os.path.join(path, name, TIME_COLUMN + '-*.npy')))):
+            self._chunks.append({
+                column: np.load(_chunk_file(path, name, column, index), mmap_mode='r')
+                for column in (TIME_COLUMN,) + self.columns})
+        rows = [len(chunk[TIME_COLUMN]) for chunk in self._chunks]
+        self._offsets = np.concatenate([[0], np.cumsum(rows)]).astype(np.int64)
+        self._first_times = np.array([chunk[TIME_COLUMN][0] for chunk in self._chunks])
+
+    def __len__(self) -> int:
+        return int(self._offsets[-1])
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            start, stop, step = key.indices(len(self))
+            if step != 1:
+                raise ValueError('Only contiguous slices are supported')
+            return self.read(start, stop)
+        raise TypeError('Index a stream with a slice, e.g. stream[100:200]')
+
+    def read(self, start: int = 0, stop: Optional[int] = None,
+             columns=None) -> Dict[str, np.ndarray]:
+        """Returns rows [start, stop) of the given columns (default: all)."""
+        stop = len(self) if stop is None else min(stop, len(self))
+        start = max(start, 0)
+        columns = (TIME_COLUMN,) + (self.columns if columns is None else tuple(
+            column for column in columns if column != TIME_COLUMN))
+        first = int(np.searchsorted(self._offsets, start, side='right')) - 1
+        parts = {column: [] for column in columns}
+        for index in range(max(first, 0), len(self._chunks)):
+            offset = self._offsets[index]
+            if offset >= stop:
+                break
+            chunk = self._chunks[index]
+            lo, hi = max(start - offset, 0), stop - offset
+            for column in columns:
+                parts[column].append(chunk[column][lo:hi])
+        return {column: np.concatenate(arrays) if arrays else
+                self._empty(column) for column, arrays in parts.items()}
+
+    def index(self, t: float) -> int:
+        """Returns the first row recorded at or after time t."""
+        chunk = int(np.searchsorted(self._first_times, t, side='right')) - 1
+        if chunk < 0:
+            return 0
+        times = self._chunks[chunk][TIME_COLUMN]
+        return int(self._offsets[chunk] + np.searchsorted(times, t))
+
+    def between(self, t_start: float, t_stop: float,
+                columns=None) -> Dict[str, np.ndarray]:
+        """Returns the rows recorded in [t_start, t_stop)."""
+        return self.read(self.index(t_start), self.index(t_stop), columns)
+
+    def chunks(self, columns=None):
+        """Yields the stream chunk by chunk as read-only memory-mapped arrays."""
+        columns = (TIME_COLUMN,) + (self.columns if columns is None else tuple(columns))
+        for chunk in self._chunks:
+            yield {column: chunk[column] for column in columns}
+
+    def _empty(self, column):
+        if self._chunks:
+            sample = self._chunks[0][column]
+            return np.empty((0,) + sample.shape[1:], sample.dtype)
+        return np.empty(0)
+
+
+class SessionReader:
+    """Opens a recorded session; index it by stream name for a StreamReader.
+
+    Also reads sessions that were not closed (e.g. after a crash): every
+    chunk written before that is there.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(os.path.join(path, INDEX_FILE)) as f:
+            self.metadata = json.load(f)
+        self.streams = {name: StreamReader(path, name, columns)
+                        for name, columns in self.metadata['streams'].items()}
+
+    def __getitem__(self, stream: str) -> StreamReader:
+        return self.streams[stream]
+
+    def __contains__(self, stream: str) -> bool:
+        return stream in self.streams
+
+    def to_wall_time(self, t):
+        """Converts recorded perf_counter timestamps to time.time()."""
+        return (np.asarray(t) - self.metadata['start_perf_counter'] +
+                self.metadata['start_time'])
@@ -0,0 +1,297 @@
+"""Offline replay of recorded sessions through the teleop pipeline.
+
+Feeds the glove bytes of a recorded session (glove_utils.recorder) through
+the stages the TeleopEngine runs live, on whole arrays at once and as fast
+as the machine goes instead of in real time:
+
+    parse      decode_buffer / decode_packets: bytes -> (N, FRAME_SIZE) frames
+    calibrate  GloveCalibration.apply: raw fingers -> 0-100% bend
+    retarget   RetargetTable: bend -> (N, 16) joint angles
+    command    conversion to LEAPhand, joint limit clip and tick rounding,
+               as CommandWriter sends them
+    feedback   ForceFeedback.update_batch over the recorded hand currents
+
+so changes to the calibration, the retargeting tables or the brake scaling
+can be checked against hours of sessions without a glove or a hand:
+
+    python -m glove_utils.replay ~/.leapglove/sessions/20250101-120000 -o out
+
+Every frame is replayed, while the live pose task only sends the newest one
+per tick; `at_ticks()` picks out what it would have sent at given times.
+The recorded COMMAND rows name the glove read their frame came in
+(`frame_t`), which is how the tool compares the replay with the session.
+"""
+import argparse
+import os
+import time
+from typing import Optional
+
+import numpy as np
+
+from glove_utils.calibration import GloveCalibration
+from glove_utils.feedback import ForceFeedback
+from glove_utils.parser import decode_buffer, frames_to_fingers
+from glove_utils.protocol import MODE_ASCII, MODE_BINARY, decode_packets
+from glove_utils.recorder import (COMMAND, GLOVE, GLOVE_BYTES, HAND, TIME_COLUMN,
+                                  SessionReader, save_session)
+from glove_utils.retarget import RetargetTable
+from leap_hand_utils.dynamixel_client import DEFAULT_POS_SCALE
+from leap_hand_utils.embodiment import LEAPHAND, Embodiment
+
+STAGES = ('parse', 'calibrate', 'retarget', 'command', 'feedback')
+BRAKES = 'brakes'  # Output stream of the feedback stage
+
+# ASCII streams are decoded in blocks of about this many bytes, so a
+# malformed line only sends its own block down decode_buffer's slow path.
+_ASCII_BLOCK = 1 << 20
+
+
+def read_glove_bytes(session: SessionReader):
+    """Reassembles the recorded glove reads.
+
+    Returns:
+        (data, ends, t): the byte stream, the offset just past each read
+        in it and the time of each read.
+    """
+    rows = session[GLOVE_BYTES].read()
+    size = rows['size'][:, 0].astype(np.int64)
+    data = rows['data'][np.arange(rows['data'].shape[1]) < size[:, None]]
+    return data.tobytes(), np.cumsum(size), rows[TIME_COLUMN]
+
+
+def parse(data: bytes, mode: str = MODE_ASCII):
+    """Decodes a recorded byte stream; returns (frames, frame end offsets)."""
+    if mode == MODE_BINARY:
+        return decode_packets(data)
+    frames, ends = [], []
+    start = 0
+    while start < len(data):
+        stop = data.rfind(b'\n', start, start + _ASCII_BLOCK) + 1
+        if stop <= start:
+            stop = data.find(b'\n', start + _ASCII_BLOCK) + 1 or len(data)
+        block_frames, block_ends = decode_buffer(data[start:stop], return_ends=True)
+        frames.append(block_frames)
+        ends.append(block_ends + start)
+        start = stop
+    if not frames:
+        return decode_buffer(b'', return_ends=True)
+    return np.concatenate(frames), np.concatenate(ends)
+
+
+def at_ticks(t: np.ndarray, values: np.ndarray, ticks: np.ndarray):
+    """Latest of `values` (timestamped `t`) at each tick.
+
+    Returns:
+        (values at the ticks, mask of the ticks that had a value yet).
+    """
+    index = np.searchsorted(t, ticks, side='right') - 1
+    valid = index >= 0
+    return values[np.maximum(index, 0)], valid
+
+
+class ReplayResult:
+    """Output of `Replay.run()`: per-frame arrays and per-stage timings.
+
+    Attributes:
+        t: Time of the glove read each frame completed in.
+        frames, fingers, bend, pose, command: The stages' outputs, one row
+            per frame; `pose` is in the retargeting table's embodiment,
+            `command` the LEAPhand goal that would be sent.
+        brake_t, brakes: Feedback output per recorded hand sample, or None.
+        timings: {stage: seconds}.
+    """
+
+    def __init__(self):
+        self.t = self.frames = self.fingers = self.bend = None
+        self.pose = self.command = self.brake_t = self.brakes = None
+        self.bytes = 0
+        self.timings = {}
+
+    def throughput(self) -> dict:
+        """Returns {stage: items per second} (bytes/s for parse)."""
+        counts = {'parse': self.bytes, 'calibrate': len(self.t),
+                  'retarget': len(self.t), 'command': len(self.t),
+                  'feedback': 0 if self.brakes is None else len(self.brakes)}
+        return {stage: counts[stage] / max(seconds, 1e-9)
+                for stage, seconds in self.timings.items()}
+
+    def save(self, path: str, metadata: Optional[dict] = None) -> str:
+        """Writes the result as a session (GLOVE, COMMAND and BRAKES streams)."""
+        streams = {
+            GLOVE: {TIME_COLUMN: self.t, 'fingers': self.fingers,
+                    'bend': self.bend.astype(np.float32)},
+            COMMAND: {TIME_COLUMN: self.t, 'pose': self.command.astype(np.float32),
+                      'frame_t': self.t[:, None]},
+        }
+        if self.brakes is not None:
+            streams[BRAKES] = {TIME_COLUMN: self.brake_t, 'brakes': self.brakes}
+        return save_session(path, streams, metadata)
+
+
+class Replay:
+    """The teleop pipeline over whole recorded streams.
+
+    Args:
+        calibration: Calibration applied to the raw fingers.
+        retarget: Retargeting tables; their `embodiment` is converted to
+            LEAPhand for the command stage.
+        feedback: ForceFeedback for the brake stage, or None to skip it.
+        embodiment: Conversions and joint limits, as LeapNode uses them.
+        quantize: Round the commands to encoder ticks like the position
+            writer does.
+    """
+
+    def __init__(self, calibration: GloveCalibration, retarget: RetargetTable,
+                 feedback: Optional[ForceFeedback] = None,
+                 embodiment: Optional[Embodiment] = None,
+                 quantize: bool = True):
+        self.calibration = calibration
+        self.retarget = retarget
+        self.feedback = feedback
+        self.embodiment = embodiment or Embodiment(allegro_zeros=False, dtype=np.float64)
+        self.quantize = quantize
+
+    def run(self, data: bytes, mode: str = MODE_ASCII,
+            read_ends: Optional[np.ndarray] = None,
+            read_t: Optional[np.ndarray] = None,
+            hand_t: Optional[np.ndarray] = None,
+            hand_currents: Optional[np.ndarray] = None) -> ReplayResult:
+        """Replays a byte stream (and optionally recorded hand currents).
+
+        Args:
+            data: Glove bytes as received.
+            mode: Link mode the bytes were sent in.
+            read_ends, read_t: Offset past each serial read in `data` and its
+                time, to timestamp the frames; without them frames are
+                numbered instead.
+            hand_t, hand_currents: Recorded read_cur() samples for the
+                feedback stage.
+        """
+        result = ReplayResult()
+        result.bytes = len(data)
+        clock = time.perf_counter
+
+        start = clock()
+        result.frames, ends = parse(data, mode)
+        result.fingers = frames_to_fingers(result.frames)
+        if read_ends is not None:
+            result.t = read_t[np.searchsorted(read_ends, ends, side='right')]
+        else:
+            result.t = np.arange(len(ends), dtype=np.float64)
+        result.timings['parse'] = clock() - start
+
+        start = clock()
+        result.bend = self.calibration.apply(result.fingers)
+        result.timings['calibrate'] = clock() - start
+
+        start = clock()
+        result.pose = self.retarget(result.bend)
+        result.timings['retarget'] = clock() - start
+
+        start = clock()
+        command = self.embodiment.convert(result.pose, self.retarget.embodiment, LEAPHAND)
+        self.embodiment.clip(command, out=command)
+        if self.quantize:
+            # Same bounds as CommandWriter: limits rounded inwards to ticks.
+            lower = np.ceil(self.embodiment.real_min / DEFAULT_POS_SCALE)
+            upper = np.floor(self.embodiment.real_max / DEFAULT_POS_SCALE)
+            ticks = np.rint(command / DEFAULT_POS_SCALE)
+            np.minimum(np.maximum(ticks, lower, out=ticks), upper, out=ticks)
+            np.multiply(ticks, DEFAULT_POS_SCALE, out=command)
+        result.command = command
+        result.timings['command'] = clock() - start
+
+        if self.feedback is not None and hand_currents is not None:
+            start = clock()
+            result.brake_t = hand_t
+            result.brakes = self.feedback.update_batch(hand_currents)
+            result.timings['feedback'] = clock() - start
+        return result
+
+    def run_session(self, session: SessionReader) -> ReplayResult:
+        """Replays a recorded session (mode from its metadata)."""
+        data, ends, t = read_glove_bytes(session)
+        hand_t = hand_currents = None
+        if HAND in session and len(session[HAND]):
+            hand = session[HAND].read(columns=['cur'])
+            hand_t, hand_currents = hand[TIME_COLUMN], hand['cur']
+        return self.run(data, session.metadata.get('link_mode', MODE_ASCII),
+                        ends, t, hand_t, hand_currents)
+
+
+def compare_commands(result: ReplayResult, session: SessionReader) -> dict:
+    """Compares a replay with the commands recorded in the session.
+
+    Each recorded command is compared with the replayed command of the frame
+    it was computed from: the newest frame of the glove read at its
+    `frame_t`, as the live decoder keeps only the newest frame per read.
+    """
+    recorded = session[COMMAND].read()
+    replayed, valid = at_ticks(result.t, result.command, recorded['frame_t'][:, 0])
+    error = np.abs(replayed[valid] - recorded['pose'][valid])
+    if error.size == 0:
+        return {'ticks': 0}
+    per_tick = error.max(axis=1)
+    return {
+        'ticks': int(valid.sum()),
+        'max_error': float(per_tick.max()),
+        'rms_error': float(np.sqrt(np.mean(error ** 2))),
+        'within_tick': float(np.mean(per_tick <= 1.01 * DEFAULT_POS_SCALE)),
+    }
+
+
+def _load_models(session: SessionReader, calibration_profile, retarget_profile):
+    if calibration_profile:
+        calibration = GloveCalibration.load(calibration_profile)
+    elif 'calibration' in session.metadata:
+        calibration = GloveCalibration.from_dict(session.metadata['calibration'])
+    else:
+        print('No calibration given or recorded, fitting one to the session')
+        calibration = GloveCalibration()
+        calibration.fit(session[GLOVE].read(columns=['fingers'])['fingers'])
+    if retarget_profile:
+        retarget = RetargetTable.load(retarget_profile)
+    elif 'retarget' in session.metadata:
+        retarget = RetargetTable.from_dict(session.metadata['retarget'])
+    else:
+        retarget = RetargetTable.load('default')
+    return calibration, retarget
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Replays recorded glove sessions through parser, calibration, '
+                    'retargeting and brake scaling, and compares the commands.')
+    parser.add_argument('sessions', nargs='+', help='Session directories')
+    parser.add_argument('-c', '--calibration', help='Calibration profile '
+                        '(default: the one recorded with the session)')
+    parser.add_argument('-r', '--retarget', help='Retargeting profile '
+                        '(default: the one recorded with the session)')
+    parser.add_argument('-o', '--output', help='Directory to write the replayed '
+                        'sessions to, one per input')
+    args = parser.parse_args()
+
+    for path in args.sessions:
+        session = SessionReader(path)
+        calibration, retarget = _load_models(session, args.calibration, args.retarget)
+        result = Replay(calibration, retarget, ForceFeedback()).run_session(session)
+        throughput = result.throughput()
+        print(f'{path}: {len(result.t)} frames, {result.bytes / 1e6:.1f} MB')
+        for stage, seconds in result.timings.items():
+            unit = 'MB/s' if stage == 'parse' else 'k rows/s'
+            rate = throughput[stage] / (1e6 if stage == 'parse' else 1e3)
+            print(f'  {stage:<10} {seconds * 1e3:9.1f} ms  {rate:10.1f} {unit}')
+        if COMMAND in session and len(session[COMMAND]):
+            comparison = compare_commands(result, session)
+            if comparison['ticks']:
+                print(f"  vs recorded: {comparison['ticks']} ticks, "
+                      f"{100 * comparison['within_tick']:.1f}% within one encoder tick, "
+                      f"max {comparison['max_error']:.4f} rad")
+        if args.output:
+            saved = result.save(os.path.join(args.output, os.path.basename(os.path.normpath(path))),
+                                {'source': os.path.abspath(path)})
+            print(f'  saved to {saved}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,294 @@
+"""Lookup-table retargeting: glove finger bend -> LEAP Hand joint angles.
+
+Every hand joint is driven by one glove finger through its own curve over
+0-100% bend. The curves are stored as dense lookup tables (value and slope
+per cell), so a tick is one gather of the driving fingers, one index /
+fraction computation and one lerp for all 16 joints at once:
+
+    table = RetargetTable.load('default')
+    pose = table(percent)                 # (5,) -> (16,), or (N, 5) -> (N, 16)
+
+The curves come from `fit_retarget`, which fits each joint from recorded
+(glove, hand) pairs: a smoothed least-squares piecewise-linear curve on
+`num_knots` knots, densified into the table linearly or with a monotone
+cubic (PCHIP). Unless given, each joint's driving finger is the one that
+correlates best with it, so the pinky and the MCP side joints are used
+when the recordings show they move together. Tables are saved as named
+JSON profiles like calibrations. From the command line:
+
+    python -m glove_utils.retarget session.npz --name default
+
+where the .npz holds `glove` (N, 5) bend percentages and `hand` (N, 16)
+joint angles.
+"""
+import json
+import os
+from typing import Optional, Sequence
+
+import numpy as np
+
+from glove_utils.calibration import profile_path
+from glove_utils.parser import FINGER_NAMES
+
+DEFAULT_PROFILE_DIR = os.path.join(os.path.expanduser('~'), '.leapglove',
+                                   'retarget')
+LINEAR = 'linear'
+PCHIP = 'pchip'
+MAX_BEND = 100.0
+
+
+class RetargetTable:
+    """Per-joint lookup tables from finger bend to joint angle.
+
+    Args:
+        joint_fingers: Glove finger (FINGER_NAMES index) driving each joint.
+        knots: Increasing bend percentages the curves are given at,
+            spanning 0-100.
+        values: (num_joints, len(knots)) joint angle at each knot.
+        interpolation: LINEAR, or PCHIP (monotone cubic between the knots).
+        resolution: Table cells over 0-100%.
+        embodiment: Convention of the output angles ('LEAPhand' or
+            'allegro'), for whoever sends the poses.
+
+    Attributes:
+        residual_rms: Per-joint fit error (set by fit_retarget).
+    """
+
+    def __init__(self, joint_fingers: Sequence[int], knots: Sequence[float],
+                 values: np.ndarray, interpolation: str = LINEAR,
+                 resolution: int = 256, embodiment: str = 'LEAPhand'):
+        if interpolation not in (LINEAR, PCHIP):
+            raise ValueError('Unknown interpolation: {}'.format(interpolation))
+        self.joint_fingers = np.asarray(joint_fingers, dtype=np.intp)
+        self.knots = np.asarray(knots, dtype=np.float64)
+        self.values = np.asarray(values, dtype=np.float64)
+        num_joints = len(self.joint_fingers)
+        if (self.values.shape != (num_joints, len(self.knots)) or
+                len(self.knots) < 2 or np.any(np.diff(self.knots) <= 0)):
+            raise ValueError('Expected increasing knots and ({}, {}) values, '
+                             'got {}'.format(num_joints, len(self.knots),
+                                             self.values.shape))
+        self.interpolation = interpolation
+        self.resolution = resolution
+        self.embodiment = embodiment
+        self.residual_rms = None
+
+        grid = np.linspace(0.0, MAX_BEND, resolution + 1)
+        table = np.array([_densify(self.knots, row, grid, interpolation)
+                          for row in self.values])
+        # Flat (joint, cell) tables so one fancy index serves every joint.
+        self._base = table[:, :-1].ravel()
+        self._slope = np.diff(table, axis=1).ravel()
+        self._rows = np.arange(num_joints) * resolution
+        self._cell = resolution / MAX_BEND
+        self._x = np.empty(num_joints)
+        self._index = np.empty(num_joints, dtype=np.intp)
+        self._base_values = np.empty(num_joints)
+
+    @classmethod
+    def linear(cls, joint_fingers: Sequence[int], open_pose: np.ndarray,
+               closed_pose: np.ndarray, **kwargs) -> 'RetargetTable':
+        """A table moving each joint linearly from open_pose (0%) to closed_pose (100%)."""
+        return cls(joint_fingers, [0.0, MAX_BEND],
+                   np.stack([open_pose, closed_pose], axis=1), **kwargs)
+
+    def __call__(self, fingers: np.ndarray, out: Optional[np.ndarray] = None
+                 ) -> np.ndarray:
+        """Maps bend percentages, (num_fingers,) or (N, num_fingers), to joint angles."""
+        fingers = np.asarray(fingers, dtype=np.float64)
+        if fingers.ndim == 1:
+            # One sample (the teleop tick): no allocations but `out`.
+            x, index, base = self._x, self._index, self._base_values
+            np.take(fingers, self.joint_fingers, out=x)
+        else:
+            x = fingers[:, self.joint_fingers]
+            index = np.empty(x.shape, dtype=np.intp)
+            base = np.empty(x.shape)
+        x *= self._cell
+        np.clip(x, 0.0, self.resolution, out=x)
+        np.floor(x, out=index, casting='unsafe')
+        np.minimum(index, self.resolution - 1, out=index)
+        x -= index  # Fraction within the cell
+        index += self._rows
+        if out is None:
+            out = np.empty(x.shape)
+        np.take(self._slope, index, out=out)
+        out *= x
+        out += np.take(self._base, index, out=base)
+        return out
+
+    # === Profiles ===
+
+    def to_dict(self) -> dict:
+        return {
+            'joint_fingers': self.joint_fingers.tolist(),
+            'knots': self.knots.tolist(),
+            'values': self.values.tolist(),
+            'interpolation': self.interpolation,
+            'resolution': self.resolution,
+            'embodiment': self.embodiment,
+            'residual_rms': (self.residual_rms.tolist()
+                             if self.residual_rms is not None else None),
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> 'RetargetTable':
+        table = cls(data['joint_fingers'], data['knots'], data['values'],
+                    interpolation=data.get('interpolation', LINEAR),
+                    resolution=data.get('resolution', 256),
+                    embodiment=data.get('embodiment', 'LEAPhand'))
+        if data.get('residual_rms') is not None:
+            table.residual_rms = np.array(data['residual_rms'])
+        return table
+
+    def save(self, name: str, directory: str = DEFAULT_PROFILE_DIR) -> str:
+        """Saves the table as profile `name`; returns the file path."""
+        path = profile_path(name, directory)
+        os.makedirs(directory, exist_ok=True)
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(self.to_dict(), f, indent=2)
+        os.replace(tmp_path, path)
+        return path
+
+    @classmethod
+    def load(cls, name: str, directory: str = DEFAULT_PROFILE_DIR) -> 'RetargetTable':
+        """Loads profile `name`; raises FileNotFoundError if it does not exist."""
+        with open(profile_path(name, directory)) as f:
+            return cls.from_dict(json.load(f))
+
+
+def fit_retarget(glove: np.ndarray, hand: np.ndarray, num_knots: int = 11,
+                 smoothing: float = 1.0,
+                 joint_fingers: Optional[Sequence[int]] = None,
+                 **kwargs) -> RetargetTable:
+    """Fits a RetargetTable to recorded (glove, hand) pairs.
+
+    Args:
+        glove: (N, num_fingers) bend percentages.
+        hand: (N, num_joints) joint angles at the same instants.
+        num_knots: Knots per curve, evenly spaced over 0-100%.
+        smoothing: Weight of the curvature penalty; keeps knots without
+            samples on a straight line between their neighbours.
+        joint_fingers: Driving finger per joint; by default the finger
+            whose bend correlates best with the joint.
+        **kwargs: Passed to RetargetTable (interpolation, resolution, ...).
+    """
+    glove = np.asarray(glove, dtype=np.float64)
+    hand = np.asarray(hand, dtype=np.float64)
+    if glove.ndim != 2 or hand.ndim != 2 or len(glove) != len(hand):
+        raise ValueError('Expected (N, fingers) and (N, joints) recordings, '
+                         'got {} and {}'.format(glove.shape, hand.shape))
+    if joint_fingers is None:
+        joint_fingers = best_fingers(glove, hand)
+    joint_fingers = np.asarray(joint_fingers, dtype=np.intp)
+
+    knots = np.linspace(0.0, MAX_BEND, num_knots)
+    curvature = np.diff(np.eye(num_knots), 2, axis=0)
+    penalty = smoothing * len(glove) / num_knots * curvature.T @ curvature
+    penalty += 1e-9 * np.eye(num_knots)
+    values = np.empty((hand.shape[1], num_knots))
+    residual_rms = np.empty(hand.shape[1])
+    bases = {}
+    for joint, finger in enumerate(joint_fingers):
+        if finger not in bases:
+            bases[finger] = _hat_basis(glove[:, finger], knots)
+        basis = bases[finger]
+        values[joint] = np.linalg.solve(basis.T @ basis + penalty,
+                                        basis.T @ hand[:, joint])
+        residual_rms[joint] = np.sqrt(np.mean((basis @ values[joint] -
+                                               hand[:, joint]) ** 2))
+    table = RetargetTable(joint_fingers, knots, values, **kwargs)
+    table.residual_rms = residual_rms
+    return table
+
+
+def best_fingers(glove: np.ndarray, hand: np.ndarray) -> np.ndarray:
+    """The finger whose bend correlates best (either sign) with each joint."""
+    glove = glove - glove.mean(axis=0)
+    hand = hand - hand.mean(axis=0)
+    norms = np.outer(np.linalg.norm(glove, axis=0), np.linalg.norm(hand, axis=0))
+    correlation = np.abs(glove.T @ hand) / np.maximum(norms, 1e-12)
+    return np.argmax(correlation, axis=0)
+
+
+def _hat_basis(x: np.ndarray, knots: np.ndarray) -> np.ndarray:
+    """(N, K) weights of each knot in the piecewise-linear curve at x."""
+    x = np.clip(x, knots[0], knots[-1])
+    cell = np.minimum(np.searchsorted(knots, x, side='right') - 1, len(knots) - 2)
+    fraction = (x - knots[cell]) / (knots[cell + 1] - knots[cell])
+    basis = np.zeros((len(x), len(knots)))
+    rows = np.arange(len(x))
+    basis[rows, cell] = 1.0 - fraction
+    basis[rows, cell + 1] = fraction
+    return basis
+
+
+def _densify(knots: np.ndarray, values: np.ndarray, grid: np.ndarray,
+             interpolation: str) -> np.ndarray:
+    """Samples the curve through (knots, values) on `grid`."""
+    if interpolation == LINEAR or len(knots) < 3:
+        return np.interp(grid, knots, values)
+    # PCHIP (Fritsch-Carlson): cubic Hermite with tangents that never
+    # overshoot, so monotone segments stay monotone.
+    h = np.diff(knots)
+    delta = np.diff(values) / h
+    tangents = np.zeros_like(values)
+    same_sign = delta[:-1] * delta[1:] > 0
+    w1 = 2 * h[1:] + h[:-1]
+    w2 = h[1:] + 2 * h[:-1]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        harmonic = (w1 + w2) / (w1 / delta[:-1] + w2 / delta[1:])
+    tangents[1:-1] = np.where(same_sign, harmonic, 0.0)
+    tangents[0], tangents[-1] = delta[0], delta[-1]
+
+    k = np.clip(np.searchsorted(knots, grid, side='right') - 1, 0, len(knots) - 2)
+    s = (grid - knots[k]) / h[k]
+    s2, s3 = s * s, s * s * s
+    return ((2 * s3 - 3 * s2 + 1) * values[k] + (s3 - 2 * s2 + s) * h[k] * tangents[k] +
+            (-2 * s3 + 3 * s2) * values[k + 1] + (s3 - s2) * h[k] * tangents[k + 1])
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        description='Fit glove -> hand retargeting tables from a recording.')
+    parser.add_argument(
+        'recordings', nargs='+',
+        help='.npz files with glove (N, 5) bend % and hand (N, 16) joint angles.')
+    parser.add_argument(
+        '-n', '--name', default='default',
+        help='Profile name to save the tables as.')
+    parser.add_argument(
+        '-d', '--directory', default=DEFAULT_PROFILE_DIR,
+        help='Directory the profile is saved in.')
+    parser.add_argument(
+        '-k', '--knots', type=int, default=11,
+        help='Knots per joint curve.')
+    parser.add_argument(
+        '-s', '--smoothing', type=float, default=1.0,
+        help='Curvature penalty weight.')
+    parser.add_argument(
+        '-i', '--interpolation', choices=(LINEAR, PCHIP), default=PCHIP,
+        help='How the tables are filled in between the knots.')
+    parser.add_argument(
+        '-e', '--embodiment', default='LEAPhand',
+        help='Convention of the recorded joint angles.')
+    parsed_args = parser.parse_args()
+
+    recordings = [np.load(path) for path in parsed_args.recordings]
+    glove_samples = np.concatenate([recording['glove'] for recording in recordings])
+    hand_samples = np.concatenate([recording['hand'] for recording in recordings])
+    fitted = fit_retarget(glove_samples, hand_samples,
+                          num_knots=parsed_args.knots,
+                          smoothing=parsed_args.smoothing,
+                          interpolation=parsed_args.interpolation,
+                          embodiment=parsed_args.embodiment)
+    print('Fitted {} joints on {} samples\n'.format(len(fitted.joint_fingers),
+                                                     len(glove_samples)))
+    for joint, (finger, rms) in enumerate(zip(fitted.joint_fingers,
+                                              fitted.residual_rms)):
+        print('  joint {:2d}  <- {:<11} rms {:.4f} rad'.format(
+            joint, FINGER_NAMES[finger], rms))
+    print('\nSaved to {}'.format(fitted.save(parsed_args.name, parsed_args.directory)))
@@ -0,0 +1,386 @@
+"""Several glove -> hand pairs in one process, e.g. a bimanual station.
+
+A `TeleopPair` owns everything one glove driving one LEAP Hand needs: the
+glove link and its decoder, calibration, retargeting tables, force feedback
+filter, haptic channel, LeapNode, an optional session recorder and its own
+TeleopEngine (glove reader thread, pose task, feedback task, bus lock).
+Pairs share no thread, lock or model, so a stalled Bluetooth link or a busy
+bus only delays its own pair, and each pair is calibrated and retargeted
+independently. A `TeleopStation` opens, runs and stops the pairs together
+and reports their loop rate, jitter and glove -> hand latency per pair:
+
+    station = TeleopStation([
+        TeleopPair('left', '/dev/rfcomm0', hand_port='/dev/serial/by-id/...A'),
+        TeleopPair('right', '/dev/rfcomm1', hand_port='/dev/serial/by-id/...B'),
+    ])
+    with station:
+        while station.is_running:
+            time.sleep(5.0)
+            print(station.stats()['left']['latency'])
+
+With more than one hand connected, give every pair its hand port: the
+hands are identical, so discovery can't tell which one is left, and open()
+refuses several pairs without one.
+"""
+import logging
+import threading
+import time
+from typing import Callable, Dict, Optional, Sequence
+
+import numpy as np
+import serial
+
+from glove_utils.calibration import GloveCalibration
+from glove_utils.feedback import ForceFeedback
+from glove_utils.haptics import HAPTIC_INTERVAL, HapticChannel
+from glove_utils.parser import GloveStreamDecoder
+from glove_utils.protocol import MODE_ASCII, HapticEncoder, negotiate
+from glove_utils.recorder import SessionRecorder, session_path
+from glove_utils.retarget import RetargetTable
+from glove_utils.teleop import TeleopEngine
+
+
+def open_glove(port: str, baud_rate: int):
+    """Opens a glove link with the read timeout the engine needs to stop."""
+    return serial.Serial(port, baud_rate, timeout=1)
+
+
+def open_hand(port: Optional[str], exclude: Sequence[str] = ()):
+    """Creates a LeapNode on `port` (None: discover it among the serial
+    ports not in `exclude`)."""
+    from LeapHandAPI import LeapNode
+    return LeapNode(port=port, exclude_ports=exclude)
+
+
+class TeleopPair:
+    """One glove driving one LEAP Hand, with its own link, models and threads.
+
+    Args:
+        name: Label for logs, stats, thread names and recordings, e.g. 'left'.
+        glove_port: Serial port of the glove.
+        hand_port: Serial port of the hand; None discovers it, which only
+            works with a single hand connected.
+        enable_hand: Drive a hand, or only read the glove.
+        calibration_profile: Loaded on open() and saved after calibrate()
+            (default: `name`).
+        retarget_profile: Retargeting profile loaded on open() (default:
+            `name`).
+        default_retarget: Table used while there is no retargeting profile.
+        baud_rate: Glove link speed.
+        binary_protocol: Try the binary framing first (see negotiate()).
+        send_interval: Pose command period in seconds.
+        feedback_interval: Force feedback period in seconds.
+        haptic_interval: Fastest haptic command rate, in seconds.
+        force_feedback: Filter turning this hand's currents into brakes, or
+            None for no force feedback.
+        record: Record the pair to session_path('<start time>-<name>').
+        telemetry_rate: Hand poll rate (Hz) while recording.
+        stats_window: Number of samples kept for the timing statistics.
+        glove_opener: Called as glove_opener(port, baud_rate) to open the
+            glove link.
+        hand_opener: Called as hand_opener(port, exclude) to create the
+            LeapNode; `exclude` lists the glove ports discovery must not
+            probe.
+    """
+
+    def __init__(self, name: str, glove_port: str,
+                 hand_port: Optional[str] = None,
+                 enable_hand: bool = True,
+                 calibration_profile: Optional[str] = None,
+                 retarget_profile: Optional[str] = None,
+                 default_retarget: Optional[RetargetTable] = None,
+                 baud_rate: int = 115200,
+                 binary_protocol: bool = True,
+                 send_interval: float = 0.012,
+                 feedback_interval: float = 0.025,
+                 haptic_interval: float = HAPTIC_INTERVAL,
+                 force_feedback: Optional[ForceFeedback] = None,
+                 record: bool = False,
+                 telemetry_rate: float = 100,
+                 stats_window: int = 1000,
+                 glove_opener: Callable = open_glove,
+                 hand_opener: Callable = open_hand):
+        self.name = name
+        self.glove_port = glove_port
+        self.hand_port = hand_port
+        self.enable_hand = enable_hand
+        self.calibration_profile = calibration_profile or name
+        self.retarget_profile = retarget_profile or name
+        self.default_retarget = default_retarget
+        self.baud_rate = baud_rate
+        self.binary_protocol = binary_protocol
+        self.send_interval = send_interval
+        self.feedback_interval = feedback_interval
+        self.haptic_interval = haptic_interval
+        self.force_feedback = force_feedback
+        self.record = record
+        self.telemetry_rate = telemetry_rate
+        self.stats_window = stats_window
+        self.glove_opener = glove_opener
+        self.hand_opener = hand_opener
+
+        self.calibration = GloveCalibration()
+        self.retarget = default_retarget
+        self.feedback_enabled = force_feedback is not None
+        self.on_calibrated = None  # Called as on_calibrated(pair) after a window closes
+        self.raw = None   # Latest raw finger values
+        self.bend = None  # Latest 0-100% bend, once calibrated
+        self.link_mode = None
+        self.glove_serial = None
+        self.haptics = None
+        self.leap_node = None
+        self.recorder = None
+        self.engine = None
+        self._polling = False  # Whether this pair started the hand's poller
+
+    # === Lifecycle ===
+
+    def open(self, glove_ports: Sequence[str] = ()):
+        """Opens the glove link and the hand and builds the engine.
+
+        Args:
+            glove_ports: Other glove links open in this process (e.g. the
+                station's other pairs). Hand discovery skips them and this
+                pair's own glove port.
+        """
+        try:
+            self.glove_serial = self.glove_opener(self.glove_port, self.baud_rate)
+            self._load_models()
+            if self.binary_protocol:
+                self.link_mode, decoder = negotiate(self.glove_serial)
+            else:
+                self.link_mode, decoder = MODE_ASCII, GloveStreamDecoder()
+            self.haptics = HapticChannel(self.glove_serial, HapticEncoder(self.link_mode),
+                                         self.haptic_interval, name=self.name + '-haptics')
+            self.haptics.start()
+            if self.enable_hand:
+                self.leap_node = self.hand_opener(self.hand_port, [self.glove_port, *glove_ports])
+            if self.record:
+                self._start_recording()
+            self.engine = TeleopEngine(
+                self.glove_serial,
+                self.leap_node,
+                decoder=decoder,
+                process=self.process,
+                retarget=self.retarget,
+                embodiment=self.retarget.embodiment,
+                feedback=self.force_feedback,
+                on_feedback=self._on_feedback,
+                send_interval=self.send_interval,
+                feedback_interval=self.feedback_interval,
+                stats_window=self.stats_window,
+                recorder=self.recorder,
+                name=self.name,
+            )
+        except Exception:
+            self.close()
+            raise
+        logging.info('%s: glove %s (%s), hand %s', self.name, self.glove_port,
+                     self.link_mode, self.hand_port if self.leap_node else 'off')
+
+    def start(self):
+        self.engine.start()
+
+    def stop(self):
+        if self.engine is not None:
+            self.engine.stop()
+
+    def close(self):
+        """Stops everything and releases the link; safe after a failed open()."""
+        self.stop()
+        if self.haptics is not None:
+            self.haptics.stop()
+        if self._polling:
+            self.leap_node.stop_polling()
+            self._polling = False
+        if self.leap_node is not None:
+            self.leap_node.dxl_client.disconnect()
+        if self.recorder is not None:
+            self.recorder.close()
+        if self.glove_serial is not None and self.glove_serial.is_open:
+            self.glove_serial.close()
+
+    @property
+    def is_running(self) -> bool:
+        return self.engine is not None and self.engine.is_running
+
+    @property
+    def error(self):
+        """The exception that stopped the glove link, if any."""
+        if self.engine is not None and self.engine.error is not None:
+            return self.engine.error
+        return self.haptics.error if self.haptics is not None else None
+
+    def _load_models(self):
+        try:
+            self.calibration = GloveCalibration.load(self.calibration_profile)
+        except FileNotFoundError:
+            logging.info('%s: no calibration profile %r yet', self.name, self.calibration_profile)
+        try:
+            self.retarget = RetargetTable.load(self.retarget_profile)
+        except FileNotFoundError:
+            if self.default_retarget is None:
+                raise
+            self.retarget = self.default_retarget
+
+    def _start_recording(self):
+        metadata = {'pair': self.name, 'link_mode': self.link_mode,
+                    'retarget': self.retarget.to_dict()}
+        if self.calibration.calibrated:
+            metadata['calibration'] = self.calibration.to_dict()
+        self.recorder = SessionRecorder(
+            session_path(time.strftime('%Y%m%d-%H%M%S-') + self.name), metadata=metadata)
+        self.recorder.start()
+        if self.leap_node is not None:
+            self.leap_node.start_polling(self.telemetry_rate)
+            self._polling = True
+
+    # === Engine callbacks (reader and feedback threads) ===
+
+    def process(self, fingers: np.ndarray) -> Optional[np.ndarray]:
+        """Feeds an open calibration window; returns the bend once calibrated."""
+        if self.calibration.observe(fingers):
+            self._calibrated()
+        self.raw = fingers.copy()
+        if not self.calibration.calibrated:
+            return None
+        self.bend = self.calibration.apply(fingers)
+        return self.bend
+
+    def _calibrated(self):
+        self.calibration.save(self.calibration_profile)
+        if self.recorder is not None:
+            self.recorder.metadata['calibration'] = self.calibration.to_dict()
+        if self.on_calibrated is not None:
+            self.on_calibrated(self)
+
+    def _on_feedback(self, brakes):
+        if brakes is not None and self.feedback_enabled:
+            self.haptics.submit(brakes)
+
+    # === Controls ===
+
+    def calibrate(self, duration: float = 5.0):
+        """Opens a calibration window; teleop keeps running meanwhile."""
+        self.calibration.begin(duration)
+
+    def submit_haptics(self, values):
+        self.haptics.submit(values)
+
+    def stats(self) -> dict:
+        """The engine's stats plus haptics, recorder and glove sample age."""
+        stats = self.engine.stats()
+        stats['haptics'] = self.haptics.stats()
+        latest = self.engine.latest_sample
+        stats['glove_age_ms'] = (None if latest is None else
+                                 (time.perf_counter() - latest[1]) * 1000.0)
+        stats['running'] = self.is_running
+        return stats
+
+
+class TeleopStation:
+    """Opens, runs and stops several TeleopPairs together.
+
+    A pair that fails while running (e.g. its glove link drops) stops on
+    its own; the others keep going. `is_running` stays True while any pair
+    runs.
+    """
+
+    def __init__(self, pairs: Sequence[TeleopPair]):
+        names = [pair.name for pair in pairs]
+        if len(set(names)) != len(names):
+            raise ValueError('Pair names must be unique: {}'.format(names))
+        self.pairs = list(pairs)
+
+    def open(self):
+        """Opens every pair concurrently (Bluetooth links can take seconds).
+
+        If any pair fails, the others are closed again and the first error
+        is raised.
+
+        Raises:
+            ValueError: If more than one pair drives a hand without a
+                hand_port.
+        """
+        unassigned = [pair.name for pair in self.pairs
+                      if pair.enable_hand and pair.hand_port is None]
+        if len(unassigned) > 1:
+            raise ValueError('Pairs {} need a hand_port each: discovery cannot '
+                             'tell identical hands apart'.format(unassigned))
+        glove_ports = [pair.glove_port for pair in self.pairs]
+        errors = {}
+
+        def open_pair(pair):
+            try:
+                pair.open(glove_ports)
+            except Exception as e:
+                errors[pair.name] = e
+
+        threads = [threading.Thread(target=open_pair, args=(pair,), name=pair.name + '-open')
+                   for pair in self.pairs]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        if errors:
+            for pair in self.pairs:
+                if pair.name not in errors:
+                    pair.close()
+            name, error = next(iter(errors.items()))
+            logging.error('Opening pair %s failed: %s', name, error)
+            raise error
+
+    def start(self):
+        for pair in self.pairs:
+            pair.start()
+
+    def stop(self):
+        for pair in self.pairs:
+            pair.stop()
+
+    def close(self):
+        for pair in self.pairs:
+            pair.close()
+
+    @property
+    def is_running(self) -> bool:
+        return any(pair.is_running for pair in self.pairs)
+
+    def errors(self) -> Dict[str, Exception]:
+        """{pair name: exception} for the pairs whose link failed."""
+        return {pair.name: pair.error for pair in self.pairs if pair.error is not None}
+
+    def calibrate(self, duration: float = 5.0):
+        for pair in self.pairs:
+            pair.calibrate(duration)
+
+    def submit_haptics(self, values):
+        for pair in self.pairs:
+            pair.submit_haptics(values)
+
+    def set_feedback(self, enabled: bool):
+        for pair in self.pairs:
+            pair.feedback_enabled = enabled and pair.force_feedback is not None
+
+    def stats(self) -> Dict[str, dict]:
+        return {pair.name: pair.stats() for pair in self.pairs}
+
+    def __getitem__(self, name: str) -> TeleopPair:
+        for pair in self.pairs:
+            if pair.name == name:
+                return pair
+        raise KeyError(name)
+
+    def __iter__(self):
+        return iter(self.pairs)
+
+    def __len__(self):
+        return len(self.pairs)
+
+    def __enter__(self):
+        self.open()
+        self.start()
+        return self
+
+    def __exit__(self, *args):
+        self.close()
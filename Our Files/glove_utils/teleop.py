@@ -0,0 +1,327 @@
+"""Event-driven teleop engine for the LeapGlove -> LEAP Hand pipeline.
+
+The engine replaces the busy-wait loop of LeapGlove.py with three threads:
+
+- a glove reader that blocks on the serial port, feeds the raw bytes to a
+  streaming decoder and keeps the latest sample,
+- a fixed-rate pose task that commands the hand every `send_interval`,
+- a lower-rate feedback task that reads the servo currents.
+
+Nothing spins: the reader sleeps inside the serial driver and the periodic
+tasks sleep until their next absolute deadline. Loop jitter and end-to-end
+latency (glove line received -> pose written to the bus) are tracked in
+`LoopStats` and exposed through `TeleopEngine.stats()`.
+
+With a `SessionRecorder` (glove_utils.recorder) the engine also records
+the raw glove bytes, every glove frame and every pose it sends, and the
+hand's telemetry poller (if started) records the measured state.
+"""
+import logging
+import threading
+import time
+from typing import Any, Callable, Optional
+
+import numpy as np
+
+from glove_utils.parser import GloveStreamDecoder
+from glove_utils.recorder import COMMAND, GLOVE, GLOVE_BYTES
+
+# Below this delay we sleep with time.sleep, which is high resolution on
+# Python 3.11+ on every platform, instead of Event.wait, which is not.
+_FINE_SLEEP_THRESHOLD = 0.05
+
+
+class LoopStats:
+    """Rolling statistics over the last `window` timing samples (seconds)."""
+
+    def __init__(self, window: int = 1000):
+        self._buffer = np.zeros(window, dtype=np.float64)
+        self.count = 0
+
+    def add(self, value: float):
+        self._buffer[self.count % len(self._buffer)] = value
+        self.count += 1
+
+    def summary(self) -> dict:
+        """Returns count, mean, std, p50, p99 and max in milliseconds."""
+        filled = min(self.count, len(self._buffer))
+        if filled == 0:
+            return {'count': 0}
+        data = self._buffer[:filled] * 1000.0
+        p50, p99 = np.percentile(data, [50, 99])
+        return {
+            'count': self.count,
+            'mean_ms': float(data.mean()),
+            'std_ms': float(data.std()),
+            'p50_ms': float(p50),
+            'p99_ms': float(p99),
+            'max_ms': float(data.max()),
+        }
+
+
+class PeriodicTask(threading.Thread):
+    """Calls `callback` every `interval` seconds against absolute deadlines.
+
+    Deadlines do not drift with the callback's run time. If a tick overruns
+    by more than a full interval, the missed ticks are skipped (and counted)
+    instead of being replayed in a burst.
+    """
+
+    def __init__(self, name: str, interval: float, callback: Callable[[], Any],
+                 stop_event: threading.Event, stats_window: int = 1000):
+        super().__init__(name=name, daemon=True)
+        self.interval = interval
+        self.callback = callback
+        self.jitter = LoopStats(stats_window)  # wakeup time - deadline
+        self.period = LoopStats(stats_window)  # time between two ticks
+        self.overruns = 0
+        self._stop_event = stop_event
+
+    def run(self):
+        next_deadline = time.perf_counter()
+        last_tick = None
+        while not self._stop_event.is_set():
+            delay = next_deadline - time.perf_counter()
+            if delay > _FINE_SLEEP_THRESHOLD:
+                if self._stop_event.wait(delay - _FINE_SLEEP_THRESHOLD):
+                    break
+                delay = next_deadline - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            now = time.perf_counter()
+            self.jitter.add(now - next_deadline)
+            if last_tick is not None:
+                self.period.add(now - last_tick)
+            last_tick = now
+
+            try:
+                self.callback()
+            except Exception:
+                logging.exception('%s tick failed', self.name)
+
+            next_deadline += self.interval
+            behind = time.perf_counter() - next_deadline
+            if behind > 0:
+                missed = int(behind // self.interval) + 1
+                self.overruns += missed
+                next_deadline += missed * self.interval
+
+
+class GloveReader(threading.Thread):
+    """Blocks on the glove serial port and feeds every chunk to `decoder`.
+
+    `on_frame(decoder, t_received)` is called whenever the decoder produced a
+    new frame, with the `time.perf_counter()` timestamp of the read. With a
+    `recorder`, every read is also recorded to its GLOVE_BYTES stream.
+    """
+
+    def __init__(self, serial_conn, decoder,
+                 on_frame: Callable[[Any, float], None],
+                 stop_event: threading.Event, recorder=None,
+                 name: str = 'glove-reader'):
+        super().__init__(name=name, daemon=True)
+        self.serial_conn = serial_conn
+        self.decoder = decoder
+        self.on_frame = on_frame
+        self.bytes_read = 0
+        self.error = None
+        self.recorder = recorder
+        self._stop_event = stop_event
+
+    def run(self):
+        while not self._stop_event.is_set():
+            try:
+                # Blocks for the first byte (up to the port timeout), then
+                # drains whatever else the driver already buffered.
+                data = self.serial_conn.read(self.serial_conn.in_waiting or 1)
+            except Exception as e:  # serial.SerialException, OSError
+                logging.error('Glove serial read failed: %s', e)
+                self.error = e
+                self._stop_event.set()
+                break
+            if not data:
+                continue
+            t_received = time.perf_counter()
+            self.bytes_read += len(data)
+            if self.recorder is not None:
+                self.recorder.record_bytes(GLOVE_BYTES, t_received, data)
+            try:
+                if self.decoder.feed(data):
+                    self.on_frame(self.decoder, t_received)
+            except Exception:
+                logging.exception('Glove frame handler failed')
+
+
+class TeleopEngine:
+    """Runs the glove -> hand pipeline on dedicated threads.
+
+    Args:
+        glove_serial: Open serial connection to the glove (pyserial-like,
+            with a read timeout so the reader can notice `stop()`).
+        leap_node: The LeapNode to command, or None to only read the glove.
+        decoder: Streaming decoder for the glove bytes; defaults to a
+            GloveStreamDecoder.
+        process: Maps the decoder's `fingers` array to a sample, or None to
+            ignore the frame. The array is reused by the decoder, so the
+            result must not alias it. Defaults to a copy of the array.
+        retarget: Maps the latest sample to a 16-joint pose.
+        embodiment: Convention of the retargeted poses, 'allegro'
+            (sent with set_allegro) or 'LEAPhand' (set_leap).
+        feedback: Called as `feedback(leap_node)` on the feedback task;
+            its result is kept in `latest_feedback`.
+        on_feedback: Optional callback receiving every feedback result.
+        send_interval: Pose command period in seconds.
+        feedback_interval: Feedback period in seconds.
+        stats_window: Number of samples kept for the timing statistics.
+        recorder: Optional started SessionRecorder. Glove reads, glove
+            frames (raw and processed) and the goal pose sent are recorded
+            here; it is also attached to `leap_node.recorder` until `stop()`,
+            so the node's telemetry poller records the hand. Close it after
+            `stop()`.
+        name: Prefix for the thread names, to tell engines apart when one
+            process runs several (glove_utils.station).
+    """
+
+    def __init__(self,
+                 glove_serial,
+                 leap_node=None,
+                 decoder=None,
+                 process: Optional[Callable[[np.ndarray], Any]] = None,
+                 retarget: Optional[Callable[[Any], np.ndarray]] = None,
+                 embodiment: str = 'allegro',
+                 feedback: Optional[Callable[[Any], Any]] = None,
+                 on_feedback: Optional[Callable[[Any], None]] = None,
+                 send_interval: float = 0.012,
+                 feedback_interval: float = 2.0,
+                 stats_window: int = 1000,
+                 recorder=None,
+                 name: Optional[str] = None):
+        self.glove_serial = glove_serial
+        self.leap_node = leap_node
+        self.decoder = decoder if decoder is not None else GloveStreamDecoder()
+        self.process = process if process is not None else np.copy
+        self.retarget = retarget
+        if embodiment not in ('allegro', 'LEAPhand'):
+            raise ValueError('Unknown pose embodiment: {}'.format(embodiment))
+        self.embodiment = embodiment
+        self.feedback = feedback
+        self.on_feedback = on_feedback
+        self.recorder = recorder
+        if recorder is not None and leap_node is not None:
+            leap_node.recorder = recorder
+
+        # Serializes every access to the Dynamixel bus across the tasks. The
+        # node's own (reentrant) lock when it has one, so the telemetry
+        # poller and anything else using the node are serialized too.
+        self.bus_lock = (getattr(leap_node, 'bus_lock', None) or
+                         threading.Lock())
+        self.latest_sample = None  # (sample, t_received)
+        self.latest_feedback = None
+        self.poses_sent = 0
+        self.latency = LoopStats(stats_window)
+
+        self.name = name
+        prefix = name + '-' if name else ''
+        self._stop_event = threading.Event()
+        self._reader = GloveReader(glove_serial, self.decoder, self._on_frame,
+                                   self._stop_event, recorder,
+                                   prefix + 'glove-reader')
+        self._pose_task = PeriodicTask(prefix + 'pose', send_interval,
+                                       self._send_pose, self._stop_event,
+                                       stats_window)
+        self._feedback_task = None
+        if feedback is not None and leap_node is not None:
+            self._feedback_task = PeriodicTask(prefix + 'feedback',
+                                               feedback_interval,
+                                               self._read_feedback,
+                                               self._stop_event, stats_window)
+
+    def _threads(self):
+        threads = [self._reader, self._pose_task]
+        if self._feedback_task is not None:
+            threads.append(self._feedback_task)
+        return threads
+
+    def start(self):
+        """Starts the reader and the periodic tasks."""
+        for thread in self._threads():
+            thread.start()
+
+    def stop(self, timeout: float = 2.0):
+        """Signals every thread to stop and waits for them."""
+        self._stop_event.set()
+        for thread in self._threads():
+            if thread.is_alive():
+                thread.join(timeout)
+        if self.recorder is not None and self.leap_node is not None:
+            if getattr(self.leap_node, 'recorder', None) is self.recorder:
+                self.leap_node.recorder = None
+
+    @property
+    def is_running(self) -> bool:
+        return not self._stop_event.is_set()
+
+    @property
+    def error(self):
+        """The exception that stopped the glove reader, if any."""
+        return self._reader.error
+
+    def _on_frame(self, decoder, t_received: float):
+        sample = self.process(decoder.fingers)
+        if self.recorder is not None:
+            self.recorder.record(GLOVE, t_received, decoder.fingers,
+                                 np.nan if sample is None else sample)
+        if sample is not None:
+            self.latest_sample = (sample, t_received)
+
+    def _send_pose(self):
+        latest = self.latest_sample
+        if latest is None or self.leap_node is None or self.retarget is None:
+            return
+        sample, t_received = latest
+        pose = self.retarget(sample)
+        with self.bus_lock:
+            if self.embodiment == 'allegro':
+                self.leap_node.set_allegro(pose)
+            else:
+                self.leap_node.set_leap(pose)
+            t_sent = time.perf_counter()
+            if self.recorder is not None:
+                self.recorder.record(COMMAND, t_sent, self.leap_node.curr_pos,
+                                     t_received)
+        self.latency.add(t_sent - t_received)
+        self.poses_sent += 1
+
+    def _read_feedback(self):
+        with self.bus_lock:
+            result = self.feedback(self.leap_node)
+        self.latest_feedback = result
+        if self.on_feedback is not None:
+            self.on_feedback(result)
+
+    def stats(self) -> dict:
+        """Returns a snapshot of the engine's counters and timing stats."""
+        stats = {
+            'glove_bytes': self._reader.bytes_read,
+            'glove_frames': self.decoder.frames,
+            'glove_errors': self.decoder.errors,
+            'poses_sent': self.poses_sent,
+            'pose_jitter': self._pose_task.jitter.summary(),
+            'pose_period': self._pose_task.period.summary(),
+            'pose_overruns': self._pose_task.overruns,
+            'latency': self.latency.summary(),
+        }
+        if self._feedback_task is not None:
+            stats['feedback_jitter'] = self._feedback_task.jitter.summary()
+            stats['feedback_period'] = self._feedback_task.period.summary()
+            stats['feedback_overruns'] = self._feedback_task.overruns
+        if self.recorder is not None:
+            stats['recorder'] = self.recorder.stats()
+        return stats
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *args):
+        self.stop()
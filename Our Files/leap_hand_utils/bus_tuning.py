@@ -0,0 +1,213 @@
+"""Measures and tunes the LEAP Hand's USB/RS-485 link.
+
+The FTDI adapter holds every reply for its latency timer (16 ms by default)
+before passing it on, which caps any read at ~60 Hz no matter the baud rate.
+`tune_bus` checks the timer in sysfs, lowers it to 1 ms when allowed (root,
+or a udev rule granting write access), and times each read type against the
+wire time at the current baud rate to report the fastest loop the bus can
+sustain:
+
+    report = tune_bus(client, set_latency=True)
+    print(format_report(report))
+
+Or from the command line:
+
+    python -m leap_hand_utils.bus_tuning --set-latency
+"""
+import time
+from typing import Dict, Optional, Sequence
+
+import numpy as np
+
+from leap_hand_utils.discovery import (RECOMMENDED_LATENCY_TIMER, SYSFS_ROOT,
+                                       latency_timer_path, read_latency_timer)
+from leap_hand_utils.dynamixel_client import (LEN_GOAL_POSITION,
+                                              LEN_PRESENT_POS_VEL,
+                                              LEN_PRESENT_POS_VEL_CUR,
+                                              LEN_PRESENT_POSITION)
+
+# Read type -> bytes per motor in its sync read.
+READ_TYPES = {
+    'read_pos': LEN_PRESENT_POSITION,
+    'read_pos_vel': LEN_PRESENT_POS_VEL,
+    'read_pos_vel_cur': LEN_PRESENT_POS_VEL_CUR,
+}
+BITS_PER_BYTE = 10  # 8N1
+# Protocol 2.0 packet overhead: header(4) + id + length(2) + instruction + crc(2).
+INSTRUCTION_OVERHEAD = 10
+STATUS_OVERHEAD = 11  # ... + error byte
+
+
+def sync_read_bytes(num_motors: int, data_length: int) -> int:
+    """Bytes on the wire for one sync read (request and all replies)."""
+    return (INSTRUCTION_OVERHEAD + 4 + num_motors +
+            num_motors * (STATUS_OVERHEAD + data_length))
+
+
+def sync_write_bytes(num_motors: int, data_length: int) -> int:
+    """Bytes on the wire for one sync write."""
+    return INSTRUCTION_OVERHEAD + 4 + num_motors * (1 + data_length)
+
+
+def wire_time(num_bytes: int, baudrate: int) -> float:
+    """Seconds `num_bytes` take on the line at `baudrate`."""
+    return num_bytes * BITS_PER_BYTE / baudrate
+
+
+def write_latency_timer(port: str, value: int,
+                        sysfs_root: str = SYSFS_ROOT) -> bool:
+    """Sets the FTDI latency timer (ms); returns False if not permitted."""
+    try:
+        with open(latency_timer_path(port, sysfs_root), 'w') as f:
+            f.write('{}\n'.format(int(value)))
+    except OSError:
+        return False
+    return read_latency_timer(port, sysfs_root) == int(value)
+
+
+def measure_read(client, read_type: str, samples: int = 200,
+                 write: bool = False) -> Dict[str, float]:
+    """Times `samples` calls of a DynamixelClient read.
+
+    Args:
+        read_type: One of READ_TYPES.
+        write: Also send a goal position write (holding the present pose)
+            before every read, i.e. time a full control tick. The write is
+            forced: the position writer would skip an unchanged goal.
+
+    Returns:
+        mean / p50 / p99 / max of the call time in seconds, and the number
+        of goal writes actually sent.
+    """
+    read = getattr(client, read_type)
+    motor_ids = list(client.motor_ids)
+    pose = client.read_pos()
+    writer = client.position_writer(motor_ids)
+    sent = writer.sent
+    times = np.empty(samples)
+    for i in range(samples):
+        start = time.perf_counter()
+        if write:
+            writer.write(pose, force=True)
+        read()
+        times[i] = time.perf_counter() - start
+    return {
+        'writes': writer.sent - sent,
+        'mean': float(times.mean()),
+        'p50': float(np.percentile(times, 50)),
+        'p99': float(np.percentile(times, 99)),
+        'max': float(times.max()),
+    }
+
+
+def tune_bus(client, set_latency: bool = False,
+             target_latency: int = RECOMMENDED_LATENCY_TIMER,
+             read_types: Sequence[str] = tuple(READ_TYPES),
+             samples: int = 200,
+             sysfs_root: str = SYSFS_ROOT) -> Dict[str, object]:
+    """Checks the latency timer and measures every read type.
+
+    Args:
+        client: A connected DynamixelClient.
+        set_latency: Lower the latency timer to `target_latency` if it is
+            above it (needs write access to sysfs).
+        read_types: Reads to measure, from READ_TYPES.
+        samples: Calls timed per read type.
+
+    Returns:
+        A report dict: port, baudrate, latency_timer (before/after, None if
+        the port has none), latency_set (bool) and, per read type, the
+        measured times, the wire time and the sustainable loop rate in Hz
+        (1 / p99, reads alone and with a pose write before each).
+    """
+    port = client.port_name
+    before = read_latency_timer(port, sysfs_root)
+    latency_set = False
+    if (set_latency and before is not None and before > target_latency):
+        latency_set = write_latency_timer(port, target_latency, sysfs_root)
+    after = read_latency_timer(port, sysfs_root)
+
+    num_motors = len(client.motor_ids)
+    write_bytes = sync_write_bytes(num_motors, LEN_GOAL_POSITION)
+    reads = {}
+    for read_type in read_types:
+        data_length = READ_TYPES[read_type]
+        read_only = measure_read(client, read_type, samples)
+        with_write = measure_read(client, read_type, samples, write=True)
+        reads[read_type] = {
+            'read': read_only,
+            'tick': with_write,
+            'wire': wire_time(sync_read_bytes(num_motors, data_length),
+                              client.baudrate),
+            'write_wire': wire_time(write_bytes, client.baudrate),
+            'max_rate': 1.0 / read_only['p99'],
+            'max_tick_rate': 1.0 / with_write['p99'],
+        }
+    return {
+        'port': port,
+        'baudrate': client.baudrate,
+        'latency_timer': {'before': before, 'after': after},
+        'latency_set': latency_set,
+        'reads': reads,
+    }
+
+
+def format_report(report: Dict[str, object]) -> str:
+    """Renders a tune_bus() report as a table."""
+    timer = report['latency_timer']
+    if timer['before'] is None:
+        timer_line = 'no FTDI latency timer found'
+    elif timer['before'] != timer['after']:
+        timer_line = '{} ms -> {} ms'.format(timer['before'], timer['after'])
+    else:
+        timer_line = '{} ms'.format(timer['before'])
+        if timer['before'] > RECOMMENDED_LATENCY_TIMER:
+            timer_line += ' (recommended {} ms; rerun with --set-latency as root)'.format(
+                RECOMMENDED_LATENCY_TIMER)
+    lines = [
+        'Port {} at {} baud, latency timer {}'.format(
+            report['port'], report['baudrate'], timer_line),
+        '',
+        '  {:<18} {:>9} {:>9} {:>9} {:>10} {:>12}'.format(
+            'read', 'wire', 'p50', 'p99', 'max rate', 'w/ write'),
+    ]
+    for read_type, result in report['reads'].items():
+        lines.append('  {:<18} {:6.2f} ms {:6.2f} ms {:6.2f} ms {:7.0f} Hz {:9.0f} Hz'.format(
+            read_type, result['wire'] * 1e3, result['read']['p50'] * 1e3,
+            result['read']['p99'] * 1e3, result['max_rate'],
+            result['max_tick_rate']))
+    return '\n'.join(lines)
+
+
+if __name__ == '__main__':
+    import argparse
+
+    from leap_hand_utils.discovery import find_leap_hand
+    from leap_hand_utils.dynamixel_client import DynamixelClient
+
+    parser = argparse.ArgumentParser(
+        description='Measure (and tune) the LEAP Hand bus.')
+    parser.add_argument(
+        '-m', '--motors', default=','.join(str(i) for i in range(16)),
+        help='Comma-separated list of motor IDs.')
+    parser.add_argument(
+        '-d', '--device', default=None,
+        help='The Dynamixel device (default: search for the hand).')
+    parser.add_argument(
+        '-b', '--baud', type=int, default=4000000,
+        help='The baudrate to connect with.')
+    parser.add_argument(
+        '--set-latency', action='store_true',
+        help='Lower the FTDI latency timer to {} ms (needs root).'.format(
+            RECOMMENDED_LATENCY_TIMER))
+    parser.add_argument(
+        '-n', '--samples', type=int, default=200,
+        help='Reads timed per read type.')
+    parsed_args = parser.parse_args()
+
+    motors = [int(motor) for motor in parsed_args.motors.split(',')]
+    device = parsed_args.device or find_leap_hand(motors, parsed_args.baud)
+    with DynamixelClient(motors, device, parsed_args.baud) as dxl_client:
+        print(format_report(tune_bus(dxl_client,
+                                     set_latency=parsed_args.set_latency,
+                                     samples=parsed_args.samples)))
@@ -0,0 +1,135 @@
+"""Timestamped waypoint buffer with host-side interpolation.
+
+Producers (the glove loop at ~83 Hz, a policy at 20 Hz) push poses with the
+time they are valid for; the consumer samples the buffer at its own, faster
+rate and gets an interpolated setpoint, so the servos see a smooth ramp
+instead of a step every producer period. LeapNode.start_streaming() runs the
+consumer side on its own thread.
+
+Sampling past the newest waypoint holds it and counts an underrun: the
+producer fell behind the playback delay.
+"""
+import bisect
+import threading
+from typing import Optional
+
+import numpy as np
+
+LINEAR = 'linear'
+CUBIC = 'cubic'
+
+
+class TrajectoryBuffer:
+    """Thread-safe waypoint buffer.
+
+    Args:
+        num_joints: Size of every pose.
+        interpolation: LINEAR, or CUBIC (cubic Hermite through the waypoints,
+            tangents from the neighbouring waypoints).
+        max_velocity: Optional per-joint speed limit (rad/s) applied to the
+            sampled setpoints.
+        capacity: Waypoints kept at most; the oldest are dropped.
+
+    Attributes:
+        pushed: Waypoints accepted.
+        rejected: Waypoints refused for not being newer than the last one.
+        samples: Setpoints produced.
+        underruns: Samples taken past the newest waypoint.
+    """
+
+    def __init__(self, num_joints: int, interpolation: str = CUBIC,
+                 max_velocity: Optional[float] = None, capacity: int = 256):
+        if interpolation not in (LINEAR, CUBIC):
+            raise ValueError('Unknown interpolation: {}'.format(interpolation))
+        self.num_joints = num_joints
+        self.interpolation = interpolation
+        self.max_velocity = max_velocity
+        self.capacity = capacity
+        self._lock = threading.Lock()
+        self._times = []
+        self._poses = []
+        self._last = None  # Last setpoint, for the velocity limit
+        self.pushed = 0
+        self.rejected = 0
+        self.samples = 0
+        self.underruns = 0
+
+    def __len__(self):
+        return len(self._times)
+
+    def reset(self, pose: Optional[np.ndarray] = None):
+        """Drops every waypoint; `pose` is where the velocity limit starts."""
+        with self._lock:
+            self._times.clear()
+            self._poses.clear()
+            self._last = None if pose is None else np.array(pose, dtype=np.float64)
+
+    def push(self, t: float, pose: np.ndarray) -> bool:
+        """Adds a waypoint valid at time `t`; returns False if refused."""
+        pose = np.array(pose, dtype=np.float64)
+        if pose.shape != (self.num_joints,):
+            raise ValueError('Expected {} joints, got {}'.format(
+                self.num_joints, pose.shape))
+        with self._lock:
+            if self._times and t <= self._times[-1]:
+                self.rejected += 1
+                return False
+            self._times.append(t)
+            self._poses.append(pose)
+            if len(self._times) > self.capacity:
+                del self._times[0], self._poses[0]
+            self.pushed += 1
+            return True
+
+    def sample(self, t: float, dt: float = 0.0) -> Optional[np.ndarray]:
+        """Returns the setpoint at time `t`, None before the first waypoint.
+
+        Args:
+            t: Playback time.
+            dt: Time since the previous sample, for the velocity limit.
+        """
+        with self._lock:
+            times, poses = self._times, self._poses
+            if not times:
+                return None
+            # Waypoints before the segment (and its left neighbour) are done.
+            done = bisect.bisect_right(times, t) - 2
+            if done > 0:
+                del times[:done], poses[:done]
+
+            k = bisect.bisect_right(times, t) - 1
+            if k >= len(times) - 1:
+                if t > times[-1]:
+                    self.underruns += 1
+                pose = poses[-1]
+            elif k < 0:
+                pose = poses[0]
+            else:
+                pose = self._interpolate(k, t)
+
+            if self.max_velocity is not None and self._last is not None:
+                step = self.max_velocity * dt
+                pose = self._last + np.clip(pose - self._last, -step, step)
+            self._last = pose
+            self.samples += 1
+            return pose.copy()
+
+    def _interpolate(self, k: int, t: float) -> np.ndarray:
+        times, poses = self._times, self._poses
+        h = times[k + 1] - times[k]
+        s = (t - times[k]) / h
+        if self.interpolation == LINEAR:
+            return poses[k] + s * (poses[k + 1] - poses[k])
+        s2 = s * s
+        s3 = s2 * s
+        return ((2 * s3 - 3 * s2 + 1) * poses[k] +
+                (s3 - 2 * s2 + s) * h * self._tangent(k) +
+                (-2 * s3 + 3 * s2) * poses[k + 1] +
+                (s3 - s2) * h * self._tangent(k + 1))
+
+    def _tangent(self, i: int) -> np.ndarray:
+        """Velocity at waypoint i from its neighbours (one-sided at the ends)."""
+        times, poses = self._times, self._poses
+        before = max(i - 1, 0)
+        after = min(i + 1, len(times) - 1)
+        return (poses[after] - poses[before]) / (times[after] - times[before])
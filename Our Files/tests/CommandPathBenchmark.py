@@ -0,0 +1,172 @@
+"""
+Test + microbenchmark: the fused command path (embodiment.CommandWriter)
+vs. the unclipped leap_hand_utils path LeapNode.set_* used before.
+
+On a simulated 16-motor bus (fake_dynamixel, no latency):
+
+1. Poses inside the joint limits reach the control table with the same goal
+   ticks either way; poses outside are clipped to the real joint limits
+   (angle_safety_clip) instead of being sent as is.
+2. With max_delta the goal moves at most max_delta per command and then
+   settles on the target; unchanged commands are skipped.
+3. LeapNode.set_ones / set_allegro / set_leap go through it and curr_pos is
+   the goal actually sent.
+4. Times one command (allegro and [-1, 1] inputs) through the legacy path,
+   the legacy path plus angle_safety_clip and the fused path (best of 3):
+   host side alone (poses that quantize to the goal already sent, so the
+   writer skips the send) and end to end with a new pose every tick, where
+   the simulated bus dominates.
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+
+import leap_hand_utils.leap_hand_utils as lhu
+from LeapHandAPI import LeapNode
+from leap_hand_utils import fake_dynamixel as fd
+from leap_hand_utils.dynamixel_client import ADDR_GOAL_POSITION, DEFAULT_POS_SCALE, DynamixelClient
+from leap_hand_utils.embodiment import ALLEGRO, ONE_RANGE, CommandWriter, Embodiment
+
+MOTORS = list(range(16))
+TICKS = 3000
+
+
+def bench(write, poses):
+    best = float("inf")
+    for _ in range(3):
+        start = time.perf_counter()
+        for pose in poses:
+            write(pose)
+        best = min(best, time.perf_counter() - start)
+    return best / len(poses)
+
+
+def goals(bus):
+    return np.array([bus.read(motor_id, ADDR_GOAL_POSITION, 4, signed=True) for motor_id in MOTORS])
+
+
+def legacy_allegro(client, pose):
+    pose = lhu.allegro_to_LEAPhand(pose, zeros=False)
+    client.write_desired_pos(MOTORS, np.array(pose))
+
+
+def legacy_ones(client, pose):
+    pose = lhu.sim_ones_to_LEAPhand(np.array(pose))
+    client.write_desired_pos(MOTORS, np.array(pose))
+
+
+def test_clip(bus, client, command):
+    rng = np.random.default_rng(1)
+    inside = rng.uniform(-0.9, 0.9, (200, 16))
+    mismatched = 0
+    for pose in inside:
+        legacy_ones(client, pose)
+        expected = goals(bus)
+        command.write(pose, ONE_RANGE)
+        # Only a rounding tie can differ.
+        assert np.abs(goals(bus) - expected).max() <= 1
+        mismatched += not np.array_equal(goals(bus), expected)
+    assert mismatched <= 2, "fused path and leap_hand_utils disagree"
+
+    embodiment = command.embodiment
+    for pose in rng.uniform(-3.0, 3.0, (200, 16)):
+        command.write(pose, ALLEGRO)
+        sent = goals(bus)
+        assert np.all(sent >= command.lower) and np.all(sent <= command.upper), "goal outside the joint limits"
+        clipped = lhu.angle_safety_clip(lhu.allegro_to_LEAPhand(pose, zeros=False)) / DEFAULT_POS_SCALE
+        assert np.abs(sent - clipped).max() <= 1.0, "not clipped to the joint limits"
+    assert np.allclose(command.position(), goals(bus) * DEFAULT_POS_SCALE)
+    assert np.all(embodiment.real_min <= command.position() + DEFAULT_POS_SCALE)
+    print("  same ticks as leap_hand_utils inside the limits, clipped outside   ok")
+
+
+def test_rate_limit(bus, command):
+    command.write(np.zeros(16), ALLEGRO)
+    command.max_delta = 0.05
+    step = np.floor(0.05 / DEFAULT_POS_SCALE)
+    previous = goals(bus)
+    target = np.full(16, 1.0)
+    for _ in range(40):
+        command.write(target, ALLEGRO)
+        sent = goals(bus)
+        assert np.abs(sent - previous).max() <= step, "rate limit exceeded"
+        previous = sent
+    expected = np.clip(np.rint(lhu.allegro_to_LEAPhand(target, zeros=False) / DEFAULT_POS_SCALE),
+                       command.lower, command.upper)
+    assert np.array_equal(previous, expected), "did not settle on the target"
+    skipped = command.writer.skipped
+    assert not command.write(target, ALLEGRO) and command.writer.skipped == skipped + 1
+    command.max_delta = None
+    print(f"  max_delta 0.05 rad: at most {step:.0f} ticks per command, settles, skips repeats   ok")
+
+
+def test_node(client):
+    leap_node = LeapNode(dxl_client=client)
+    leap_node.set_ones(np.full(16, 5.0))
+    assert np.allclose(leap_node.curr_pos, leap_node.embodiment.real_max, atol=DEFAULT_POS_SCALE)
+    leap_node.set_allegro(np.full(16, -5.0))
+    assert np.allclose(leap_node.curr_pos, leap_node.embodiment.real_min, atol=DEFAULT_POS_SCALE)
+    leap_node.set_leap(np.full(16, np.pi))
+    assert np.allclose(leap_node.curr_pos, np.pi, atol=DEFAULT_POS_SCALE)
+    assert np.allclose(leap_node.prev_pos, leap_node.embodiment.real_min, atol=DEFAULT_POS_SCALE)
+    print("  LeapNode.set_* clip, curr_pos is the goal sent   ok")
+
+
+def main():
+    fd.reset_buses()
+    bus = fd.get_bus("fake-command", latency=0.0)
+    client = DynamixelClient(MOTORS, "fake-command", 4000000, sdk=fd)
+    client.connect()
+    command = CommandWriter(Embodiment(allegro_zeros=False, dtype=np.float64), client.position_writer(MOTORS))
+
+    print("Fused command path\n")
+    test_clip(bus, client, command)
+    test_rate_limit(bus, command)
+    test_node(client)
+
+    rng = np.random.default_rng(0)
+    allegro = rng.uniform(0.0, 1.5, (TICKS, 16))
+    ones = rng.uniform(-1.0, 1.0, (TICKS, 16))
+    # Sub-tick noise around one pose: every path does all of its work and
+    # the writer then skips the send, so this times the host side alone.
+    still = (np.rint(np.pi / DEFAULT_POS_SCALE) + rng.uniform(-0.2, 0.2, (TICKS, 16))) * DEFAULT_POS_SCALE
+    still_allegro = np.array([lhu.LEAPhand_to_allegro(pose, zeros=False) for pose in still])
+    still_ones = np.array([lhu.LEAPhand_to_sim_ones(pose) for pose in still])
+    paths = {
+        "allegro": (
+            lambda pose: legacy_allegro(client, pose),
+            lambda pose: client.write_desired_pos(
+                MOTORS, lhu.angle_safety_clip(lhu.allegro_to_LEAPhand(pose, zeros=False))),
+            lambda pose: command.write(pose, ALLEGRO),
+            allegro, still_allegro,
+        ),
+        "[-1, 1]": (
+            lambda pose: legacy_ones(client, pose),
+            lambda pose: client.write_desired_pos(
+                MOTORS, lhu.angle_safety_clip(lhu.sim_ones_to_LEAPhand(np.array(pose)))),
+            lambda pose: command.write(pose, ONE_RANGE),
+            ones, still_ones,
+        ),
+    }
+    print(f"\n{len(MOTORS)} motors, best of 3 x {TICKS} commands\n")
+    print(f"  {'input':<10} {'':<22} {'unclipped':>12} {'+ clip':>12} {'fused':>12}")
+    for name, (legacy, clipped, fused, moving, still_poses) in paths.items():
+        for label, poses in (("host side (no send)", still_poses), ("pose changes, sent", moving)):
+            sent = command.writer.sent
+            times = [bench(path, poses) for path in (legacy, clipped, fused)]
+            assert poses is moving or command.writer.sent - sent <= 3, "host side timing includes sends"
+            print(f"  {name:<10} {label:<22} " + " ".join(f"{t * 1e6:9.1f} us" for t in times)
+                  + f"  ({times[0] / times[2]:.2f}x vs unclipped)")
+            assert times[2] < times[1], f"{name}: fused path slower than the clipped one"
+            if poses is still_poses:
+                assert times[2] < times[0], f"{name}: fused path slower than the unclipped one"
+    client.disconnect()
+    print("\n✅ Fused command path clips and is cheaper than the unclipped path")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+"""
+Hand bring-up benchmark: the old LeapNode init sequence vs. DynamixelClient.configure().
+
+Runs on a simulated 16-motor bus (fake_dynamixel) with the baud-rate latency
+model on, and times:
+
+- legacy:  8 sync_writes + set_torque_enabled (per-motor write1ByteTxRx)
+- cold:    configure() on a freshly powered hand (everything differs)
+- warm:    configure() again, as when a node restarts on a powered hand
+- mode:    configure() after someone left the hand in position mode with
+           torque on (EEPROM change: torque off, write, torque on)
+
+and checks every run leaves the same control table.
+
+Usage:
+    python ConfigureBenchmark.py [usb_latency_ms]
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+
+from leap_hand_utils import fake_dynamixel as fd
+from leap_hand_utils.dynamixel_client import CONFIG_REGISTERS, DynamixelClient
+
+MOTORS = list(range(16))
+SIDE = [0, 4, 8]
+KP, KI, KD, CURR_LIM = 600, 0, 200, 350
+
+
+def legacy_init(client):
+    motors = MOTORS
+    client.sync_write(motors, np.ones(len(motors)) * 5, 11, 1)
+    client.set_torque_enabled(motors, True)
+    client.sync_write(motors, np.ones(len(motors)) * KP, 84, 2)
+    client.sync_write(SIDE, np.ones(3) * (KP * 0.75), 84, 2)
+    client.sync_write(motors, np.ones(len(motors)) * KI, 82, 2)
+    client.sync_write(motors, np.ones(len(motors)) * KD, 80, 2)
+    client.sync_write(SIDE, np.ones(3) * (KD * 0.75), 80, 2)
+    client.sync_write(motors, np.ones(len(motors)) * CURR_LIM, 102, 2)
+    return 8 + len(motors)
+
+
+def configure(client):
+    side = np.isin(MOTORS, SIDE)
+    return client.configure(MOTORS, {
+        'operating_mode': 5,
+        'position_p_gain': np.where(side, KP * 0.75, KP),
+        'position_i_gain': KI,
+        'position_d_gain': np.where(side, KD * 0.75, KD),
+        'current_limit': CURR_LIM,
+        'torque_enable': 1,
+    })
+
+
+def control_table(bus):
+    return {name: [bus.read(motor_id, address, size) for motor_id in MOTORS]
+            for name, (address, size) in CONFIG_REGISTERS.items()}
+
+
+def timed(name, init, client, bus):
+    transactions = bus.transactions
+    start = time.perf_counter()
+    writes = init(client)
+    elapsed = time.perf_counter() - start
+    print(f"  {name:<8} {elapsed * 1000:8.2f} ms  {bus.transactions - transactions:3d} transactions  {writes:3d} writes")
+    return control_table(bus)
+
+
+def main():
+    latency = float(sys.argv[1]) / 1000.0 if len(sys.argv) > 1 else 0.001
+    fd.reset_buses()
+    print(f"16 motors at 4 Mbps, {latency * 1000:.1f} ms per reply\n")
+
+    bus = fd.get_bus("fake-legacy", latency=latency, simulate_baud=True)
+    client = DynamixelClient(MOTORS, "fake-legacy", 4000000, sdk=fd)
+    client.connect()
+    expected = timed("legacy", legacy_init, client, bus)
+
+    bus = fd.get_bus("fake-configure", latency=latency, simulate_baud=True)
+    client = DynamixelClient(MOTORS, "fake-configure", 4000000, sdk=fd)
+    client.connect()
+    assert timed("cold", configure, client, bus) == expected, "cold configure differs from the legacy init"
+    assert timed("warm", configure, client, bus) == expected, "warm configure changed the table"
+
+    for motor_id in MOTORS:
+        bus.write(motor_id, fd.ADDR_TORQUE_ENABLE, 1, 0)
+        bus.write(motor_id, fd.ADDR_OPERATING_MODE, 1, 3)
+        bus.write(motor_id, fd.ADDR_TORQUE_ENABLE, 1, 1)
+    assert timed("mode", configure, client, bus) == expected, "EEPROM change with torque on failed"
+
+    print("\n✅ configure() matches the legacy init")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,162 @@
+"""
+Test + benchmark for the latest-command control loop (leap_hand_utils.control_loop)
+that the ROS 2 leaphand_node runs from its control timer.
+
+Against the fake Dynamixel bus, a 1 kHz command publisher and a state query
+client hammer the loop from their own threads while it ticks at CONTROL_RATE:
+
+1. The tick rate holds and the bus sees one goal write + one read per tick,
+   whatever the command rate; the commands in between are coalesced.
+2. Queries are answered from the cache in microseconds, never waiting on the
+   bus, with consistent readings (seq only moves forward).
+3. The last command wins: after it, goal and position match it.
+4. The same traffic sent to the bus per message (the old callbacks) for
+   comparison.
+"""
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+
+from leap_hand_utils import fake_dynamixel
+from leap_hand_utils.control_loop import HandControlLoop
+from leap_hand_utils.dynamixel_client import DEFAULT_POS_SCALE, DynamixelClient
+from leap_hand_utils.embodiment import LEAPHAND, ONE_RANGE, CommandWriter, Embodiment
+
+RUN_TIME = 2.0
+CONTROL_RATE = 100.0
+COMMAND_RATE = 1000.0
+MOTORS = list(range(16))
+
+
+def make_loop(port):
+    client = DynamixelClient(MOTORS, port, 4000000, sdk=fake_dynamixel)
+    client.connect()
+    client.set_torque_enabled(MOTORS, True)
+    embodiment = Embodiment(allegro_zeros=False, dtype=np.float64)
+    command = CommandWriter(embodiment, client.position_writer(MOTORS))
+    return HandControlLoop(client, command, MOTORS), embodiment
+
+
+def pose_at(t):
+    return np.full(16, 0.5 * np.sin(2 * np.pi * t))
+
+
+def periodic(rate, stop, tick):
+    interval = 1.0 / rate
+    next_tick = time.perf_counter()
+    while not stop.is_set():
+        tick()
+        next_tick += interval
+        delay = next_tick - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+
+
+def percentile_us(samples, q):
+    return np.percentile(np.array(samples) * 1e6, q)
+
+
+def test_loop():
+    loop, embodiment = make_loop("fake-control-loop")
+    bus = fake_dynamixel.get_bus("fake-control-loop")
+    stop = threading.Event()
+    query_times, seqs = [], []
+
+    def command():
+        loop.submit(pose_at(time.perf_counter()), ONE_RANGE)
+
+    def query():
+        start = time.perf_counter()
+        state = loop.state()
+        query_times.append(time.perf_counter() - start)
+        seqs.append(state.seq)
+
+    threads = [threading.Thread(target=periodic, args=(CONTROL_RATE, stop, loop.tick)),
+               threading.Thread(target=periodic, args=(COMMAND_RATE, stop, command)),
+               threading.Thread(target=periodic, args=(COMMAND_RATE, stop, query))]
+    ticks, transactions = loop.ticks, bus.transactions
+    for thread in threads:
+        thread.start()
+    time.sleep(RUN_TIME)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    ticks = loop.ticks - ticks
+    transactions = bus.transactions - transactions
+    stats = loop.stats()
+
+    rate = ticks / RUN_TIME
+    print(f"  {rate:.1f} Hz control loop, {stats['submitted']} commands, {stats['coalesced']} coalesced, "
+          f"{stats['sent']} goals sent, {transactions / ticks:.2f} bus transactions per tick")
+    print(f"  state() from {len(query_times)} queries: p50 {percentile_us(query_times, 50):.1f} us, "
+          f"p99 {percentile_us(query_times, 99):.1f} us")
+    assert abs(rate - CONTROL_RATE) < 0.1 * CONTROL_RATE, "control loop is not at CONTROL_RATE"
+    assert transactions <= 2 * ticks, "more than one write + read per tick"
+    assert stats['coalesced'] > 0.5 * stats['submitted'] and stats['sent'] <= ticks
+    assert percentile_us(query_times, 99) < 1000.0, "state() waited on the bus"
+    assert all(a <= b for a, b in zip(seqs, seqs[1:]))
+
+    # Last command wins, and the hand follows it.
+    final = np.full(16, 0.25)
+    loop.submit(np.zeros(16), ONE_RANGE)
+    loop.submit(final, ONE_RANGE)
+    loop.tick()
+    state = loop.tick()
+    expected = embodiment.clip(embodiment.convert(final, ONE_RANGE, LEAPHAND))
+    assert np.allclose(state.goal, expected, atol=DEFAULT_POS_SCALE)
+    assert np.allclose(state.pos, state.goal, atol=DEFAULT_POS_SCALE)
+
+    try:
+        loop.submit(np.zeros(12))
+        raise AssertionError("wrong sized command accepted")
+    except ValueError:
+        pass
+    print("  last command wins, wrong sized commands refused   ok")
+
+
+def baseline():
+    """The old callbacks: every command and query goes to the bus right away."""
+    loop, _ = make_loop("fake-control-direct")
+    client, command = loop.client, loop.command
+    stop = threading.Event()
+    query_times = []
+    lock = threading.Lock()  # The single-threaded executor ran one callback at a time
+
+    def direct_command():
+        with lock:
+            command.write(pose_at(time.perf_counter()), ONE_RANGE)
+
+    def direct_query():
+        start = time.perf_counter()
+        with lock:
+            client.read_pos_vel_cur()
+        query_times.append(time.perf_counter() - start)
+
+    bus = fake_dynamixel.get_bus("fake-control-direct")
+    transactions = bus.transactions
+    threads = [threading.Thread(target=periodic, args=(COMMAND_RATE, stop, direct_command)),
+               threading.Thread(target=periodic, args=(COMMAND_RATE, stop, direct_query))]
+    for thread in threads:
+        thread.start()
+    time.sleep(RUN_TIME)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    print(f"\n  per-message baseline: {(bus.transactions - transactions) / RUN_TIME:.0f} bus transactions/s, "
+          f"query p50 {percentile_us(query_times, 50):.0f} us, p99 {percentile_us(query_times, 99):.0f} us")
+
+
+def main():
+    print("Control loop\n")
+    test_loop()
+    baseline()
+    print("\n✅ Control loop test passed")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+"""
+Test + microbenchmark: leap_hand_utils conversion functions vs. the
+precomputed, batched Embodiment (leap_hand_utils.embodiment).
+
+1. Every Embodiment conversion matches the leap_hand_utils function it
+   replaces, for one pose and for an (N, 16) batch, in float64 and float32;
+   round trips come back; out=x converts in place; clip matches
+   angle_safety_clip.
+2. LEAPsim_limits: sim_ones_to_LEAPhand() works again, unknown limit sets
+   (hack_thumb=True) raise instead of failing on an unbound name.
+3. Times one pose and a batch of poses through both (best of 3).
+4. With torch installed, the torch backend matches the numpy one.
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+
+import leap_hand_utils.leap_hand_utils as lhu
+from leap_hand_utils.embodiment import Embodiment
+
+BATCH = 4096
+TICKS = 5000
+
+# (Embodiment method, legacy function, kwargs for the Embodiment)
+CONVERSIONS = [
+    ("sim_ones_to_LEAPhand", lhu.sim_ones_to_LEAPhand, {}),
+    ("LEAPhand_to_sim_ones", lhu.LEAPhand_to_sim_ones, {}),
+    ("LEAPsim_to_LEAPhand", lhu.LEAPsim_to_LEAPhand, {}),
+    ("LEAPhand_to_LEAPsim", lhu.LEAPhand_to_LEAPsim, {}),
+    ("allegro_to_LEAPhand", lhu.allegro_to_LEAPhand, {}),
+    ("LEAPhand_to_allegro", lhu.LEAPhand_to_allegro, {}),
+    ("allegro_to_LEAPhand", lambda x: lhu.allegro_to_LEAPhand(x, zeros=False), {"allegro_zeros": False}),
+    ("allegro_to_LEAPhand", lambda x: lhu.allegro_to_LEAPhand(x, teleop=True), {"allegro_teleop": True}),
+    ("LEAPhand_to_allegro", lambda x: lhu.LEAPhand_to_allegro(x, teleop=True), {"allegro_teleop": True}),
+]
+
+
+def bench(fn, count):
+    best = float("inf")
+    for _ in range(3):
+        start = time.perf_counter()
+        for _ in range(count):
+            fn()
+        best = min(best, time.perf_counter() - start)
+    return best / count
+
+
+def test_conversions(poses):
+    for dtype, tol in ((np.float64, 1e-12), (np.float32, 1e-5)):
+        for name, legacy, kwargs in CONVERSIONS:
+            embodiment = Embodiment(dtype=dtype, **kwargs)
+            convert = getattr(embodiment, name)
+            expected = np.array([legacy(pose) for pose in poses])
+            assert np.allclose(convert(poses[0]), expected[0], atol=tol, rtol=0), f"{name} {kwargs} one pose"
+            batch = convert(poses)
+            assert batch.dtype == dtype and np.allclose(batch, expected, atol=tol, rtol=0), f"{name} {kwargs} batch"
+            buffer = poses.astype(dtype)
+            assert convert(buffer, out=buffer) is buffer and np.allclose(buffer, batch, atol=tol, rtol=0), f"{name} in place"
+
+    embodiment = Embodiment(dtype=np.float64)
+    leap = embodiment.sim_ones_to_LEAPhand(poses)
+    assert np.allclose(embodiment.LEAPhand_to_sim_ones(leap), poses)
+    assert np.allclose(embodiment.convert(poses, "one_range", "LEAPsim"), lhu.LEAPhand_to_LEAPsim(leap))
+    wide = 4 * poses + np.pi
+    assert np.array_equal(embodiment.clip(wide), np.array([lhu.angle_safety_clip(pose) for pose in wide]))
+    print("  conversions match leap_hand_utils (float64 / float32, pose / batch / in place)   ok")
+
+
+def test_limits():
+    assert np.allclose(lhu.sim_ones_to_LEAPhand(np.zeros(16)), lhu.LEAPsim_to_LEAPhand(np.mean(lhu.LEAPsim_limits(), axis=0)))
+    for call in (lambda: lhu.LEAPsim_limits("hack_thumb"), lambda: lhu.sim_ones_to_LEAPhand(np.zeros(16), hack_thumb=True)):
+        try:
+            call()
+        except ValueError:
+            continue
+        raise AssertionError("unknown limits did not raise")
+    print("  LEAPsim_limits: regular works, unknown types raise ValueError   ok")
+
+
+def test_torch(poses):
+    try:
+        import torch
+    except ImportError:
+        print("  (torch not installed, skipping the torch backend)")
+        return
+    numpy_embodiment = Embodiment()
+    torch_embodiment = Embodiment(backend="torch")
+    x = torch.from_numpy(poses.astype(np.float32))
+    for name, _, _ in CONVERSIONS[:6]:
+        expected = getattr(numpy_embodiment, name)(poses)
+        assert np.allclose(getattr(torch_embodiment, name)(x).numpy(), expected, atol=1e-5), name
+    torch_embodiment.clip(x, out=x)
+    assert np.allclose(x.numpy(), numpy_embodiment.clip(poses.astype(np.float32)))
+    print("  torch backend matches numpy   ok")
+
+
+def main():
+    rng = np.random.default_rng(0)
+    poses = rng.uniform(-1.0, 1.0, (BATCH, 16))
+
+    print("Embodiment conversions\n")
+    test_conversions(poses)
+    test_limits()
+    test_torch(poses)
+
+    embodiment = Embodiment()
+    pose = poses[0].astype(np.float32)
+    out = np.empty(16, dtype=np.float32)
+    legacy_pose = bench(lambda: lhu.sim_ones_to_LEAPhand(pose), TICKS)
+    embodiment_pose = bench(lambda: embodiment.sim_ones_to_LEAPhand(pose, out=out), TICKS)
+    batch = poses.astype(np.float32)
+    batch_out = np.empty_like(batch)
+    legacy_batch = bench(lambda: [lhu.sim_ones_to_LEAPhand(p) for p in batch], 3)
+    embodiment_batch = bench(lambda: embodiment.sim_ones_to_LEAPhand(batch, out=batch_out), 50)
+
+    print("\nsim_ones_to_LEAPhand, best of 3\n")
+    print(f"  one pose   leap_hand_utils {legacy_pose * 1e6:9.1f} us   Embodiment {embodiment_pose * 1e6:7.1f} us"
+          f"  ({legacy_pose / embodiment_pose:.1f}x)")
+    print(f"  {BATCH} poses leap_hand_utils {legacy_batch * 1e3:9.1f} ms   Embodiment {embodiment_batch * 1e3:7.2f} ms"
+          f"  ({legacy_batch / embodiment_batch:.0f}x)")
+    assert embodiment_pose < legacy_pose and embodiment_batch < legacy_batch
+    print("\n✅ Embodiment matches leap_hand_utils")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""
+Control-loop rate benchmark: separate write/read calls vs. DynamixelClient.exchange().
+
+Runs a 16-motor LEAP Hand on the simulated bus (fake_dynamixel) and times a
+control tick (command a pose, read back state) done three ways:
+
+- write_desired_pos + read_pos + read_cur   (what teleop did: 3 transactions)
+- write_desired_pos + read_pos_vel_cur      (2 transactions)
+- exchange(pose, fields)                    (2 transactions, prepared packets)
+
+Usage:
+    python ExchangeBenchmark.py [bus_latency_ms]
+
+With a latency of 0 only the Python cost per tick is left.
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+
+from leap_hand_utils import fake_dynamixel
+from leap_hand_utils.dynamixel_client import DEFAULT_POS_SCALE, DynamixelClient
+
+MOTORS = list(range(16))
+TICKS = 2000
+
+
+def bench(name, tick, poses):
+    best = float("inf")
+    for _ in range(3):
+        start = time.perf_counter()
+        for pose in poses:
+            tick(pose)
+        best = min(best, time.perf_counter() - start)
+    per_tick = best / len(poses)
+    print(f"  {name:<44} {per_tick * 1e6:8.0f} us/tick  {1 / per_tick:8.0f} Hz")
+
+
+def main():
+    bus_latency = float(sys.argv[1]) / 1000.0 if len(sys.argv) > 1 else 0.0
+    fake_dynamixel.reset_buses()
+    fake_dynamixel.get_bus("fake-exchange", latency=bus_latency)
+    client = DynamixelClient(MOTORS, "fake-exchange", 4000000, sdk=fake_dynamixel)
+    client.connect()
+    client.set_torque_enabled(MOTORS, True)
+
+    rng = np.random.default_rng(0)
+    ticks = TICKS if bus_latency == 0 else max(50, int(0.5 / bus_latency))
+    poses = np.pi + rng.uniform(-0.5, 0.5, (ticks, len(MOTORS)))
+    print(f"Simulated bus latency {bus_latency * 1000:.1f} ms per read, {ticks} ticks\n")
+
+    def separate_pos_cur(pose):
+        client.write_desired_pos(MOTORS, pose)
+        return client.read_pos(), client.read_cur()
+
+    def separate_pos_vel_cur(pose):
+        client.write_desired_pos(MOTORS, pose)
+        return client.read_pos_vel_cur()
+
+    bench("write_desired_pos + read_pos + read_cur", separate_pos_cur, poses)
+    bench("write_desired_pos + read_pos_vel_cur", separate_pos_vel_cur, poses)
+    bench("exchange(pose, ('pos', 'cur'))", lambda pose: client.exchange(pose, ("pos", "cur")), poses)
+    bench("exchange(pose, ('pos', 'vel', 'cur'))", lambda pose: client.exchange(pose), poses)
+
+    # Both paths must leave the hand in the same state.
+    pos, vel, cur = client.exchange(poses[-1])
+    expected = client.read_pos_vel_cur()
+    assert all(np.array_equal(a, b) for a, b in zip((pos, vel, cur), expected)), "exchange disagrees with read_pos_vel_cur"
+    assert np.allclose(pos, poses[-1], atol=2 * np.pi / 4096), "goal positions not written"
+
+    # Goals are rounded to the nearest tick, as the position writer does.
+    ticks = 2048 + np.arange(len(MOTORS))
+    client.exchange((ticks + 0.9) * DEFAULT_POS_SCALE)
+    bus = fake_dynamixel.get_bus("fake-exchange")
+    goals = [bus.read(motor_id, fake_dynamixel.ADDR_GOAL_POSITION, 4, signed=True) for motor_id in MOTORS]
+    assert goals == (ticks + 1).tolist(), "exchange() truncated the goals"
+    client.disconnect()
+    print("\n✅ exchange() matches the separate calls")
+
+
+if __name__ == "__main__":
+    main()
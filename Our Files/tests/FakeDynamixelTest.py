@@ -0,0 +1,125 @@
+"""
+Self-test for the simulated Dynamixel bus (leap_hand_utils.fake_dynamixel).
+
+Checks, through the real DynamixelClient / LeapNode code paths:
+- LeapNode's init lands in the control table (mode 11, torque 64, gains
+  80/82/84, current limit 102) and EEPROM stays locked while torque is on,
+- ping / readNByteTxRx,
+- the baud-rate latency model: a 16-motor sync read costs what the bytes on
+  the wire cost at 1 Mbps vs 4 Mbps,
+- first-order dynamics: ~63% of a step after one time constant, velocity
+  follows the motion, current saturates at the limit in current-based
+  position mode.
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+
+from LeapHandAPI import LeapNode
+from leap_hand_utils import fake_dynamixel as fd
+from leap_hand_utils.dynamixel_client import DynamixelClient
+
+MOTORS = list(range(16))
+
+
+def connect(port, baudrate=4000000, **bus_kwargs):
+    bus = fd.get_bus(port, **bus_kwargs)
+    client = DynamixelClient(MOTORS, port, baudrate, sdk=fd)
+    client.connect()
+    return bus, client
+
+
+def test_control_table():
+    bus, client = connect("fake-table", latency=0.0)
+    leap_node = LeapNode(dxl_client=client)
+    for motor_id in MOTORS:
+        side = motor_id in (0, 4, 8)
+        assert bus.read(motor_id, fd.ADDR_OPERATING_MODE, 1) == 5
+        assert bus.read(motor_id, fd.ADDR_TORQUE_ENABLE, 1) == 1
+        assert bus.read(motor_id, fd.ADDR_POSITION_P_GAIN, 2) == int(leap_node.kP * (0.75 if side else 1))
+        assert bus.read(motor_id, fd.ADDR_POSITION_I_GAIN, 2) == leap_node.kI
+        assert bus.read(motor_id, fd.ADDR_POSITION_D_GAIN, 2) == int(leap_node.kD * (0.75 if side else 1))
+        assert bus.read(motor_id, fd.ADDR_GOAL_CURRENT, 2) == leap_node.curr_lim
+
+    # Mode is EEPROM: ignored by sync write and refused by TxRx while torque is on.
+    client.sync_write(MOTORS, np.ones(len(MOTORS)) * 3, fd.ADDR_OPERATING_MODE, 1)
+    assert bus.read(0, fd.ADDR_OPERATING_MODE, 1) == 5
+    comm, error = client.packet_handler.write1ByteTxRx(client.port_handler, 0, fd.ADDR_OPERATING_MODE, 3)
+    assert comm == fd.COMM_SUCCESS and error == fd.ERRNUM_ACCESS
+
+    model, comm, _ = client.packet_handler.ping(client.port_handler, 3)
+    assert comm == fd.COMM_SUCCESS and model == fd.DEFAULT_MODEL_NUMBER
+    _, comm, _ = client.packet_handler.ping(client.port_handler, 42)
+    assert comm == fd.COMM_RX_TIMEOUT
+    value, comm, _ = client.packet_handler.read2ByteTxRx(client.port_handler, 2, fd.ADDR_GOAL_CURRENT)
+    assert value == leap_node.curr_lim
+    client.disconnect()
+    print("  control table, EEPROM lock, ping     ok")
+
+
+def test_latency_model():
+    reads = 100
+    for baudrate in (1000000, 4000000):
+        bus, client = connect(f"fake-baud-{baudrate}", baudrate, latency=0.0, simulate_baud=True)
+        client.read_pos_vel_cur()
+        start = time.perf_counter()
+        for _ in range(reads):
+            client.read_pos_vel_cur()
+        measured = (time.perf_counter() - start) / reads
+        # Sync read: 10 + 4 + 16 bytes out, 16 x (11 + 10) bytes back.
+        wire = (10 + 4 + 16 + 16 * (11 + 10)) * 10 / baudrate
+        print(f"  sync read @ {baudrate / 1e6:.0f} Mbps  {measured * 1e6:7.1f} us  (wire {wire * 1e6:6.1f} us)")
+        assert wire <= measured < wire + 0.0015, "sync read time does not follow the baud rate"
+        client.disconnect()
+
+
+def test_dynamics():
+    tau = 0.05
+    bus, client = connect("fake-dynamics", latency=0.0, time_constant=tau)
+    leap_node = LeapNode(dxl_client=client)
+    # Let the hand settle on the home pose, then step every joint by 0.5 rad.
+    time.sleep(0.3)
+    client.read_pos()
+    time.sleep(0.3)
+    start_pos = client.read_pos()
+    goal = start_pos + 0.5
+    leap_node.set_leap(goal)
+    start = time.perf_counter()
+    peak_cur = 0.0
+    vel = np.zeros(len(MOTORS))
+    while time.perf_counter() - start < tau:
+        pos, vel_now, cur = client.read_pos_vel_cur()
+        vel = np.maximum(vel, vel_now)
+        peak_cur = max(peak_cur, np.abs(cur).max())
+        time.sleep(0.001)
+    elapsed = time.perf_counter() - start
+    pos = client.read_pos()
+    fraction = float(np.median((pos - start_pos) / 0.5))
+    expected = 1 - np.exp(-elapsed / tau)
+    print(f"  step response after {elapsed * 1000:.0f} ms: {fraction:.2f} of the step (unsaturated {expected:.2f}), "
+          f"peak current {peak_cur:.0f} mA")
+    assert 0.05 < fraction <= expected + 0.05, "position does not follow a first-order response"
+    assert np.all(vel > 0), "present velocity does not follow the motion"
+    # Current limit 350 (unit ~1 mA, cur scale 1.34 per unit): saturated at the start of the step.
+    assert peak_cur <= leap_node.curr_lim * 1.34 + 1, "current exceeded the limit"
+    time.sleep(20 * tau)
+    client.read_pos()
+    assert np.allclose(client.read_pos(), goal, atol=0.01), "joint did not settle on the goal"
+    client.disconnect()
+
+
+def main():
+    fd.reset_buses()
+    print("Fake Dynamixel bus\n")
+    test_control_table()
+    test_latency_model()
+    test_dynamics()
+    print("\n✅ Fake Dynamixel test passed")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+"""
+Latency and throughput benchmark for the closed force feedback loop:
+LEAP Hand current -> ForceFeedback -> HapticChannel -> glove servos.
+
+Runs the full TeleopEngine against a simulated glove (GloveSimulator) and a
+simulated Dynamixel bus (fake_dynamixel). Every CONTACT_PERIOD the present
+current of one finger's motor is stepped between idle and contact; the
+latency is measured from the step to the first haptic command the glove
+receives with that finger's brake above half scale. The pose loop rate and
+jitter are reported alongside to show the feedback stage does not hold up
+the pose path.
+
+Usage:
+    python ForceFeedbackBenchmark.py [bus_latency_ms]
+
+Linux/macOS only (uses GloveSimulator).
+"""
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+import serial
+
+from glove_utils.feedback import FILTER_EMA, FILTER_MEDIAN, FINGER_MOTORS, ForceFeedback
+from glove_utils.haptics import HAPTIC_FINGER_ORDER, HapticChannel
+from glove_utils.parser import FINGER_NAMES
+from glove_utils.protocol import HapticEncoder, negotiate
+from glove_utils.teleop import TeleopEngine
+from GloveSimulator import GloveSimulator
+from LeapHandAPI import LeapNode
+from leap_hand_utils import fake_dynamixel
+from leap_hand_utils.dynamixel_client import DynamixelClient
+
+RUN_TIME = 4.0
+CONTACT_PERIOD = 0.25            # Time between current steps
+CONTACT_CURRENT = 400            # Raw register value, ~1.44 A after scaling -> full brake
+SEND_INTERVAL = 0.012
+FINGER = 1                       # Index (P)
+CONFIGS = [
+    ("30 Hz, EMA", 1 / 30, FILTER_EMA),
+    ("60 Hz, EMA", 1 / 60, FILTER_EMA),
+    ("60 Hz, median", 1 / 60, FILTER_MEDIAN),
+    ("100 Hz, EMA", 1 / 100, FILTER_EMA),
+]
+
+
+def brake_of(command, letter):
+    """Returns the value for `letter` in an ASCII haptic command, or None."""
+    start = command.find(letter)
+    if start < 0:
+        return None
+    end = start + 1
+    while end < len(command) and command[end].isdigit():
+        end += 1
+    return int(command[start + 1:end])
+
+
+def run(name, feedback_interval, filter_type, bus_latency, port):
+    fake_dynamixel.reset_buses()
+    bus = fake_dynamixel.get_bus(port, latency=bus_latency)
+    client = DynamixelClient(list(range(16)), port, 4000000, sdk=fake_dynamixel)
+    client.connect()
+    leap_node = LeapNode(dxl_client=client)
+    motor = int(FINGER_MOTORS[FINGER])
+    letter = "ABCDE"[HAPTIC_FINGER_ORDER.index(FINGER_NAMES[FINGER])]
+
+    steps = []  # (time, contact)
+    stop = threading.Event()
+
+    def step_current():
+        contact = False
+        while not stop.wait(CONTACT_PERIOD):
+            contact = not contact
+            with bus.lock:
+                bus.write(motor, fake_dynamixel.ADDR_PRESENT_CURRENT, 2, CONTACT_CURRENT if contact else 0)
+            steps.append((time.perf_counter(), contact))
+
+    with GloveSimulator() as sim:
+        glove = serial.Serial(sim.port_name, timeout=0.1)
+        mode, decoder = negotiate(glove)
+        haptics = HapticChannel(glove, HapticEncoder(mode))
+        haptics.start()
+        engine = TeleopEngine(glove, leap_node, decoder=decoder,
+                              process=lambda fingers: fingers / 4095.0,
+                              retarget=lambda sample: np.zeros(16),
+                              feedback=ForceFeedback(filter_type=filter_type),
+                              on_feedback=lambda brakes: brakes is not None and haptics.submit(brakes),
+                              send_interval=SEND_INTERVAL, feedback_interval=feedback_interval)
+        stepper = threading.Thread(target=step_current, daemon=True)
+        transactions = bus.transactions
+        with engine:
+            stepper.start()
+            time.sleep(RUN_TIME)
+            stop.set()
+            stats = engine.stats()
+        transactions = bus.transactions - transactions
+        haptics.stop()
+        glove.close()
+        client.disconnect()
+        commands = list(zip(sim.haptic_times, sim.haptic_commands))
+
+    # First command after each contact step with the finger braked past half scale.
+    latencies = []
+    for step_time, contact in steps:
+        for received, command in commands:
+            brake = brake_of(command, letter)
+            if received < step_time or brake is None:
+                continue
+            if (brake >= 500) == contact:
+                latencies.append(received - step_time)
+                break
+    latencies = np.array(latencies) * 1000.0
+
+    feedback_rate = 1000.0 / stats['feedback_period']['mean_ms']
+    pose_rate = 1000.0 / stats['pose_period']['mean_ms']
+    print(f"  {name:<14} reads {feedback_rate:6.1f} Hz  bus {transactions / RUN_TIME:6.0f} tx/s  "
+          f"haptics {haptics.sent / RUN_TIME:5.1f} Hz  "
+          f"step->glove p50 {np.percentile(latencies, 50):6.1f} ms  p99 {np.percentile(latencies, 99):6.1f} ms  "
+          f"({len(latencies)}/{len(steps)} steps)  "
+          f"pose {pose_rate:5.1f} Hz jitter p99 {stats['pose_jitter']['p99_ms']:5.2f} ms")
+    assert feedback_rate > 0.9 / feedback_interval, f"{name}: feedback loop too slow"
+    assert len(latencies) >= len(steps) - 1, f"{name}: contact steps never reached the glove"
+
+
+def main():
+    bus_latency = float(sys.argv[1]) / 1000.0 if len(sys.argv) > 1 else 0.001
+    print(f"Simulated bus latency {bus_latency * 1000:.1f} ms per transaction, pose loop {1 / SEND_INTERVAL:.1f} Hz\n")
+    for i, (name, interval, filter_type) in enumerate(CONFIGS):
+        run(name, interval, filter_type, bus_latency, f"fake-feedback-{i}")
+    print("\n✅ Force feedback benchmark complete")
+
+
+if __name__ == "__main__":
+    main()
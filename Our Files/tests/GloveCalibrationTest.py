@@ -0,0 +1,164 @@
+"""
+Test for the glove calibration model (glove_utils.calibration).
+
+1. Min/max and percentile bounds, and readings at or above OUTLIER_THRESHOLD
+   masked out per finger.
+2. The fitted curve keeps the end points, evens out a sensor that sits near
+   one end of its range, and never decreases, even at a degree where the raw
+   polynomial wiggles.
+3. begin()/observe(): apply() keeps the previous calibration while the
+   window collects samples, and the new one is swapped in when it closes.
+4. Profiles: save/load round trip, profile names.
+"""
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+
+from glove_utils import calibration as cal
+from glove_utils.calibration import GloveCalibration
+
+FINGERS = 5
+WINDOW = 0.2  # Calibration window in seconds
+
+
+def ramp(low, high, count=1001):
+    return np.repeat(np.linspace(low, high, count)[:, None], FINGERS, axis=1)
+
+
+def test_bounds():
+    samples = ramp(1000, 3000)
+    calibration = GloveCalibration()
+    assert not calibration.calibrated and np.all(calibration.apply(samples[0]) == 0)
+    assert calibration.fit(samples) and calibration.calibrated
+    assert np.allclose(calibration.lower, 1000) and np.allclose(calibration.upper, 3000)
+    assert np.allclose(calibration.apply(np.full(FINGERS, 2000)), 50)
+    assert np.allclose(calibration.apply(np.array([[0] * 5, [5000] * 5])), [[0] * 5, [100] * 5])
+
+    percentile = GloveCalibration(percentiles=(5, 95))
+    percentile.fit(samples)
+    assert np.allclose(percentile.lower, 1100) and np.allclose(percentile.upper, 2900)
+
+    # A glitch on one finger only drops that finger's reading.
+    glitched = samples.copy()
+    glitched[10, 2] = cal.OUTLIER_THRESHOLD
+    glitched[20, 2] = 65535
+    glitched[500, 0] = 0
+    calibration.fit(glitched)
+    assert calibration.upper[2] == 3000 and calibration.lower[2] == 1000
+    assert calibration.lower[0] == 0 and np.all(calibration.upper == 3000)
+
+    # A finger that never moved stays at 0%.
+    flat = samples.copy()
+    flat[:, 4] = 2000
+    calibration.fit(flat)
+    assert np.all(calibration.apply(samples)[:, 4] == 0)
+    print("  min/max and percentile bounds, outliers masked per finger   ok")
+
+
+def test_curve():
+    # Sensor that sits near the low end for most of the motion.
+    rng = np.random.default_rng(0)
+    motion = rng.uniform(0.0, 1.0, (5000, FINGERS))
+    samples = 1000 + 2000 * motion ** 3
+    linear = GloveCalibration()
+    linear.fit(samples)
+    curved = GloveCalibration(curve_degree=3)
+    curved.fit(samples)
+    assert curved.curve.shape == (FINGERS, cal.CURVE_POINTS)
+    assert np.allclose(curved.apply(np.array([[1000] * 5, [3000] * 5])), [[0] * 5, [100] * 5], atol=2)
+    # Evened out: the median sample maps near 50% instead of near 12.5%.
+    median = np.median(samples, axis=0)
+    assert np.all(linear.apply(median) < 20) and np.all(np.abs(curved.apply(median) - 50) < 10)
+
+    # Clustered samples at a high degree: the raw fit goes backwards, the
+    # table does not.
+    clustered = np.concatenate([ramp(1000, 1100, 500), ramp(2900, 3000, 500), ramp(1000, 3000, 20)])
+    wiggly = GloveCalibration(curve_degree=9)
+    wiggly.fit(clustered)
+    grid = np.linspace(0, 1, 201)
+    bend = np.clip((clustered - 1000) / 2000, 0, 1)
+    x = np.concatenate([np.quantile(bend[:, 0], np.linspace(0, 1, 21)), [0.0, 1.0]])
+    y = np.concatenate([np.linspace(0, 1, 21), [0.0, 1.0]])
+    raw = np.polyval(np.polyfit(x, y, 9, w=np.concatenate([np.ones(21), [10.0, 10.0]])), grid)
+    assert np.any(np.diff(raw) < 0), "raw fit is monotonic, the check below proves nothing"
+    sweep = wiggly.apply(1000 + 2000 * np.repeat(grid[:, None], FINGERS, axis=1))
+    assert np.all(np.diff(wiggly.curve, axis=1) >= 0) and np.all(np.diff(sweep, axis=0) >= 0)
+    print("  curve keeps end points, evens out the range, never decreases   ok")
+
+
+def test_window():
+    calibration = GloveCalibration()
+    calibration.fit(ramp(1000, 3000))
+    probe = np.full(FINGERS, 1500)
+    assert not calibration.observe(probe), "observe() outside a window"
+
+    calibration.begin(WINDOW)
+    assert calibration.active
+    closed = 0
+    start = time.monotonic()
+    # The operator sweeps the whole 0-4000 range several times per window.
+    for value in np.tile(np.linspace(0, 4000, 40), 10):
+        # The old calibration applies until the window closes.
+        before = calibration.apply(probe)
+        if calibration.observe(np.full(FINGERS, value)):
+            closed += 1
+            assert time.monotonic() - start >= WINDOW
+        elif closed == 0:
+            assert np.allclose(before, 25) and calibration.active
+        time.sleep(WINDOW / 200)
+    assert closed == 1 and not calibration.active
+    assert np.allclose(calibration.lower, 0) and np.allclose(calibration.upper, 4000)
+    assert np.allclose(calibration.apply(probe), 37.5)
+
+    # A cancelled window leaves the calibration alone.
+    lower, upper = calibration.lower, calibration.upper
+    calibration.begin(0.0)
+    calibration.cancel()
+    assert not calibration.observe(np.full(FINGERS, 9000))
+    assert calibration.lower is lower and calibration.upper is upper
+    print("  window: old calibration applies until the new one is swapped in   ok")
+
+
+def test_profiles():
+    directory = tempfile.mkdtemp()
+    calibration = GloveCalibration(percentiles=(2, 98), curve_degree=3)
+    calibration.fit(1000 + 2000 * np.random.default_rng(1).uniform(0, 1, (2000, FINGERS)) ** 2)
+    path = calibration.save("operator-1", directory)
+    assert path == cal.profile_path("operator-1", directory) and os.path.exists(path)
+    assert cal.list_profiles(directory) == ["operator-1"]
+
+    loaded = GloveCalibration.load("operator-1", directory)
+    assert loaded.percentiles == [2, 98] and loaded.curve_degree == 3 and loaded.calibrated
+    samples = ramp(500, 3500, 101)
+    assert np.array_equal(loaded.apply(samples), calibration.apply(samples))
+
+    for name in ("../escape", "a b", ""):
+        try:
+            cal.profile_path(name, directory)
+            raise AssertionError(f"profile name {name!r} accepted")
+        except ValueError:
+            pass
+    try:
+        GloveCalibration.load("missing", directory)
+        raise AssertionError("missing profile loaded")
+    except FileNotFoundError:
+        pass
+    print("  save/load round trip, profile names   ok")
+
+
+def main():
+    print("Glove calibration\n")
+    test_bounds()
+    test_curve()
+    test_window()
+    test_profiles()
+    print("\n✅ Glove calibration test passed")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+"""
+Microbenchmark: legacy regex parser vs. GloveStreamDecoder vs. decode_buffer.
+
+Usage:
+    python GloveParserBenchmark.py [glove_log.txt ...]
+
+Each log is a raw capture of the glove serial stream (one alpha-encoded line
+per firmware loop). Without arguments a synthetic log from GloveSimulator's
+encoder is used. Before timing, decode_buffer is also checked against the
+streaming decoder on lines the batch validation could mistake for clean ones.
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+
+from glove_utils.parser import (FINGER_NAMES, GloveStreamDecoder, decode_buffer,
+                                frames_to_fingers, parse_raw_data)
+
+SYNTHETIC_LINES = 50000
+CHUNK_SIZE = 256  # Roughly what one serial read returns when the host lags
+
+
+def load_logs(paths):
+    if paths:
+        data = b"".join(open(path, "rb").read() for path in paths)
+        return data, f"{len(paths)} recorded log(s)"
+    from GloveSimulator import LOOP_TIME, encode_line
+    data = "".join(encode_line(i * LOOP_TIME) for i in range(SYNTHETIC_LINES)).encode()
+    return data, "synthetic log"
+
+
+def bench(name, func, num_lines, repeat=3):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    print(f"  {name:<34} {best * 1e9 / num_lines:8.0f} ns/line  {num_lines / best / 1000:8.1f} k lines/s")
+
+
+def legacy(lines):
+    for line in lines:
+        parse_raw_data(line.decode("utf-8").strip())
+
+
+def streaming(lines):
+    decoder = GloveStreamDecoder()
+    for line in lines:
+        decoder.feed(line)
+    return decoder
+
+
+def streaming_chunked(data):
+    decoder = GloveStreamDecoder()
+    for i in range(0, len(data), CHUNK_SIZE):
+        decoder.feed(data[i:i + CHUNK_SIZE])
+    return decoder
+
+
+def check_agreement(lines, data):
+    reference = [parse_raw_data(line.decode("utf-8").strip()) for line in lines]
+    reference = np.array([[values[key] for key in FINGER_NAMES] for values in reference if values])
+    decoder = GloveStreamDecoder()
+    streamed = np.array([decoder.fingers.copy() for line in lines if decoder.feed(line)])
+    assert np.array_equal(reference, streamed), "streaming decoder disagrees with the regex path"
+    assert np.array_equal(reference, frames_to_fingers(decode_buffer(data))), "batch decoder disagrees with the regex path"
+    assert np.array_equal(streaming_chunked(data).fingers, reference[-1]), "chunked decoder lost the newest frame"
+    return len(reference)
+
+
+def check_malformed():
+    good = b"A1B2C3D4E5F6G7P8\n"
+    cases = {
+        "empty field": b"AB2C3D4E5F6G7P8\n",
+        "flag mid-line": b"A1HB2C3D4E5F6G7P8\n",
+        "carriage return mid-line": b"A1\rB2C3D4E5F6G7P8\n",
+        "trailing flags and CR": b"A1B2C3D4E5F6G7P8HK\r\n",
+    }
+    for name, line in cases.items():
+        data = good + line + good.replace(b"1", b"9")
+        decoder = GloveStreamDecoder()
+        streamed = np.array([decoder.frame.copy() for line in data.splitlines(keepends=True) if decoder.feed(line)])
+        assert np.array_equal(decode_buffer(data), streamed), f"batch and streaming decoders disagree: {name}"
+    return len(cases)
+
+
+def main():
+    data, source = load_logs(sys.argv[1:])
+    lines = data.splitlines(keepends=True)
+    print(f"Batch and streaming decoders agree on {check_malformed()} malformed line cases")
+    print(f"Decoding {len(lines)} lines ({len(data)} bytes) from {source}\n")
+
+    bench("legacy regex + dicts", lambda: legacy(lines), len(lines))
+    bench("GloveStreamDecoder, line per read", lambda: streaming(lines), len(lines))
+    bench(f"GloveStreamDecoder, {CHUNK_SIZE} B reads", lambda: streaming_chunked(data), len(lines))
+    bench("decode_buffer (vectorized batch)", lambda: decode_buffer(data), len(lines))
+
+    print(f"\n✅ All decoders agree on {check_agreement(lines, data)} frames")
+
+
+if __name__ == "__main__":
+    main()
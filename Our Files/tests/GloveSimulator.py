@@ -0,0 +1,148 @@
+"""
+Pseudo-terminal stand-in for the LucidGlove ESP32 (Linux/macOS only).
+
+Streams alpha-encoded lines ('A%dB%dC%dD%dE%dF%dG%dP%d' + button flags) every
+LOOP_TIME like the firmware does, and records every haptic command the host
+writes back. Open `sim.port_name` with pyserial exactly like the real COM port.
+
+With binary=True the simulator also answers the binary protocol handshake
+(glove_utils.protocol) and then streams binary packets instead; haptic
+packets are recorded in their ASCII form so both modes can be compared.
+
+Run directly to print the port name and stream until Ctrl+C.
+"""
+import math
+import os
+import pty
+import select
+import sys
+import threading
+import time
+import tty
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from glove_utils import protocol
+
+LOOP_TIME = 0.004   # Matches LOOP_TIME in the firmware's AdvancedConfig.h
+ANALOG_MAX = 4095   # ESP32 ADC range
+
+
+def glove_fields(t, period=2.0):
+    """Returns the eight A..G, P values the firmware would send at time t (all fingers opening and closing)."""
+    bend = 0.5 - 0.5 * math.cos(2 * math.pi * t / period)
+    flexion = [int(bend * ANALOG_MAX * (0.8 + 0.05 * i)) for i in range(5)]
+    trigger = (flexion[1] - ANALOG_MAX // 2) * 2 if flexion[1] > ANALOG_MAX // 2 else 0
+    return flexion + [ANALOG_MAX // 2, ANALOG_MAX // 2, trigger]
+
+
+def encode_line(t, period=2.0):
+    """Returns the ASCII line the firmware would send at time t."""
+    return "A{}B{}C{}D{}E{}F{}G{}P{}\n".format(*glove_fields(t, period))
+
+
+class GloveSimulator:
+    def __init__(self, loop_time=LOOP_TIME, period=2.0, binary=False):
+        self.loop_time = loop_time
+        self.period = period          # Seconds for one full open/close cycle
+        self.binary = binary          # Answer the binary protocol handshake
+        self.mode = protocol.MODE_ASCII
+        self.lines_sent = 0
+        self.malformed = set()        # ASCII line numbers sent without the thumb's digits
+        self.bytes_sent = 0
+        self.haptic_commands = []     # Every line the host wrote to the glove
+        self.haptic_times = []        # time.perf_counter() when each command arrived
+        self._master_fd, self._slave_fd = pty.openpty()
+        tty.setraw(self._slave_fd)
+        self.port_name = os.ttyname(self._slave_fd)
+        self._stop_event = threading.Event()
+        self._threads = [
+            threading.Thread(target=self._stream, daemon=True),
+            threading.Thread(target=self._listen, daemon=True),
+        ]
+
+    def _stream(self):
+        start = time.perf_counter()
+        next_send = start
+        while not self._stop_event.is_set():
+            now = time.perf_counter()
+            if self.mode == protocol.MODE_BINARY:
+                fields = glove_fields(now - start, self.period)
+                data = protocol.encode_glove_frame(fields + [0] * 8, self.lines_sent)
+            else:
+                data = encode_line(now - start, self.period).encode()
+                if self.lines_sent in self.malformed:
+                    data = b"A" + data[data.index(b"B"):]
+            try:
+                os.write(self._master_fd, data)
+            except OSError:
+                break
+            self.lines_sent += 1
+            self.bytes_sent += len(data)
+            next_send += self.loop_time
+            delay = next_send - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+
+    def _listen(self):
+        pending = bytearray()
+        while not self._stop_event.is_set():
+            ready, _, _ = select.select([self._master_fd], [], [], 0.1)
+            if not ready:
+                continue
+            try:
+                pending += os.read(self._master_fd, 1024)
+            except OSError:
+                break
+            now = time.perf_counter()
+            if self.mode == protocol.MODE_BINARY:
+                packets, _ = protocol.split_packets(pending)
+                for packet_type, _, payload in packets:
+                    if packet_type == protocol.PACKET_HAPTICS:
+                        limits = protocol.decode_haptics(payload)
+                        self.haptic_commands.append(protocol.encode_haptics_ascii(limits).decode().strip())
+                        self.haptic_times.append(now)
+                continue
+            *lines, rest = pending.split(b"\n")
+            pending = bytearray(rest)
+            for i, line in enumerate(lines):
+                if self.binary and line + b"\n" == protocol.HELLO:
+                    # The ACK is written before the first binary packet; whatever
+                    # follows the HELLO is already binary.
+                    os.write(self._master_fd, protocol.ACK)
+                    self.mode = protocol.MODE_BINARY
+                    pending = bytearray(b"\n".join(lines[i + 1:] + [rest]))
+                    break
+                self.haptic_commands.append(line.decode())
+                self.haptic_times.append(now)
+
+    def start(self):
+        for thread in self._threads:
+            thread.start()
+        return self
+
+    def stop(self):
+        self._stop_event.set()
+        for thread in self._threads:
+            thread.join(1.0)
+        os.close(self._master_fd)
+        os.close(self._slave_fd)
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *args):
+        self.stop()
+
+
+if __name__ == "__main__":
+    with GloveSimulator() as sim:
+        print(f"✅ Simulated glove streaming on {sim.port_name} (Ctrl+C to stop)")
+        try:
+            while True:
+                time.sleep(1)
+                for command in sim.haptic_commands:
+                    print(f"← Received: {command}")
+                sim.haptic_commands.clear()
+        except KeyboardInterrupt:
+            print("🛑 Exiting...")
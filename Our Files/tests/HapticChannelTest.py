@@ -0,0 +1,88 @@
+"""
+Floods a HapticChannel with haptic updates and checks what reaches the glove.
+
+Runs against GloveSimulator over a pseudo-terminal, once per link mode:
+submits random load updates at ~1 kHz (many of them repeats), then checks
+that the write rate stays under the firmware's hapticInterval, that the
+partial commands add up to the last submitted value, and that every
+submission is accounted for as sent, coalesced or dropped.
+
+Linux/macOS only (uses GloveSimulator).
+"""
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import serial
+
+from glove_utils import protocol
+from glove_utils.haptics import HAPTIC_FINGER_ORDER, HAPTIC_INTERVAL, HapticChannel
+from glove_utils.parser import FINGER_NAMES
+from GloveSimulator import GloveSimulator
+
+TEST_TIME = 2.0
+SUBMIT_INTERVAL = 0.001
+
+
+def apply_command(state, command):
+    """Applies a (possibly partial) ASCII haptic command to the servo state."""
+    letter = None
+    digits = ""
+    for char in command + "\n":
+        if char.isdigit():
+            digits += char
+            continue
+        if letter is not None:
+            state[letter] = int(digits)
+        letter, digits = char, ""
+
+
+def run(binary_glove):
+    rng = random.Random(0)
+    with GloveSimulator(binary=binary_glove) as sim:
+        conn = serial.Serial(sim.port_name, timeout=0.1)
+        mode, _ = protocol.negotiate(conn)
+        channel = HapticChannel(conn, protocol.HapticEncoder(mode))
+        channel.start()
+
+        values = [0] * 5
+        start = time.perf_counter()
+        while time.perf_counter() - start < TEST_TIME:
+            if rng.random() < 0.3:
+                values[rng.randrange(5)] = rng.randrange(0, 1001, 50)
+            channel.submit(values)
+            time.sleep(SUBMIT_INTERVAL)
+        elapsed = time.perf_counter() - start
+        time.sleep(5 * HAPTIC_INTERVAL)
+        channel.stop()
+        time.sleep(0.1)
+        conn.close()
+
+    stats = channel.stats()
+
+    # A legacy glove also receives (and ignores) the negotiation HELLO.
+    commands = [command for command in sim.haptic_commands
+                if command + "\n" != protocol.HELLO.decode()]
+    state = {}
+    for command in commands:
+        apply_command(state, command)
+    expected = dict(zip(FINGER_NAMES, values))
+    glove = {finger: state.get(letter) for letter, finger in zip("ABCDE", HAPTIC_FINGER_ORDER)}
+    assert glove == expected, f"glove has {glove}, expected {expected}"
+    assert stats['sent'] == len(commands), "commands lost on the link"
+    assert stats['sent'] <= elapsed / HAPTIC_INTERVAL + 2, "rate limit exceeded"
+    assert stats['submitted'] == stats['sent'] + stats['coalesced'] + stats['dropped'], \
+        "submissions not accounted for"
+    rate = stats['sent'] / elapsed
+    print(f"✅ {mode}: {stats['submitted']} submitted -> {stats['sent']} sent ({rate:.1f} Hz), "
+          f"{stats['coalesced']} coalesced, {stats['dropped']} dropped, "
+          f"{stats['bytes_sent'] / max(stats['sent'], 1):.1f} bytes/command")
+
+
+if __name__ == "__main__":
+    run(binary_glove=False)
+    run(binary_glove=True)
+    print("\n✅ Haptic channel test complete")
@@ -0,0 +1,145 @@
+"""
+Test + timing for LEAP Hand port discovery (leap_hand_utils.discovery).
+
+Sets up simulated serial ports (fake_dynamixel) where a missing motor costs a
+ping timeout: a glove-like port with no Dynamixels, a 6-motor arm, and the
+16-motor hand. Checks that find_leap_hand():
+- picks the hand and never the arm,
+- probes the ports in parallel (about one timeout, not one per port),
+- caches the port and only pings that one on the next start,
+- falls back to a search when the cached port holds something else,
+- searches again, and refuses to guess, when a second hand shows up,
+- refuses to guess when no port or two ports match,
+- never probes an excluded port (the open glove link), under either name,
+and that /dev/serial/by-id names and the FTDI latency timer are resolved
+from a fake /dev and sysfs tree.
+"""
+import logging
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from leap_hand_utils import discovery
+from leap_hand_utils import fake_dynamixel as fd
+
+MOTORS = list(range(16))
+TIMEOUT = 0.05  # Simulated ping timeout / reply latency
+PORTS = {"fake-glove": [], "fake-arm": list(range(1, 7)), "fake-hand": MOTORS}
+
+
+def setup_buses(ports):
+    fd.reset_buses()
+    return {port: fd.get_bus(port, motor_ids=ids, latency=TIMEOUT) for port, ids in ports.items()}
+
+
+def transactions(buses):
+    return {port: bus.transactions for port, bus in buses.items()}
+
+
+def main():
+    tmp = tempfile.mkdtemp()
+    cache = os.path.join(tmp, "leap_hand_port.json")
+    sysfs = os.path.join(tmp, "sys")
+    print("Port discovery\n")
+
+    # Sequential probing, for comparison: a timeout per empty port plus the hand.
+    buses = setup_buses(PORTS)
+    start = time.perf_counter()
+    for port in PORTS:
+        discovery.probe_port(port, MOTORS, sdk=fd)
+    sequential = time.perf_counter() - start
+
+    start = time.perf_counter()
+    port = discovery.find_leap_hand(MOTORS, candidates=list(PORTS), cache_path=cache, sdk=fd, sysfs_root=sysfs)
+    parallel = time.perf_counter() - start
+    assert port == "fake-hand", port
+    print(f"  search   sequential {sequential * 1000:6.0f} ms   parallel {parallel * 1000:6.0f} ms")
+    assert parallel < sequential - TIMEOUT, "ports were not probed in parallel"
+
+    before = transactions(buses)
+    start = time.perf_counter()
+    assert discovery.find_leap_hand(MOTORS, candidates=list(PORTS), cache_path=cache, sdk=fd, sysfs_root=sysfs) == "fake-hand"
+    cached = time.perf_counter() - start
+    after = transactions(buses)
+    print(f"  cached   {cached * 1000:6.0f} ms")
+    assert after["fake-glove"] == before["fake-glove"] and after["fake-arm"] == before["fake-arm"], \
+        "cached start probed other ports"
+
+    # Replugged: the cached name now belongs to the arm, the hand moved.
+    setup_buses({"fake-glove": [], "fake-arm": MOTORS, "fake-hand": list(range(1, 7))})
+    assert discovery.find_leap_hand(MOTORS, candidates=list(PORTS), cache_path=cache, sdk=fd,
+                                     sysfs_root=sysfs) == "fake-arm"
+    assert discovery.load_cached_port(cache) == "fake-arm"
+    print("  stale cache -> search               ok")
+
+    # A second hand plugged in: the cached one still answers, but the new
+    # port brings back the search, which finds two hands.
+    setup_buses({"fake-glove": [], "fake-arm": MOTORS, "fake-hand": list(range(1, 7)), "fake-hand-2": MOTORS})
+    try:
+        discovery.find_leap_hand(MOTORS, candidates=list(PORTS) + ["fake-hand-2"], cache_path=cache, sdk=fd,
+                                 sysfs_root=sysfs)
+    except OSError:
+        pass
+    else:
+        raise AssertionError("cache picked one of two hands")
+    assert discovery.load_cached_port(cache) == "fake-arm"
+    print("  second hand -> search, refused      ok")
+
+    for ports in ({"fake-glove": [], "fake-arm": list(range(1, 7))}, {"fake-a": MOTORS, "fake-b": MOTORS}):
+        setup_buses(ports)
+        try:
+            discovery.find_leap_hand(MOTORS, candidates=list(ports), cache_path=None, sdk=fd)
+        except OSError as e:
+            print(f"  {'no hand' if 'fake-glove' in ports else 'two hands'}: {e}")
+        else:
+            raise AssertionError("expected OSError")
+
+    # The glove link is open and among the candidates: it must not be touched.
+    buses = setup_buses(PORTS)
+    before = transactions(buses)
+    assert discovery.find_leap_hand(MOTORS, candidates=list(PORTS), cache_path=None, sdk=fd,
+                                     exclude=["fake-glove"]) == "fake-hand"
+    assert transactions(buses)["fake-glove"] == before["fake-glove"], "excluded glove port was probed"
+    print("  glove port excluded, not probed     ok")
+
+    # /dev/serial/by-id and the latency timer, on a fake tree.
+    dev = os.path.join(tmp, "dev")
+    by_id = os.path.join(dev, "serial", "by-id")
+    os.makedirs(by_id)
+    tty = os.path.join(dev, "ttyUSB3")
+    open(tty, "w").close()
+    link = os.path.join(by_id, "usb-FTDI_USB__-__Serial_Converter_FT7W91VW-if00-port0")
+    os.symlink(tty, link)
+    assert discovery.by_id_path(tty, by_id) == link
+    assert discovery.by_id_path(os.path.join(dev, "ttyUSB9"), by_id) == os.path.join(dev, "ttyUSB9")
+    # A glove opened by its by-id name also excludes the tty node, and back.
+    assert discovery.exclude_ports([tty, "fake-hand"], [link]) == ["fake-hand"]
+    assert discovery.exclude_ports([link, "fake-hand"], [tty]) == ["fake-hand"]
+    buses = setup_buses({tty: [], "fake-hand": MOTORS})
+    before = transactions(buses)
+    assert discovery.find_leap_hand(MOTORS, candidates=[tty, "fake-hand"], cache_path=None, sdk=fd,
+                                     exclude=[link]) == "fake-hand"
+    assert transactions(buses)[tty] == before[tty], "glove probed under its tty name"
+
+    timer = discovery.latency_timer_path(link, sysfs)
+    assert timer.endswith(os.path.join("devices", "ttyUSB3", "latency_timer")), timer
+    os.makedirs(os.path.dirname(timer))
+    with open(timer, "w") as f:
+        f.write("16\n")
+    warnings = []
+    handler = logging.Handler()
+    handler.emit = lambda record: warnings.append(record.getMessage())
+    logging.getLogger().addHandler(handler)
+    assert discovery.check_latency_timer(link, sysfs) == 16
+    assert warnings and "16 ms" in warnings[0], warnings
+    assert discovery.read_latency_timer(os.path.join(dev, "ttyUSB9"), sysfs) is None
+    print("  by-id link, latency timer warning   ok")
+
+    print("\n✅ Port discovery test passed")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+"""
+Microbenchmark: per-motor sync_write loop vs. the dirty-checking
+DynamixelPositionWriter behind write_desired_pos().
+
+On a simulated 16-motor bus (fake_dynamixel, no latency) times a goal write
+three ways:
+
+- legacy:     positions / scale -> sync_write (int, to_bytes, addParam per motor)
+- changed:    write_desired_pos with a new pose every tick
+- unchanged:  write_desired_pos with the same pose (plus sub-tick noise),
+              which the writer skips without touching the bus
+
+and checks both paths put the same goal ticks in the control table and that
+the sent / skipped counters add up.
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+
+from leap_hand_utils import fake_dynamixel as fd
+from leap_hand_utils.dynamixel_client import (ADDR_GOAL_POSITION, DEFAULT_POS_SCALE, LEN_GOAL_POSITION,
+                                              DynamixelClient)
+
+MOTORS = list(range(16))
+TICKS = 3000
+
+
+def bench(write, poses):
+    best = float("inf")
+    for _ in range(3):
+        start = time.perf_counter()
+        for pose in poses:
+            write(pose)
+        best = min(best, time.perf_counter() - start)
+    return best / len(poses)
+
+
+def goals(bus):
+    return [bus.read(motor_id, ADDR_GOAL_POSITION, 4, signed=True) for motor_id in MOTORS]
+
+
+def main():
+    fd.reset_buses()
+    bus = fd.get_bus("fake-writer", latency=0.0)
+    client = DynamixelClient(MOTORS, "fake-writer", 4000000, sdk=fd)
+    client.connect()
+    writer = client.position_writer(MOTORS)
+
+    rng = np.random.default_rng(0)
+    # Poses a quarter tick above the grid, so truncation and rounding agree.
+    ticks = rng.integers(1500, 2600, (TICKS, len(MOTORS)))
+    poses = (ticks + 0.25) * DEFAULT_POS_SCALE
+    still = poses[0] + rng.uniform(-0.2, 0.2, (TICKS, len(MOTORS))) * DEFAULT_POS_SCALE
+
+    def legacy(pose):
+        client.sync_write(MOTORS, pose / DEFAULT_POS_SCALE, ADDR_GOAL_POSITION, LEN_GOAL_POSITION)
+
+    legacy(poses[-1])
+    expected = goals(bus)
+    client.write_desired_pos(MOTORS, poses[-1])
+    assert goals(bus) == expected == ticks[-1].tolist(), "writer and sync_write disagree"
+
+    transactions = bus.transactions
+    legacy_time = bench(legacy, poses)
+    sent = writer.sent
+    changed_time = bench(lambda pose: client.write_desired_pos(MOTORS, pose), poses)
+    assert writer.sent - sent == 3 * TICKS, "changed poses were skipped"
+    sent, skipped, transactions = writer.sent, writer.skipped, bus.transactions
+    unchanged_time = bench(lambda pose: client.write_desired_pos(MOTORS, pose), still)
+    assert writer.sent - sent <= 1 and writer.skipped - skipped >= 3 * TICKS - 1, "unchanged poses were sent"
+    assert bus.transactions - transactions <= 1, "skipped writes reached the bus"
+    assert goals(bus) == (ticks[0]).tolist()
+
+    # Anything else writing goals makes the next write go out again.
+    client.exchange(poses[1])
+    assert client.write_desired_pos(MOTORS, poses[0]), "write after exchange() was skipped"
+
+    print(f"{len(MOTORS)} motors, best of 3 x {TICKS} writes\n")
+    print(f"  legacy sync_write        {legacy_time * 1e6:7.1f} us")
+    print(f"  writer, pose changed     {changed_time * 1e6:7.1f} us  ({legacy_time / changed_time:.1f}x)")
+    print(f"  writer, pose unchanged   {unchanged_time * 1e6:7.1f} us  ({legacy_time / unchanged_time:.1f}x)")
+    print(f"  counters: sent {writer.sent}, skipped {writer.skipped}")
+    client.disconnect()
+    print("\n✅ Position writer matches sync_write")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,149 @@
+"""
+Loopback test for the binary glove protocol (glove_utils/protocol.py).
+
+1. Round-trips random glove frames and haptic commands through the encoder
+   and the stream decoder, with random chunking, corrupted and dropped packets.
+2. Negotiates with a simulated glove over a pseudo-terminal: one that speaks
+   the binary protocol and one legacy ASCII-only glove (must fall back).
+3. Compares bytes per frame and host parse cost of the two encodings.
+
+Linux/macOS only (uses GloveSimulator).
+"""
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import serial
+
+from glove_utils import protocol
+from glove_utils.parser import FRAME_SIZE, NUM_FIELDS, GloveStreamDecoder
+from GloveSimulator import GloveSimulator, encode_line, glove_fields
+
+NUM_FRAMES = 20000
+LINK_TEST_TIME = 1.0
+
+
+def random_frame(rng):
+    fields = [rng.randrange(4096) for _ in range(NUM_FIELDS - 1)] + [rng.randrange(8192)]
+    return fields + [int(rng.random() < 0.2) for _ in range(FRAME_SIZE - NUM_FIELDS)]
+
+
+def test_round_trip():
+    rng = random.Random(0)
+    frames = [random_frame(rng) for _ in range(NUM_FRAMES)]
+    packets = [protocol.encode_glove_frame(frame, seq) for seq, frame in enumerate(frames)]
+
+    # One packet per feed: every frame must come back exactly.
+    decoder = protocol.BinaryGloveDecoder()
+    for frame, packet in zip(frames, packets):
+        assert decoder.feed(packet), "packet not decoded"
+        assert decoder.frame.tolist() == frame, "frame mismatch"
+    assert decoder.errors == 0 and decoder.dropped == 0
+
+    # decode_line() takes the same bytes, split anywhere.
+    decoder = protocol.BinaryGloveDecoder()
+    assert not decoder.decode_line(packets[0][:5]) and decoder.decode_line(packets[0][5:])
+    assert decoder.decode_line(packets[1]) and decoder.frame.tolist() == frames[1]
+
+    # Random chunks with noise, corrupted and dropped packets in between.
+    stream = bytearray()
+    expected = []
+    corrupted = dropped = 0
+    for frame, packet in zip(frames, packets):
+        roll = rng.random()
+        if roll < 0.01:
+            dropped += 1
+            continue
+        if roll < 0.02:
+            packet = bytearray(packet)
+            packet[rng.randrange(protocol.HEADER_SIZE, len(packet))] ^= 0x40
+            corrupted += 1
+        elif roll < 0.03:
+            stream += bytes(rng.randrange(256) for _ in range(rng.randrange(1, 8)))
+            expected.append(frame)
+        else:
+            expected.append(frame)
+        stream += packet
+
+    decoder = protocol.BinaryGloveDecoder()
+    decoded = []
+    pos = 0
+    while pos < len(stream):
+        size = rng.randrange(1, 64)
+        if decoder.feed(bytes(stream[pos:pos + size])):
+            decoded.append(decoder.frame.tolist())
+        pos += size
+    # Chunks holding several packets only keep the newest one.
+    assert decoder.frames + decoder.superseded == len(expected), "frames lost in resync"
+    assert all(frame in expected for frame in decoded[-100:]), "decoded a frame that was never sent"
+    assert decoded[-1] == expected[-1], "newest frame lost"
+    assert decoder.errors >= corrupted, "corrupted packets not detected"
+    assert decoder.dropped == dropped + corrupted, "sequence gaps not counted"
+    print(f"✅ Round trip: {NUM_FRAMES} frames, {corrupted} corrupted, {dropped} dropped, "
+          f"{decoder.errors} CRC/sync errors detected")
+
+    encoder = protocol.HapticEncoder(protocol.MODE_BINARY)
+    limits = [700, -1, 0, 1000, 350]
+    packets, errors = protocol.split_packets(bytearray(encoder.encode(limits)))
+    assert errors == 0 and len(packets) == 1
+    assert protocol.decode_haptics(packets[0][2]) == limits
+    assert protocol.encode_haptics_ascii(limits) == b"A700C0D1000E350\n"
+    print("✅ Haptic packets round trip")
+
+
+def run_link(binary_glove):
+    with GloveSimulator(binary=binary_glove) as sim:
+        conn = serial.Serial(sim.port_name, timeout=0.1)
+        try:
+            mode, decoder = protocol.negotiate(conn)
+            expected_mode = protocol.MODE_BINARY if binary_glove else protocol.MODE_ASCII
+            assert mode == expected_mode, f"negotiated {mode}, expected {expected_mode}"
+
+            encoder = protocol.HapticEncoder(mode)
+            conn.write(encoder.encode([100, 200, 300, 400, 500]))
+            deadline = time.time() + LINK_TEST_TIME
+            while time.time() < deadline:
+                decoder.feed(conn.read(conn.in_waiting or 1))
+            time.sleep(0.1)
+        finally:
+            conn.close()
+
+    assert decoder.errors == 0, f"{decoder.errors} decode errors"
+    assert decoder.frames > 0.5 * LINK_TEST_TIME / sim.loop_time, "glove stream too slow"
+    assert decoder.fingers.max() > 0, "no finger data"
+    assert sim.haptic_commands[-1] == "A100B200C300D400E500", sim.haptic_commands
+    print(f"✅ {'Binary' if binary_glove else 'Legacy'} glove: negotiated {mode}, "
+          f"{decoder.frames} frames, {sim.bytes_sent / sim.lines_sent:.1f} bytes/frame")
+
+
+def bench(name, decoder, chunks):
+    best = float("inf")
+    for _ in range(3):
+        decoder.reset()
+        start = time.perf_counter()
+        for chunk in chunks:
+            decoder.feed(chunk)
+        best = min(best, time.perf_counter() - start)
+    size = sum(map(len, chunks)) / len(chunks)
+    print(f"  {name:<8} {size:6.1f} bytes/frame  {best * 1e9 / len(chunks):8.0f} ns/frame")
+
+
+def test_cost():
+    times = [i * 0.004 for i in range(NUM_FRAMES)]
+    ascii_chunks = [encode_line(t).encode() for t in times]
+    binary_chunks = [protocol.encode_glove_frame(glove_fields(t) + [0] * (FRAME_SIZE - NUM_FIELDS), seq)
+                     for seq, t in enumerate(times)]
+    print("\nOne frame per read:")
+    bench("ascii", GloveStreamDecoder(), ascii_chunks)
+    bench("binary", protocol.BinaryGloveDecoder(), binary_chunks)
+
+
+if __name__ == "__main__":
+    test_round_trip()
+    run_link(binary_glove=True)
+    run_link(binary_glove=False)
+    test_cost()
+    print("\n✅ Protocol loopback test complete")
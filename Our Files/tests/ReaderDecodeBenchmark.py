@@ -0,0 +1,75 @@
+"""
+Microbenchmark: vectorized np.frombuffer decode vs. the per-motor getData loop
+in DynamixelReader.
+
+Fills a simulated 16-motor bus (fake_dynamixel, no latency) with random
+signed positions, velocities and currents, then times every reader's read()
+with `vectorized` on and off, and checks both paths return the same data.
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+
+from leap_hand_utils import fake_dynamixel
+from leap_hand_utils.dynamixel_client import (ADDR_PRESENT_CURRENT, ADDR_PRESENT_POSITION,
+                                              ADDR_PRESENT_VELOCITY, DynamixelClient)
+
+MOTORS = list(range(16))
+READS = 3000
+
+
+def bench(reader, vectorized):
+    reader.vectorized = vectorized
+    best = float("inf")
+    for _ in range(3):
+        start = time.perf_counter()
+        for _ in range(READS):
+            reader.read()
+        best = min(best, time.perf_counter() - start)
+    return best / READS
+
+
+def main():
+    fake_dynamixel.reset_buses()
+    bus = fake_dynamixel.get_bus("fake-decode", latency=0.0)
+    rng = np.random.default_rng(0)
+    for motor_id in MOTORS:
+        bus.write(motor_id, ADDR_PRESENT_CURRENT, 2, int(rng.integers(-2000, 2000)) & 0xFFFF)
+        bus.write(motor_id, ADDR_PRESENT_VELOCITY, 4, int(rng.integers(-300, 300)) & 0xFFFFFFFF)
+        bus.write(motor_id, ADDR_PRESENT_POSITION, 4, int(rng.integers(-4096, 8192)) & 0xFFFFFFFF)
+    client = DynamixelClient(MOTORS, "fake-decode", 4000000, sdk=fake_dynamixel)
+    client.connect()  # Torque stays off, so the present values are left alone
+
+    readers = [
+        ("read_pos_vel_cur", client._pos_vel_cur_reader),
+        ("read_pos_vel", client._pos_vel_reader),
+        ("read_pos", client._pos_reader),
+        ("read_vel", client._vel_reader),
+        ("read_cur", client._cur_reader),
+    ]
+    print(f"{len(MOTORS)} motors, best of 3 x {READS} reads\n")
+    print(f"  {'reader':<18} {'getData loop':>14} {'frombuffer':>12} {'speedup':>8}")
+    for name, reader in readers:
+        reader.vectorized = False
+        expected = reader.read()
+        reader.vectorized = True
+        vectorized = reader.read()
+        if isinstance(expected, tuple):
+            assert all(np.array_equal(a, b) for a, b in zip(expected, vectorized)), f"{name}: paths disagree"
+        else:
+            assert np.array_equal(expected, vectorized), f"{name}: paths disagree"
+
+        slow = bench(reader, vectorized=False)
+        fast = bench(reader, vectorized=True)
+        print(f"  {name:<18} {slow * 1e6:11.1f} us {fast * 1e6:9.1f} us {slow / fast:7.1f}x")
+
+    client.disconnect()
+    print("\n✅ Vectorized and per-motor decode agree")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,203 @@
+"""
+Test + benchmark for offline session replay (glove_utils.replay).
+
+1. Records a few seconds of the TeleopEngine (pseudo-terminal glove
+   simulator in ASCII and in binary mode, fake Dynamixel bus, telemetry
+   poller, force feedback) and replays the session: every glove frame the
+   engine decoded is reproduced, every command matches the recorded one
+   for the same frame to an encoder tick (a replay one frame off does not),
+   and the brakes match ForceFeedback run sample by sample. The ASCII
+   session holds a few malformed lines, which both paths skip.
+2. The batch decoders skip corrupt lines / packets and nothing else.
+3. Times each stage on a synthetic 10 minute session in both link modes
+   against the per-frame live path and extrapolates to an hour.
+"""
+import copy
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+import serial
+
+from GloveSimulator import LOOP_TIME, GloveSimulator, encode_line, glove_fields
+from glove_utils.calibration import GloveCalibration
+from glove_utils.feedback import ForceFeedback
+from glove_utils.parser import FRAME_SIZE, GloveStreamDecoder
+from glove_utils.protocol import MODE_ASCII, MODE_BINARY, BinaryGloveDecoder, encode_glove_frame, negotiate
+from glove_utils.recorder import COMMAND, GLOVE, HAND, SessionReader, SessionRecorder
+from glove_utils.replay import Replay, at_ticks, compare_commands, parse, read_glove_bytes
+from glove_utils.retarget import RetargetTable
+from glove_utils.teleop import TeleopEngine
+from leap_hand_utils import fake_dynamixel
+from leap_hand_utils.dynamixel_client import DynamixelClient
+from leap_hand_utils.embodiment import ALLEGRO
+from LeapHandAPI import LeapNode
+
+RUN_TIME = 3.0
+SYNTHETIC_MINUTES = 10
+JOINT_FINGERS = [1, 1, 1, 1, 2, 2, 2, 2, 3, 3, 3, 3, 0, 0, 0, 0]
+MALFORMED_LINES = {100, 101, 400}
+
+
+def models():
+    calibration = GloveCalibration()
+    calibration.fit(np.array([[0] * 5, [3500] * 5]))
+    retarget = RetargetTable.linear(JOINT_FINGERS, np.zeros(16), np.full(16, 1.6), embodiment=ALLEGRO)
+    return calibration, retarget
+
+
+def record(directory, binary):
+    calibration, retarget = models()
+    path = os.path.join(directory, 'binary' if binary else 'ascii')
+    with GloveSimulator(binary=binary) as sim:
+        if not binary:
+            sim.malformed = MALFORMED_LINES
+        glove = serial.Serial(sim.port_name, 115200, timeout=0.1)
+        mode, decoder = negotiate(glove) if binary else (MODE_ASCII, GloveStreamDecoder())
+        assert mode == (MODE_BINARY if binary else MODE_ASCII)
+        client = DynamixelClient(list(range(16)), "fake-replay", 4000000, sdk=fake_dynamixel)
+        client.connect()
+        leap_node = LeapNode(dxl_client=client, poll_rate=100)
+        # Some load on the fingers so the brakes are not all zero.
+        bus = fake_dynamixel.get_bus("fake-replay")
+        for motor_id in range(16):
+            bus.loads[motor_id] = 150 * (motor_id % 5)
+        feedback = ForceFeedback()
+        metadata = {'link_mode': mode, 'calibration': calibration.to_dict(), 'retarget': retarget.to_dict()}
+        with SessionRecorder(path, metadata=metadata) as recorder:
+            engine = TeleopEngine(glove, leap_node, decoder=decoder, process=calibration.apply,
+                                  retarget=retarget, embodiment=retarget.embodiment,
+                                  feedback=feedback, feedback_interval=0.025, recorder=recorder)
+            engine.start()
+            time.sleep(RUN_TIME)
+            engine.stop()
+            leap_node.stop_polling()
+        glove.close()
+    return path
+
+
+def test_session(directory, binary):
+    path = record(directory, binary)
+    session = SessionReader(path)
+    calibration = GloveCalibration.from_dict(session.metadata['calibration'])
+    retarget = RetargetTable.from_dict(session.metadata['retarget'])
+    result = Replay(calibration, retarget, ForceFeedback()).run_session(session)
+
+    glove = session[GLOVE].read()
+    fingers, valid = at_ticks(result.t, result.fingers, glove['t'])
+    assert valid.all() and np.array_equal(fingers, glove['fingers']), "replayed frames differ from the live ones"
+    assert len(result.t) >= len(glove['t'])
+
+    if session.metadata['link_mode'] == MODE_ASCII:
+        assert read_glove_bytes(session)[0].count(b"\nAB") == len(MALFORMED_LINES)
+    comparison = compare_commands(result, session)
+    assert comparison['ticks'] == len(session[COMMAND]) > 0
+    assert comparison['within_tick'] == 1.0, comparison
+    shifted = copy.copy(result)
+    shifted.command = np.roll(result.command, 1, axis=0)
+    assert compare_commands(shifted, session)['within_tick'] < 0.9, "a one-frame shift went unnoticed"
+
+    cur = session[HAND].read(columns=['cur'])['cur']
+    live = ForceFeedback()
+    expected = np.array([live.update(sample) for sample in cur])
+    assert np.abs(result.brakes - expected).max() <= 1, "batched brakes differ from update()"
+
+    replayed = result.save(os.path.join(directory, 'replayed-' + session.metadata['link_mode']))
+    assert np.array_equal(SessionReader(replayed)[COMMAND].read()['pose'], result.command.astype(np.float32))
+    print(f"  {session.metadata['link_mode']:<6}: {len(glove['t'])} live frames of {len(result.t)} replayed, "
+          f"{comparison['ticks']} commands, {100 * comparison['within_tick']:.1f}% within a tick, "
+          f"{len(cur)} brake samples   ok")
+    return path
+
+
+def test_corrupt():
+    lines = [encode_line(i * LOOP_TIME).encode() for i in range(2000)]
+    frames = [glove_fields(i * LOOP_TIME) for i in range(2000)]
+    bad = {5, 700, 1500}
+    data = b"".join(b"A12B\xff" + line if i in bad else line for i, line in enumerate(lines))
+    parsed, ends = parse(b"D12E3\n" + data)
+    expected = np.array([frame for i, frame in enumerate(frames) if i not in bad])
+    assert np.array_equal(parsed[:, :8], expected) and ends[-1] == len(data) + 5
+
+    packets = [encode_glove_frame(list(frame) + [0] * 8, i) for i, frame in enumerate(frames)]
+    data = b"".join(packet[:-1] + b"\x00" if i in bad else packet for i, packet in enumerate(packets))
+    parsed, ends = parse(b"\x5a\x01" + data, MODE_BINARY)
+    assert np.array_equal(parsed[:, :8], expected)
+    print("  corrupt lines and packets are skipped, nothing else   ok")
+
+
+def synthetic(mode):
+    count = int(SYNTHETIC_MINUTES * 60 / LOOP_TIME)
+    t = np.arange(count) * LOOP_TIME
+    period = 2.0
+    bend = 0.5 - 0.5 * np.cos(2 * np.pi * t / period)
+    fields = np.empty((count, FRAME_SIZE), dtype=np.int64)
+    fields[:, :5] = (bend[:, None] * 4095 * (0.8 + 0.05 * np.arange(5))).astype(np.int64)
+    fields[:, 5:7] = 2047
+    fields[:, 7] = np.where(fields[:, 1] > 2047, (fields[:, 1] - 2047) * 2, 0)
+    fields[:, 8:] = 0
+    if mode == MODE_BINARY:
+        reads = [encode_glove_frame(row, i) for i, row in enumerate(fields)]
+    else:
+        reads = [b"A%dB%dC%dD%dE%dF%dG%dP%d\n" % tuple(row[:8]) for row in fields]
+    # One read per frame, as the engine receives them.
+    return b"".join(reads), np.cumsum([len(read) for read in reads]), t
+
+
+def live_path(data, mode, calibration, retarget, count):
+    """Per-frame cost of what the engine runs, without the bus."""
+    decoder = BinaryGloveDecoder() if mode == MODE_BINARY else GloveStreamDecoder()
+    size = len(data) // (len(data) // 23 if mode == MODE_BINARY else data.count(b"\n"))
+    replay = Replay(calibration, retarget)
+    embodiment = replay.embodiment
+    start = time.perf_counter()
+    for i in range(count):
+        if decoder.feed(data[i * size:(i + 1) * size]):
+            pose = retarget(calibration.apply(decoder.fingers))
+            embodiment.clip(embodiment.convert(pose, retarget.embodiment, "LEAPhand"))
+    return (time.perf_counter() - start) / count
+
+
+def bench():
+    calibration, retarget = models()
+    print(f"\n  synthetic {SYNTHETIC_MINUTES} min sessions ({1 / LOOP_TIME:.0f} Hz glove), best of 3:")
+    for mode in (MODE_ASCII, MODE_BINARY):
+        data, ends, t = synthetic(mode)
+        best = None
+        for _ in range(3):
+            result = Replay(calibration, retarget).run(data, mode, ends, t)
+            if best is None or sum(result.timings.values()) < sum(best.timings.values()):
+                best = result
+        assert len(best.t) == len(t) and np.array_equal(best.t, t)
+        total = sum(best.timings.values())
+        live = live_path(data, mode, calibration, retarget, 5000)
+        stages = ", ".join(f"{stage} {seconds * 1e3:.0f} ms" for stage, seconds in best.timings.items())
+        print(f"    {mode:<6} {len(data) / 1e6:5.1f} MB, {len(t)} frames: {stages}")
+        print(f"           {total / len(t) * 1e9:.0f} ns/frame vs {live * 1e9:.0f} ns/frame live path "
+              f"({live * len(t) / total:.0f}x), one hour in {total * 60 / SYNTHETIC_MINUTES:.1f} s")
+        assert total * 60 / SYNTHETIC_MINUTES < 30.0, "an hour of glove data takes longer than 30 s"
+        assert total < live * len(t)
+
+
+def main():
+    directory = tempfile.mkdtemp()
+    print("Session replay\n")
+    ascii_path = test_session(directory, binary=False)
+    test_session(directory, binary=True)
+    test_corrupt()
+    tool = subprocess.run([sys.executable, "-m", "glove_utils.replay", ascii_path, "-o", os.path.join(directory, "cli")],
+                          cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                          capture_output=True, text=True)
+    assert tool.returncode == 0 and "within one encoder tick" in tool.stdout, tool.stdout + tool.stderr
+    print("  replay tool runs   ok")
+    bench()
+    print("\n✅ Session replay test passed")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+"""
+Test for lookup-table retargeting (glove_utils.retarget).
+
+Builds a synthetic recording: five fingers moving independently and a hand
+whose joints follow them through nonlinear curves (plus the ring finger's
+MCP side joint following the pinky, which the fixed linear gains ignore),
+with sensor noise. Checks that:
+- fit_retarget picks the right driving finger for every moving joint,
+- the fitted tables (linear and PCHIP) track the true curves far better
+  than the best straight line from open to closed,
+- a linear table reproduces the straight line exactly,
+- batched and per-sample evaluation agree, profiles round-trip through
+  JSON, and the fitting tool runs from the command line,
+then times one tick and a batch.
+"""
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+
+from glove_utils.retarget import LINEAR, PCHIP, RetargetTable, fit_retarget
+
+SAMPLES = 20000
+NOISE = 0.01  # rad
+TICKS = 20000
+
+# Joint -> driving finger (Thumb, Index, Middle, Ring, Pinky); -1 holds still.
+TRUE_FINGERS = np.array([-1, 1, 1, 1, -1, 2, 2, 2, 4, 3, 3, 3, 0, 0, 0, 0])
+
+
+def true_pose(glove):
+    """A hand that curls nonlinearly with the glove, in LEAP radians."""
+    b = np.clip(glove / 100.0, 0.0, 1.0)
+    pose = np.full((len(b), 16), np.pi)
+    for joint, finger in enumerate(TRUE_FINGERS):
+        if finger < 0:
+            continue
+        x = b[:, finger]
+        if joint in (1, 5, 9):      # MCP: slow start, then fast
+            pose[:, joint] += 1.6 * x ** 2
+        elif joint == 8:            # Ring side joint spreads with the pinky
+            pose[:, joint] -= 0.3 * x
+        elif joint >= 12:           # Thumb: saturating
+            pose[:, joint] += 1.2 * np.sin(0.5 * np.pi * x) - (0.5 if joint == 12 else 0.0)
+        else:                       # PIP / DIP: S-curve
+            pose[:, joint] += 1.4 * (3 * x ** 2 - 2 * x ** 3)
+    return pose
+
+
+def recording(rng):
+    walk = np.cumsum(rng.normal(0.0, 3.0, (SAMPLES, 5)), axis=0)
+    glove = 50.0 + 50.0 * np.sin(walk / 40.0 + rng.uniform(0, 2 * np.pi, 5))
+    return glove, true_pose(glove) + rng.normal(0.0, NOISE, (SAMPLES, 16))
+
+
+def main():
+    rng = np.random.default_rng(0)
+    glove, hand = recording(rng)
+    grid = np.repeat(np.linspace(0.0, 100.0, 201)[:, None], 5, axis=1)
+    truth = true_pose(grid)
+
+    print("Retargeting tables\n")
+    # Best straight line per joint: the fixed-gain approach at its best.
+    line = RetargetTable.linear(np.where(TRUE_FINGERS < 0, 0, TRUE_FINGERS), truth[0], truth[-1])
+    line_error = np.abs(line(grid) - truth).max()
+
+    for interpolation in (LINEAR, PCHIP):
+        table = fit_retarget(glove, hand, interpolation=interpolation)
+        moving = TRUE_FINGERS >= 0
+        assert np.array_equal(table.joint_fingers[moving], TRUE_FINGERS[moving]), table.joint_fingers
+        error = np.abs(table(grid) - truth).max()
+        print(f"  {interpolation:<7} max error {error:.4f} rad  (straight line {line_error:.4f} rad),"
+              f" fit rms <= {table.residual_rms.max():.4f} rad")
+        assert error < 0.05 and error < line_error / 3, "table does not follow the curves"
+        assert table.residual_rms.max() < 2 * NOISE
+
+    b = rng.uniform(0, 100, (100, 5))
+    expected = truth[0] + (truth[-1] - truth[0]) * b[:, np.where(TRUE_FINGERS < 0, 0, TRUE_FINGERS)] / 100.0
+    assert np.allclose(line(b), expected), "linear table is not a straight line"
+    assert np.allclose(table(np.array([-20.0, 0, 0, 0, 130.0])), table(np.array([0.0, 0, 0, 0, 100.0]))), "no clamping"
+
+    batch = table(glove[:500])
+    single = np.array([table(sample) for sample in glove[:500]])
+    assert np.allclose(batch, single), "batched and per-sample evaluation differ"
+    print("  driving fingers found (pinky -> ring side joint), straight lines exact, batch == per sample   ok")
+
+    directory = tempfile.mkdtemp()
+    table.save("test", directory)
+    loaded = RetargetTable.load("test", directory)
+    assert np.array_equal(loaded(glove[:100]), table(glove[:100]))
+    path = os.path.join(directory, "session.npz")
+    np.savez(path, glove=glove, hand=hand)
+    tool = subprocess.run([sys.executable, "-m", "glove_utils.retarget", path, "--name", "cli", "-d", directory],
+                          cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                          capture_output=True, text=True)
+    assert tool.returncode == 0, tool.stderr
+    assert np.allclose(RetargetTable.load("cli", directory)(grid), fit_retarget(glove, hand, interpolation=PCHIP)(grid))
+    print("  profiles round-trip, fitting tool runs   ok")
+
+    out = np.empty(16)
+    sample = glove[0]
+    best = float("inf")
+    for _ in range(3):
+        start = time.perf_counter()
+        for _ in range(TICKS):
+            table(sample, out)
+        best = min(best, time.perf_counter() - start)
+    start = time.perf_counter()
+    table(glove)
+    batch_time = time.perf_counter() - start
+    print(f"\n  one tick {best / TICKS * 1e6:.1f} us,  {SAMPLES} samples in {batch_time * 1e3:.1f} ms")
+    print("\n✅ Retargeting test passed")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,181 @@
+"""
+Test + microbenchmark for the session recorder (glove_utils.recorder).
+
+1. Rows recorded from three producer threads come back identical through
+   SessionReader, across chunk boundaries, by row and by time; a session
+   that was not closed yet shows every chunk written so far.
+2. With the writer stalled, rows are dropped and counted, never blocking.
+3. Times one record() per stream (best of 3) against the 12 ms pose tick.
+4. Runs the TeleopEngine with a recorder (pseudo-terminal glove simulator,
+   fake Dynamixel bus, 100 Hz telemetry poller) and checks that every
+   glove frame, pose and poll landed in the session at the usual loop rate.
+"""
+import os
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+import serial
+
+from GloveSimulator import GloveSimulator
+from glove_utils.recorder import COMMAND, GLOVE, HAND, SessionReader, SessionRecorder
+from glove_utils.teleop import TeleopEngine
+from leap_hand_utils import fake_dynamixel
+from leap_hand_utils.dynamixel_client import DynamixelClient
+from LeapHandAPI import LeapNode
+
+ROWS = 10000
+CHUNK_ROWS = 512
+TICKS = 20000
+SEND_INTERVAL = 0.012
+RUN_TIME = 3.0
+
+
+def produce(recorder, stream, data):
+    for row in range(ROWS):
+        recorder.record(stream, data['t'][row], *(data[column][row] for column in data if column != 't'))
+
+
+def synthetic(rng):
+    t = np.cumsum(rng.uniform(0.001, 0.02, ROWS))
+    return {
+        GLOVE: {'t': t, 'fingers': rng.integers(0, 4096, (ROWS, 5), dtype=np.int32),
+                'bend': rng.uniform(0, 100, (ROWS, 5)).astype(np.float32)},
+        COMMAND: {'t': t + 0.001, 'pose': rng.uniform(2, 4, (ROWS, 16)).astype(np.float32), 'frame_t': t[:, None]},
+        HAND: {'t': t + 0.002, **{column: rng.normal(0, 1, (ROWS, 16)).astype(np.float32)
+                                  for column in ('pos', 'vel', 'cur')}},
+    }
+
+
+def test_round_trip(directory):
+    data = synthetic(np.random.default_rng(0))
+    path = os.path.join(directory, 'round-trip')
+    # Producers run flat out here, far above the teleop rates: enough chunks
+    # that the writer never has to keep up for the data to round-trip.
+    recorder = SessionRecorder(path, chunk_rows=CHUNK_ROWS, num_chunks=ROWS // CHUNK_ROWS + 2)
+    recorder.start()
+    threads = [threading.Thread(target=produce, args=(recorder, stream, data[stream])) for stream in data]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    # Not closed yet: the full chunks are readable, the partial ones pending.
+    while recorder.stats()['chunks_written'] < 3 * (ROWS // CHUNK_ROWS):
+        time.sleep(0.01)
+    live = SessionReader(path)
+    assert len(live[GLOVE]) == ROWS // CHUNK_ROWS * CHUNK_ROWS
+    recorder.close()
+    stats = recorder.stats()
+    assert all(dropped == 0 for dropped in stats['dropped'].values()), stats
+
+    session = SessionReader(path)
+    assert all(session.metadata['rows'][stream] == ROWS for stream in data)
+    for stream, columns in data.items():
+        reader = session[stream]
+        assert len(reader) == ROWS
+        full = reader.read()
+        for column, values in columns.items():
+            assert np.array_equal(full[column], values), (stream, column)
+        window = reader[CHUNK_ROWS - 7:3 * CHUNK_ROWS + 5]
+        assert np.array_equal(window['t'], columns['t'][CHUNK_ROWS - 7:3 * CHUNK_ROWS + 5])
+        t0, t1 = columns['t'][1234] - 1e-6, columns['t'][5678] + 1e-6
+        between = reader.between(t0, t1, columns=[reader.columns[-1]])
+        assert set(between) == {'t', reader.columns[-1]}
+        assert np.array_equal(between[reader.columns[-1]], columns[reader.columns[-1]][1234:5679])
+        assert len(reader.between(columns['t'][-1] + 1, columns['t'][-1] + 2)['t']) == 0
+        chunks = list(reader.chunks())
+        assert len(chunks) == -(-ROWS // CHUNK_ROWS) and isinstance(chunks[0]['t'], np.memmap)
+    assert abs(session.to_wall_time(session.metadata['start_perf_counter']) - session.metadata['start_time']) < 1e-6
+    print(f"  {ROWS} rows x 3 streams from 3 threads, read back by row, time and chunk   ok")
+
+
+def test_drops():
+    recorder = SessionRecorder(tempfile.mkdtemp(), chunk_rows=16, num_chunks=2)
+    # Writer never started: both chunks fill up, then rows are dropped.
+    start = time.perf_counter()
+    accepted = sum(recorder.record(COMMAND, float(row), np.zeros(16), 0.0) for row in range(100))
+    assert time.perf_counter() - start < 0.5
+    assert accepted == 32 and recorder.stats()['dropped'][COMMAND] == 68
+    print("  writer stalled: 68 of 100 rows dropped and counted, caller never blocks   ok")
+
+
+def bench_record(directory):
+    recorder = SessionRecorder(os.path.join(directory, 'bench'))
+    recorder.start()
+    fingers, bend, pose = np.zeros(5, np.int32), np.zeros(5), np.zeros(16)
+    hand = np.zeros(16, np.float32)
+    calls = {
+        GLOVE: lambda t: recorder.record(GLOVE, t, fingers, bend),
+        COMMAND: lambda t: recorder.record(COMMAND, t, pose, t),
+        HAND: lambda t: recorder.record(HAND, t, hand, hand, hand),
+    }
+    times = {}
+    for stream, call in calls.items():
+        best = float("inf")
+        for _ in range(3):
+            start = time.perf_counter()
+            for tick in range(TICKS):
+                call(float(tick))
+            best = min(best, time.perf_counter() - start)
+        times[stream] = best / TICKS
+    recorder.close()
+    assert sum(recorder.stats()['dropped'].values()) == 0
+    per_tick = sum(times.values())
+    print("\n  record() " + ", ".join(f"{stream} {t * 1e6:.1f} us" for stream, t in times.items())
+          + f": {100 * per_tick / SEND_INTERVAL:.3f}% of a {SEND_INTERVAL * 1e3:.0f} ms tick")
+    assert per_tick < 0.01 * SEND_INTERVAL, "recording costs more than 1% of a tick"
+
+
+def test_engine(directory):
+    path = os.path.join(directory, 'teleop')
+    with GloveSimulator() as sim:
+        glove = serial.Serial(sim.port_name, 115200, timeout=0.1)
+        client = DynamixelClient(list(range(16)), "fake-recorder", 4000000, sdk=fake_dynamixel)
+        client.connect()
+        leap_node = LeapNode(dxl_client=client, poll_rate=100)
+        with SessionRecorder(path) as recorder:
+            engine = TeleopEngine(glove, leap_node, process=lambda fingers: fingers / 40.95,
+                                  retarget=lambda sample: np.full(16, 0.01) * sample[[0, 1, 2, 3] * 4],
+                                  send_interval=SEND_INTERVAL, recorder=recorder)
+            engine.start()
+            time.sleep(RUN_TIME)
+            engine.stop()
+            leap_node.stop_polling()
+        glove.close()
+    assert leap_node.recorder is None
+
+    stats = engine.stats()
+    session = SessionReader(path)
+    rate = 1000.0 / stats["pose_period"]["mean_ms"]
+    print(f"\n  teleop {RUN_TIME:.0f} s: {rate:.1f} Hz, jitter p99 {stats['pose_jitter']['p99_ms']:.2f} ms, "
+          f"recorded glove {len(session[GLOVE])}, command {len(session[COMMAND])}, hand {len(session[HAND])}")
+    assert abs(rate - 1.0 / SEND_INTERVAL) < 5.0, "pose loop is not at SEND_INTERVAL"
+    assert len(session[GLOVE]) == stats['glove_frames'] > 0
+    assert len(session[COMMAND]) == stats['poses_sent'] > 0
+    assert len(session[HAND]) == leap_node.polls > 0
+    assert sum(stats['recorder']['dropped'].values()) == 0
+    glove_rows = session[GLOVE].read()
+    assert np.allclose(glove_rows['bend'], glove_rows['fingers'] / 40.95, atol=1e-3)
+    # Each command names the glove read of the frame it was computed from.
+    assert np.all(np.isin(session[COMMAND].read(columns=['frame_t'])['frame_t'][:, 0], glove_rows['t']))
+    assert np.all(np.diff(session[HAND].read(columns=[])['t']) > 0)
+    print("  every glove frame, pose and telemetry poll recorded   ok")
+
+
+def main():
+    directory = tempfile.mkdtemp()
+    print("Session recorder\n")
+    test_round_trip(directory)
+    test_drops()
+    bench_record(directory)
+    test_engine(directory)
+    print("\n✅ Session recorder test passed")
+
+
+if __name__ == "__main__":
+    main()
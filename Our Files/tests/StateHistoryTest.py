@@ -0,0 +1,148 @@
+"""
+Test + microbenchmark for the reading history behind the leap_history
+services (leap_hand_utils.history).
+
+1. last(k) returns the newest k samples oldest first, before and after the
+   ring wraps around, and copies (later appends don't change them).
+2. A reader taking windows while a 100 Hz control loop (fake Dynamixel bus)
+   appends gets whole rows only, never half of one update.
+3. Times append() against the control tick and last(K), and compares the
+   float64 and float32 response sizes.
+"""
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+
+from leap_hand_utils import fake_dynamixel
+from leap_hand_utils.control_loop import HandControlLoop
+from leap_hand_utils.dynamixel_client import DynamixelClient
+from leap_hand_utils.embodiment import CommandWriter, Embodiment
+from leap_hand_utils.history import StateHistory
+
+CAPACITY = 1000
+WINDOW = 50
+CONTROL_RATE = 100.0
+RUN_TIME = 2.0
+CALLS = 20000
+MOTORS = list(range(16))
+
+
+def row(i):
+    values = np.full(16, i, dtype=np.float32)
+    return float(i), values, values + 0.5, -values
+
+
+def test_window():
+    history = StateHistory(16, capacity=8)
+    assert len(history) == 0 and len(history.last(5)[0]) == 0
+    for i in range(5):
+        history.append(*row(i))
+    t, pos, vel, cur = history.last(3)
+    assert t.tolist() == [2, 3, 4] and pos.shape == (3, 16) and np.all(vel[:, 0] == [2.5, 3.5, 4.5])
+    assert history.last(0)[0].tolist() == [0, 1, 2, 3, 4] and history.last(100)[0].tolist() == [0, 1, 2, 3, 4]
+    for i in range(5, 21):
+        history.append(*row(i))
+    t, pos, vel, cur = history.last(0)
+    assert len(history) == 8 and t.tolist() == list(range(13, 21))
+    assert np.all(pos[:, 0] == t) and np.all(cur[:, -1] == -t)
+    window = history.last(4)
+    history.append(*row(21))
+    assert window[0].tolist() == [17, 18, 19, 20], "window changed after an append"
+    try:
+        StateHistory(16, capacity=0)
+        raise AssertionError("empty history accepted")
+    except ValueError:
+        pass
+    print("  newest k oldest first, across the wrap, copied out   ok")
+
+
+def test_control_loop():
+    client = DynamixelClient(MOTORS, "fake-history", 4000000, sdk=fake_dynamixel)
+    client.connect()
+    client.set_torque_enabled(MOTORS, True)
+    loop = HandControlLoop(client, CommandWriter(Embodiment(allegro_zeros=False, dtype=np.float64),
+                                                 client.position_writer(MOTORS)), MOTORS)
+    history = StateHistory(len(MOTORS), CAPACITY)
+    stop = threading.Event()
+    windows = []
+
+    def control():
+        # As the ROS 2 node's control timer: tick, then buffer the reading.
+        interval = 1.0 / CONTROL_RATE
+        next_tick = time.perf_counter()
+        while not stop.is_set():
+            loop.submit(np.full(16, 3.14 + 0.3 * np.sin(next_tick)))
+            state = loop.tick()
+            history.append(state.timestamp, state.pos, state.vel, state.cur)
+            next_tick += interval
+            time.sleep(max(0.0, next_tick - time.perf_counter()))
+
+    def query():
+        while not stop.is_set():
+            windows.append(history.last(WINDOW))
+            time.sleep(0.001)
+
+    threads = [threading.Thread(target=control), threading.Thread(target=query)]
+    for thread in threads:
+        thread.start()
+    time.sleep(RUN_TIME)
+    stop.set()
+    for thread in threads:
+        thread.join()
+
+    # Every tick fits in the buffer, so no row is overwritten: each row of
+    # each window must equal the final buffer's row for its timestamp.
+    t, pos, _, _ = history.last(0)
+    assert len(t) == history.appended >= 0.9 * RUN_TIME * CONTROL_RATE
+    by_time = dict(zip(t.tolist(), map(tuple, pos)))
+    for window_t, window_pos, _, _ in windows:
+        assert np.all(np.diff(window_t) > 0) and len(window_t) <= WINDOW
+        for stamp, values in zip(window_t.tolist(), window_pos):
+            assert by_time[stamp] == tuple(values), "torn row in a window"
+    print(f"  {len(windows)} windows of {WINDOW} taken during {history.appended} control ticks, no torn rows   ok")
+
+
+def bench():
+    history = StateHistory(16, CAPACITY)
+    pos = np.zeros(16, dtype=np.float32)
+    best = float("inf")
+    for _ in range(3):
+        start = time.perf_counter()
+        for i in range(CALLS):
+            history.append(float(i), pos, pos, pos)
+        best = min(best, time.perf_counter() - start)
+    append = best / CALLS
+
+    best = float("inf")
+    for _ in range(3):
+        start = time.perf_counter()
+        for _ in range(CALLS // 10):
+            history.last(WINDOW)
+        best = min(best, time.perf_counter() - start)
+    window = best / (CALLS // 10)
+
+    t, pos, vel, cur = history.last(WINDOW)
+    size64 = t.nbytes + 3 * pos.astype(np.float64).nbytes
+    size32 = t.nbytes + 3 * pos.nbytes
+    print(f"\n  append() {append * 1e6:.1f} us ({100 * append * CONTROL_RATE:.3f}% of a "
+          f"{1e3 / CONTROL_RATE:.0f} ms tick), last({WINDOW}) {window * 1e6:.1f} us")
+    print(f"  {WINDOW} sample response: {size64} bytes float64, {size32} bytes float32 "
+          f"(vs {WINDOW} service round trips)")
+    assert append * CONTROL_RATE < 0.01, "buffering costs more than 1% of a tick"
+
+
+def main():
+    print("State history\n")
+    test_window()
+    test_control_loop()
+    bench()
+    print("\n✅ State history test passed")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,172 @@
+"""
+Test for the multi-pair teleop station (glove_utils.station).
+
+1. Two glove -> hand pairs (pseudo-terminal glove simulators, fake Dynamixel
+   buses on their own ports) run side by side, each with its own threads,
+   calibration, retargeting and stats.
+2. One pair is then slowed down (glove streaming at 10 Hz, 20 ms bus round
+   trips): its own loop overruns, the other keeps its pose rate, jitter and
+   glove -> hand latency.
+3. Hand discovery is told to skip every pair's glove port.
+4. close() releases the hands; duplicate pair names and several pairs
+   left to discover their hand are refused; a pair failing to open closes
+   the pairs that did open.
+"""
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+
+from GloveSimulator import GloveSimulator
+from glove_utils.calibration import GloveCalibration
+from glove_utils.feedback import ForceFeedback
+from glove_utils.retarget import RetargetTable
+from glove_utils.station import TeleopPair, TeleopStation, open_glove
+from leap_hand_utils import fake_dynamixel
+from leap_hand_utils.dynamixel_client import DynamixelClient
+from leap_hand_utils.embodiment import ALLEGRO
+from LeapHandAPI import LeapNode
+
+RUN_TIME = 3.0
+SEND_INTERVAL = 0.012
+STATS_WINDOW = 200  # Pose ticks in the stats, about 2.4 s: each phase mostly sees its own
+JOINT_FINGERS = [1, 1, 1, 1, 2, 2, 2, 2, 3, 3, 3, 3, 0, 0, 0, 0]
+SLOW_LOOP_TIME = 0.1    # Glove stream of the slowed pair (a stalling Bluetooth link)
+SLOW_BUS_LATENCY = 0.02  # Round trip per reply on the slowed pair's bus
+EXCLUDED = {}  # Hand port -> ports the pair told discovery to skip
+
+
+def fake_hand(port, exclude):
+    EXCLUDED[port] = list(exclude)
+    client = DynamixelClient(list(range(16)), port, 4000000, sdk=fake_dynamixel)
+    client.connect()
+    return LeapNode(dxl_client=client)
+
+
+def make_pair(name, glove_port, gain):
+    # Profile names nobody has saved, so the pairs start from the defaults.
+    profile = f"station-test-{os.getpid()}-{name}"
+    pair = TeleopPair(name, glove_port, hand_port="fake-station-" + name,
+                      calibration_profile=profile, retarget_profile=profile,
+                      default_retarget=RetargetTable.linear(JOINT_FINGERS, np.zeros(16),
+                                                            np.full(16, gain), embodiment=ALLEGRO),
+                      binary_protocol=False, send_interval=SEND_INTERVAL,
+                      force_feedback=ForceFeedback(), stats_window=STATS_WINDOW, glove_opener=open_glove, hand_opener=fake_hand)
+    return pair
+
+
+def calibrate(pair):
+    calibration = GloveCalibration()
+    calibration.fit(np.array([[0] * 5, [3500] * 5]))
+    pair.calibration = calibration
+
+
+def summary(name, stats):
+    rate = 1000.0 / stats["pose_period"]["mean_ms"]
+    return (f"    {name:<6} {rate:5.1f} Hz, jitter p99 {stats['pose_jitter']['p99_ms']:5.2f} ms, "
+            f"overruns {stats['pose_overruns']:3d}, latency p99 {stats['latency']['p99_ms']:6.1f} ms, "
+            f"glove frames {stats['glove_frames']}"), rate
+
+
+def run(station):
+    time.sleep(RUN_TIME)
+    results = {}
+    for name, stats in station.stats().items():
+        line, rate = summary(name, stats)
+        print(line)
+        results[name] = (stats, rate)
+    return results
+
+
+def test_pairs():
+    with GloveSimulator() as left_sim, GloveSimulator() as right_sim:
+        station = TeleopStation([make_pair("left", left_sim.port_name, 1.0),
+                                 make_pair("right", right_sim.port_name, 1.6)])
+        station.open()
+        try:
+            gloves = {left_sim.port_name, right_sim.port_name}
+            assert all(set(EXCLUDED[pair.hand_port]) == gloves for pair in station), EXCLUDED
+            assert all(pair.retarget is pair.default_retarget for pair in station)
+            assert not any(pair.calibration.calibrated for pair in station)
+            for pair in station:
+                calibrate(pair)
+            station.start()
+            threads = {thread.name for thread in threading.enumerate()}
+            for name in ("left", "right"):
+                assert {f"{name}-glove-reader", f"{name}-pose", f"{name}-feedback", f"{name}-haptics"} <= threads, threads
+            time.sleep(0.5)
+
+            print(f"  both pairs healthy, {RUN_TIME:.0f} s:")
+            results = run(station)
+            for name, (stats, rate) in results.items():
+                assert abs(rate - 1.0 / SEND_INTERVAL) < 5.0, f"{name}: pose loop is not at SEND_INTERVAL"
+                assert stats["glove_frames"] > 0 and stats["poses_sent"] > 0 and stats["running"]
+            # Independent retargeting: each hand follows its own table.
+            left, right = station["left"].leap_node.curr_pos, station["right"].leap_node.curr_pos
+            assert not np.allclose(left, right)
+
+            # Slow the right pair down on both ends.
+            right_sim.loop_time = SLOW_LOOP_TIME
+            fake_dynamixel.get_bus("fake-station-right").latency = SLOW_BUS_LATENCY
+            time.sleep(0.5)
+            print(f"\n  right pair slowed ({SLOW_LOOP_TIME * 1e3:.0f} ms glove, {SLOW_BUS_LATENCY * 1e3:.0f} ms bus round trip):")
+            healthy = {name: stats for name, (stats, rate) in results.items()}
+            results = run(station)
+            left_stats, left_rate = results["left"]
+            right_stats, right_rate = results["right"]
+            assert right_rate < 1.0 / SEND_INTERVAL - 5.0, "slowed pair kept its rate, test is not slowing it"
+            assert abs(left_rate - 1.0 / SEND_INTERVAL) < 5.0, "healthy pair lost its rate"
+            assert left_stats["latency"]["p99_ms"] < max(2 * healthy["left"]["latency"]["p99_ms"], 10.0), "healthy pair's latency went up"
+            left_frames = left_stats["glove_frames"] - healthy["left"]["glove_frames"]
+            right_frames = right_stats["glove_frames"] - healthy["right"]["glove_frames"]
+            assert left_stats["glove_age_ms"] < 50.0 and right_frames < left_frames / 5
+            assert station.is_running and not station.errors()
+        finally:
+            station.close()
+    assert not station.is_running
+    assert not any(pair.leap_node.dxl_client.is_connected for pair in station), "hand left connected"
+    print("  slowed pair only delays itself, hands disconnected on close   ok")
+
+
+def test_open_failure():
+    try:
+        TeleopStation([TeleopPair("left", "a"), TeleopPair("left", "b")])
+        raise AssertionError("duplicate pair names accepted")
+    except ValueError:
+        pass
+    try:
+        TeleopStation([TeleopPair("left", "a"), TeleopPair("right", "b")]).open()
+        raise AssertionError("two pairs without a hand port accepted")
+    except ValueError:
+        pass
+
+    def missing_glove(port, baud_rate):
+        raise OSError("no glove on " + port)
+
+    with GloveSimulator() as sim:
+        good = make_pair("good", sim.port_name, 1.0)
+        bad = make_pair("bad", "/dev/does-not-exist", 1.0)
+        bad.glove_opener = missing_glove
+        try:
+            TeleopStation([good, bad]).open()
+            raise AssertionError("failed pair did not raise")
+        except OSError:
+            pass
+        assert not good.glove_serial.is_open and not good.haptics.is_alive()
+        assert not good.leap_node.dxl_client.is_connected
+    print("  duplicate names and unassigned hands refused, failed open closes the other pairs   ok")
+
+
+def main():
+    print("Teleop station\n")
+    test_pairs()
+    test_open_failure()
+    print("\n✅ Teleop station test passed")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,148 @@
+"""
+Test + benchmark for the LeapNode background telemetry poller.
+
+Runs a LeapNode on a simulated 16-motor bus (fake_dynamixel) with polling on,
+while one thread streams poses and several threads read snapshot() at
+kHz rates. Every commanded pose sets all joints to the same angle, so a
+snapshot mixing two polls (a torn read) shows up as unequal joints.
+
+Reports the poll rate, the caller-side read latency from the snapshot against
+a blocking bus read, and checks:
+- no torn snapshots, sequence numbers never go backwards,
+- commands and polls never overlap on the bus (bus_lock),
+- the snapshot follows the commanded pose,
+- a failing read is counted and exposed in `error`, and polling carries on.
+
+Usage:
+    python TelemetryPollerTest.py [bus_latency_ms]
+"""
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+
+from LeapHandAPI import LeapNode
+from leap_hand_utils import fake_dynamixel
+from leap_hand_utils.dynamixel_client import DynamixelClient
+
+MOTORS = list(range(16))
+POLL_RATE = 200
+RUN_TIME = 2.0
+READERS = 3
+
+
+def read_latency(read, count=200):
+    start = time.perf_counter()
+    for _ in range(count):
+        read()
+    return (time.perf_counter() - start) / count
+
+
+def main():
+    bus_latency = float(sys.argv[1]) / 1000.0 if len(sys.argv) > 1 else 0.001
+    fake_dynamixel.reset_buses()
+    bus = fake_dynamixel.get_bus("fake-telemetry", latency=bus_latency)
+    client = DynamixelClient(MOTORS, "fake-telemetry", 4000000, sdk=fake_dynamixel)
+    client.connect()
+    leap_node = LeapNode(dxl_client=client)
+    leap_node.set_leap(np.full(len(MOTORS), np.pi))  # The home pose is not uniform
+
+    blocking = read_latency(leap_node.read_pos, count=50)
+
+    # Detect overlapping transactions: the poller and the command writer must
+    # never be inside the client at the same time.
+    overlaps = [0]
+    in_bus = [0]
+    original_transact = bus.transact
+
+    failures = [0]  # Transactions left to fail, as a serial timeout would
+
+    def transact(*args, **kwargs):
+        if failures[0] > 0:
+            failures[0] -= 1
+            raise OSError("simulated serial timeout")
+        in_bus[0] += 1
+        if in_bus[0] > 1:
+            overlaps[0] += 1
+        try:
+            return original_transact(*args, **kwargs)
+        finally:
+            in_bus[0] -= 1
+    bus.transact = transact
+
+    leap_node.start_polling(POLL_RATE)
+    assert leap_node.is_polling
+    stop = threading.Event()
+    torn = [0]
+    backwards = [0]
+    reads = [0]
+
+    def command():
+        angle = 0
+        while not stop.is_set():
+            angle = (angle + 1) % 64
+            leap_node.set_leap(np.full(len(MOTORS), np.pi + (angle - 32) * 0.009))  # Inside every joint limit
+            time.sleep(0.005)
+
+    def reader():
+        last_seq = 0
+        while not stop.is_set():
+            snapshot = leap_node.snapshot()
+            if not np.all(snapshot.pos == snapshot.pos[0]):
+                torn[0] += 1
+            if snapshot.seq < last_seq:
+                backwards[0] += 1
+            last_seq = snapshot.seq
+            reads[0] += 1
+            time.sleep(0.0002)  # ~kHz consumers; busy-spinning threads would starve the poller of the GIL
+
+    threads = [threading.Thread(target=command)] + [threading.Thread(target=reader) for _ in range(READERS)]
+    start_polls = leap_node.polls
+    for thread in threads:
+        thread.start()
+    time.sleep(RUN_TIME)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    polls = leap_node.polls - start_polls
+
+    cached = read_latency(leap_node.read_pos)
+    time.sleep(0.05)
+    expected = leap_node.curr_pos
+    assert np.allclose(leap_node.read_pos(), expected, atol=2 * np.pi / 4096), "snapshot does not follow the pose"
+    pos, vel, cur = leap_node.pos_vel_eff_srv()
+    assert pos.shape == vel.shape == cur.shape == (len(MOTORS),)
+
+    # Reads that raise are logged and counted; the poller keeps running.
+    assert leap_node.poll_errors == 0 and leap_node.error is None
+    polls_before = leap_node.polls
+    failures[0] = 3
+    time.sleep(0.2)
+    assert leap_node.poll_errors == 3 and isinstance(leap_node.error, OSError), "poll errors not reported"
+    assert leap_node.is_polling and leap_node.polls > polls_before + 3, "poller stopped after an error"
+    assert time.perf_counter() - leap_node.snapshot().timestamp < 0.05
+
+    leap_node.stop_polling()
+    assert not leap_node.is_polling
+    assert np.allclose(leap_node.read_pos(), expected, atol=2 * np.pi / 4096), "bus read after stop_polling failed"
+    client.disconnect()
+
+    print(f"Simulated bus latency {bus_latency * 1000:.1f} ms, poll rate {POLL_RATE} Hz, {READERS} reader threads\n")
+    print(f"  polls             {polls / RUN_TIME:8.1f} Hz  (overruns {leap_node.poll_overruns})")
+    print(f"  snapshot reads    {reads[0]:8d}     torn {torn[0]}  seq backwards {backwards[0]}")
+    print(f"  bus overlaps      {overlaps[0]:8d}")
+    print(f"  poll errors       {leap_node.poll_errors:8d}     injected 3, poller kept going")
+    print(f"  read_pos latency  {blocking * 1e6:8.1f} us blocking  {cached * 1e6:6.1f} us from snapshot")
+    assert torn[0] == 0, "torn snapshot"
+    assert backwards[0] == 0, "snapshot sequence went backwards"
+    assert overlaps[0] == 0, "poller and commands overlapped on the bus"
+    assert polls > 0.5 * POLL_RATE * RUN_TIME, "poller too slow"
+    print("\n✅ Telemetry poller test passed")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+"""
+Test for host-side trajectory streaming (TrajectoryBuffer + LeapNode.start_streaming).
+
+1. TrajectoryBuffer on its own: linear / cubic interpolation hit the
+   waypoints, the velocity limit holds, stale waypoints are refused,
+   sampling past the newest waypoint counts an underrun.
+2. A LeapNode on the simulated bus (fake_dynamixel with joint dynamics)
+   driven by a 20 Hz producer (like deploy.py) following a 1 Hz sine:
+   direct set_leap() vs. streaming at 200 Hz. Reports the largest goal step
+   the servos see, the command rate, and underruns, then stops the producer
+   to check underruns are reported.
+"""
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+
+from LeapHandAPI import LeapNode
+from leap_hand_utils import fake_dynamixel as fd
+from leap_hand_utils.dynamixel_client import DynamixelClient
+from leap_hand_utils.trajectory import CUBIC, LINEAR, TrajectoryBuffer
+
+MOTORS = list(range(16))
+PRODUCER_RATE = 20
+STREAM_RATE = 200
+RUN_TIME = 2.0
+AMPLITUDE = 0.5
+
+
+def test_buffer():
+    times = [0.0, 0.1, 0.2, 0.3]
+    poses = [np.full(2, p) for p in (0.0, 1.0, 0.0, 1.0)]
+    for interpolation in (LINEAR, CUBIC):
+        buffer = TrajectoryBuffer(2, interpolation)
+        for t, pose in zip(times, poses):
+            assert buffer.push(t, pose)
+        for t, pose in zip(times[:-1], poses[:-1]):
+            assert np.allclose(buffer.sample(t), pose), f"{interpolation}: missed waypoint at {t}"
+    buffer = TrajectoryBuffer(2, LINEAR)
+    buffer.push(0.0, poses[0])
+    buffer.push(0.1, poses[1])
+    assert np.allclose(buffer.sample(0.05), 0.5)
+    assert not buffer.push(0.05, poses[0]) and buffer.rejected == 1
+    assert np.allclose(buffer.sample(0.2), 1.0) and buffer.underruns == 1
+
+    limited = TrajectoryBuffer(2, LINEAR, max_velocity=2.0)
+    limited.reset(np.zeros(2))
+    limited.push(0.0, np.full(2, 1.0))
+    previous = np.zeros(2)
+    for _ in range(10):
+        pose = limited.sample(0.0, dt=0.01)
+        assert np.all(np.abs(pose - previous) <= 2.0 * 0.01 + 1e-12), "velocity limit exceeded"
+        previous = pose
+    assert np.allclose(previous, 0.2)
+    print("  TrajectoryBuffer: waypoints, velocity limit, rejects, underruns   ok")
+
+
+def target(t):
+    return np.pi + AMPLITUDE * np.sin(2 * np.pi * t) * np.ones(len(MOTORS))
+
+
+def run(name, streaming, port):
+    fd.get_bus(port, latency=0.0005, time_constant=0.02)
+    client = DynamixelClient(MOTORS, port, 4000000, sdk=fd)
+    client.connect()
+    leap_node = LeapNode(dxl_client=client)
+    leap_node.set_leap(target(0.0))
+
+    writer = client.position_writer(MOTORS)
+    sent = []
+    write = writer.write_affine
+
+    def recording_write(*args, **kwargs):
+        if write(*args, **kwargs):
+            sent.append(writer.goal_positions())
+            return True
+        return False
+    writer.write_affine = recording_write
+
+    if streaming:
+        leap_node.start_streaming(STREAM_RATE, delay=2.0 / PRODUCER_RATE, interpolation=CUBIC, max_velocity=8.0)
+    start = time.perf_counter()
+    while time.perf_counter() - start < RUN_TIME:
+        now = time.perf_counter()
+        if streaming:
+            leap_node.stream_leap(target(now - start), t=now)
+        else:
+            leap_node.set_leap(target(now - start))
+        time.sleep(1.0 / PRODUCER_RATE)
+
+    result = {"steps": np.abs(np.diff(np.array(sent), axis=0)).max(), "rate": len(sent) / RUN_TIME}
+    if streaming:
+        result["underruns"] = leap_node.trajectory.underruns
+        # Producer gone: playback runs off the end of the buffer.
+        time.sleep(0.2)
+        result["stalled_underruns"] = leap_node.trajectory.underruns - result["underruns"]
+        leap_node.stop_streaming()
+        assert not leap_node.is_streaming
+    client.disconnect()
+    print(f"  {name:<24} {result['rate']:6.1f} writes/s  max goal step {result['steps']:.4f} rad"
+          + (f"  underruns {result['underruns']} (after producer stop +{result['stalled_underruns']})"
+             if streaming else ""))
+    return result
+
+
+def main():
+    fd.reset_buses()
+    print("Trajectory streaming\n")
+    test_buffer()
+    direct = run(f"direct set_leap {PRODUCER_RATE} Hz", False, "fake-direct")
+    streamed = run(f"streamed {STREAM_RATE} Hz cubic", True, "fake-stream")
+    assert streamed["rate"] > 5 * direct["rate"], "stream did not raise the command rate"
+    assert streamed["steps"] < direct["steps"] / 4, "streaming did not smooth the goal steps"
+    assert streamed["underruns"] <= 2, "underruns while the producer kept up"
+    assert streamed["stalled_underruns"] > 0, "underruns not reported after the producer stopped"
+    print("\n✅ Trajectory streaming test passed")
+
+
+if __name__ == "__main__":
+    main()
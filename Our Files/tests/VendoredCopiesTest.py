@@ -0,0 +1,60 @@
+"""
+Check that the vendored leap_hand_utils copies match Our Files/leap_hand_utils.
+
+The python, ros_module and ros2_module trees each ship their own copy of the
+package (a subset of its modules). Run this after changing any of them:
+
+1. Every vendored module is byte-identical to the one in Our Files.
+2. Every `leap_hand_utils.<module>` a copy imports is shipped in that copy.
+
+Fix a mismatch by copying the Our Files version over the vendored one.
+"""
+import filecmp
+import os
+import re
+import sys
+
+OUR_FILES = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SOURCE = os.path.join(OUR_FILES, "leap_hand_utils")
+VENDORED_ROOT = os.path.join(os.path.dirname(OUR_FILES), "LeapHand Files", "LeapHand Source Code")
+COPIES = ["python/leap_hand_utils", "ros_module/leap_hand_utils", "ros2_module/scripts/leap_hand_utils"]
+IMPORT = re.compile(r"^\s*(?:from|import)\s+leap_hand_utils\.(\w+)", re.MULTILINE)
+
+
+def modules(directory):
+    return sorted(name for name in os.listdir(directory) if name.endswith(".py"))
+
+
+def check_copy(copy):
+    directory = os.path.join(VENDORED_ROOT, copy)
+    shipped = modules(directory)
+    problems = []
+    for name in shipped:
+        source = os.path.join(SOURCE, name)
+        if not os.path.exists(source):
+            problems.append(f"{name} is not in Our Files/leap_hand_utils")
+        elif not filecmp.cmp(source, os.path.join(directory, name), shallow=False):
+            problems.append(f"{name} differs from Our Files/leap_hand_utils/{name}")
+        with open(os.path.join(directory, name)) as f:
+            for module in IMPORT.findall(f.read()):
+                if module + ".py" not in shipped:
+                    problems.append(f"{name} imports leap_hand_utils.{module}, which this copy does not ship")
+    return shipped, problems
+
+
+def main():
+    print("Vendored leap_hand_utils copies\n")
+    failed = False
+    for copy in COPIES:
+        shipped, problems = check_copy(copy)
+        print(f"  {copy:<40} {len(shipped)} modules   {'ok' if not problems else 'OUT OF SYNC'}")
+        for problem in problems:
+            print(f"    - {problem}")
+        failed = failed or bool(problems)
+    if failed:
+        sys.exit("\n❌ Vendored copies out of sync")
+    print("\n✅ Vendored copies match Our Files")
+
+
+if __name__ == "__main__":
+    main()